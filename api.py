@@ -0,0 +1,322 @@
+# api.py
+"""
+API HTTP assíncrona (ASGI) para os equipamentos das cancelas: câmeras de leitura de
+placa e controladores de barreira. Usa os mesmos controllers da interface Streamlit,
+executados em um pool de threads limitado, para que os dois caminhos gravem igual.
+
+Uso:
+    MONGO_URI="mongodb+srv://..." uvicorn api:app --host 0.0.0.0 --port 8000
+    STORAGE_BACKEND=sqlite uvicorn api:app --port 8000
+
+Rotas:
+    POST /entradas   {"placa", "tipo_veiculo"?, "entrada"?}
+    POST /saidas     {"placa", "saida"?}
+    GET  /cotacao    ?placa=...&saida=...
+    GET  /ocupacao   (estacionados, capacidade e vagas livres por tipo, dos contadores)
+    POST /lote       {"operacoes": [{"operacao": "entrada" | "saida" | "cotacao", ...}, ...]}
+    GET  /exportacao ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD&tipo=Carro&tipo=...  (CSV em streaming;
+                     exige "Authorization: Bearer <API_TOKEN>")
+    GET  /metrics    (métricas de desempenho no formato do Prometheus)
+
+Todas as rotas aceitam "lot_id" (no corpo ou na query string) para indicar o pátio da
+cancela; sem ele, vale o pátio do servidor (LOT_ID). Em /lote, o "lot_id" do corpo vale
+para todas as operações. Só são aceitos os pátios de API_LOTS ou, sem essa lista, os que
+já existem no banco; os demais respondem 422.
+
+/exportacao entrega o histórico inteiro do período e só responde com o cabeçalho
+"Authorization: Bearer <token>" igual a API_TOKEN; sem API_TOKEN definido, a rota fica
+fechada (403) e as demais continuam abertas para os equipamentos da rede das cancelas.
+
+/cotacao e /saidas localizam a placa no espelho em memória dos estacionados
+(storage/live.py), que inclui as entradas ainda no diário local; o banco só é
+consultado se ela não estiver lá.
+
+Datas seguem o ISO 8601; sem elas, vale o horário do servidor. Conflitos (placa já
+estacionada, pátio lotado para o tipo, saída já registrada) respondem 409, placas não
+estacionadas 404 e requisições inválidas 422.
+"""
+import hmac
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+import anyio
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from controllers.export_controller import iter_csv
+from controllers.pricing_controller import obter_precos
+from controllers.vehicle_controller import registrar_entrada, registrar_saida, cotar_saida, ocupacao
+from models.vehicle import TIPOS_VEICULOS
+from storage import open_repositories, STORAGE_BACKEND, ConflictError
+from storage.live import get_mirror
+from storage.occupancy import start_reconciler
+from utils.metrics import formato_prometheus, iniciar_exportacao
+
+# Threads disponíveis para os controllers; convém não passar do maxPoolSize do MongoClient
+API_WORKERS = int(os.environ.get("API_WORKERS", "32"))
+# Quantidade máxima de operações aceitas em uma chamada a /lote
+LIMITE_LOTE = int(os.environ.get("API_LIMITE_LOTE", "500"))
+# Token exigido por /exportacao; vazio mantém a rota fechada
+API_TOKEN = os.environ.get("API_TOKEN", "")
+# Pátios aceitos no "lot_id" das requisições, separados por vírgula; vazio aceita os já
+# existentes no banco (list_lots), relidos a cada API_LOTS_TTL segundos
+API_LOTS = [patio.strip() for patio in os.environ.get("API_LOTS", "").split(",") if patio.strip()]
+API_LOTS_TTL = float(os.environ.get("API_LOTS_TTL", 60))
+
+
+class RequisicaoInvalida(ValueError):
+    pass
+
+
+class PlacaNaoEstacionada(LookupError):
+    pass
+
+
+def _placa(dados):
+    placa = str(dados.get("placa") or "").upper().strip()
+    if not placa:
+        raise RequisicaoInvalida("Informe a placa do veículo.")
+    return placa
+
+
+def _instante(dados, campo):
+    valor = dados.get(campo)
+    if not valor:
+        return datetime.now()
+    try:
+        instante = datetime.fromisoformat(str(valor))
+    except ValueError:
+        raise RequisicaoInvalida(f"Data inválida em '{campo}': {valor}")
+    # Os registros são gravados no horário local, sem fuso
+    return instante.astimezone().replace(tzinfo=None) if instante.tzinfo else instante
+
+
+def _entrada(repo, config_repo, dados):
+    placa = _placa(dados)
+    tipo_veiculo = dados.get("tipo_veiculo") or "Carro"
+    if tipo_veiculo not in TIPOS_VEICULOS:
+        raise RequisicaoInvalida(f"Tipo de veículo desconhecido: {tipo_veiculo}")
+    entrada = _instante(dados, "entrada")
+    mensagem = registrar_entrada(repo, placa, tipo_veiculo, entrada)
+    return {"mensagem": mensagem, "placa": placa, "tipo_veiculo": tipo_veiculo, "entrada": entrada.isoformat()}
+
+
+def _cotacao(repo, config_repo, dados):
+    placa = _placa(dados)
+    saida = _instante(dados, "saida")
+    veiculo, valor = cotar_saida(repo, placa, saida, obter_precos(config_repo), espelho=get_mirror(repo))
+    if veiculo is None:
+        raise PlacaNaoEstacionada(f"Nenhum veículo estacionado com a placa {placa}.")
+    return {
+        "placa": veiculo["placa"],
+        "tipo_veiculo": veiculo.get("tipo_veiculo"),
+        "entrada": veiculo["entrada"].isoformat(),
+        "saida": saida.isoformat(),
+        "valor": float(valor),
+    }
+
+
+def _saida(repo, config_repo, dados):
+    placa = _placa(dados)
+    saida = _instante(dados, "saida")
+    veiculo, valor = cotar_saida(repo, placa, saida, obter_precos(config_repo), espelho=get_mirror(repo))
+    if veiculo is None:
+        raise PlacaNaoEstacionada(f"Nenhum veículo estacionado com a placa {placa}.")
+    mensagem = registrar_saida(repo, veiculo["_id"], veiculo["entrada"], saida, veiculo.get("tipo_veiculo"), valor)
+    return {
+        "mensagem": mensagem,
+        "placa": veiculo["placa"],
+        "tipo_veiculo": veiculo.get("tipo_veiculo"),
+        "entrada": veiculo["entrada"].isoformat(),
+        "saida": saida.isoformat(),
+        "valor_cobrado": float(valor),
+    }
+
+
+# operação: (função, status HTTP de sucesso)
+OPERACOES = {
+    "entrada": (_entrada, 201),
+    "saida": (_saida, 200),
+    "cotacao": (_cotacao, 200),
+}
+
+
+def _executar(operacao, repo, config_repo, dados, status_sucesso=200):
+    """Executa uma operação e devolve (status HTTP, corpo), convertendo os erros conhecidos."""
+    try:
+        return status_sucesso, operacao(repo, config_repo, dados)
+    except RequisicaoInvalida as e:
+        return 422, {"erro": str(e)}
+    except PlacaNaoEstacionada as e:
+        return 404, {"erro": str(e)}
+    except ConflictError as e:
+        return 409, {"erro": str(e)}
+
+
+def _executar_lote(repo, config_repo, operacoes):
+    resultados = []
+    for dados in operacoes:
+        operacao = OPERACOES.get(dados.get("operacao")) if isinstance(dados, dict) else None
+        if operacao is None:
+            resultados.append({"status": 422, "erro": "Operação inválida; use 'entrada', 'saida' ou 'cotacao'."})
+            continue
+        funcao, status_sucesso = operacao
+        status, corpo = _executar(funcao, repo, config_repo, dados, status_sucesso)
+        resultados.append({"status": status, **corpo})
+    return resultados
+
+
+def _autorizado(request, token):
+    """Confere o cabeçalho "Authorization: Bearer <token>" em tempo constante."""
+    esquema, _, informado = request.headers.get("authorization", "").partition(" ")
+    return esquema.lower() == "bearer" and hmac.compare_digest(informado.strip().encode(), token.encode())
+
+
+def create_app(repo=None, config_repo=None, workers=API_WORKERS, token=None, patios=None):
+    """
+    Cria a aplicação ASGI. Sem repositórios informados, abre os do backend de
+    STORAGE_BACKEND (no MongoDB, com a string de conexão de MONGO_URI) ao iniciar.
+    `token` protege /exportacao (padrão: API_TOKEN) e `patios` limita os pátios aceitos
+    (padrão: API_LOTS ou, se vazio, os existentes no banco).
+    """
+    token = API_TOKEN if token is None else token
+    patios = API_LOTS if patios is None else patios
+    estado = {"repo": repo, "config_repo": config_repo, "patios": None, "patios_lidos_em": 0.0}
+    limitador = anyio.CapacityLimiter(workers)
+    # Repositórios dos demais pátios, abertos uma única vez por lot_id
+    abertos = {}
+    abrindo = anyio.Lock()
+
+    async def em_thread(funcao, *args):
+        return await anyio.to_thread.run_sync(funcao, *args, limiter=limitador)
+
+    # Sem repositórios informados, os dos demais pátios são abertos no mesmo backend
+    abrir_patios = repo is None
+
+    async def patios_aceitos():
+        if patios:
+            return set(patios)
+        if estado["patios"] is None or time.monotonic() - estado["patios_lidos_em"] > API_LOTS_TTL:
+            estado["patios"] = set(await em_thread(estado["repo"].list_lots))
+            estado["patios_lidos_em"] = time.monotonic()
+        return estado["patios"]
+
+    async def repositorios(lot_id):
+        if not lot_id or lot_id == estado["repo"].lot_id:
+            return estado["repo"], estado["config_repo"]
+        # Um lot_id qualquer do cliente não pode criar pátios nem abrir repositórios à vontade
+        if not abrir_patios or not isinstance(lot_id, str) or lot_id not in await patios_aceitos():
+            raise RequisicaoInvalida(f"Pátio não atendido por esta API: {lot_id}")
+        if lot_id not in abertos:
+            async with abrindo:
+                if lot_id not in abertos:
+                    # Abrir pode conectar ao banco: fora do laço de eventos, como em lifespan
+                    abertos[lot_id] = await em_thread(
+                        lambda: open_repositories(STORAGE_BACKEND, mongo_uri=os.environ.get("MONGO_URI"), lot_id=lot_id)
+                    )
+        return abertos[lot_id]
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if estado["repo"] is None:
+            def abrir():
+                repo, config_repo = open_repositories(STORAGE_BACKEND, mongo_uri=os.environ.get("MONGO_URI"))
+                repo.ensure_indexes()
+                return repo, config_repo
+
+            estado["repo"], estado["config_repo"] = await em_thread(abrir)
+        start_reconciler(estado["repo"])
+        # Cotações e saídas procuram a placa primeiro no espelho dos estacionados, em memória
+        get_mirror(estado["repo"])
+        iniciar_exportacao()
+        yield
+
+    async def corpo_json(request):
+        try:
+            dados = await request.json()
+        except ValueError:
+            raise RequisicaoInvalida("O corpo da requisição deve ser um JSON válido.")
+        if not isinstance(dados, dict):
+            raise RequisicaoInvalida("O corpo da requisição deve ser um objeto JSON.")
+        return dados
+
+    def rota(operacao, status_sucesso=200, consulta=False):
+        async def endpoint(request):
+            try:
+                dados = dict(request.query_params) if consulta else await corpo_json(request)
+                repo_patio, config_patio = await repositorios(dados.get("lot_id"))
+            except RequisicaoInvalida as e:
+                return JSONResponse({"erro": str(e)}, status_code=422)
+            status, corpo = await em_thread(_executar, operacao, repo_patio, config_patio, dados, status_sucesso)
+            return JSONResponse(corpo, status_code=status)
+        return endpoint
+
+    async def lote(request):
+        try:
+            corpo = await corpo_json(request)
+            operacoes = corpo.get("operacoes")
+            if not isinstance(operacoes, list):
+                raise RequisicaoInvalida("Informe a lista 'operacoes'.")
+            if len(operacoes) > LIMITE_LOTE:
+                raise RequisicaoInvalida(f"No máximo {LIMITE_LOTE} operações por lote.")
+            repo_patio, config_patio = await repositorios(corpo.get("lot_id"))
+        except RequisicaoInvalida as e:
+            return JSONResponse({"erro": str(e)}, status_code=422)
+        # O lote inteiro roda em uma única passagem pelo pool de threads
+        resultados = await em_thread(_executar_lote, repo_patio, config_patio, operacoes)
+        return JSONResponse({"resultados": resultados})
+
+    async def exportacao(request):
+        if not token:
+            return JSONResponse({"erro": "Exportação desativada: defina API_TOKEN no servidor."}, status_code=403)
+        if not _autorizado(request, token):
+            return JSONResponse(
+                {"erro": "Informe o cabeçalho Authorization: Bearer <API_TOKEN>."},
+                status_code=401, headers={"WWW-Authenticate": "Bearer"},
+            )
+        try:
+            inicio, fim = (request.query_params.get(campo) for campo in ("inicio", "fim"))
+            inicio = datetime.combine(date.fromisoformat(inicio), datetime.min.time()) if inicio else None
+            fim = datetime.combine(date.fromisoformat(fim), datetime.max.time()) if fim else None
+        except ValueError:
+            return JSONResponse({"erro": "Datas devem estar no formato AAAA-MM-DD."}, status_code=422)
+        try:
+            repo_patio, _ = await repositorios(request.query_params.get("lot_id"))
+        except RequisicaoInvalida as e:
+            return JSONResponse({"erro": str(e)}, status_code=422)
+        tipos = request.query_params.getlist("tipo") or None
+        # O gerador é consumido lote a lote conforme a resposta é enviada
+        return StreamingResponse(
+            iter_csv(repo_patio, inicio, fim, tipos),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="historico.csv"'},
+        )
+
+    async def ocupacao_atual(request):
+        try:
+            repo_patio, _ = await repositorios(request.query_params.get("lot_id"))
+        except RequisicaoInvalida as e:
+            return JSONResponse({"erro": str(e)}, status_code=422)
+        return JSONResponse(await em_thread(ocupacao, repo_patio))
+
+    async def metricas(request):
+        return PlainTextResponse(formato_prometheus(), media_type="text/plain; version=0.0.4")
+
+    return Starlette(
+        routes=[
+            Route("/entradas", rota(*OPERACOES["entrada"]), methods=["POST"]),
+            Route("/saidas", rota(*OPERACOES["saida"]), methods=["POST"]),
+            Route("/cotacao", rota(*OPERACOES["cotacao"], consulta=True), methods=["GET"]),
+            Route("/ocupacao", ocupacao_atual, methods=["GET"]),
+            Route("/lote", lote, methods=["POST"]),
+            Route("/exportacao", exportacao, methods=["GET"]),
+            Route("/metrics", metricas, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
@@ -1,28 +1,79 @@
 # app.py
+import hashlib
+import hmac
+import os
+import tempfile
 import streamlit as st
-from pymongo import MongoClient
 from datetime import datetime, timedelta
-import pandas as pd
 from st_keyup import st_keyup
 from controllers.vehicle_controller import (
     registrar_entrada,
     preparar_saida,
     registrar_saida,
-    remover_veiculo
+    remover_veiculo,
+    limpar_veiculos,
+    pagina_historico,
+    ocupacao,
+    configurar_capacidade,
+    reconciliar_ocupacao
 )
-from controllers.pricing_controller import load_config, save_config
-from models.vehicle import normalize_vehicle_data
-from utils.helpers import calcular_valor
+from controllers.pricing_controller import load_config, save_config, simular_precos, DEFAULT_PRICES
+from controllers.dashboard_controller import resumo_faturamento_rollup, resumo_faturamento_patios
+from controllers.rollup_controller import reconstruir_rollups
+from controllers.export_controller import exportar, FORMATOS_EXPORTACAO
+from controllers.import_controller import importar, FORMATOS_IMPORTACAO
+from models.vehicle import normalize_vehicle_data, TIPOS_VEICULOS
+from utils.helpers import calcular_valor, calcular_valores
+from utils.tariffs import montar_regra, regra_tarifa
+from utils.metrics import BUCKETS, SLOW_OPERATION_MS, iniciar_exportacao, medir, operacoes_lentas, series, zerar
+from utils.plates import LIMITE_BUSCA
+from storage import open_repositories, open_lots, STORAGE_BACKEND, ConflictError
+from storage.archive import start_archiver
+from storage.occupancy import start_reconciler
+from storage.live import get_mirror
+
+# Opções de tamanho de página do Histórico
+TAMANHOS_PAGINA_HISTORICO = [25, 50, 100, 200]
+# Intervalo (segundos) em que a lista de estacionados é redesenhada a partir do espelho
+LIVE_REFRESH_INTERVAL = 2
+# Intervalo (segundos) em que o Dashboard confere se o histórico das análises ficou pronto
+ANALYTICS_WAIT_INTERVAL = 2
+# Seções do app; só a selecionada é executada a cada rerun
+SECOES = ["Movimento", "Dashboard", "Histórico", "Configurações"]
+# Opção do Dashboard que consolida todos os pátios
+TODOS_PATIOS = "Todos os pátios"
+# Análises do Dashboard; só a escolhida é calculada a cada rerun
+ANALISES_DASHBOARD = ["Ocupação", "Permanência", "Horários de pico", "Previsão"]
 
 st.set_page_config(page_title="Controle de Estacionamento", layout="wide")
 
-TIPOS_VEICULOS = {
-    "Carro": "🚗",
-    "Moto": "🏍️",
-    "Caminhão": "🚛",
-    "Van": "🚐",
-    "Bicicleta": "🚲"
-}
+
+def download_adiado():
+    """Se o st.download_button aceita data=função, lida só no clique (Streamlit recente), em vez dos bytes a cada rerun."""
+    try:
+        from streamlit.proto.DownloadButton_pb2 import DownloadButton
+    except ImportError:
+        return False
+    return "deferred_file_id" in DownloadButton.DESCRIPTOR.fields_by_name
+
+
+def descartar_exportacao():
+    """Apaga o arquivo da última exportação desta sessão, se ainda existir."""
+    exportacao = st.session_state.pop("exportacao", None)
+    if exportacao:
+        try:
+            os.remove(exportacao["caminho"])
+        except FileNotFoundError:
+            pass
+
+
+def ler_arquivo(caminho):
+    """Função sem argumentos que lê o arquivo em bytes, para o download adiado."""
+    def ler():
+        with open(caminho, "rb") as arquivo:
+            return arquivo.read()
+    return ler
+
 
 def show_connection_form():
     """
@@ -67,42 +118,74 @@ def show_connection_form():
 
 def init_connection():
     """
-    Lê a string de conexão do st.session_state e inicializa o MongoClient.
-    Retorna o objeto client para ser usado globalmente.
+    Retorna os repositórios de veículos e de preços do backend configurado em STORAGE_BACKEND.
+    No MongoDB, lê a string de conexão do st.session_state e usa o MongoClient compartilhado
+    para essa string, criado e validado apenas uma vez por processo; nos reruns seguintes
+    apenas o reaproveitamos. Os backends locais (sqlite, memory) não precisam de conexão.
     """
+    if STORAGE_BACKEND != "mongo":
+        return iniciar_armazenamento(STORAGE_BACKEND)
+
     mongo_uri = st.session_state.get("connection_string")
     if not mongo_uri:
         raise ValueError("String de conexão não configurada em st.session_state.")
-    return MongoClient(mongo_uri)
+    return iniciar_armazenamento("mongo", mongo_uri)
+
+@st.cache_resource(show_spinner=False)
+def iniciar_armazenamento(backend, mongo_uri=None):
+    """
+    Abre o armazenamento e sobe o que roda junto dele (índices, espelho dos estacionados,
+    arquivamento, reconciliação de vagas, exportação de métricas) uma única vez por
+    backend/URI; os reruns e as outras sessões recebem o resultado guardado. Falhas não
+    ficam em cache, e a próxima execução tenta de novo.
+    """
+    with medir("etapa", "Inicialização"):
+        if backend == "mongo":
+            repo, config_repo = open_repositories("mongo", mongo_uri=mongo_uri)
+        else:
+            repo, config_repo = open_repositories(backend)
+        erros_indices = repo.ensure_indexes()
+        estacionados_ao_vivo = get_mirror(repo)
+        start_archiver(repo)
+        reconciliador_ocupacao = start_reconciler(repo)
+        iniciar_exportacao()
+    return repo, config_repo, erros_indices, estacionados_ao_vivo, reconciliador_ocupacao
+
+def abrir_patios(lot_ids):
+    """Repositórios de veículos dos pátios informados, no mesmo armazenamento de init_connection."""
+    if STORAGE_BACKEND != "mongo":
+        return open_lots(STORAGE_BACKEND, lot_ids=lot_ids)
+    return open_lots("mongo", mongo_uri=st.session_state.connection_string, lot_ids=lot_ids)
 
 # Inicializa estados necessários
 if 'connection_tried' not in st.session_state:
     st.session_state.connection_tried = False
 
 if 'PRECO_POR_HORA' not in st.session_state:
-    st.session_state.PRECO_POR_HORA = {
-        "Carro": 10.0,
-        "Moto": 5.0,
-        "Caminhão": 15.0,
-        "Van": 12.0,
-        "Bicicleta": 2.0
-    }
-
-# Tenta conectar ao MongoDB com a URI armazenada
+    st.session_state.PRECO_POR_HORA = dict(DEFAULT_PRICES)
+
+# Tenta conectar ao armazenamento (MongoDB com a URI armazenada, por padrão)
 try:
-    client = init_connection()
-    client.server_info()  # Verifica se a conexão funciona
-    db = client.estacionamento
-    collection = db.veiculos
-    config_collection = db.configuracoes
+    repo, config_repo, erros_indices, estacionados_ao_vivo, reconciliador_ocupacao = init_connection()
 except Exception as e:
+    if STORAGE_BACKEND != "mongo":
+        st.error(f"Erro ao abrir o armazenamento '{STORAGE_BACKEND}': {e}")
+        st.stop()
     st.error(f"Erro ao conectar no MongoDB: {e}")
     show_connection_form()
     st.stop()
 
+# O health check roda em segundo plano; aqui apenas consultamos o último resultado
+if STORAGE_BACKEND == "mongo":
+    from utils.connection import connection_status
+
+    status_conexao = connection_status(st.session_state.connection_string)
+    if status_conexao and not status_conexao["ok"]:
+        st.warning(f"Conexão com o MongoDB instável: {status_conexao['error']}")
+
 # Tenta carregar as configurações de preços
 try:
-    load_config(config_collection)
+    load_config(config_repo)
 except Exception as e:
     st.error(f"Não foi possível carregar as configurações de preço: {e}")
 
@@ -125,17 +208,25 @@ def update_datetime():
         st.session_state.last_plate = st.session_state.placa_entrada
 
 st.title("📋 Controle de Estacionamento")
+st.caption(f"📍 Pátio: {repo.lot_id}")
 
-tab1, tab2, tab3, tab4 = st.tabs(["Movimento", "Dashboard", "Histórico", "Configurações"])
+# Ao contrário de st.tabs, que executa todas as abas a cada rerun, só a seção escolhida
+# roda (e consulta o banco); dentro dela, cada bloco interativo é um fragmento que
+# reroda sozinho
+secao = st.radio("Seção:", SECOES, horizontal=True, key="secao", label_visibility="collapsed")
 
 # -----------------------------------------
-# TAB 1 - Movimento (Entrada e Lista de Veículos Estacionados)
+# SEÇÃO 1 - Movimento (Entrada e Lista de Veículos Estacionados)
 # -----------------------------------------
-with tab1:
+@medir("tela", "Movimento")
+def secao_movimento():
     col1, col2 = st.columns(2)
 
-    # Seção de Registrar Entrada
-    with col1:
+    # Seção de Registrar Entrada: fragmento próprio, para que digitar a placa ou trocar
+    # o tipo redesenhe só o formulário
+    @st.fragment
+    @medir("tela", "Movimento: entrada")
+    def registro_entrada():
         st.subheader("Registrar Entrada")
 
         placa_input = st.text_input(
@@ -171,55 +262,90 @@ with tab1:
                 st.error("Por favor, informe a placa do veículo.")
             else:
                 try:
+                    versao = estacionados_ao_vivo.version
                     message = registrar_entrada(
-                        collection,
+                        repo,
                         placa_input.upper().strip(),
                         tipo_veiculo,
                         datetime_entrada
                     )
+                    estacionados_ao_vivo.sync(versao)
                     st.success(message)
                     st.rerun()
+                except ConflictError as e:
+                    st.warning(str(e))
                 except Exception as e:
                     st.error(f"Ocorreu um erro ao registrar a entrada: {e}")
 
-    # Seção de Veículos Estacionados
-    with col2:
+    # Seção de Veículos Estacionados: lida do espelho em memória e redesenhada sozinha,
+    # sem rerun da página, para mostrar também as entradas e saídas de outros terminais
+    @st.fragment(run_every=LIVE_REFRESH_INTERVAL)
+    @medir("tela", "Movimento: estacionados")
+    def lista_estacionados():
         st.subheader("Veículos Estacionados")
-        busca_placa = st_keyup("🔍 Buscar placa:", key="0").upper()
 
-        query = {"status": "estacionado"}
-        if busca_placa:
-            query["placa"] = {"$regex": busca_placa, "$options": "i"}
+        # Vagas livres das zonas com capacidade, lidas dos contadores (sem percorrer os estacionados)
+        try:
+            situacao = ocupacao(repo)
+        except Exception as e:
+            st.caption(f"⚠️ Não foi possível ler a ocupação: {e}")
+            situacao = None
+        if situacao and situacao["capacidade"]:
+            for coluna, (tipo, livres) in zip(st.columns(len(situacao["vagas_livres"])), situacao["vagas_livres"].items()):
+                coluna.metric(
+                    f"{TIPOS_VEICULOS.get(tipo, '🚗')} Vagas livres",
+                    livres,
+                    help=f"{situacao['por_tipo'].get(tipo, 0)} de {situacao['capacidade'][tipo]} ocupadas ({tipo})"
+                )
+
+        busca_placa = st_keyup("🔍 Buscar placa:", key="0", debounce=300).upper()
 
         try:
-            veiculos = list(collection.find(query))
+            veiculos = estacionados_ao_vivo.snapshot(busca_placa, limite=LIMITE_BUSCA if busca_placa else None)
         except Exception as e:
             st.error(f"Não foi possível buscar veículos estacionados: {e}")
             veiculos = []
 
+        if not estacionados_ao_vivo.status["ok"]:
+            st.caption(f"⚠️ Atualização ao vivo interrompida: {estacionados_ao_vivo.status['error']}")
+
+        replicacao = repo.replication_status()
+        if replicacao and replicacao["pendentes"]:
+            st.caption(
+                f"⏳ {replicacao['pendentes']} operações aguardando envio ao MongoDB "
+                f"(a mais antiga há {replicacao['atraso_s']:.0f}s)"
+            )
+
         if not veiculos:
             if busca_placa:
                 st.info(f"Nenhum veículo encontrado com a placa contendo '{busca_placa}'.")
             else:
                 st.info("Não há veículos estacionados no momento.")
         else:
-            for veiculo in veiculos:
+            # Calcula o valor de todos os veículos listados em uma única passada
+            try:
+                valores_estimados = calcular_valores(
+                    [veiculo['entrada'] for veiculo in veiculos],
+                    datetime.now(),
+                    [veiculo.get('tipo_veiculo') for veiculo in veiculos],
+                    st.session_state.PRECO_POR_HORA,
+                    placas=[veiculo['placa'] for veiculo in veiculos]
+                )
+                erro_valores = None
+            except Exception as e:
+                valores_estimados = [0] * len(veiculos)
+                erro_valores = e
+
+            for veiculo, valor in zip(veiculos, valores_estimados):
                 emoji = TIPOS_VEICULOS.get(veiculo.get('tipo_veiculo', 'Carro'), '🚗')
                 with st.expander(f"{emoji} {veiculo['placa']}"):
                     st.write(f"Tipo: {veiculo.get('tipo_veiculo', 'Não especificado')}")
                     st.write(f"Entrada: {veiculo['entrada'].strftime('%d/%m/%Y %H:%M:%S')}")
 
-                    try:
-                        valor = calcular_valor(
-                            veiculo['entrada'],
-                            datetime.now(),
-                            veiculo['tipo_veiculo'],
-                            st.session_state.PRECO_POR_HORA
-                        )
+                    if erro_valores is None:
                         st.write(f"Valor a pagar (se sair agora): R$ {valor:.2f}")
-                    except Exception as e:
-                        st.error(f"Erro ao calcular valor estimado: {e}")
-                        valor = 0
+                    else:
+                        st.error(f"Erro ao calcular valor estimado: {erro_valores}")
 
                     if st.button(f"Registrar Saída {veiculo['placa']}", key=f"saida_{veiculo['placa']}", type="primary"):
                         try:
@@ -229,10 +355,20 @@ with tab1:
                         except Exception as e:
                             st.error(f"Não foi possível preparar a saída: {e}")
 
+    with col1:
+        registro_entrada()
+    with col2:
+        lista_estacionados()
+
 # -----------------------------------------
-# TAB 2 - Dashboard (Faturamento)
+# SEÇÃO 2 - Dashboard (Faturamento)
 # -----------------------------------------
-with tab2:
+@st.fragment
+@medir("tela", "Dashboard")
+def secao_dashboard():
+    # O pandas só é importado pelas seções que montam tabelas, e não no início do app
+    import pandas as pd
+
     st.subheader("Dashboard de Faturamento")
 
     col_data_inicio, col_data_fim = st.columns(2)
@@ -251,88 +387,341 @@ with tab2:
     fim = datetime.combine(data_fim, datetime.max.time())
 
     try:
-        veiculos_finalizados = list(collection.find({
-            "status": "finalizado",
-            "saida": {"$gte": inicio, "$lte": fim}
-        }))
+        patios = repo.list_lots()
     except Exception as e:
-        st.error(f"Erro ao buscar veículos finalizados: {e}")
-        veiculos_finalizados = []
+        st.error(f"Erro ao listar os pátios: {e}")
+        patios = [repo.lot_id]
+    opcoes_patio = patios + [TODOS_PATIOS] if len(patios) > 1 else patios
+    patio = st.selectbox("Pátio:", opcoes_patio, index=opcoes_patio.index(repo.lot_id), key="dashboard_patio")
 
-    # Normaliza os dados do veículo para evitar inconsistências
-    veiculos_finalizados = [normalize_vehicle_data(v) for v in veiculos_finalizados]
-    veiculos_finalizados = [v for v in veiculos_finalizados if v is not None]
-
-    if veiculos_finalizados:
-        df = pd.DataFrame(veiculos_finalizados)
-        total_faturado = df['valor_cobrado'].sum()
-
-        veiculos_por_tipo = df['tipo_veiculo'].value_counts()
+    por_patio = None
+    repos_patio = {}
+    try:
+        if patio == TODOS_PATIOS:
+            # Um resumo por pátio, consultados em paralelo, e a soma de todos
+            repos_patio = abrir_patios(patios)
+            consolidado = resumo_faturamento_patios(repos_patio, inicio, fim)
+            resumo, por_patio = consolidado["total"], consolidado["por_patio"]
+        elif patio == repo.lot_id:
+            repos_patio = {repo.lot_id: repo}
+            resumo = resumo_faturamento_rollup(repo, inicio, fim)
+        else:
+            repos_patio = abrir_patios([patio])
+            resumo = resumo_faturamento_rollup(repos_patio[patio], inicio, fim)
+    except Exception as e:
+        st.error(f"Erro ao buscar veículos finalizados: {e}")
+        resumo = None
 
+    if resumo and resumo["quantidade"]:
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Faturado", f"R$ {total_faturado:.2f}")
+            st.metric("Total Faturado", f"R$ {resumo['total_faturado']:.2f}")
         with col2:
-            st.metric("Quantidade de Veículos", len(veiculos_finalizados))
+            st.metric("Quantidade de Veículos", resumo["quantidade"])
         with col3:
-            ticket_medio = total_faturado / len(veiculos_finalizados) if veiculos_finalizados else 0
-            st.metric("Ticket Médio", f"R$ {ticket_medio:.2f}")
+            st.metric("Ticket Médio", f"R$ {resumo['ticket_medio']:.2f}")
+
+        if por_patio:
+            st.subheader("Faturamento por Pátio")
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "Pátio": lot_id,
+                        "Total faturado": r["total_faturado"],
+                        "Veículos": r["quantidade"],
+                        "Ticket médio": r["ticket_medio"],
+                    }
+                    for lot_id, r in por_patio.items()
+                ]),
+                hide_index=True,
+                column_config={
+                    "Total faturado": st.column_config.NumberColumn(format="R$ %.2f"),
+                    "Ticket médio": st.column_config.NumberColumn(format="R$ %.2f"),
+                },
+            )
 
         st.subheader("Distribuição por Tipo de Veículo")
-        st.bar_chart(veiculos_por_tipo)
+        with medir("etapa", "Dashboard: gráfico por tipo"):
+            st.bar_chart(pd.Series(resumo["por_tipo"], name="count"))
     else:
         st.info("Nenhum veículo finalizado no período selecionado.")
 
+    if repos_patio:
+        analises_dashboard(repos_patio, inicio, fim)
+
+@st.fragment(run_every=ANALYTICS_WAIT_INTERVAL)
+def aguardar_retratos(repos_patio):
+    """Aviso exibido enquanto os retratos são montados; recarrega a página quando ficam prontos (ou falham)."""
+    from controllers.analytics_controller import retrato_sem_espera
+
+    try:
+        prontos = all(retrato_sem_espera(repo_patio) is not None for repo_patio in repos_patio)
+    except Exception:
+        prontos = True
+    if prontos:
+        st.rerun()
+    st.info("Preparando o histórico das análises; ele aparece aqui assim que estiver pronto.")
+
+def analises_dashboard(repos_patio, inicio, fim):
+    """
+    Curva de ocupação, permanências, horários de pico e previsão dos pátios de
+    `repos_patio`, calculadas sobre o retrato em disco de cada um (controllers.analytics_controller).
+    O retrato é atualizado em segundo plano: enquanto isso, vale o último pronto e, antes
+    do primeiro, um aviso. Como nas seções, só a análise escolhida é calculada e desenhada.
+    """
+    import altair as alt
+    from controllers.analytics_controller import (
+        DIAS_SEMANA,
+        HORAS_PREVISAO,
+        MEDIDAS_PICO,
+        combinar,
+        curva_ocupacao,
+        distribuicao_permanencia,
+        mapa_pico,
+        previsao_ocupacao,
+        retrato_sem_espera,
+    )
+
+    st.subheader("Ocupação e Permanência")
+    try:
+        with medir("etapa", "Dashboard: retrato"):
+            retratos = [retrato_sem_espera(repo_patio) for repo_patio in repos_patio.values()]
+            if any(pronto is None for pronto in retratos):
+                aguardar_retratos(list(repos_patio.values()))
+                return
+            dados = combinar(retratos)
+            # O pátio deste terminal vem do espelho ao vivo; os demais, do armazenamento
+            estacionados = [
+                veiculo
+                for lot_id, repo_patio in repos_patio.items()
+                for veiculo in (estacionados_ao_vivo.snapshot() if lot_id == repo.lot_id else repo_patio.list_parked())
+            ]
+    except Exception as e:
+        st.error(f"Erro ao carregar o histórico das análises: {e}")
+        return
+
+    if not len(dados) and not estacionados:
+        st.info("Ainda não há movimento para analisar.")
+        return
+
+    analise = st.radio("Análise:", ANALISES_DASHBOARD, horizontal=True, key="dashboard_analise")
+    agora = datetime.now()
+
+    if analise == "Ocupação":
+        with medir("etapa", "Dashboard: curva de ocupação"):
+            st.line_chart(curva_ocupacao(dados, inicio, min(fim, agora), estacionados=estacionados))
+        st.caption("Veículos no pátio a cada hora, por tipo e no total.")
+
+    elif analise == "Permanência":
+        with medir("etapa", "Dashboard: permanência"):
+            distribuicao = distribuicao_permanencia(dados, inicio, fim)
+        if distribuicao["resumo"].empty:
+            st.info("Nenhum veículo finalizado no período selecionado.")
+        else:
+            st.bar_chart(distribuicao["faixas"])
+            st.dataframe(
+                distribuicao["resumo"],
+                hide_index=True,
+                column_config={
+                    coluna: st.column_config.NumberColumn(format="%.0f")
+                    for coluna in ("Média (min)", "Mediana (min)", "p90 (min)")
+                },
+            )
+
+    elif analise == "Horários de pico":
+        medida = st.selectbox("Medida:", list(MEDIDAS_PICO), format_func=MEDIDAS_PICO.get, key="dashboard_medida_pico")
+        with medir("etapa", "Dashboard: horários de pico"):
+            mapa = mapa_pico(dados, inicio, fim, medida, estacionados=estacionados)
+            celulas = mapa.rename_axis("Dia").reset_index().melt(id_vars="Dia", var_name="Hora", value_name="Média")
+            st.altair_chart(
+                alt.Chart(celulas).mark_rect().encode(
+                    x=alt.X("Hora:O"),
+                    y=alt.Y("Dia:N", sort=DIAS_SEMANA),
+                    color=alt.Color("Média:Q", title=MEDIDAS_PICO[medida]),
+                    tooltip=["Dia", "Hora", alt.Tooltip("Média:Q", format=".1f")],
+                )
+            )
+        st.caption("Média por dia no período, por dia da semana e hora.")
+
+    else:
+        with medir("etapa", "Dashboard: previsão"):
+            previsao = previsao_ocupacao(dados, agora, estacionados=estacionados)
+        if previsao is None:
+            st.info("A previsão precisa de pelo menos uma semana de histórico.")
+        else:
+            st.line_chart(previsao[["Prevista", "Faixa inferior", "Faixa superior"]])
+            st.bar_chart(previsao["Entradas previstas"])
+            st.caption(
+                f"Ocupação prevista para as próximas {HORAS_PREVISAO} horas: média do mesmo dia e horário "
+                "nas semanas anteriores, ajustada pela ocupação atual, e as entradas esperadas a cada hora."
+            )
+
 # -----------------------------------------
-# TAB 3 - Histórico de Veículos
+# SEÇÃO 3 - Histórico de Veículos
 # -----------------------------------------
-with tab3:
-    st.subheader("Histórico de Veículos")
+@st.fragment
+@medir("tela", "Histórico")
+def secao_historico():
+    import pandas as pd
 
-    busca_historico = st_keyup("🔍 Buscar placa no histórico:", key="1").upper()
+    st.subheader("Histórico de Veículos")
 
-    query_historico = {"status": "finalizado"}
-    if busca_historico:
-        query_historico["placa"] = {"$regex": busca_historico, "$options": "i"}
+    col_busca, col_tamanho = st.columns([3, 1])
+    with col_busca:
+        busca_historico = st_keyup("🔍 Buscar placa no histórico:", key="1", debounce=300).upper()
+    with col_tamanho:
+        tamanho_pagina = st.selectbox("Registros por página:", TAMANHOS_PAGINA_HISTORICO, index=1, key="historico_tamanho")
+
+    # Cursores (saida, _id) das páginas já visitadas; uma nova busca volta à primeira página
+    if st.session_state.get("historico_consulta") != (busca_historico, tamanho_pagina):
+        st.session_state.historico_consulta = (busca_historico, tamanho_pagina)
+        st.session_state.historico_cursores = [None]
+    cursores = st.session_state.historico_cursores
+
+    for removido, message in st.session_state.pop("historico_remocao", []):
+        if removido:
+            st.success(message)
+        else:
+            st.error(message)
 
     try:
-        historico = list(collection.find(query_historico).sort("saida", -1).limit(50))
+        historico, proximo_cursor = pagina_historico(repo, busca_historico, tamanho_pagina, cursores[-1])
     except Exception as e:
         st.error(f"Erro ao buscar histórico de veículos: {e}")
-        historico = []
+        historico, proximo_cursor = [], None
 
     historico = [normalize_vehicle_data(v) for v in historico]
     historico = [v for v in historico if v is not None]
 
     if historico:
-        for veiculo in historico:
-            emoji = TIPOS_VEICULOS.get(veiculo.get('tipo_veiculo', 'Carro'), '🚗')
-            saida_str = veiculo['saida'].strftime('%d/%m/%Y %H:%M') if veiculo.get('saida') else "Desconhecido"
-            with st.expander(f"{emoji} {veiculo['placa']} - {saida_str}"):
-                st.write(f"Tipo: {veiculo.get('tipo_veiculo', 'Não especificado')}")
-                st.write(f"Entrada: {veiculo['entrada'].strftime('%d/%m/%Y %H:%M:%S')}")
-                st.write(f"Saída: {saida_str}")
-                valor = veiculo.get('valor_cobrado', 0.0)
-                st.write(f"Valor cobrado: R$ {valor:.2f}")
-
-                # Remoção de veículo do histórico
-                confirma_remover = st.text_input(
-                    "Digite 'CONFIRMAR' para remover este veículo do histórico:",
-                    key=f"remover_{veiculo['_id']}"
-                )
-                if st.button(f"Remover Veículo {veiculo['placa']}", key=f"btn_remover_{veiculo['_id']}", type="primary"):
-                    if confirma_remover == "CONFIRMAR":
-                        try:
-                            message = remover_veiculo(collection, veiculo['_id'])
-                            st.success(message)
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Não foi possível remover o veículo: {e}")
-                    else:
-                        st.error("Para remover, digite exatamente 'CONFIRMAR' no campo acima.")
+        with medir("etapa", "Histórico: DataFrame"):
+            tabela = pd.DataFrame({
+                "Placa": [f"{TIPOS_VEICULOS.get(v['tipo_veiculo'], '🚗')} {v['placa']}" for v in historico],
+                "Tipo": [v["tipo_veiculo"] for v in historico],
+                "Entrada": [v["entrada"] for v in historico],
+                "Saída": [v["saida"] for v in historico],
+                "Valor cobrado": [float(v.get("valor_cobrado") or 0.0) for v in historico],
+            })
+        selecao = st.dataframe(
+            tabela,
+            hide_index=True,
+            use_container_width=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"historico_tabela_{busca_historico}_{tamanho_pagina}_{len(cursores)}",
+            column_config={
+                "Entrada": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm:ss"),
+                "Saída": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm"),
+                "Valor cobrado": st.column_config.NumberColumn(format="R$ %.2f"),
+            },
+        )
+
+        col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+        with col_anterior:
+            if st.button("⬅️ Anterior", disabled=len(cursores) == 1, key="historico_anterior"):
+                cursores.pop()
+                st.rerun()
+        with col_pagina:
+            st.caption(f"Página {len(cursores)}")
+        with col_proxima:
+            if st.button("Próxima ➡️", disabled=proximo_cursor is None, key="historico_proxima"):
+                cursores.append(proximo_cursor)
+                st.rerun()
+
+        # Remoção como ação sobre as linhas selecionadas na tabela
+        selecionados = [historico[linha] for linha in selecao.selection.rows if linha < len(historico)]
+        if selecionados:
+            placas = ", ".join(v["placa"] for v in selecionados)
+            confirma_remover = st.text_input(
+                f"Digite 'CONFIRMAR' para remover do histórico: {placas}",
+                key="historico_confirma_remover"
+            )
+            if st.button(f"Remover {len(selecionados)} registro(s)", type="primary", key="historico_remover"):
+                if confirma_remover == "CONFIRMAR":
+                    # Um resultado por placa, exibido depois do rerun que relê a página
+                    resultados = []
+                    for veiculo in selecionados:
+                        removido, message = remover_veiculo(repo, veiculo['_id'])
+                        resultados.append((removido, f"{veiculo['placa']}: {message}"))
+                    st.session_state.historico_remocao = resultados
+                    st.rerun()
+                else:
+                    st.error("Para remover, digite exatamente 'CONFIRMAR' no campo acima.")
+    elif len(cursores) > 1:
+        st.info("Não há mais registros nesta página.")
+        if st.button("⬅️ Voltar à primeira página", key="historico_inicio"):
+            st.session_state.historico_cursores = [None]
+            st.rerun()
     else:
         st.info("Nenhum registro encontrado no histórico.")
 
+    with st.expander("📤 Exportar Histórico"):
+        st.write("Gera um arquivo com os veículos finalizados no período, lido e gravado em lotes.")
+        st.caption("Para exportações muito grandes, prefira `python cli.py export`, que grava direto no disco.")
+
+        col_exp_inicio, col_exp_fim = st.columns(2)
+        with col_exp_inicio:
+            exportar_inicio = st.date_input(
+                "Data inicial:",
+                value=datetime.now().date().replace(day=1),
+                key="exportar_inicio"
+            )
+        with col_exp_fim:
+            exportar_fim = st.date_input("Data final:", value=datetime.now().date(), key="exportar_fim")
+        exportar_tipos = st.multiselect("Tipos de veículo (todos, se vazio):", list(TIPOS_VEICULOS.keys()), key="exportar_tipos")
+        exportar_formato = st.radio("Formato:", FORMATOS_EXPORTACAO, horizontal=True, key="exportar_formato")
+
+        if st.button("Gerar arquivo", key="btn_exportar"):
+            # Um arquivo por sessão: o da exportação anterior é apagado antes de gerar o novo
+            descartar_exportacao()
+            arquivo = tempfile.NamedTemporaryFile(suffix=f".{exportar_formato}", delete=False)
+            arquivo.close()
+            try:
+                with st.spinner("Exportando..."):
+                    inicio_exp = datetime.combine(exportar_inicio, datetime.min.time())
+                    fim_exp = datetime.combine(exportar_fim, datetime.max.time())
+                    if exportar_formato == "csv":
+                        with open(arquivo.name, "w", newline="", encoding="utf-8") as destino:
+                            quantidade = exportar(repo, destino, "csv", inicio_exp, fim_exp, exportar_tipos or None)
+                    else:
+                        quantidade = exportar(repo, arquivo.name, exportar_formato, inicio_exp, fim_exp, exportar_tipos or None)
+                st.session_state.exportacao = {
+                    "caminho": arquivo.name,
+                    "nome": f"historico_{exportar_inicio:%Y%m%d}_{exportar_fim:%Y%m%d}.{exportar_formato}",
+                    "quantidade": quantidade,
+                }
+            except Exception as e:
+                os.remove(arquivo.name)
+                st.error(f"Não foi possível exportar o histórico: {e}")
+
+        exportacao = st.session_state.get("exportacao")
+        if exportacao and os.path.exists(exportacao["caminho"]):
+            st.success(f"{exportacao['quantidade']} registros exportados.")
+            if download_adiado():
+                # O arquivo só é lido quando o botão é clicado, não a cada rerun da seção
+                st.download_button(
+                    "⬇️ Baixar arquivo",
+                    data=ler_arquivo(exportacao["caminho"]),
+                    file_name=exportacao["nome"],
+                    on_click="ignore",
+                    key="download_exportacao"
+                )
+            else:
+                baixado = st.download_button(
+                    "⬇️ Baixar arquivo",
+                    data=ler_arquivo(exportacao["caminho"])(),
+                    file_name=exportacao["nome"],
+                    key="download_exportacao"
+                )
+                if baixado:
+                    # Os bytes já foram entregues ao navegador: o arquivo temporário não é mais necessário
+                    descartar_exportacao()
+            if st.button("Descartar arquivo", key="descartar_exportacao"):
+                descartar_exportacao()
+                st.rerun()
+        elif exportacao:
+            st.session_state.pop("exportacao")
+
 # -----------------------------------------
 # SIDEBAR - Registrar Saída (Dialog de edição) 
 # -----------------------------------------
@@ -394,7 +783,8 @@ if st.session_state.show_exit_dialog:
                 entrada_edit,
                 saida_edit,
                 tipo_veiculo_edit,
-                st.session_state.PRECO_POR_HORA
+                st.session_state.PRECO_POR_HORA,
+                placa=veiculo['placa']
             )
         except Exception as e:
             st.sidebar.error(f"Erro ao calcular o valor de saída: {e}")
@@ -410,17 +800,22 @@ if st.session_state.show_exit_dialog:
                         entrada_edit,
                         saida_edit,
                         tipo_veiculo_edit,
-                        st.session_state.PRECO_POR_HORA
+                        st.session_state.PRECO_POR_HORA,
+                        placa=veiculo['placa']
                     )
+                    versao = estacionados_ao_vivo.version
                     message = registrar_saida(
-                        collection,
+                        repo,
                         veiculo['_id'],
                         entrada_edit,
                         saida_edit,
                         tipo_veiculo_edit,
                         valor_cobrado
                     )
+                    estacionados_ao_vivo.sync(versao)
                     st.sidebar.success(message)
+                except ConflictError as e:
+                    st.sidebar.warning(str(e))
                 except Exception as e:
                     st.sidebar.error(f"Não foi possível registrar a saída: {e}")
                 finally:
@@ -439,16 +834,21 @@ if st.session_state.show_exit_dialog:
                 st.rerun()
 
 # -----------------------------------------
-# TAB 4 - Configurações
+# SEÇÃO 4 - Configurações
 # -----------------------------------------
-with tab4:
+@st.fragment
+@medir("tela", "Configurações")
+def secao_configuracoes():
+    import pandas as pd
+
     st.subheader("⚙️ Configurações do Sistema")
 
     st.write("### Preços por Hora")
+    st.caption(f"Tabela do pátio {config_repo.lot_id}; cada pátio tem a sua.")
 
     # Carrega a configuração atual do banco
     try:
-        precos = load_config(config_collection)
+        precos = load_config(config_repo)
     except Exception as e:
         st.error(f"Erro ao carregar configurações de preço: {e}")
         precos = st.session_state.PRECO_POR_HORA
@@ -458,28 +858,148 @@ with tab4:
     for tipo, emoji in TIPOS_VEICULOS.items():
         col1, col2 = st.columns([3, 1])
         with col1:
-            valor_atual = float(precos.get(tipo, st.session_state.PRECO_POR_HORA.get(tipo, 0.0)))
-            novos_precos[tipo] = st.number_input(
+            regra = regra_tarifa(precos.get(tipo, st.session_state.PRECO_POR_HORA.get(tipo, 0.0)))
+            preco_hora = st.number_input(
                 f"{emoji} Preço por hora para {tipo}:",
                 min_value=0.0,
-                value=valor_atual,
+                value=regra["preco_hora"],
                 step=0.5,
                 format="%.2f"
             )
 
+            # Campos com valor 0 desligam a regra correspondente
+            with st.expander(f"⏱️ Regras de tarifa para {tipo}"):
+                col_fracao, col_carencia = st.columns(2)
+                fracao = col_fracao.number_input(
+                    "Fração de cobrança (min):", min_value=1, value=regra["fracao_minutos"], key=f"fracao_{tipo}"
+                )
+                carencia = col_carencia.number_input(
+                    "Carência (min):", min_value=0, value=int(regra["carencia_minutos"]), key=f"carencia_{tipo}"
+                )
+                col_primeira, col_diaria = st.columns(2)
+                primeira_hora = col_primeira.number_input(
+                    "Valor da primeira hora (R$):", min_value=0.0, value=regra["primeira_hora"] or 0.0,
+                    step=0.5, format="%.2f", key=f"primeira_hora_{tipo}"
+                )
+                diaria_maxima = col_diaria.number_input(
+                    "Diária máxima (R$):", min_value=0.0, value=regra["diaria_maxima"] or 0.0,
+                    step=0.5, format="%.2f", key=f"diaria_maxima_{tipo}"
+                )
+
+                faixas = regra["faixas"]
+                noturna = faixas[0] if faixas else {"inicio": "22:00", "fim": "06:00", "preco_hora": regra["preco_hora"]}
+                usar_noturna = st.checkbox("Tarifa noturna", value=bool(faixas), key=f"noturna_{tipo}")
+                col_inicio, col_fim, col_preco = st.columns(3)
+                inicio_noturna = col_inicio.time_input(
+                    "Das:", value=datetime.strptime(noturna["inicio"], "%H:%M").time(), key=f"noturna_inicio_{tipo}"
+                )
+                fim_noturna = col_fim.time_input(
+                    "Até:", value=datetime.strptime(noturna["fim"], "%H:%M").time(), key=f"noturna_fim_{tipo}"
+                )
+                preco_noturna = col_preco.number_input(
+                    "Preço por hora (R$):", min_value=0.0, value=float(noturna["preco_hora"]),
+                    step=0.5, format="%.2f", key=f"noturna_preco_{tipo}"
+                )
+                if usar_noturna:
+                    # Faixas além da primeira (gravadas por fora da tela) são mantidas
+                    faixas = [{
+                        "inicio": inicio_noturna.strftime("%H:%M"),
+                        "fim": fim_noturna.strftime("%H:%M"),
+                        "preco_hora": preco_noturna,
+                    }] + faixas[1:]
+                else:
+                    faixas = []
+
+            novos_precos[tipo] = montar_regra(
+                preco_hora, fracao, carencia, primeira_hora or None, diaria_maxima or None, faixas
+            )
+
+    mensalistas = st.text_area(
+        "🎫 Mensalistas (uma placa por linha; não pagam pela permanência):",
+        value="\n".join(precos.get("mensalistas") or []),
+        key="mensalistas"
+    )
+    placas_mensalistas = [placa.strip().upper() for placa in mensalistas.splitlines() if placa.strip()]
+    if placas_mensalistas:
+        novos_precos["mensalistas"] = placas_mensalistas
+
     if st.button("Salvar Preços", type="primary"):
         try:
-            save_config(config_collection, novos_precos)
+            save_config(config_repo, novos_precos)
             st.success("Preços atualizados com sucesso!")
             st.rerun()
         except Exception as e:
             st.error(f"Não foi possível salvar as configurações de preço: {e}")
 
+    with st.expander("📊 Simular Preços no Histórico"):
+        st.write("Recalcula todas as cobranças do histórico com os preços informados acima, sem gravar nada.")
+
+        if st.button("Simular", key="btn_simular_precos"):
+            try:
+                with st.spinner("Recalculando cobranças..."):
+                    simulacao = simular_precos(repo, novos_precos)
+                if simulacao:
+                    df_simulacao = pd.DataFrame.from_dict(simulacao, orient="index")
+                    df_simulacao["diferenca"] = df_simulacao["faturamento_simulado"] - df_simulacao["faturamento_atual"]
+                    st.dataframe(df_simulacao)
+                    st.metric(
+                        "Faturamento simulado",
+                        f"R$ {df_simulacao['faturamento_simulado'].sum():.2f}",
+                        f"R$ {df_simulacao['diferenca'].sum():.2f}"
+                    )
+                else:
+                    st.info("Nenhum veículo finalizado no histórico.")
+            except Exception as e:
+                st.error(f"Não foi possível simular os preços: {e}")
+
+    st.write("### Capacidade por Tipo")
+    st.caption(f"Vagas do pátio {repo.lot_id}, numeradas a partir de 1 em cada tipo; 0 deixa o tipo sem limite.")
+
+    try:
+        capacidade = repo.get_capacity()
+    except Exception as e:
+        st.error(f"Erro ao carregar a capacidade: {e}")
+        capacidade = {}
+
+    nova_capacidade = {}
+    colunas_capacidade = st.columns(len(TIPOS_VEICULOS))
+    for coluna, (tipo, emoji) in zip(colunas_capacidade, TIPOS_VEICULOS.items()):
+        nova_capacidade[tipo] = coluna.number_input(
+            f"{emoji} {tipo}:", min_value=0, value=int(capacidade.get(tipo, 0)), step=1, key=f"capacidade_{tipo}"
+        )
+
+    if st.button("Salvar Capacidade", type="primary", key="btn_salvar_capacidade"):
+        try:
+            configurar_capacidade(repo, nova_capacidade)
+            st.success("Capacidade atualizada com sucesso!")
+        except Exception as e:
+            st.error(f"Não foi possível salvar a capacidade: {e}")
+
+    with st.expander("🅿️ Contadores de Ocupação"):
+        st.write("Os contadores de vagas são atualizados a cada entrada e saída e conferidos "
+                 "periodicamente com os veículos estacionados.")
+        if reconciliador_ocupacao is not None and reconciliador_ocupacao.status["updated_at"]:
+            status_reconciliacao = reconciliador_ocupacao.status
+            st.caption(f"Última conferência em {status_reconciliacao['updated_at'].strftime('%d/%m/%Y %H:%M:%S')}")
+            if not status_reconciliacao["ok"]:
+                st.warning(f"Falha na última conferência: {status_reconciliacao['error']}")
+        if st.button("Conferir Agora", key="btn_reconciliar_ocupacao"):
+            try:
+                correcoes = reconciliar_ocupacao(repo)
+                if correcoes:
+                    st.success("Contadores corrigidos: " + ", ".join(
+                        f"{zona} ({diferenca:+d})" for zona, diferenca in correcoes.items()
+                    ))
+                else:
+                    st.success("Os contadores conferem com os veículos estacionados.")
+            except Exception as e:
+                st.error(f"Não foi possível conferir os contadores: {e}")
+
     st.write("### Gerenciamento do Banco de Dados")
     st.warning("⚠️ Atenção: As ações abaixo são irreversíveis!")
 
     with st.expander("🗑️ Limpar Banco de Dados"):
-        st.write("Esta ação irá apagar todos os registros de veículos do banco de dados (histórico e atuais).")
+        st.write(f"Esta ação irá apagar todos os registros de veículos do pátio {repo.lot_id} (histórico e atuais).")
         st.write("Os preços configurados serão mantidos.")
 
         confirma_texto = st.text_input(
@@ -490,10 +1010,178 @@ with tab4:
         if st.button("Limpar Banco de Dados", type="primary", key="btn_limpar"):
             if confirma_texto == "CONFIRMAR":
                 try:
-                    collection.delete_many({})
+                    versao = estacionados_ao_vivo.version
+                    limpar_veiculos(repo)
+                    estacionados_ao_vivo.sync(versao)
                     st.success("Banco de dados limpo com sucesso!")
                     st.rerun()
                 except Exception as e:
                     st.error(f"Não foi possível limpar o banco de dados: {e}")
             else:
-                st.error("Por favor, digite 'CONFIRMAR' para prosseguir com a limpeza do banco de dados.")
\ No newline at end of file
+                st.error("Por favor, digite 'CONFIRMAR' para prosseguir com a limpeza do banco de dados.")
+
+    with st.expander("📥 Importar Movimentos"):
+        st.write("Importa entradas e saídas de um arquivo CSV ou JSONL com as colunas "
+                 "`placa`, `tipo_veiculo`, `entrada`, `saida` e `valor_cobrado` (opcional; "
+                 "calculado pela tabela de preços quando ausente). Linhas sem saída entram como estacionadas.")
+        st.caption("Se a importação for interrompida, envie o mesmo arquivo de novo: ela continua do último lote concluído. "
+                   "Linhas já gravadas nunca são duplicadas.")
+
+        arquivo_importacao = st.file_uploader("Arquivo:", type=list(FORMATOS_IMPORTACAO), key="arquivo_importacao")
+        recomecar_importacao = st.checkbox(
+            "Recomeçar importação", key="recomecar_importacao",
+            help="Ignora o checkpoint e relê o arquivo desde o início; as linhas já gravadas são puladas."
+        )
+        if arquivo_importacao is not None and st.button("Importar", key="btn_importar"):
+            # Caminho estável pelo conteúdo, para que o checkpoint seja encontrado ao reenviar o arquivo
+            # (mesmo com outro nome) e nunca seja o de outro arquivo de mesmo nome e tamanho
+            conteudo = arquivo_importacao.getbuffer()
+            pasta = os.path.join(tempfile.gettempdir(), "openstparkinglot_importacoes")
+            os.makedirs(pasta, exist_ok=True)
+            extensao = os.path.splitext(arquivo_importacao.name)[1]
+            caminho = os.path.join(pasta, f"{hashlib.sha256(conteudo).hexdigest()}{extensao}")
+            with open(caminho, "wb") as destino:
+                destino.write(conteudo)
+
+            andamento = st.empty()
+            try:
+                versao = estacionados_ao_vivo.version
+                estado = importar(
+                    repo, caminho, precos=st.session_state.PRECO_POR_HORA, recomecar=recomecar_importacao,
+                    progresso=lambda e: andamento.write(
+                        f"Linha {e['linha']}: {e['importados']} importados, {e['erros']} recusados..."
+                    )
+                )
+                estacionados_ao_vivo.sync(versao)
+                andamento.empty()
+                st.success(f"Importação concluída: {estado['importados']} importados, {estado['erros']} recusados.")
+                if estado["repetidas"]:
+                    st.info(f"{estado['repetidas']} linhas já tinham sido importadas e foram puladas.")
+                if estado["erros"]:
+                    with open(caminho + ".erros.csv", "rb") as relatorio:
+                        st.download_button(
+                            "⬇️ Baixar relatório de erros",
+                            data=relatorio,
+                            file_name=f"erros_{os.path.basename(arquivo_importacao.name)}.csv",
+                            key="download_erros_importacao"
+                        )
+            except Exception as e:
+                st.error(f"Não foi possível importar o arquivo: {e}")
+
+    with st.expander("🔄 Reconstruir Agregados do Dashboard"):
+        st.write("Recalcula o faturamento por hora e por tipo a partir de todo o histórico de veículos.")
+        st.write("Use após importar dados antigos ou se o Dashboard divergir do Histórico.")
+
+        if st.button("Reconstruir Agregados", key="btn_reconstruir_rollups"):
+            try:
+                with st.spinner("Reconstruindo agregados..."):
+                    gravados = reconstruir_rollups(repo)
+                st.success(f"Agregados reconstruídos: {gravados} registros gravados.")
+            except Exception as e:
+                st.error(f"Não foi possível reconstruir os agregados: {e}")
+
+    with st.expander("🔤 Reindexar Placas"):
+        st.write("Gera os campos de busca de placa nos registros que ainda não os possuem (registros antigos).")
+
+        if st.button("Reindexar Placas", key="btn_reindexar_placas"):
+            try:
+                with st.spinner("Reindexando placas..."):
+                    atualizados = repo.backfill_plate_tokens()
+                st.success(f"Placas reindexadas: {atualizados} registros atualizados.")
+            except Exception as e:
+                st.error(f"Não foi possível reindexar as placas: {e}")
+
+    replicacao = repo.replication_status()
+    if replicacao is not None:
+        with st.expander("🛰️ Replicação do Diário Local"):
+            st.write("Entradas e saídas são gravadas primeiro no diário local e enviadas ao MongoDB em segundo plano.")
+            col_pendentes, col_atraso, col_conflitos = st.columns(3)
+            col_pendentes.metric("Pendentes", replicacao["pendentes"])
+            col_atraso.metric("Atraso", f"{replicacao['atraso_s']:.1f}s")
+            col_conflitos.metric("Conflitos", replicacao["conflitos"])
+            if replicacao["ultima_replicacao"]:
+                st.caption(f"Última operação replicada em {replicacao['ultima_replicacao'].strftime('%d/%m/%Y %H:%M:%S')}")
+            if replicacao["ultimo_erro"]:
+                st.warning(f"Falha ao replicar: {replicacao['ultimo_erro']}")
+            if replicacao["conflitos"]:
+                st.write("#### Operações recusadas pelo MongoDB")
+                st.dataframe(pd.DataFrame([
+                    {
+                        "Operação": conflito["tipo"],
+                        "Placa": conflito["dados"].get("placa") or f"ticket {conflito['dados'].get('_id')}",
+                        "Registrada em": conflito["criado_em"].strftime('%d/%m/%Y %H:%M:%S'),
+                        "Motivo": conflito["erro"],
+                    }
+                    for conflito in repo.list_conflicts()
+                ]), hide_index=True)
+
+    with st.expander("🩺 Diagnóstico de Índices"):
+        if erros_indices:
+            for erro in erros_indices:
+                st.warning(f"Falha ao criar índice: {erro}")
+
+        if st.button("Verificar Índices e Consultas", key="btn_diagnostico_indices"):
+            try:
+                diagnostico = repo.diagnose()
+                if diagnostico is None:
+                    st.info(f"O diagnóstico de índices não está disponível para o armazenamento '{repo.name}'.")
+                else:
+                    st.write("#### Índices")
+                    st.dataframe(pd.DataFrame(diagnostico["indices"]), hide_index=True)
+
+                    st.write("#### Planos de Consulta")
+                    st.dataframe(pd.DataFrame(diagnostico["consultas"]), hide_index=True)
+                    for item in diagnostico["consultas"]:
+                        if item["collscan"]:
+                            st.warning(f"A consulta '{item['consulta']}' está fazendo varredura completa da coleção (COLLSCAN).")
+            except Exception as e:
+                st.error(f"Não foi possível executar o diagnóstico: {e}")
+
+    with st.expander("📈 Desempenho"):
+        # Fechada por padrão: as métricas expõem operações e tempos do servidor
+        senha_admin = os.environ.get("ADMIN_PASSWORD")
+        if not senha_admin:
+            st.info("Seção desativada. Defina ADMIN_PASSWORD no servidor para ver as métricas de desempenho.")
+        elif not hmac.compare_digest(
+            st.text_input("Senha de administrador:", type="password", key="senha_desempenho").encode(), senha_admin.encode()
+        ):
+            st.info("Informe a senha de administrador para ver as métricas de desempenho.")
+        else:
+            metricas = series()
+            if not metricas:
+                st.info("Nenhuma operação medida ainda.")
+            else:
+                st.write("Latência de cada aba, etapa das telas e chamada ao armazenamento, desde o início do processo.")
+                tabela_metricas = pd.DataFrame(metricas).drop(columns="baldes")
+                st.dataframe(
+                    tabela_metricas,
+                    hide_index=True,
+                    column_config={
+                        coluna: st.column_config.NumberColumn(format="%.1f")
+                        for coluna in ("media_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+                    },
+                )
+
+                rotulos = {f"{m['grupo']} · {m['operacao']}": m for m in metricas}
+                escolhida = st.selectbox("Histograma de latência:", list(rotulos), key="metrica_histograma")
+                faixas = [f"≤ {limite * 1000:g} ms" for limite in BUCKETS] + [f"> {BUCKETS[-1] * 1000:g} ms"]
+                st.bar_chart(pd.Series(rotulos[escolhida]["baldes"], index=pd.CategoricalIndex(faixas, categories=faixas, ordered=True), name="execuções"))
+
+            lentas = operacoes_lentas()
+            st.write(f"#### Operações acima de {SLOW_OPERATION_MS:g} ms")
+            if lentas:
+                st.dataframe(pd.DataFrame(lentas), hide_index=True)
+            else:
+                st.caption("Nenhuma operação lenta registrada.")
+
+            if st.button("Zerar métricas", key="btn_zerar_metricas"):
+                zerar()
+                st.rerun()
+
+# Executa apenas a seção visível
+{
+    "Movimento": secao_movimento,
+    "Dashboard": secao_dashboard,
+    "Histórico": secao_historico,
+    "Configurações": secao_configuracoes,
+}[secao]()
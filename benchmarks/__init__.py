@@ -0,0 +1,12 @@
+# benchmarks/__init__.py
+"""
+Benchmark de um dia de operação do estacionamento.
+
+Uso:
+    python -m benchmarks --backend sqlite --historico 100000
+    python -m benchmarks --backend mongo --uri "mongodb+srv://..." --historico 1000000 --salvar resultado.json
+    python -m benchmarks --backend memory --comparar resultado.json
+
+Partida a frio do app (tempo até o primeiro render, com orçamento):
+    python -m benchmarks.startup --orcamento 3
+"""
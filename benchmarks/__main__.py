@@ -0,0 +1,73 @@
+# benchmarks/__main__.py
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.runner import executar, salvar, carregar, comparar, formatar
+from storage import BACKENDS
+
+
+def abrir_repositorio(args):
+    if args.backend == "mongo":
+        from storage.mongo import MongoVehicleRepository
+        from utils.connection import get_client
+
+        if not args.uri:
+            raise SystemExit("Informe a string de conexão com --uri ou MONGO_URI.")
+        # Banco separado, pois o benchmark apaga todos os veículos antes de começar
+        return MongoVehicleRepository(get_client(args.uri)[args.database])
+
+    if args.backend == "sqlite":
+        from storage.sqlite import connect, SQLiteVehicleRepository
+
+        caminho = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "benchmark.db")
+        return SQLiteVehicleRepository(connect(caminho))
+
+    from storage.memory import MemoryVehicleRepository
+    return MemoryVehicleRepository()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de um dia de operação do estacionamento")
+    parser.add_argument("--backend", choices=BACKENDS, default="memory")
+    parser.add_argument("--uri", default=os.environ.get("MONGO_URI"), help="String de conexão do MongoDB")
+    parser.add_argument("--database", default="estacionamento_benchmark", help="Banco MongoDB usado no benchmark")
+    parser.add_argument("--sqlite-path", help="Arquivo SQLite (padrão: arquivo temporário)")
+    parser.add_argument("--historico", type=int, default=10000, help="Registros históricos (ex.: 10000 a 10000000)")
+    parser.add_argument("--veiculos-por-dia", type=int, default=2000)
+    parser.add_argument("--dias", type=int, default=1, help="Dias de operação simulados")
+    parser.add_argument("--consultas-a-cada", type=int, default=25, help="Eventos entre cada rodada de consultas das telas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--salvar", help="Grava o resultado em JSON neste caminho")
+    parser.add_argument("--comparar", help="Resultado JSON anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Piora tolerada no p95 (fração)")
+    args = parser.parse_args(argv)
+
+    resultado = executar(
+        abrir_repositorio(args),
+        historico=args.historico,
+        veiculos_por_dia=args.veiculos_por_dia,
+        dias=args.dias,
+        seed=args.seed,
+        consultas_a_cada=args.consultas_a_cada,
+    )
+    print(formatar(resultado))
+
+    if args.salvar:
+        salvar(resultado, args.salvar)
+        print(f"\nResultado gravado em {args.salvar}")
+
+    if args.comparar:
+        regressoes = comparar(resultado, carregar(args.comparar), tolerancia=args.tolerancia)
+        if regressoes:
+            print("\nRegressões no p95:")
+            for operacao, antes, depois, variacao in regressoes:
+                print(f"  {operacao}: {antes:.3f} ms -> {depois:.3f} ms (+{variacao:.0%})")
+            return 1
+        print("\nNenhuma regressão no p95 acima da tolerância.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# benchmarks/runner.py
+"""
+Executa um dia de operação simulado contra um backend de armazenamento e mede
+a latência de cada operação.
+"""
+import json
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from benchmarks.traffic import gerar_eventos_dia, gerar_historico
+from controllers.dashboard_controller import resumo_faturamento_rollup
+from controllers.pricing_controller import DEFAULT_PRICES
+from controllers.rollup_controller import reconstruir_rollups
+from controllers.vehicle_controller import registrar_entrada, registrar_saida
+from storage import ConflictError
+from utils.helpers import calcular_valor, calcular_valores
+from utils.plates import LIMITE_BUSCA, limpar_placa
+
+
+class Medidor:
+    """Acumula durações (em segundos) por operação."""
+
+    def __init__(self):
+        self.duracoes = {}
+
+    @contextmanager
+    def medir(self, operacao):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.duracoes.setdefault(operacao, []).append(time.perf_counter() - inicio)
+
+    def relatorio(self):
+        relatorio = {}
+        for operacao, duracoes in sorted(self.duracoes.items()):
+            amostras = np.array(duracoes)
+            total = float(amostras.sum())
+            relatorio[operacao] = {
+                "quantidade": len(amostras),
+                "throughput_ops_s": len(amostras) / total if total else None,
+                "p50_ms": float(np.percentile(amostras, 50) * 1000),
+                "p95_ms": float(np.percentile(amostras, 95) * 1000),
+                "p99_ms": float(np.percentile(amostras, 99) * 1000),
+                "max_ms": float(amostras.max() * 1000),
+            }
+        return relatorio
+
+
+def popular_historico(repo, medidor, quantidade, fim, seed, tamanho_lote=10000):
+    """Grava `quantidade` veículos finalizados sintéticos e reconstrói os agregados."""
+    rng = np.random.default_rng(seed)
+    for lote in gerar_historico(rng, quantidade, fim, tamanho_lote=tamanho_lote):
+        with medidor.medir("seed_insert_many"):
+            repo.insert_many(lote)
+    with medidor.medir("rebuild_rollups"):
+        reconstruir_rollups(repo)
+
+
+def simular_dia(repo, medidor, dia, veiculos_por_dia, seed, consultas_a_cada=25, precos=None):
+    """
+    Passa os eventos de um dia por registrar_entrada e registrar_saida (com o valor de
+    calcular_valor), intercalando as consultas das telas a cada `consultas_a_cada` eventos.
+    """
+    precos = precos or DEFAULT_PRICES
+    rng = np.random.default_rng(seed + 1)
+    eventos = gerar_eventos_dia(rng, dia, veiculos_por_dia)
+    inicio_dashboard = datetime.combine(dia - timedelta(days=30), datetime.min.time())
+    fim_dia = datetime.combine(dia, datetime.max.time())
+
+    for numero, (tipo_evento, instante, placa, tipo_veiculo) in enumerate(eventos, start=1):
+        if tipo_evento == "entrada":
+            # Placas sorteadas podem repetir: a entrada duplicada é recusada pelo armazenamento
+            with medidor.medir("registrar_entrada"):
+                try:
+                    registrar_entrada(repo, placa, tipo_veiculo, instante)
+                except ConflictError:
+                    pass
+        else:
+            veiculo = repo.find_parked(placa)
+            if veiculo is not None:
+                with medidor.medir("calcular_valor"):
+                    valor = calcular_valor(veiculo["entrada"], instante, tipo_veiculo, precos)
+                with medidor.medir("registrar_saida"):
+                    registrar_saida(repo, veiculo["_id"], veiculo["entrada"], instante, tipo_veiculo, valor)
+
+        if numero % consultas_a_cada == 0:
+            with medidor.medir("listar_estacionados"):
+                estacionados = repo.list_parked()
+            with medidor.medir("calcular_valores_estacionados"):
+                calcular_valores(
+                    [v["entrada"] for v in estacionados], instante,
+                    [v.get("tipo_veiculo") for v in estacionados], precos
+                )
+            with medidor.medir("buscar_placa_estacionados"):
+                repo.list_parked(limpar_placa(placa)[1:4], limite=LIMITE_BUSCA)
+            with medidor.medir("historico"):
+                repo.list_history(limite=LIMITE_BUSCA)
+            with medidor.medir("buscar_placa_historico"):
+                repo.list_history(limpar_placa(placa)[2:5], limite=LIMITE_BUSCA)
+            with medidor.medir("dashboard_rollups"):
+                resumo_faturamento_rollup(repo, inicio_dashboard, fim_dia)
+
+    return len(eventos)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def executar(repo, historico=10000, veiculos_por_dia=2000, dias=1, seed=42, consultas_a_cada=25):
+    """
+    Limpa o backend, popula o histórico e simula `dias` dias de operação.
+    Retorna um dicionário com os parâmetros e o relatório por operação.
+    """
+    medidor = Medidor()
+    primeiro_dia = date.today()
+
+    repo.delete_all()
+    repo.reset_rollups()
+    repo.ensure_indexes()
+
+    inicio = time.perf_counter()
+    popular_historico(repo, medidor, historico, datetime.combine(primeiro_dia, datetime.min.time()), seed)
+    eventos = 0
+    for deslocamento in range(dias):
+        eventos += simular_dia(
+            repo, medidor, primeiro_dia + timedelta(days=deslocamento),
+            veiculos_por_dia, seed + deslocamento, consultas_a_cada
+        )
+
+    return {
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "backend": repo.name,
+        "parametros": {
+            "historico": historico,
+            "veiculos_por_dia": veiculos_por_dia,
+            "dias": dias,
+            "seed": seed,
+            "consultas_a_cada": consultas_a_cada,
+        },
+        "eventos": eventos,
+        "duracao_total_s": time.perf_counter() - inicio,
+        "operacoes": medidor.relatorio(),
+    }
+
+
+def salvar(resultado, caminho):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+
+def carregar(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def comparar(atual, anterior, metrica="p95_ms", tolerancia=0.2):
+    """
+    Compara duas execuções e retorna as operações cuja `metrica` piorou mais que
+    `tolerancia` (fração), como lista de (operacao, anterior, atual, variacao).
+    """
+    regressoes = []
+    for operacao, medidas in atual["operacoes"].items():
+        base = anterior["operacoes"].get(operacao)
+        if not base or not base.get(metrica):
+            continue
+        variacao = medidas[metrica] / base[metrica] - 1
+        if variacao > tolerancia:
+            regressoes.append((operacao, base[metrica], medidas[metrica], variacao))
+    return regressoes
+
+
+def formatar(resultado):
+    linhas = [
+        f"Backend: {resultado['backend']}  |  histórico: {resultado['parametros']['historico']}  |  "
+        f"eventos: {resultado['eventos']}  |  duração: {resultado['duracao_total_s']:.1f}s",
+        f"{'operação':<32}{'qtd':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for operacao, medidas in resultado["operacoes"].items():
+        linhas.append(
+            f"{operacao:<32}{medidas['quantidade']:>8}{medidas['throughput_ops_s'] or 0:>12.1f}"
+            f"{medidas['p50_ms']:>10.3f}{medidas['p95_ms']:>10.3f}{medidas['p99_ms']:>10.3f}"
+        )
+    return "\n".join(linhas)
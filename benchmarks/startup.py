@@ -0,0 +1,103 @@
+# benchmarks/startup.py
+"""
+Mede a partida a frio do app: cada medida sobe um interpretador novo e executa o
+app.py com o AppTest do Streamlit até o primeiro render (imports do app, abertura do
+armazenamento e a tela inicial), seguido de alguns reruns já aquecidos. Sai com código
+1 se a mediana do primeiro render passar do orçamento.
+
+Uso:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --backend sqlite --orcamento 1.5 --vezes 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from storage import BACKENDS
+
+# Orçamento (segundos) do primeiro render em um processo novo
+STARTUP_BUDGET_S = float(os.environ.get("STARTUP_BUDGET_S", 3.0))
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado no interpretador novo. O Streamlit já estaria carregado pelo servidor, então
+# o relógio só começa no app.py
+_MEDICAO = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+app = AppTest.from_file("app.py", default_timeout=60)
+if len(sys.argv) > 1:
+    app.session_state["connection_string"] = sys.argv[1]
+inicio = time.perf_counter()
+app.run()
+primeiro = time.perf_counter() - inicio
+reruns = []
+for _ in range({reruns}):
+    inicio = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - inicio)
+pesados = [m for m in ("pandas", "pyarrow", "pymongo") if m in sys.modules]
+print(json.dumps({{
+    "primeiro_render_s": primeiro,
+    "reruns_s": reruns,
+    "erros": [str(e.value) for e in app.exception],
+    "modulos_pesados": pesados,
+}}))
+"""
+
+
+def medir_partida(backend="memory", uri=None, reruns=3):
+    """Uma partida a frio em um processo separado; retorna o dicionário impresso por _MEDICAO."""
+    env = dict(os.environ, STORAGE_BACKEND=backend, PYTHONPATH=RAIZ)
+    if backend == "sqlite":
+        env["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="startup_"), "startup.db")
+    comando = [sys.executable, "-c", _MEDICAO.format(reruns=reruns)]
+    if backend == "mongo":
+        comando.append(uri)
+    saida = subprocess.run(comando, cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo até o primeiro render do app em um processo novo")
+    parser.add_argument("--backend", choices=BACKENDS, default="memory")
+    parser.add_argument("--uri", default=os.environ.get("MONGO_URI"), help="String de conexão do MongoDB")
+    parser.add_argument("--vezes", type=int, default=3, help="Partidas a frio medidas (vale a mediana)")
+    parser.add_argument("--reruns", type=int, default=3, help="Reruns aquecidos medidos após cada partida")
+    parser.add_argument("--orcamento", type=float, default=STARTUP_BUDGET_S, help="Limite (s) do primeiro render")
+    args = parser.parse_args(argv)
+
+    if args.backend == "mongo" and not args.uri:
+        raise SystemExit("Informe a string de conexão com --uri ou MONGO_URI.")
+
+    medidas = [medir_partida(args.backend, args.uri, args.reruns) for _ in range(args.vezes)]
+    erros = [erro for medida in medidas for erro in medida["erros"]]
+    if erros:
+        print("O app falhou no primeiro render:")
+        for erro in erros:
+            print(f"  {erro}")
+        return 1
+
+    primeiro = statistics.median(medida["primeiro_render_s"] for medida in medidas)
+    reruns = [rerun for medida in medidas for rerun in medida["reruns_s"]]
+    print(f"Backend: {args.backend}  |  partidas: {args.vezes}")
+    print(f"Primeiro render (mediana): {primeiro * 1000:.0f} ms  |  orçamento: {args.orcamento * 1000:.0f} ms")
+    if reruns:
+        print(f"Rerun aquecido (mediana): {statistics.median(reruns) * 1000:.0f} ms")
+    pesados = sorted({modulo for medida in medidas for modulo in medida["modulos_pesados"]})
+    print(f"Módulos pesados carregados: {', '.join(pesados) or 'nenhum'}")
+
+    if primeiro > args.orcamento:
+        print(f"\nPrimeiro render acima do orçamento em {(primeiro - args.orcamento) * 1000:.0f} ms.")
+        return 1
+    print("\nPrimeiro render dentro do orçamento.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# benchmarks/traffic.py
+"""
+Geração de tráfego sintético de um estacionamento: chegadas de Poisson com picos
+de manhã e de fim de tarde, mistura de tipos de veículo e permanências de cauda longa.
+"""
+import string
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from controllers.pricing_controller import DEFAULT_PRICES
+from utils.helpers import calcular_valores
+from utils.plates import campos_placa
+
+# Participação de cada tipo de models.vehicle.TIPOS_VEICULOS no tráfego gerado
+MIX_TIPOS = {
+    "Carro": 0.72,
+    "Moto": 0.14,
+    "Van": 0.06,
+    "Caminhão": 0.04,
+    "Bicicleta": 0.04,
+}
+
+# Permanência log-normal: mediana de ~1h30, com cauda até alguns dias
+PERMANENCIA_MEDIANA_MINUTOS = 90
+PERMANENCIA_SIGMA = 1.0
+PERMANENCIA_MAXIMA_MINUTOS = 3 * 24 * 60
+
+
+def _intensidade(horas):
+    horas = np.asarray(horas, dtype=np.float64)
+    base = 0.15 + 0.35 * ((horas >= 6) & (horas <= 22))
+    picos = np.exp(-((horas - 8) ** 2) / 2) + 0.9 * np.exp(-((horas - 18) ** 2) / 2.5)
+    return base + picos
+
+
+_MINUTOS_DO_DIA = np.arange(24 * 60) / 60
+_PESOS_MINUTOS = _intensidade(_MINUTOS_DO_DIA) / _intensidade(_MINUTOS_DO_DIA).sum()
+_INTEGRAL_DIA = _intensidade(_MINUTOS_DO_DIA).sum() / 60
+
+
+def taxa_chegadas(horas, veiculos_por_dia):
+    """
+    Intensidade (veículos/hora) ao longo do dia: uma base diurna mais dois picos
+    gaussianos, às 8h e às 18h, normalizada para somar `veiculos_por_dia`.
+    """
+    return _intensidade(horas) * veiculos_por_dia / _INTEGRAL_DIA
+
+
+def gerar_placas(rng, quantidade):
+    """Placas aleatórias no padrão Mercosul (e ~30% no formato antigo, com hífen)."""
+    letras = np.array(list(string.ascii_uppercase))
+    digitos = np.array(list(string.digits))
+    placas = []
+    for prefixo, d1, quinto, d2, antiga in zip(
+        ("".join(p) for p in rng.choice(letras, size=(quantidade, 3))),
+        rng.choice(digitos, size=quantidade),
+        rng.integers(0, 10, size=quantidade),
+        ("".join(p) for p in rng.choice(digitos, size=(quantidade, 2))),
+        rng.random(quantidade) < 0.3,
+    ):
+        if antiga:
+            placas.append(f"{prefixo}-{d1}{quinto}{d2}")
+        else:
+            placas.append(f"{prefixo}{d1}{chr(ord('A') + int(quinto))}{d2}")
+    return placas
+
+
+def gerar_tipos(rng, quantidade):
+    return [str(tipo) for tipo in rng.choice(list(MIX_TIPOS), size=quantidade, p=list(MIX_TIPOS.values()))]
+
+
+def gerar_permanencias(rng, quantidade):
+    minutos = rng.lognormal(np.log(PERMANENCIA_MEDIANA_MINUTOS), PERMANENCIA_SIGMA, size=quantidade)
+    return np.clip(minutos, 1, PERMANENCIA_MAXIMA_MINUTOS)
+
+
+def gerar_chegadas(rng, dia, veiculos_por_dia):
+    """
+    Instantes de chegada de um dia, por afinamento (thinning) de um processo de
+    Poisson homogêneo com a intensidade máxima de taxa_chegadas.
+    """
+    taxa_maxima = taxa_chegadas(_MINUTOS_DO_DIA, veiculos_por_dia).max()
+    candidatos = np.sort(rng.uniform(0, 24, size=rng.poisson(taxa_maxima * 24)))
+    aceitos = candidatos[rng.random(len(candidatos)) < taxa_chegadas(candidatos, veiculos_por_dia) / taxa_maxima]
+    inicio = datetime.combine(dia, datetime.min.time())
+    return [inicio + timedelta(hours=float(h)) for h in aceitos]
+
+
+def gerar_eventos_dia(rng, dia, veiculos_por_dia):
+    """
+    Eventos de um dia de operação, em ordem cronológica: ("entrada", instante, placa, tipo)
+    e ("saida", instante, placa, tipo). Saídas que cairiam depois do fim do dia são
+    descartadas, deixando esses veículos estacionados.
+    """
+    chegadas = gerar_chegadas(rng, dia, veiculos_por_dia)
+    placas = gerar_placas(rng, len(chegadas))
+    tipos = gerar_tipos(rng, len(chegadas))
+    permanencias = gerar_permanencias(rng, len(chegadas))
+    fim_dia = datetime.combine(dia, datetime.max.time())
+
+    eventos = []
+    for chegada, placa, tipo, minutos in zip(chegadas, placas, tipos, permanencias):
+        eventos.append(("entrada", chegada, placa, tipo))
+        saida = chegada + timedelta(minutes=float(minutos))
+        if saida <= fim_dia:
+            eventos.append(("saida", saida, placa, tipo))
+    eventos.sort(key=lambda evento: evento[1])
+    return eventos
+
+
+def gerar_historico(rng, quantidade, fim, veiculos_por_dia=2000, tamanho_lote=10000, precos=None):
+    """
+    Gera `quantidade` veículos finalizados terminando em `fim`, em lotes prontos para
+    VehicleRepository.insert_many, com valores calculados pela tabela de preços.
+    """
+    precos = precos or DEFAULT_PRICES
+    dias = max(1, int(np.ceil(quantidade / veiculos_por_dia)))
+    inicio = fim - timedelta(days=dias)
+
+    gerados = 0
+    while gerados < quantidade:
+        tamanho = min(tamanho_lote, quantidade - gerados)
+        # Dia uniforme no período, minuto do dia seguindo o perfil de chegadas
+        segundos = (rng.integers(0, dias, size=tamanho) * 86400
+                    + rng.choice(24 * 60, size=tamanho, p=_PESOS_MINUTOS) * 60
+                    + rng.uniform(0, 60, size=tamanho))
+        entradas = [inicio + timedelta(seconds=float(s)) for s in segundos]
+        saidas = [e + timedelta(minutes=float(m)) for e, m in zip(entradas, gerar_permanencias(rng, tamanho))]
+        tipos = gerar_tipos(rng, tamanho)
+        valores = calcular_valores(entradas, saidas, tipos, precos)
+
+        yield [
+            {
+                "placa": placa,
+                "tipo_veiculo": tipo,
+                "entrada": entrada,
+                "saida": saida,
+                "status": "finalizado",
+                "valor_cobrado": float(valor),
+                **campos_placa(placa),
+            }
+            for placa, tipo, entrada, saida, valor in zip(gerar_placas(rng, tamanho), tipos, entradas, saidas, valores)
+        ]
+        gerados += tamanho
@@ -0,0 +1,166 @@
+# cli.py
+"""
+Comandos de manutenção executados fora do Streamlit.
+
+Uso:
+    python cli.py --uri "mongodb+srv://..." rebuild-rollups
+    python cli.py --backend sqlite --sqlite-path estacionamento.db rebuild-rollups
+    python cli.py --uri "mongodb+srv://..." export --inicio 2026-01-01 --fim 2026-01-31 janeiro.csv
+
+A string de conexão também pode vir da variável de ambiente MONGO_URI, e o
+backend de STORAGE_BACKEND.
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from storage import open_repositories, BACKENDS, LOT_ID, STORAGE_BACKEND, SQLITE_PATH
+from controllers.rollup_controller import reconstruir_rollups
+from controllers.analytics_controller import reconstruir_retrato
+from controllers.vehicle_controller import ocupacao, reconciliar_ocupacao
+from controllers.export_controller import exportar, FORMATOS_EXPORTACAO
+from controllers.import_controller import importar, FORMATOS_IMPORTACAO
+from controllers.pricing_controller import obter_precos
+from models.vehicle import TIPOS_VEICULOS
+
+
+def cmd_rebuild_rollups(repo, config_repo, args):
+    gravados = reconstruir_rollups(repo, dias_por_lote=args.dias_por_lote)
+    print(f"Agregados reconstruídos: {gravados} registros gravados.")
+
+
+def cmd_reindex_plates(repo, config_repo, args):
+    atualizados = repo.backfill_plate_tokens(tamanho_lote=args.tamanho_lote)
+    print(f"Placas reindexadas: {atualizados} registros atualizados.")
+
+
+def cmd_export(repo, config_repo, args):
+    inicio = datetime.combine(args.inicio, datetime.min.time()) if args.inicio else None
+    fim = datetime.combine(args.fim, datetime.max.time()) if args.fim else None
+    formato = args.formato or ("parquet" if args.arquivo.endswith(".parquet") else "csv")
+    if formato == "csv":
+        with open(args.arquivo, "w", newline="", encoding="utf-8") as destino:
+            quantidade = exportar(repo, destino, "csv", inicio, fim, args.tipo, args.tamanho_lote)
+    else:
+        quantidade = exportar(repo, args.arquivo, formato, inicio, fim, args.tipo, args.tamanho_lote)
+    print(f"Exportados {quantidade} registros para {args.arquivo}.")
+
+
+def cmd_import(repo, config_repo, args):
+    def progresso(estado):
+        print(f"  linha {estado['linha']}: {estado['importados']} importados, {estado['erros']} recusados", flush=True)
+
+    estado = importar(
+        repo, args.arquivo, formato=args.formato, precos=obter_precos(config_repo),
+        tamanho_lote=args.tamanho_lote, recomecar=args.recomecar, progresso=progresso
+    )
+    print(f"Importação concluída: {estado['importados']} importados, {estado['erros']} recusados.")
+    if estado["repetidas"]:
+        print(f"{estado['repetidas']} linhas já tinham sido importadas e foram puladas.")
+    if estado["erros"]:
+        print(f"Linhas recusadas e motivos em {args.arquivo}.erros.csv")
+
+
+def cmd_archive(repo, config_repo, args):
+    antes_de = datetime.now() - timedelta(days=args.dias)
+    movidos = repo.archive_finished(antes_de, tamanho_lote=args.tamanho_lote, pausa=args.pausa)
+    print(f"Arquivados {movidos} veículos finalizados antes de {antes_de:%d/%m/%Y %H:%M}.")
+
+
+def cmd_sync_journal(repo, config_repo, args):
+    if repo.replication_status() is None:
+        print("O diário local está desligado (defina JOURNAL_PATH).")
+        return
+    repo.flush(timeout=args.timeout)
+    situacao = repo.replication_status()
+    print(f"Diário replicado: {situacao['pendentes']} pendentes, {situacao['conflitos']} conflitos.")
+    for conflito in repo.list_conflicts():
+        print(f"  {conflito['criado_em']:%d/%m/%Y %H:%M:%S} {conflito['tipo']}: {conflito['erro']}")
+
+
+def cmd_reconcile_occupancy(repo, config_repo, args):
+    correcoes = reconciliar_ocupacao(repo)
+    for zona, diferenca in correcoes.items():
+        print(f"  {zona}: contador corrigido em {diferenca:+d}")
+    situacao = ocupacao(repo)
+    print(f"Ocupação conferida: {situacao['total']} estacionados, {len(correcoes)} zonas corrigidas.")
+    for tipo, livres in situacao["vagas_livres"].items():
+        print(f"  {tipo}: {livres} de {situacao['capacidade'][tipo]} vagas livres")
+
+
+def cmd_rebuild_analytics(repo, config_repo, args):
+    retrato = reconstruir_retrato(repo)
+    print(f"Retrato das análises refeito: {len(retrato)} veículos finalizados até {retrato.marca_dagua or '-'}.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Manutenção do OpenStParkingLot")
+    parser.add_argument("--backend", choices=BACKENDS, default=STORAGE_BACKEND, help="Armazenamento a utilizar")
+    parser.add_argument("--uri", default=os.environ.get("MONGO_URI"), help="String de conexão do MongoDB")
+    parser.add_argument("--sqlite-path", default=SQLITE_PATH, help="Arquivo do banco SQLite")
+    parser.add_argument("--patio", default=LOT_ID, help="Pátio (lot_id) em que o comando atua")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-rollups", help="Regenera os agregados horários do Dashboard")
+    rebuild.add_argument("--dias-por-lote", type=int, default=31, help="Tamanho da janela de cada lote, em dias")
+    rebuild.set_defaults(func=cmd_rebuild_rollups)
+
+    reindex = subparsers.add_parser("reindex-plates", help="Gera os campos de busca de placa em registros antigos")
+    reindex.add_argument("--tamanho-lote", type=int, default=1000, help="Documentos por lote")
+    reindex.set_defaults(func=cmd_reindex_plates)
+
+    export = subparsers.add_parser("export", help="Exporta os veículos finalizados para CSV ou Parquet")
+    export.add_argument("arquivo", help="Arquivo de destino (.csv ou .parquet)")
+    export.add_argument("--inicio", type=date.fromisoformat, help="Primeiro dia de saída (AAAA-MM-DD)")
+    export.add_argument("--fim", type=date.fromisoformat, help="Último dia de saída (AAAA-MM-DD)")
+    export.add_argument("--tipo", action="append", choices=list(TIPOS_VEICULOS), help="Tipo de veículo (repetível)")
+    export.add_argument("--formato", choices=FORMATOS_EXPORTACAO, help="Padrão: pela extensão do arquivo")
+    export.add_argument("--tamanho-lote", type=int, default=10000, help="Registros lidos e gravados por lote")
+    export.set_defaults(func=cmd_export)
+
+    import_ = subparsers.add_parser("import", help="Importa entradas e saídas de um arquivo CSV ou JSONL")
+    import_.add_argument("arquivo", help="Arquivo com as colunas placa, tipo_veiculo, entrada, saida, valor_cobrado")
+    import_.add_argument("--formato", choices=FORMATOS_IMPORTACAO, help="Padrão: pela extensão do arquivo")
+    import_.add_argument("--tamanho-lote", type=int, default=5000, help="Linhas gravadas por lote")
+    import_.add_argument("--recomecar", action="store_true", help="Ignora o checkpoint e importa desde o início")
+    import_.set_defaults(func=cmd_import)
+
+    archive = subparsers.add_parser("archive", help="Move finalizados antigos para as partições mensais de arquivo")
+    archive.add_argument("--dias", type=int, default=90, help="Arquiva os finalizados com saída há mais de N dias")
+    archive.add_argument("--tamanho-lote", type=int, default=1000, help="Documentos movidos por lote")
+    archive.add_argument("--pausa", type=float, default=0.5, help="Segundos de espera entre lotes")
+    archive.set_defaults(func=cmd_archive)
+
+    sync_journal = subparsers.add_parser("sync-journal", help="Envia ao MongoDB o que estiver pendente no diário local")
+    sync_journal.add_argument("--timeout", type=float, default=60, help="Segundos de espera pelo MongoDB")
+    sync_journal.set_defaults(func=cmd_sync_journal)
+
+    reconcile = subparsers.add_parser(
+        "reconcile-occupancy", help="Confere os contadores de vagas com os veículos estacionados"
+    )
+    reconcile.set_defaults(func=cmd_reconcile_occupancy)
+
+    analytics = subparsers.add_parser(
+        "rebuild-analytics", help="Refaz o retrato em disco usado pelas análises do Dashboard"
+    )
+    analytics.set_defaults(func=cmd_rebuild_analytics)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.backend == "mongo" and not args.uri:
+        print("Informe a string de conexão com --uri ou MONGO_URI.", file=sys.stderr)
+        return 1
+
+    repo, config_repo = open_repositories(
+        args.backend, mongo_uri=args.uri, sqlite_path=args.sqlite_path, lot_id=args.patio
+    )
+    args.func(repo, config_repo, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
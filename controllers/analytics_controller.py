@@ -0,0 +1,508 @@
+# controllers/analytics_controller.py
+"""
+Análises do Dashboard: curva de ocupação, distribuição das permanências, mapa dos
+horários de pico e previsão de ocupação para as próximas horas. Tudo é calculado com
+NumPy sobre um retrato colunar dos veículos finalizados de um pátio (entrada, saída,
+tipo e valor cobrado), em ordem de saída.
+
+O retrato fica em disco, em ANALYTICS_CACHE_DIR, com um arquivo Parquet por mês de
+saída. Cada atualização lê do armazenamento só os finalizados com saída a partir da
+marca d'água do retrato (menos ANALYTICS_OVERLAP, para pegar gravações que chegaram
+fora de ordem) e regrava apenas os meses afetados.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Pasta dos retratos em disco; vazio guarda apenas em memória
+ANALYTICS_CACHE_DIR = os.environ.get("ANALYTICS_CACHE_DIR", "analytics_cache")
+# Por quanto tempo (segundos) o retrato em memória é usado sem consultar o armazenamento
+ANALYTICS_REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_REFRESH_INTERVAL", 60))
+# Janela (segundos) antes da marca d'água relida a cada atualização: saídas gravadas fora
+# de ordem (diário local, outras instâncias) dentro dela entram no retrato
+ANALYTICS_OVERLAP = float(os.environ.get("ANALYTICS_OVERLAP", 3600))
+# Intervalo (segundos) entre reconstruções completas, que incorporam importações e
+# remoções de registros mais antigos que a janela
+ANALYTICS_FULL_REBUILD = float(os.environ.get("ANALYTICS_FULL_REBUILD", 86400))
+
+# Versão do formato em disco; retratos de outra versão são reconstruídos
+VERSAO_RETRATO = 1
+CAMPOS_RETRATO = ("tipo_veiculo", "entrada", "saida", "valor_cobrado")
+TAMANHO_LOTE_RETRATO = 10000
+
+# Limites (minutos, inclusivos) das faixas de permanência
+LIMITES_PERMANENCIA = [15, 30, 60, 120, 240, 480, 1440]
+FAIXAS_PERMANENCIA = [
+    "até 15 min", "15–30 min", "30 min–1 h", "1–2 h", "2–4 h", "4–8 h", "8–24 h", "mais de 24 h",
+]
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+MEDIDAS_PICO = {"entradas": "Entradas", "saidas": "Saídas", "faturamento": "Faturamento (R$)"}
+
+# Horas previstas e semanas anteriores usadas como referência na previsão
+HORAS_PREVISAO = 12
+SEMANAS_PREVISAO = 4
+# Em quantas horas a diferença entre a ocupação atual e a das semanas anteriores cai à metade
+MEIA_VIDA_AJUSTE = 2.0
+
+HORA = np.timedelta64(1, "h")
+SEMANA = np.timedelta64(7, "D")
+
+_lock = threading.Lock()
+_retratos = {}
+_travas = {}
+# Atualização em segundo plano de cada retrato (retrato_sem_espera) e o erro da última que falhou
+_atualizacoes = {}
+_erros = {}
+
+
+class Retrato:
+    """Colunas dos veículos finalizados, em ordem de saída; `tipo` indexa `tipos`."""
+
+    def __init__(self, entrada, saida, tipo, valor, tipos, marca_dagua=None, completo_em=0.0):
+        self.entrada = entrada
+        self.saida = saida
+        self.tipo = tipo
+        self.valor = valor
+        self.tipos = tipos
+        self.marca_dagua = marca_dagua
+        self.completo_em = completo_em
+        self.lido_em = 0.0
+        self._ordenadas = {}
+
+    @classmethod
+    def vazio(cls):
+        return cls(
+            np.array([], dtype="datetime64[us]"), np.array([], dtype="datetime64[us]"),
+            np.array([], dtype=np.int16), np.array([], dtype=np.float64), [],
+        )
+
+    def __len__(self):
+        return len(self.saida)
+
+    def tipos_presentes(self):
+        return [self.tipos[codigo] for codigo in np.unique(self.tipo)]
+
+    def fatia(self, inicio=None, fim=None):
+        """Registros com saída no intervalo (sem copiar as colunas)."""
+        i = np.searchsorted(self.saida, np.datetime64(inicio, "us"), "left") if inicio is not None else 0
+        j = np.searchsorted(self.saida, np.datetime64(fim, "us"), "right") if fim is not None else len(self)
+        return Retrato(self.entrada[i:j], self.saida[i:j], self.tipo[i:j], self.valor[i:j], self.tipos)
+
+    def com_tipos(self, tipos):
+        """O mesmo retrato com `tipo` reindexado para a lista `tipos`."""
+        if tipos == self.tipos:
+            return self
+        posicoes = np.array([tipos.index(tipo) for tipo in self.tipos] or [0], dtype=np.int16)
+        return Retrato(self.entrada, self.saida, posicoes[self.tipo], self.valor, tipos)
+
+    def ocupacao(self, instantes, tipo=None):
+        """Veículos do retrato presentes em cada instante (entrada <= instante < saída)."""
+        if tipo not in self._ordenadas:
+            if tipo is None:
+                entradas, saidas = self.entrada, self.saida
+            else:
+                mascara = self.tipo == self.tipos.index(tipo)
+                entradas, saidas = self.entrada[mascara], self.saida[mascara]
+            self._ordenadas[tipo] = (np.sort(entradas), saidas)
+        entradas, saidas = self._ordenadas[tipo]
+        return np.searchsorted(entradas, instantes, "right") - np.searchsorted(saidas, instantes, "right")
+
+    def entradas_ordenadas(self):
+        self.ocupacao(np.array([], dtype="datetime64[us]"))
+        return self._ordenadas[None][0]
+
+
+def combinar(retratos):
+    """Junta retratos (de pátios diferentes ou de lotes da mesma leitura) em um só, em ordem de saída."""
+    retratos = [retrato for retrato in retratos if len(retrato)]
+    if not retratos:
+        return Retrato.vazio()
+    tipos = sorted(set().union(*(retrato.tipos for retrato in retratos)))
+    retratos = [retrato.com_tipos(tipos) for retrato in retratos]
+    colunas = [
+        np.concatenate([getattr(retrato, coluna) for retrato in retratos])
+        for coluna in ("entrada", "saida", "tipo", "valor")
+    ]
+    # Partes já em sequência (meses em disco, mantidos + novos) dispensam a ordenação
+    saida = colunas[1]
+    if len(saida) > 1 and not (saida[1:] >= saida[:-1]).all():
+        ordem = np.argsort(saida, kind="stable")
+        colunas = [coluna[ordem] for coluna in colunas]
+    return Retrato(*colunas, tipos)
+
+
+# --- Leitura e atualização -------------------------------------------------
+
+def _ler(repo, inicio):
+    """Finalizados com saída a partir de `inicio` (todos, se None), já em colunas."""
+    entradas, saidas, tipos, valores = [], [], [], []
+    for veiculo in repo.iter_finished(inicio, tamanho_lote=TAMANHO_LOTE_RETRATO, campos=CAMPOS_RETRATO):
+        entradas.append(veiculo["entrada"])
+        saidas.append(veiculo["saida"])
+        tipos.append(veiculo.get("tipo_veiculo") or "Carro")
+        valores.append(float(veiculo.get("valor_cobrado") or 0.0))
+    if not saidas:
+        return Retrato.vazio()
+    nomes, codigos = np.unique(np.array(tipos, dtype=object), return_inverse=True)
+    return Retrato(
+        np.array(entradas, dtype="datetime64[us]"),
+        np.array(saidas, dtype="datetime64[us]"),
+        codigos.astype(np.int16),
+        np.array(valores, dtype=np.float64),
+        list(nomes),
+    )
+
+
+def _atualizar(repo, anterior):
+    """
+    Novo retrato a partir de `anterior`: mantém os registros com saída antes do corte
+    (marca d'água menos ANALYTICS_OVERLAP) e lê o resto do armazenamento. Sem `anterior`,
+    lê tudo. Retorna (retrato, corte).
+    """
+    if anterior is None or anterior.marca_dagua is None:
+        corte, mantidos = None, Retrato.vazio()
+    else:
+        corte = anterior.marca_dagua - timedelta(seconds=ANALYTICS_OVERLAP)
+        i = np.searchsorted(anterior.saida, np.datetime64(corte, "us"), "left")
+        mantidos = Retrato(anterior.entrada[:i], anterior.saida[:i], anterior.tipo[:i], anterior.valor[:i], anterior.tipos)
+    novos = _ler(repo, corte)
+    retrato = combinar([mantidos, novos]) if len(mantidos) else novos
+    if len(retrato):
+        retrato.marca_dagua = retrato.saida[-1].astype(datetime)
+    retrato.completo_em = time.time() if anterior is None else anterior.completo_em
+    return retrato, corte
+
+
+def _inalterado(anterior, retrato, corte):
+    if anterior is None or len(anterior) != len(retrato) or corte is None:
+        return False
+    i = np.searchsorted(anterior.saida, np.datetime64(corte, "us"), "left")
+    antes, depois = anterior.fatia(corte), retrato.fatia(corte)
+    return (
+        np.array_equal(antes.saida, depois.saida)
+        and np.array_equal(antes.entrada, depois.entrada)
+        and np.array_equal(antes.valor, depois.valor)
+        and [anterior.tipos[c] for c in anterior.tipo[i:]] == [retrato.tipos[c] for c in retrato.tipo[i:]]
+    )
+
+
+def _pasta(repo, diretorio):
+    chave = repo.storage_key
+    if chave is None or not diretorio:
+        return None
+    return os.path.join(diretorio, hashlib.sha1(repr(chave).encode()).hexdigest()[:16])
+
+
+def _gravar_arquivo(caminho, gravar):
+    # Grava ao lado e troca de uma vez: um leitor nunca vê o arquivo pela metade
+    temporario = f"{caminho}.tmp"
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+def _gravar(pasta, repo, retrato, corte):
+    """Regrava os meses com saída a partir do corte (todos, se None) e o estado do retrato."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(pasta, exist_ok=True)
+    meses = retrato.saida.astype("datetime64[M]")
+    primeiro = np.datetime64(corte, "M") if corte is not None else None
+    for arquivo in glob.glob(os.path.join(pasta, "*.parquet")):
+        if primeiro is None or np.datetime64(os.path.basename(arquivo)[:7], "M") >= primeiro:
+            os.remove(arquivo)
+
+    tipos = pa.array(retrato.tipos, pa.string())
+    for mes in np.unique(meses if primeiro is None else meses[meses >= primeiro]):
+        i, j = np.searchsorted(meses, mes, "left"), np.searchsorted(meses, mes, "right")
+        tabela = pa.table({
+            "entrada": pa.array(retrato.entrada[i:j], pa.timestamp("us")),
+            "saida": pa.array(retrato.saida[i:j], pa.timestamp("us")),
+            "tipo_veiculo": pa.DictionaryArray.from_arrays(pa.array(retrato.tipo[i:j], pa.int16()), tipos),
+            "valor_cobrado": pa.array(retrato.valor[i:j], pa.float64()),
+        })
+        _gravar_arquivo(
+            os.path.join(pasta, f"{mes}.parquet"),
+            lambda destino, tabela=tabela: pq.write_table(tabela, destino, compression="zstd"),
+        )
+
+    estado = {
+        "versao": VERSAO_RETRATO,
+        "chave": repr(repo.storage_key),
+        "marca_dagua": retrato.marca_dagua.isoformat() if retrato.marca_dagua else None,
+        "completo_em": retrato.completo_em,
+    }
+
+    def gravar_estado(destino):
+        with open(destino, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo)
+
+    _gravar_arquivo(os.path.join(pasta, "estado.json"), gravar_estado)
+
+
+def _carregar(pasta):
+    """Retrato gravado em `pasta`, ou None se não houver um válido (e ele será reconstruído)."""
+    import pyarrow.parquet as pq
+
+    try:
+        with open(os.path.join(pasta, "estado.json"), encoding="utf-8") as arquivo:
+            estado = json.load(arquivo)
+        if estado.get("versao") != VERSAO_RETRATO:
+            return None
+        partes = []
+        for caminho in sorted(glob.glob(os.path.join(pasta, "*.parquet"))):
+            tabela = pq.read_table(caminho, read_dictionary=["tipo_veiculo"])
+            coluna = tabela.column("tipo_veiculo").combine_chunks()
+            partes.append(Retrato(
+                tabela.column("entrada").to_numpy(),
+                tabela.column("saida").to_numpy(),
+                coluna.indices.to_numpy(zero_copy_only=False).astype(np.int16),
+                tabela.column("valor_cobrado").to_numpy(),
+                coluna.dictionary.to_pylist(),
+            ))
+    except (OSError, ValueError, KeyError):
+        return None
+    retrato = combinar(partes)
+    if estado["marca_dagua"]:
+        retrato.marca_dagua = datetime.fromisoformat(estado["marca_dagua"])
+    retrato.completo_em = estado["completo_em"]
+    return retrato
+
+
+def _chave(repo):
+    chave = repo.storage_key
+    return chave if chave is not None else repo.cache_key
+
+
+def retrato(repo, diretorio=ANALYTICS_CACHE_DIR, forcar=False):
+    """
+    Retrato dos finalizados do pátio de `repo`, compartilhado entre as sessões. O
+    armazenamento só é consultado a cada ANALYTICS_REFRESH_INTERVAL segundos (ou com
+    `forcar`), e então apenas pelos registros a partir da marca d'água; a cada
+    ANALYTICS_FULL_REBUILD segundos o retrato é refeito por inteiro. Em backends cujos
+    dados não sobrevivem ao processo (memory), o retrato fica só em memória.
+    """
+    chave = _chave(repo)
+    with _lock:
+        trava = _travas.setdefault(chave, threading.Lock())
+    with trava:
+        pasta = _pasta(repo, diretorio)
+        anterior = _retratos.get(chave)
+        if anterior is None and pasta:
+            anterior = _carregar(pasta)
+            if anterior is not None:
+                # Já serve às leituras sem espera enquanto é atualizado
+                _retratos[chave] = anterior
+        agora = time.monotonic()
+        if anterior is not None and not forcar and agora - anterior.lido_em < ANALYTICS_REFRESH_INTERVAL:
+            return anterior
+
+        if anterior is not None and time.time() - anterior.completo_em >= ANALYTICS_FULL_REBUILD:
+            anterior = None
+        novo, corte = _atualizar(repo, anterior)
+        if _inalterado(anterior, novo, corte):
+            novo = anterior
+        elif pasta:
+            _gravar(pasta, repo, novo, corte)
+        novo.lido_em = agora
+        _retratos[chave] = novo
+        return novo
+
+
+def _atualizar_em_segundo_plano(repo, diretorio, chave):
+    try:
+        retrato(repo, diretorio)
+        _erros.pop(chave, None)
+    except Exception as e:
+        _erros[chave] = e
+
+
+def retrato_sem_espera(repo, diretorio=ANALYTICS_CACHE_DIR):
+    """
+    Como retrato(), mas sem bloquear quem chama: retorna o último retrato pronto de
+    `repo` (o em memória ou, logo após a carga, o gravado em disco) ou None se ainda não
+    houver um, e dispara em uma thread a atualização do vencido, uma por armazenamento.
+    Sem retrato pronto, levanta o erro da última atualização que falhou.
+    """
+    chave = _chave(repo)
+    with _lock:
+        atual = _retratos.get(chave)
+        atualizacao = _atualizacoes.get(chave)
+        vencido = atual is None or time.monotonic() - atual.lido_em >= ANALYTICS_REFRESH_INTERVAL
+        if vencido and (atualizacao is None or not atualizacao.is_alive()):
+            atualizacao = threading.Thread(
+                target=_atualizar_em_segundo_plano, args=(repo, diretorio, chave),
+                daemon=True, name=f"retrato-{repo.name}",
+            )
+            _atualizacoes[chave] = atualizacao
+            atualizacao.start()
+        erro = _erros.get(chave)
+    if atual is None and erro is not None:
+        raise erro
+    return atual
+
+
+def descartar_retrato(repo, diretorio=ANALYTICS_CACHE_DIR):
+    """
+    Descarta o retrato de `repo` (em memória e em disco), para que a próxima leitura o
+    refaça. Usado depois de importações e limpezas, que mudam registros antigos.
+    """
+    chave = _chave(repo)
+    with _lock:
+        trava = _travas.setdefault(chave, threading.Lock())
+    with trava:
+        _retratos.pop(chave, None)
+        pasta = _pasta(repo, diretorio)
+        if pasta:
+            for arquivo in glob.glob(os.path.join(pasta, "*.parquet")) + glob.glob(os.path.join(pasta, "estado.json")):
+                os.remove(arquivo)
+
+
+def reconstruir_retrato(repo, diretorio=ANALYTICS_CACHE_DIR):
+    """Refaz o retrato de `repo` lendo todos os finalizados. Retorna o retrato."""
+    descartar_retrato(repo, diretorio)
+    return retrato(repo, diretorio)
+
+
+# --- Análises ----------------------------------------------------------------
+
+def _entradas_estacionados(estacionados):
+    """{tipo: entradas ordenadas} dos veículos ainda estacionados."""
+    por_tipo = {}
+    for veiculo in estacionados:
+        if veiculo.get("entrada") is not None:
+            por_tipo.setdefault(veiculo.get("tipo_veiculo") or "Carro", []).append(veiculo["entrada"])
+    return {tipo: np.sort(np.array(entradas, dtype="datetime64[us]")) for tipo, entradas in por_tipo.items()}
+
+
+def _instantes(inicio, fim, passo):
+    return np.arange(
+        np.datetime64(inicio, "us"), np.datetime64(fim, "us") + 1, np.timedelta64(passo // timedelta(microseconds=1), "us")
+    )
+
+
+def curva_ocupacao(retrato, inicio, fim, passo=timedelta(hours=1), estacionados=()):
+    """
+    Veículos no pátio a cada `passo` entre `inicio` e `fim`, por tipo e no total. Conta os
+    finalizados do retrato presentes em cada instante e os `estacionados` (documentos
+    ainda sem saída) que já tinham entrado.
+    """
+    instantes = _instantes(inicio, fim, passo)
+    abertos = _entradas_estacionados(estacionados)
+    colunas = {}
+    for tipo in sorted(set(retrato.tipos_presentes()) | set(abertos)):
+        ocupacao = retrato.ocupacao(instantes, tipo) if tipo in retrato.tipos else np.zeros(len(instantes), dtype=np.int64)
+        if tipo in abertos:
+            ocupacao = ocupacao + np.searchsorted(abertos[tipo], instantes, "right")
+        colunas[tipo] = ocupacao
+    curva = pd.DataFrame(colunas, index=pd.DatetimeIndex(instantes, name="Horário"))
+    curva["Total"] = curva.sum(axis=1)
+    return curva
+
+
+def distribuicao_permanencia(retrato, inicio, fim):
+    """
+    Permanência dos veículos com saída no período: {"faixas": veículos por faixa de
+    FAIXAS_PERMANENCIA e tipo, "resumo": média, mediana e p90 (minutos) por tipo e no total}.
+    """
+    fatia = retrato.fatia(inicio, fim)
+    minutos = (fatia.saida - fatia.entrada) / np.timedelta64(1, "m")
+    faixa = np.searchsorted(LIMITES_PERMANENCIA, minutos, "left")
+    quantidade_faixas = len(FAIXAS_PERMANENCIA)
+    contagem = np.bincount(
+        fatia.tipo.astype(np.int64) * quantidade_faixas + faixa, minlength=len(fatia.tipos) * quantidade_faixas
+    ).reshape(len(fatia.tipos), quantidade_faixas)
+    tipos = fatia.tipos_presentes()
+    faixas = pd.DataFrame(
+        {tipo: contagem[fatia.tipos.index(tipo)] for tipo in tipos},
+        index=pd.CategoricalIndex(FAIXAS_PERMANENCIA, categories=FAIXAS_PERMANENCIA, ordered=True, name="Permanência"),
+    )
+
+    linhas = []
+    for tipo, valores in [(tipo, minutos[fatia.tipo == fatia.tipos.index(tipo)]) for tipo in tipos] + [("Total", minutos)]:
+        if len(valores):
+            mediana, p90 = np.percentile(valores, [50, 90])
+            linhas.append({
+                "Tipo": tipo, "Veículos": len(valores), "Média (min)": valores.mean(),
+                "Mediana (min)": mediana, "p90 (min)": p90,
+            })
+    return {"faixas": faixas, "resumo": pd.DataFrame(linhas)}
+
+
+def mapa_pico(retrato, inicio, fim, medida="entradas", estacionados=()):
+    """
+    Média por dia de `medida` (MEDIDAS_PICO) em cada dia da semana e hora, no período. As
+    entradas incluem as dos `estacionados`; saídas e faturamento contam pela hora da saída.
+    """
+    if medida not in MEDIDAS_PICO:
+        raise ValueError(f"Medida desconhecida: {medida}")
+    inicio64, fim64 = np.datetime64(inicio, "us"), np.datetime64(fim, "us")
+    pesos = None
+    if medida == "entradas":
+        abertos = _entradas_estacionados(estacionados).values()
+        instantes = np.concatenate([retrato.entrada, *abertos]) if abertos else retrato.entrada
+        instantes = instantes[(instantes >= inicio64) & (instantes <= fim64)]
+    else:
+        fatia = retrato.fatia(inicio, fim)
+        instantes = fatia.saida
+        pesos = fatia.valor if medida == "faturamento" else None
+
+    dias = instantes.astype("datetime64[D]")
+    # 1970-01-01 foi uma quinta-feira: +3 leva a segunda-feira ao 0
+    dia_semana = (dias.astype(np.int64) + 3) % 7
+    hora = (instantes - dias) // HORA
+    soma = np.bincount(dia_semana * 24 + hora, weights=pesos, minlength=7 * 24).reshape(7, 24)
+
+    calendario = np.arange(inicio64.astype("datetime64[D]"), fim64.astype("datetime64[D]") + 1)
+    ocorrencias = np.bincount((calendario.astype(np.int64) + 3) % 7, minlength=7)
+    return pd.DataFrame(soma / np.maximum(ocorrencias, 1)[:, None], index=DIAS_SEMANA, columns=range(24))
+
+
+def previsao_ocupacao(retrato, agora, horas=HORAS_PREVISAO, semanas=SEMANAS_PREVISAO, estacionados=()):
+    """
+    Previsão da ocupação total a cada hora, de `agora` até `horas` adiante, para a escala
+    da equipe. Parte da média do mesmo dia da semana e horário nas `semanas` anteriores
+    cobertas pelo retrato e soma a diferença entre a ocupação atual e essa média, que
+    cai à metade a cada MEIA_VIDA_AJUSTE horas. A faixa vai do p10 ao p90 das semanas e
+    "Entradas previstas" é a média de chegadas na hora seguinte. None sem histórico.
+    """
+    base = np.datetime64(agora, "us")
+    passos = base + np.arange(horas + 1) * HORA
+    desvios = np.arange(1, semanas + 1) * SEMANA
+    if not len(retrato):
+        return None
+    desvios = desvios[base - desvios >= retrato.entradas_ordenadas()[0]]
+    if not len(desvios):
+        return None
+
+    abertos = _entradas_estacionados(estacionados).values()
+    abertos = np.sort(np.concatenate(list(abertos))) if abertos else np.array([], dtype="datetime64[us]")
+
+    def ocupacao(instantes):
+        return retrato.ocupacao(instantes) + np.searchsorted(abertos, instantes, "right")
+
+    def chegadas(instantes):
+        entradas = retrato.entradas_ordenadas()
+        return (
+            np.searchsorted(entradas, instantes + HORA, "left") - np.searchsorted(entradas, instantes, "left")
+            + np.searchsorted(abertos, instantes + HORA, "left") - np.searchsorted(abertos, instantes, "left")
+        )
+
+    historico = passos[None, :] - desvios[:, None]
+    valores = ocupacao(historico.ravel()).reshape(historico.shape)
+    media = valores.mean(axis=0)
+    ajuste = (ocupacao(base[None])[0] - media[0]) * 0.5 ** (np.arange(horas + 1) / MEIA_VIDA_AJUSTE)
+    inferior, superior = np.percentile(valores, [10, 90], axis=0)
+    return pd.DataFrame({
+        "Prevista": np.maximum(media + ajuste, 0),
+        "Faixa inferior": np.maximum(inferior + ajuste, 0),
+        "Faixa superior": np.maximum(superior + ajuste, 0),
+        "Entradas previstas": chegadas(historico.ravel()).reshape(historico.shape).mean(axis=0),
+    }, index=pd.DatetimeIndex(passos, name="Horário"))
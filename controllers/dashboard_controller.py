@@ -0,0 +1,45 @@
+# controllers/dashboard_controller.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from storage.base import somar_resumos
+
+# Pátios consultados ao mesmo tempo pelas visões consolidadas
+LOT_WORKERS = int(os.environ.get("LOT_WORKERS", 8))
+
+def _com_ticket_medio(resumo):
+    quantidade = resumo["quantidade"]
+    return {
+        **resumo,
+        "ticket_medio": resumo["total_faturado"] / quantidade if quantidade else 0.0,
+    }
+
+def resumo_faturamento(repo, inicio, fim):
+    """
+    Total faturado, quantidade de veículos, ticket médio e distribuição por tipo dos
+    veículos finalizados no período, agregados pelo próprio armazenamento (no MongoDB,
+    em um único pipeline) para que apenas as linhas agregadas trafeguem.
+    """
+    return _com_ticket_medio(repo.summarize_finished(inicio, fim))
+
+def resumo_faturamento_rollup(repo, inicio, fim):
+    """
+    Mesmo resultado de resumo_faturamento, mas lido dos agregados horários mantidos
+    na saída de cada veículo, lendo no máximo uma linha por hora e tipo em vez do histórico bruto.
+    """
+    return _com_ticket_medio(repo.summarize_rollups(inicio, fim))
+
+def resumo_faturamento_patios(repos, inicio, fim, workers=LOT_WORKERS):
+    """
+    Resumo de resumo_faturamento_rollup de cada pátio de `repos` ({lot_id: repositório}),
+    consultados em paralelo, e o consolidado de todos. Cada consulta percorre só os
+    agregados do seu pátio. Retorna {"total": resumo, "por_patio": {lot_id: resumo}}.
+    """
+    if not repos:
+        return {"total": _com_ticket_medio(somar_resumos([])), "por_patio": {}}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(repos)))) as executor:
+        resumos = dict(zip(repos, executor.map(lambda repo: repo.summarize_rollups(inicio, fim), repos.values())))
+    return {
+        "total": _com_ticket_medio(somar_resumos(resumos.values())),
+        "por_patio": {lot_id: _com_ticket_medio(resumo) for lot_id, resumo in resumos.items()},
+    }
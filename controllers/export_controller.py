@@ -0,0 +1,90 @@
+# controllers/export_controller.py
+import csv
+import io
+
+# Colunas dos arquivos exportados, na ordem em que aparecem
+COLUNAS_EXPORTACAO = ["placa", "tipo_veiculo", "entrada", "saida", "permanencia_minutos", "valor_cobrado"]
+FORMATOS_EXPORTACAO = ("csv", "parquet")
+TAMANHO_LOTE_EXPORTACAO = 10000
+
+def _lotes(repo, inicio, fim, tipos, tamanho_lote):
+    """Agrupa os finalizados lidos do armazenamento em listas de linhas prontas para gravação."""
+    lote = []
+    campos = ("placa", "tipo_veiculo", "entrada", "saida", "valor_cobrado")
+    for veiculo in repo.iter_finished(inicio, fim, tamanho_lote=tamanho_lote, tipos=tipos, campos=campos):
+        lote.append({
+            "placa": veiculo.get("placa"),
+            "tipo_veiculo": veiculo.get("tipo_veiculo") or "Carro",
+            "entrada": veiculo["entrada"],
+            "saida": veiculo["saida"],
+            "permanencia_minutos": round((veiculo["saida"] - veiculo["entrada"]).total_seconds() / 60, 2),
+            "valor_cobrado": float(veiculo.get("valor_cobrado") or 0.0),
+        })
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _linha_csv(linha):
+    return {**linha, "entrada": linha["entrada"].isoformat(), "saida": linha["saida"].isoformat()}
+
+def iter_csv(repo, inicio=None, fim=None, tipos=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Gera o CSV dos veículos finalizados em pedaços de texto (cabeçalho e um pedaço por
+    lote), sem manter mais de um lote em memória. Datas em ISO 8601.
+    """
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUNAS_EXPORTACAO)
+    escritor.writeheader()
+    for lote in _lotes(repo, inicio, fim, tipos, tamanho_lote):
+        escritor.writerows(_linha_csv(linha) for linha in lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def exportar_csv(repo, destino, inicio=None, fim=None, tipos=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Grava o CSV em `destino` (arquivo de texto aberto com newline=""), lote a lote.
+    Retorna a quantidade de registros.
+    """
+    escritor = csv.DictWriter(destino, fieldnames=COLUNAS_EXPORTACAO)
+    escritor.writeheader()
+    quantidade = 0
+    for lote in _lotes(repo, inicio, fim, tipos, tamanho_lote):
+        escritor.writerows(_linha_csv(linha) for linha in lote)
+        quantidade += len(lote)
+    return quantidade
+
+def exportar_parquet(repo, destino, inicio=None, fim=None, tipos=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Grava um arquivo Parquet em `destino` (caminho ou arquivo binário), com um row group
+    por lote. Retorna a quantidade de registros.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("placa", pa.string()),
+        ("tipo_veiculo", pa.string()),
+        ("entrada", pa.timestamp("us")),
+        ("saida", pa.timestamp("us")),
+        ("permanencia_minutos", pa.float64()),
+        ("valor_cobrado", pa.float64()),
+    ])
+    quantidade = 0
+    with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+        for lote in _lotes(repo, inicio, fim, tipos, tamanho_lote):
+            escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+            quantidade += len(lote)
+    return quantidade
+
+def exportar(repo, destino, formato="csv", inicio=None, fim=None, tipos=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """Exporta o histórico no formato escolhido ("csv" ou "parquet"). Retorna a quantidade de registros."""
+    if formato == "csv":
+        return exportar_csv(repo, destino, inicio, fim, tipos, tamanho_lote)
+    if formato == "parquet":
+        return exportar_parquet(repo, destino, inicio, fim, tipos, tamanho_lote)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
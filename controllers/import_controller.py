@@ -0,0 +1,244 @@
+# controllers/import_controller.py
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from controllers.pricing_controller import DEFAULT_PRICES
+from models.vehicle import normalize_vehicle_data, TIPOS_VEICULOS
+from storage.base import AlreadyImported, periodo_rollup
+from utils.helpers import calcular_valores
+from utils.plates import campos_placa
+
+FORMATOS_IMPORTACAO = ("csv", "jsonl")
+TAMANHO_LOTE_IMPORTACAO = 5000
+
+# Formatos de data aceitos além do ISO 8601 (os mesmos exibidos pelo app)
+FORMATOS_DATA = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
+
+def _data(valor, campo):
+    if valor in (None, ""):
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    texto = str(valor).strip()
+    try:
+        data = datetime.fromisoformat(texto)
+        return data.astimezone().replace(tzinfo=None) if data.tzinfo else data
+    except ValueError:
+        pass
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida em '{campo}': {texto}")
+
+def validar_linha(dados):
+    """
+    Converte uma linha do arquivo em documento de veículo. Exige placa e entrada; sem
+    saída o veículo é importado como estacionado. O tipo ausente segue o padrão de
+    normalize_vehicle_data. Levanta ValueError descrevendo o primeiro problema encontrado.
+    """
+    placa = str(dados.get("placa") or "").upper().strip()
+    if not placa:
+        raise ValueError("placa ausente")
+    entrada = _data(dados.get("entrada"), "entrada")
+    if entrada is None:
+        raise ValueError("entrada ausente")
+    saida = _data(dados.get("saida"), "saida")
+    if saida is not None and saida < entrada:
+        raise ValueError("saída anterior à entrada")
+
+    veiculo = normalize_vehicle_data({
+        "placa": placa,
+        "tipo_veiculo": dados.get("tipo_veiculo") or None,
+        "entrada": entrada,
+    }, campos=("tipo_veiculo",))
+    if veiculo["tipo_veiculo"] not in TIPOS_VEICULOS:
+        raise ValueError(f"tipo de veículo desconhecido: {veiculo['tipo_veiculo']}")
+
+    if saida is None:
+        veiculo["status"] = "estacionado"
+    else:
+        veiculo["status"] = "finalizado"
+        veiculo["saida"] = saida
+        valor = dados.get("valor_cobrado")
+        # Só a célula vazia (ou ausente) é cobrança a calcular; 0 é uma cortesia
+        if valor is not None and str(valor).strip() != "":
+            try:
+                veiculo["valor_cobrado"] = float(str(valor).strip().replace(",", "."))
+            except ValueError:
+                raise ValueError(f"valor_cobrado inválido: {valor}")
+    veiculo.update(campos_placa(placa))
+    return veiculo
+
+def ler_linhas(caminho, formato=None):
+    """Itera sobre (número da linha, dicionário) de um arquivo CSV ou JSONL."""
+    formato = formato or ("jsonl" if caminho.endswith((".jsonl", ".json")) else "csv")
+    with open(caminho, newline="", encoding="utf-8-sig") as arquivo:
+        if formato == "csv":
+            # A linha 1 é o cabeçalho
+            for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+                yield numero, linha
+        elif formato == "jsonl":
+            for numero, texto in enumerate(arquivo, start=1):
+                if not texto.strip():
+                    continue
+                try:
+                    dados = json.loads(texto)
+                except ValueError as e:
+                    dados = {"_erro": f"JSON inválido: {e}", "_texto": texto.strip()}
+                yield numero, dados if isinstance(dados, dict) else {"_erro": "a linha não é um objeto JSON"}
+        else:
+            raise ValueError(f"Formato de importação desconhecido: {formato}")
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """sha256 (hexadecimal) do conteúdo do arquivo, lido em blocos."""
+    resumo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+def _carregar_checkpoint(caminho):
+    estado = {"linha": 0, "importados": 0, "erros": 0, "repetidas": 0}
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as arquivo:
+            estado.update(json.load(arquivo))
+    return estado
+
+def _salvar_checkpoint(caminho, checkpoint):
+    # Grava em um arquivo temporário e renomeia, para nunca deixar um checkpoint pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(checkpoint, arquivo)
+    os.replace(temporario, caminho)
+
+def _gravar_lote(repo, lote, precos):
+    """
+    Calcula as cobranças ausentes, grava o lote e atualiza os agregados. Retorna
+    {posição: ConflictError} dos recusados.
+
+    AlreadyImported indica uma execução anterior que gravou o lote, mas pode ter caído
+    antes de somar os agregados: em vez de somar, as horas de saída do lote são
+    refeitas a partir do histórico (rebuild_rollups no intervalo), que já tem tanto as
+    linhas antigas quanto as novas.
+    """
+    sem_valor = [v for _, v, _ in lote if v["status"] == "finalizado" and "valor_cobrado" not in v]
+    if sem_valor:
+        # Mesma regra de calcular_valor, vetorizada para o lote inteiro
+        valores = calcular_valores(
+            [v["entrada"] for v in sem_valor], [v["saida"] for v in sem_valor],
+            [v["tipo_veiculo"] for v in sem_valor], precos, placas=[v["placa"] for v in sem_valor]
+        )
+        for veiculo, valor in zip(sem_valor, valores):
+            veiculo["valor_cobrado"] = float(valor)
+
+    erros = repo.import_batch([veiculo for _, veiculo, _ in lote]) if lote else {}
+
+    if any(isinstance(erro, AlreadyImported) for erro in erros.values()):
+        horas = [
+            periodo_rollup(veiculo["saida"]) for posicao, (_, veiculo, _) in enumerate(lote)
+            if veiculo["status"] == "finalizado" and isinstance(erros.get(posicao, AlreadyImported), AlreadyImported)
+        ]
+        if horas:
+            repo.rebuild_rollups(inicio=min(horas), fim=max(horas))
+        return erros
+
+    # Agregados do Dashboard somados por (hora, tipo) em memória: uma escrita por chave, não por linha
+    agregados = {}
+    for posicao, (_, veiculo, _) in enumerate(lote):
+        if posicao in erros or veiculo["status"] != "finalizado":
+            continue
+        linha = agregados.setdefault((periodo_rollup(veiculo["saida"]), veiculo["tipo_veiculo"]), [0, 0.0, 0.0])
+        linha[0] += 1
+        linha[1] += veiculo["valor_cobrado"]
+        linha[2] += (veiculo["saida"] - veiculo["entrada"]) / timedelta(minutes=1)
+    for (periodo, tipo), (quantidade, faturamento, minutos) in agregados.items():
+        repo.increment_rollup(periodo, tipo, quantidade, faturamento, minutos)
+    return erros
+
+def importar(repo, caminho, formato=None, precos=None, tamanho_lote=TAMANHO_LOTE_IMPORTACAO,
+             checkpoint=None, relatorio=None, recomecar=False, progresso=None):
+    """
+    Importa entradas e saídas de um arquivo CSV ou JSONL (colunas placa, tipo_veiculo,
+    entrada, saida, valor_cobrado), em lotes gravados de uma vez. Cobranças ausentes
+    são calculadas com a tabela `precos` (padrão: DEFAULT_PRICES).
+
+    Após cada lote, a última linha concluída é gravada em `checkpoint` (padrão:
+    <arquivo>.checkpoint.json); uma nova chamada continua dali, a menos que `recomecar`.
+    Cada veículo leva a chave_importacao "<sha256 do arquivo>:<linha>", única no pátio:
+    se o processo cair entre a gravação de um lote e o checkpoint, ou com `recomecar`,
+    as linhas já gravadas são recusadas pelo armazenamento e contadas em "repetidas",
+    sem duplicar o histórico; os agregados das horas desse lote são refeitos a partir do
+    histórico, o que também recupera os de uma queda entre a gravação do lote e a soma
+    dos agregados. Linhas recusadas por outros motivos vão
+    para `relatorio` (padrão: <arquivo>.erros.csv), com o número da linha e o motivo.
+    `progresso`, se informado, é chamado com o checkpoint a cada lote. Retorna o
+    checkpoint final.
+    """
+    precos = precos or DEFAULT_PRICES
+    # 64 bits do sha256 bastam para distinguir os arquivos importados em um pátio
+    arquivo_id = hash_arquivo(caminho)[:16]
+    checkpoint = checkpoint or caminho + ".checkpoint.json"
+    relatorio = relatorio or caminho + ".erros.csv"
+    if recomecar:
+        for arquivo in (checkpoint, relatorio):
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+    estado = _carregar_checkpoint(checkpoint)
+
+    novo_relatorio = not os.path.exists(relatorio)
+    with open(relatorio, "a", newline="", encoding="utf-8") as arquivo_erros:
+        erros_csv = csv.writer(arquivo_erros)
+        if novo_relatorio:
+            erros_csv.writerow(["linha", "erro", "conteudo"])
+
+        def concluir(lote, invalidas):
+            recusadas, repetidas = list(invalidas), 0
+            for posicao, erro in _gravar_lote(repo, lote, precos).items():
+                if isinstance(erro, AlreadyImported):
+                    repetidas += 1
+                    continue
+                numero, _, dados = lote[posicao]
+                recusadas.append((numero, str(erro), dados))
+            recusadas.sort(key=lambda item: item[0])
+            erros_csv.writerows(
+                [numero, mensagem, json.dumps(dados, ensure_ascii=False, default=str)]
+                for numero, mensagem, dados in recusadas
+            )
+            arquivo_erros.flush()
+
+            estado["linha"] = max(numero for numero, _, _ in lote + invalidas)
+            estado["importados"] += len(lote) + len(invalidas) - len(recusadas) - repetidas
+            estado["erros"] += len(recusadas)
+            estado["repetidas"] += repetidas
+            _salvar_checkpoint(checkpoint, estado)
+            if progresso:
+                progresso(dict(estado))
+
+        lote, invalidas = [], []
+        for numero, dados in ler_linhas(caminho, formato):
+            if numero <= estado["linha"]:
+                continue
+            try:
+                if "_erro" in dados:
+                    raise ValueError(dados["_erro"])
+                veiculo = validar_linha(dados)
+                veiculo["chave_importacao"] = f"{arquivo_id}:{numero}"
+                lote.append((numero, veiculo, dados))
+            except ValueError as e:
+                invalidas.append((numero, str(e), dados))
+            if len(lote) + len(invalidas) >= tamanho_lote:
+                concluir(lote, invalidas)
+                lote, invalidas = [], []
+        if lote or invalidas:
+            concluir(lote, invalidas)
+
+    # Registros antigos não passam pela marca d'água do retrato das análises: ele é refeito
+    from controllers.analytics_controller import descartar_retrato
+
+    descartar_retrato(repo)
+    return estado
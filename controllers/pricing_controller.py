@@ -1,24 +1,105 @@
 # controllers/pricing_controller.py
+import threading
+import time
+
 import streamlit as st
+from utils.helpers import calcular_valores
 
-def load_config(config_collection):
-    config = config_collection.find_one({"type": "price_config"})
-    if config and "prices" in config:
-        st.session_state.PRECO_POR_HORA = config["prices"]
-    else:
-        st.session_state.PRECO_POR_HORA = {
-            "Carro": 10.0,
-            "Moto": 5.0,
-            "Caminhão": 15.0,
-            "Van": 12.0,
-            "Bicicleta": 2.0
-        }
+DEFAULT_PRICES = {
+    "Carro": 10.0,
+    "Moto": 5.0,
+    "Caminhão": 15.0,
+    "Van": 12.0,
+    "Bicicleta": 2.0
+}
+
+# Por quanto tempo (segundos) a configuração em memória é usada sem consultar o banco.
+# Depois disso, apenas o campo "version" é lido para saber se outro processo a alterou.
+PRICE_CONFIG_TTL = 60
+
+_cache_lock = threading.Lock()
+_price_cache = {}
+
+def invalidate_config_cache(config_repo=None):
+    with _cache_lock:
+        if config_repo is None:
+            _price_cache.clear()
+        else:
+            _price_cache.pop(config_repo.cache_key, None)
+
+def _config_em_cache(config_repo):
+    key = config_repo.cache_key
+    agora = time.monotonic()
+
+    with _cache_lock:
+        entry = _price_cache.get(key)
+    if entry is not None and agora - entry["checked_at"] < PRICE_CONFIG_TTL:
+        return entry["prices"]
+
+    if entry is not None and config_repo.get_version() == entry["version"]:
+        with _cache_lock:
+            entry["checked_at"] = agora
+        return entry["prices"]
+
+    prices, versao = config_repo.get()
+    if prices is None:
+        prices = dict(DEFAULT_PRICES)
+    with _cache_lock:
+        _price_cache[key] = {"prices": prices, "version": versao, "checked_at": agora}
+    return prices
+
+def obter_precos(config_repo):
+    """
+    Retorna a tabela de preços a partir de um cache compartilhado entre as sessões.
+    O banco só é consultado após PRICE_CONFIG_TTL segundos, e nesse caso apenas a
+    versão da configuração é lida, a menos que ela tenha mudado.
+    """
+    return dict(_config_em_cache(config_repo))
+
+def load_config(config_repo):
+    """Carrega a tabela de preços (ver obter_precos) no st.session_state da sessão."""
+    st.session_state.PRECO_POR_HORA = obter_precos(config_repo)
     return st.session_state.PRECO_POR_HORA
 
-def save_config(config_collection, prices):
-    config_collection.update_one(
-        {"type": "price_config"},
-        {"$set": {"prices": prices}},
-        upsert=True
-    )
-    st.session_state.PRECO_POR_HORA = prices
\ No newline at end of file
+def save_config(config_repo, prices):
+    versao = config_repo.save(prices)
+    with _cache_lock:
+        _price_cache[config_repo.cache_key] = {
+            "prices": dict(prices),
+            "version": versao,
+            "checked_at": time.monotonic(),
+        }
+    st.session_state.PRECO_POR_HORA = prices
+
+def simular_precos(repo, prices, inicio=None, fim=None, tamanho_lote=50000):
+    """
+    Recalcula as cobranças dos veículos finalizados com uma tabela de preços hipotética,
+    lendo o histórico em lotes e calculando cada lote de forma vetorizada.
+    Retorna {tipo: {"quantidade", "faturamento_atual", "faturamento_simulado"}}.
+    """
+    cursor = repo.iter_finished(inicio, fim, tamanho_lote=tamanho_lote)
+
+    resultado = {}
+
+    def processar(lote):
+        tipos = [v.get("tipo_veiculo") or "Carro" for v in lote]
+        simulados = calcular_valores(
+            [v["entrada"] for v in lote], [v["saida"] for v in lote], tipos, prices,
+            placas=[v.get("placa") for v in lote]
+        )
+        for tipo, veiculo, simulado in zip(tipos, lote, simulados):
+            linha = resultado.setdefault(tipo, {"quantidade": 0, "faturamento_atual": 0.0, "faturamento_simulado": 0.0})
+            linha["quantidade"] += 1
+            linha["faturamento_atual"] += float(veiculo.get("valor_cobrado") or 0.0)
+            linha["faturamento_simulado"] += float(simulado)
+
+    lote = []
+    for veiculo in cursor:
+        lote.append(veiculo)
+        if len(lote) >= tamanho_lote:
+            processar(lote)
+            lote = []
+    if lote:
+        processar(lote)
+
+    return resultado
@@ -0,0 +1,30 @@
+# controllers/rollup_controller.py
+from datetime import timedelta
+
+from storage.base import periodo_rollup
+
+def aplicar_saida(repo, veiculo, sinal=1):
+    """
+    Soma (sinal=1) ou estorna (sinal=-1) a contribuição de um veículo finalizado
+    no agregado de (hora de saída, tipo de veículo).
+    """
+    if veiculo.get("saida") is None or veiculo.get("entrada") is None:
+        return
+
+    repo.increment_rollup(
+        periodo_rollup(veiculo["saida"]),
+        veiculo.get("tipo_veiculo") or "Carro",
+        sinal,
+        sinal * float(veiculo.get("valor_cobrado") or 0.0),
+        sinal * ((veiculo["saida"] - veiculo["entrada"]) / timedelta(minutes=1))
+    )
+
+def resetar_rollups(repo):
+    repo.reset_rollups()
+
+def reconstruir_rollups(repo, dias_por_lote=31):
+    """
+    Regenera todos os agregados a partir do histórico de veículos, em lotes.
+    Retorna a quantidade de agregados gravados.
+    """
+    return repo.rebuild_rollups(dias_por_lote=dias_por_lote)
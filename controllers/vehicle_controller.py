@@ -1,48 +1,132 @@
 # controllers/vehicle_controller.py
 from datetime import datetime
 from utils.helpers import calcular_valor
+from utils.plates import campos_placa
+from controllers.rollup_controller import aplicar_saida, resetar_rollups
 
-def registrar_entrada(collection, placa, tipo_veiculo, hora_entrada):
+def registrar_entrada(repo, placa, tipo_veiculo, hora_entrada):
+    """
+    Registra a entrada com uma única escrita, no pátio do repositório (repo.lot_id).
+    A unicidade de ticket aberto por placa no pátio é garantida pelo armazenamento: se
+    outro terminal já registrou a placa, levanta VehicleAlreadyParked (um ConflictError).
+    Da mesma forma, a vaga é reservada pelo armazenamento, que levanta LotFull se a zona
+    do tipo de veículo estiver lotada.
+    """
     if not placa:
         return "Por favor, digite uma placa válida!"
 
-    veiculo = collection.find_one({"placa": placa, "status": "estacionado"})
-    if veiculo:
-        return f"Veículo com placa {placa} já está estacionado!"
-
     entrada = {
         "placa": placa,
         "tipo_veiculo": tipo_veiculo,
         "entrada": hora_entrada,
-        "status": "estacionado"
+        "status": "estacionado",
+        **campos_placa(placa)
     }
-    collection.insert_one(entrada)
+    repo.insert(entrada)
+    if entrada.get("vaga") is not None:
+        return f"Entrada registrada para o veículo {placa} na vaga {entrada['vaga']} ({entrada['zona']})"
     return f"Entrada registrada para o veículo {placa}"
 
 def preparar_saida(veiculo):
     return veiculo
 
-def registrar_saida(collection, veiculo_id, entrada, saida, tipo_veiculo, valor_cobrado):
-    collection.update_one(
-        {"_id": veiculo_id},
+def cotar_saida(repo, placa, saida, precos_por_hora, espelho=None):
+    """
+    Localiza o veículo estacionado com a placa e calcula o valor devido até `saida`.
+    Retorna (veiculo, valor) ou (None, None) se a placa não estiver estacionada.
+    Com `espelho` (storage.live.ParkedMirror), a placa é procurada primeiro nele, em
+    memória; o repositório só é consultado se ela não estiver lá. Um espelho atrasado
+    não registra saída indevida: finalize recusa o ticket que já foi fechado.
+    """
+    veiculo = espelho.find(placa) if espelho is not None else None
+    if veiculo is None:
+        veiculo = repo.find_parked(placa)
+    if veiculo is None:
+        return None, None
+    valor = calcular_valor(veiculo["entrada"], saida, veiculo.get("tipo_veiculo"), precos_por_hora, placa=veiculo["placa"])
+    return veiculo, valor
+
+def registrar_saida(repo, veiculo_id, entrada, saida, tipo_veiculo, valor_cobrado):
+    """
+    Finaliza o ticket com uma única atualização condicionada a ele ainda estar estacionado
+    no pátio do repositório. Se outro terminal já registrou a saída (ou removeu o veículo),
+    levanta VehicleNotParked (um ConflictError) e nada é alterado.
+    """
+    finalizado = repo.finalize(
+        veiculo_id,
         {
-            "$set": {
-                "saida": saida,
-                "status": "finalizado",
-                "tipo_veiculo": tipo_veiculo,
-                "entrada": entrada,
-                "valor_cobrado": valor_cobrado
-            }
+            "saida": saida,
+            "status": "finalizado",
+            "tipo_veiculo": tipo_veiculo,
+            "entrada": entrada,
+            "valor_cobrado": valor_cobrado
         }
     )
+    aplicar_saida(repo, finalizado)
     return f"Saída registrada. Valor cobrado: R$ {valor_cobrado:.2f}"
 
-def remover_veiculo(collection, veiculo_id):
+def ocupacao(repo):
+    """
+    Veículos estacionados (no total e por tipo), capacidade e vagas livres das zonas
+    com capacidade, lidos dos contadores mantidos pelo armazenamento: o custo não
+    depende de quantos veículos estão estacionados, e o painel da cancela pode
+    consultar a cada segundo.
+    """
+    zonas = repo.occupancy()
+    por_tipo = {zona: contador["ocupadas"] for zona, contador in zonas.items() if contador["ocupadas"]}
+    capacidade = {zona: contador["capacidade"] for zona, contador in zonas.items() if contador["capacidade"]}
+    vagas_livres = {zona: max(vagas - por_tipo.get(zona, 0), 0) for zona, vagas in capacidade.items()}
+    return {
+        "total": sum(por_tipo.values()),
+        "por_tipo": por_tipo,
+        "capacidade": capacidade,
+        "vagas_livres": vagas_livres,
+    }
+
+def configurar_capacidade(repo, capacidade):
+    """
+    Grava a quantidade de vagas de cada tipo de veículo no pátio ({tipo: vagas}; 0
+    deixa o tipo sem limite) e renumera as vagas livres.
+    """
+    repo.set_capacity(capacidade)
+
+def reconciliar_ocupacao(repo):
+    """
+    Recalcula os contadores de ocupação a partir dos estacionados. Retorna
+    {zona: diferença} das zonas que estavam divergentes.
+    """
+    return repo.reconcile_occupancy()
+
+def pagina_historico(repo, busca=None, tamanho=50, apos=None):
+    """
+    Uma página do histórico, da saída mais recente para a mais antiga. `apos` é o cursor
+    devolvido para a página anterior. Retorna (veículos, cursor da próxima página ou None).
+    """
+    veiculos = repo.list_history(busca, limite=tamanho + 1, apos=apos)
+    if len(veiculos) <= tamanho:
+        return veiculos, None
+    veiculos = veiculos[:tamanho]
+    ultimo = veiculos[-1]
+    proximo = (ultimo["saida"], ultimo["_id"]) if ultimo.get("saida") is not None else None
+    return veiculos, proximo
+
+def remover_veiculo(repo, veiculo_id):
+    """Retorna (removido, mensagem); removido é False se o veículo não existe ou a remoção falhou."""
     try:
-        result = collection.delete_one({"_id": veiculo_id})
-        if result.deleted_count == 1:
-            return "Veículo removido com sucesso!"
+        removido = repo.delete(veiculo_id)
+        if removido is not None:
+            if removido.get("status") == "finalizado":
+                aplicar_saida(repo, removido, sinal=-1)
+            return True, "Veículo removido com sucesso!"
         else:
-            return "Veículo não encontrado ou não pôde ser removido."
+            return False, "Veículo não encontrado ou não pôde ser removido."
     except Exception as e:
-        return f"Ocorreu um erro ao remover o veículo: {e}"
\ No newline at end of file
+        return False, f"Ocorreu um erro ao remover o veículo: {e}"
+
+def limpar_veiculos(repo):
+    # Importado aqui para não carregar o pandas das análises junto do controlador
+    from controllers.analytics_controller import descartar_retrato
+
+    repo.delete_all()
+    resetar_rollups(repo)
+    descartar_retrato(repo)
@@ -1,7 +1,19 @@
 # models/vehicle.py
 from datetime import datetime
 
-def normalize_vehicle_data(veiculo):
+TIPOS_VEICULOS = {
+    "Carro": "🚗",
+    "Moto": "🏍️",
+    "Caminhão": "🚛",
+    "Van": "🚐",
+    "Bicicleta": "🚲"
+}
+
+def normalize_vehicle_data(veiculo, campos=None):
+    """
+    Preenche os campos ausentes ou nulos com valores padrão. `campos` limita quais
+    campos são preenchidos (todos, por padrão).
+    """
     if not isinstance(veiculo, dict):
         return None
 
@@ -14,6 +26,8 @@ def normalize_vehicle_data(veiculo):
     }
 
     for key, default_value in defaults.items():
+        if campos is not None and key not in campos:
+            continue
         if key not in veiculo or veiculo[key] is None:
             veiculo[key] = default_value
 
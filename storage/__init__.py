@@ -0,0 +1,110 @@
+# storage/__init__.py
+import os
+import threading
+
+from storage.base import (
+    DEFAULT_LOT,
+    LOT_ID,
+    VehicleRepository,
+    PriceConfigRepository,
+    ConflictError,
+    AlreadyImported,
+    LotFull,
+    VehicleAlreadyParked,
+    VehicleNotParked,
+)
+from utils.metrics import instrumentar
+
+# "mongo" (padrão), "sqlite" ou "memory"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mongo")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "estacionamento.db")
+
+BACKENDS = ("mongo", "sqlite", "memory")
+
+_lock = threading.Lock()
+_locais = {}
+
+
+def open_repositories(backend=STORAGE_BACKEND, mongo_uri=None, sqlite_path=SQLITE_PATH, lot_id=LOT_ID):
+    """
+    Retorna o par (repositório de veículos, repositório de preços) do pátio `lot_id`
+    no backend escolhido. Os backends locais são criados uma única vez por processo e
+    compartilhados entre as sessões; no MongoDB o compartilhamento fica a cargo de
+    utils.connection.get_client. Com JOURNAL_PATH definido, os veículos do pátio deste
+    terminal (LOT_ID) no MongoDB passam pelo diário local (storage.journal), também
+    único por processo. Cada chamada aos repositórios é medida por utils.metrics.
+    """
+    repo, config_repo = _abrir(backend, mongo_uri, sqlite_path, lot_id)
+    return instrumentar(repo, backend), instrumentar(config_repo, f"{backend}.precos")
+
+
+def _abrir(backend, mongo_uri, sqlite_path, lot_id):
+    if backend == "mongo":
+        from storage.mongo import MongoVehicleRepository, MongoPriceConfigRepository
+        from storage.journal import JOURNAL_PATH, JournaledVehicleRepository, start_replicator
+        from utils.connection import get_client
+
+        db = get_client(mongo_uri).estacionamento
+        # O diário guarda as gravações das cancelas deste terminal; os demais pátios são lidos direto
+        if not JOURNAL_PATH or lot_id != LOT_ID:
+            return MongoVehicleRepository(db, lot_id), MongoPriceConfigRepository(db, lot_id)
+        key = ("journal", JOURNAL_PATH, mongo_uri)
+        with _lock:
+            if key not in _locais:
+                journal = JournaledVehicleRepository(MongoVehicleRepository(db, lot_id), JOURNAL_PATH)
+                start_replicator(journal)
+                _locais[key] = journal
+        return _locais[key], MongoPriceConfigRepository(db, lot_id)
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+
+    key = (backend, sqlite_path if backend == "sqlite" else None, lot_id)
+    with _lock:
+        if key not in _locais:
+            if backend == "sqlite":
+                from storage.sqlite import connect, SQLiteVehicleRepository, SQLitePriceConfigRepository
+
+                # Os pátios dividem a conexão (e a trava) do arquivo
+                if ("conexao", sqlite_path) not in _locais:
+                    _locais[("conexao", sqlite_path)] = (connect(sqlite_path), threading.RLock())
+                conn, lock = _locais[("conexao", sqlite_path)]
+                _locais[key] = (
+                    SQLiteVehicleRepository(conn, lock, lot_id),
+                    SQLitePriceConfigRepository(conn, lock, path=sqlite_path, lot_id=lot_id),
+                )
+            else:
+                from storage.memory import MemoryVehicleRepository, MemoryPriceConfigRepository
+
+                _locais[key] = (MemoryVehicleRepository(lot_id), MemoryPriceConfigRepository(lot_id))
+        return _locais[key]
+
+
+def open_lots(backend=STORAGE_BACKEND, mongo_uri=None, sqlite_path=SQLITE_PATH, lot_ids=None):
+    """
+    {lot_id: repositório de veículos} de cada pátio em `lot_ids` (padrão: todos os
+    que o armazenamento conhece), para as visões consolidadas.
+    """
+    if lot_ids is None:
+        lot_ids = open_repositories(backend, mongo_uri, sqlite_path)[0].list_lots()
+    return {
+        lot_id: open_repositories(backend, mongo_uri, sqlite_path, lot_id)[0]
+        for lot_id in lot_ids
+    }
+
+
+__all__ = [
+    "VehicleRepository",
+    "PriceConfigRepository",
+    "ConflictError",
+    "LotFull",
+    "VehicleAlreadyParked",
+    "VehicleNotParked",
+    "open_repositories",
+    "open_lots",
+    "DEFAULT_LOT",
+    "LOT_ID",
+    "STORAGE_BACKEND",
+    "SQLITE_PATH",
+    "BACKENDS",
+]
@@ -0,0 +1,56 @@
+# storage/archive.py
+"""
+Arquivamento em segundo plano: de tempos em tempos, move os veículos finalizados há
+mais de ARCHIVE_AFTER_DAYS dias para as partições de arquivo do backend, em lotes
+espaçados, para que a coleção de trabalho guarde só os estacionados e o histórico
+recente. Consultas de histórico, Dashboard e exportação continuam lendo tudo.
+"""
+import os
+from datetime import datetime, timedelta
+
+from storage.workers import BackgroundWorker, WorkerRegistry
+
+# Idade (dias desde a saída) a partir da qual um finalizado é arquivado; 0 desliga
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 0))
+# Intervalo (segundos) entre duas rodadas de arquivamento
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", 3600))
+# Documentos movidos por lote e pausa (segundos) entre lotes
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 1000))
+ARCHIVE_PAUSE = float(os.environ.get("ARCHIVE_PAUSE", 0.5))
+
+_arquivadores = WorkerRegistry()
+
+
+class ArchiveWorker(BackgroundWorker):
+    """
+    Thread que chama repo.archive_finished a cada `interval` segundos. `status` guarda
+    a última rodada: quantos foram movidos, quando e o último erro.
+    """
+
+    def __init__(self, repo, dias=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL,
+                 tamanho_lote=ARCHIVE_BATCH_SIZE, pausa=ARCHIVE_PAUSE):
+        super().__init__(f"archive-{repo.name}", interval, movidos=0)
+        self.repo = repo
+        self.dias = dias
+        self.tamanho_lote = tamanho_lote
+        self.pausa = pausa
+
+    def rodada(self):
+        antes_de = datetime.now() - timedelta(days=self.dias)
+        movidos = self.repo.archive_finished(
+            antes_de, tamanho_lote=self.tamanho_lote, pausa=self.pausa, parar=self.stop_event
+        )
+        return {"movidos": movidos}
+
+
+def start_archiver(repo, dias=ARCHIVE_AFTER_DAYS):
+    """
+    Inicia (uma vez por armazenamento) o arquivamento de `repo`. Retorna a thread, ou
+    None se o arquivamento estiver desligado.
+    """
+    if dias <= 0:
+        return None
+    return _arquivadores.start(repo.cache_key, lambda: ArchiveWorker(repo, dias))
+
+
+stop_all = _arquivadores.stop_all
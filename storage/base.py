@@ -0,0 +1,376 @@
+# storage/base.py
+import os
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+# Pátio dos registros gravados antes da separação por pátio
+DEFAULT_LOT = "principal"
+# Pátio (estacionamento ou unidade) em que este terminal opera
+LOT_ID = os.environ.get("LOT_ID", DEFAULT_LOT)
+
+
+class ConflictError(Exception):
+    """A operação foi recusada porque o veículo mudou de estado (por exemplo, em outro terminal)."""
+
+
+class VehicleAlreadyParked(ConflictError):
+
+    def __init__(self, placa):
+        super().__init__(f"Veículo com placa {placa} já está estacionado!")
+        self.placa = placa
+
+
+class VehicleNotParked(ConflictError):
+
+    def __init__(self, veiculo_id):
+        super().__init__("Este veículo não está mais estacionado: a saída já foi registrada ou ele foi removido.")
+        self.veiculo_id = veiculo_id
+
+
+class LotFull(ConflictError):
+
+    def __init__(self, zona):
+        super().__init__(f"Não há vagas livres para {zona} neste pátio.")
+        self.zona = zona
+
+
+class AlreadyImported(ConflictError):
+
+    def __init__(self, chave):
+        super().__init__(f"Linha já importada anteriormente ({chave}).")
+        self.chave = chave
+
+
+# Campos exibidos no Histórico, os únicos lidos pela consulta paginada
+CAMPOS_HISTORICO = ("placa", "tipo_veiculo", "entrada", "saida", "status", "valor_cobrado")
+
+
+def periodo_rollup(saida):
+    """Hora cheia da saída, chave temporal dos agregados de faturamento."""
+    return saida.replace(minute=0, second=0, microsecond=0)
+
+
+def fim_periodo_rollup(instante):
+    """Último instante da hora cheia de `instante`, limite inclusivo das saídas desse agregado."""
+    return periodo_rollup(instante) + timedelta(hours=1, microseconds=-1)
+
+
+def zona_veiculo(veiculo):
+    """
+    Zona de vagas ocupada por um veículo estacionado: a gravada na entrada ou, nos
+    registros anteriores às vagas, o tipo de veículo (cada tipo é uma zona).
+    """
+    return veiculo.get("zona") or veiculo.get("tipo_veiculo") or "Carro"
+
+
+def contar_vagas(capacidade, estacionados):
+    """
+    Situação esperada das zonas a partir da capacidade configurada ({zona: vagas}) e dos
+    veículos estacionados: {zona: {"capacidade", "ocupadas", "livres"}}, com as vagas
+    livres em ordem crescente. Base da reconciliação dos contadores em todos os backends.
+    """
+    zonas = {zona: {"capacidade": vagas, "ocupadas": 0, "livres": set(range(1, vagas + 1))}
+             for zona, vagas in capacidade.items()}
+    for veiculo in estacionados:
+        zona = zonas.setdefault(zona_veiculo(veiculo), {"capacidade": None, "ocupadas": 0, "livres": set()})
+        zona["ocupadas"] += 1
+        zona["livres"].discard(veiculo.get("vaga"))
+    for zona in zonas.values():
+        # Estacionados sem número de vaga (anteriores à capacidade) também ocupam lugar
+        livres = max((zona["capacidade"] or 0) - zona["ocupadas"], 0)
+        zona["livres"] = sorted(zona["livres"])[:livres]
+    return zonas
+
+
+def corrigir_vagas(atual, esperado):
+    """
+    Compara a situação gravada das zonas com a de contar_vagas (mesmo formato) e retorna
+    {zona: ocupadas esperadas - ocupadas gravadas} das zonas que divergem em algo.
+    """
+    vazia = {"capacidade": None, "ocupadas": 0, "livres": []}
+    correcoes = {}
+    for zona in set(atual) | set(esperado):
+        antes, depois = atual.get(zona, vazia), esperado.get(zona, vazia)
+        if (antes["capacidade"], antes["ocupadas"], sorted(antes["livres"])) != \
+                (depois["capacidade"], depois["ocupadas"], depois["livres"]):
+            correcoes[zona] = depois["ocupadas"] - antes["ocupadas"]
+    return correcoes
+
+
+def somar_resumos(resumos):
+    """Soma resumos no formato de summarize_rollups (de coleções ou de pátios diferentes)."""
+    total, quantidade, por_tipo = 0.0, 0, {}
+    for resumo in resumos:
+        total += resumo["total_faturado"]
+        quantidade += resumo["quantidade"]
+        for tipo, qtd in resumo["por_tipo"].items():
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + qtd
+    return {
+        "total_faturado": total,
+        "quantidade": quantidade,
+        "por_tipo": dict(sorted(por_tipo.items(), key=lambda item: (-item[1], item[0]))),
+    }
+
+
+class VehicleRepository(ABC):
+    """
+    Interface de armazenamento dos veículos e dos agregados de faturamento de um pátio
+    (`lot_id`): as leituras só enxergam os registros do pátio e as gravações o anotam.
+    Os documentos trafegam como dicionários com as mesmas chaves usadas no MongoDB
+    ("_id", "lot_id", "placa", "tipo_veiculo", "entrada", "saida", "status", "valor_cobrado",
+    "zona", "vaga").
+
+    O armazenamento também mantém a ocupação de cada zona de vagas (uma por tipo de
+    veículo): um contador de estacionados e a lista de vagas livres, atualizados na mesma
+    operação que grava a entrada ou a saída, para que a consulta de vagas livres não
+    dependa da quantidade de estacionados.
+    """
+
+    name = "base"
+    lot_id = DEFAULT_LOT
+
+    # --- Veículos -------------------------------------------------------
+
+    @abstractmethod
+    def find_parked(self, placa):
+        """Retorna o veículo estacionado com a placa informada (em qualquer grafia), ou None."""
+
+    @abstractmethod
+    def insert(self, veiculo):
+        """
+        Grava um novo veículo em uma única operação e retorna seu _id. O documento já traz
+        os campos de busca gerados por utils.plates.campos_placa. Um veículo estacionado
+        cuja placa já tenha um ticket aberto é recusado pela restrição de unicidade do
+        armazenamento, com VehicleAlreadyParked, e um que não caiba na zona do seu tipo,
+        com LotFull. A zona e a vaga atribuídas são anotadas em `veiculo` ("zona", "vaga";
+        a vaga é None nas zonas sem capacidade configurada).
+        """
+
+    def insert_many(self, veiculos):
+        """Grava vários veículos de uma vez e retorna a lista de _ids."""
+        return [self.insert(veiculo) for veiculo in veiculos]
+
+    def import_batch(self, veiculos):
+        """
+        Grava um lote de importação sem interromper nos registros recusados.
+        Retorna {posição no lote: ConflictError} dos que não foram gravados. Um veículo
+        com "chave_importacao" já gravada no pátio é recusado com AlreadyImported, para
+        que reimportar um lote (após uma queda antes do checkpoint) não o duplique.
+        """
+        erros = {}
+        for posicao, veiculo in enumerate(veiculos):
+            try:
+                self.insert(veiculo)
+            except ConflictError as e:
+                erros[posicao] = e
+        return erros
+
+    @abstractmethod
+    def finalize(self, veiculo_id, campos):
+        """
+        Em uma única operação atômica, aplica os campos de saída ao veículo se ele ainda
+        estiver estacionado e retorna o documento finalizado. Levanta VehicleNotParked se o
+        veículo não existir ou já tiver sido finalizado. A vaga do veículo é liberada.
+        """
+
+    @abstractmethod
+    def delete(self, veiculo_id):
+        """Remove o veículo (liberando a vaga, se estava estacionado) e retorna o documento removido, ou None."""
+
+    @abstractmethod
+    def delete_all(self):
+        """Remove todos os veículos e zera a ocupação."""
+
+    @abstractmethod
+    def list_parked(self, busca=None, limite=None):
+        """Veículos estacionados, opcionalmente filtrados por um trecho de placa."""
+
+    @abstractmethod
+    def list_history(self, busca=None, limite=50, apos=None):
+        """
+        Veículos finalizados, do mais recente para o mais antigo, em ordem de (saida, _id).
+        `apos` é o cursor (saida, _id) do último registro da página anterior: a página
+        seguinte começa logo depois dele, com o mesmo custo em qualquer profundidade.
+        """
+
+    @abstractmethod
+    def iter_finished(self, inicio=None, fim=None, tamanho_lote=1000, tipos=None, campos=None):
+        """
+        Itera sobre os veículos finalizados com saída no intervalo, em ordem de saída,
+        lendo do armazenamento em lotes. `tipos` restringe os tipos de veículo e `campos`
+        os campos lidos (quando o backend permite escolher).
+        """
+
+    # --- Agregados de faturamento --------------------------------------
+
+    @abstractmethod
+    def increment_rollup(self, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia):
+        """Soma os valores no agregado (periodo, tipo_veiculo), criando-o se preciso."""
+
+    @abstractmethod
+    def reset_rollups(self, inicio=None, fim=None):
+        """Remove todos os agregados ou, com `inicio` e `fim`, os das horas de inicio a fim."""
+
+    @abstractmethod
+    def summarize_rollups(self, inicio, fim):
+        """
+        Retorna {"total_faturado", "quantidade", "por_tipo"} a partir dos agregados
+        cujo período está no intervalo.
+        """
+
+    def summarize_finished(self, inicio, fim):
+        """Mesmo resultado de summarize_rollups, calculado a partir dos veículos."""
+        total_faturado = 0.0
+        por_tipo = {}
+        for veiculo in self.iter_finished(inicio, fim):
+            tipo = veiculo.get("tipo_veiculo") or "Carro"
+            total_faturado += float(veiculo.get("valor_cobrado") or 0.0)
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + 1
+        return {
+            "total_faturado": total_faturado,
+            "quantidade": sum(por_tipo.values()),
+            "por_tipo": dict(sorted(por_tipo.items(), key=lambda item: (-item[1], item[0]))),
+        }
+
+    def rebuild_rollups(self, dias_por_lote=31, inicio=None, fim=None):
+        """
+        Regenera os agregados a partir dos veículos finalizados. Retorna a quantidade de
+        agregados gravados. Com `inicio` e `fim`, refaz só as horas de inicio a fim (as
+        dos dois extremos inclusive) e mantém as demais. Implementações podem
+        sobrescrever para agrupar no servidor.
+        """
+        self.reset_rollups(inicio, fim)
+        linhas = {}
+        intervalo = () if inicio is None else (periodo_rollup(inicio), fim_periodo_rollup(fim))
+        for veiculo in self.iter_finished(*intervalo):
+            if veiculo.get("entrada") is None or veiculo.get("saida") is None:
+                continue
+            chave = (periodo_rollup(veiculo["saida"]), veiculo.get("tipo_veiculo") or "Carro")
+            linha = linhas.setdefault(chave, [0, 0.0, 0.0])
+            linha[0] += 1
+            linha[1] += float(veiculo.get("valor_cobrado") or 0.0)
+            linha[2] += (veiculo["saida"] - veiculo["entrada"]) / timedelta(minutes=1)
+        for (periodo, tipo), (quantidade, faturamento, minutos) in linhas.items():
+            self.increment_rollup(periodo, tipo, quantidade, faturamento, minutos)
+        return len(linhas)
+
+    # --- Ocupação e vagas -----------------------------------------------
+
+    @abstractmethod
+    def get_capacity(self):
+        """Capacidade configurada, {zona: vagas}; zonas ausentes não têm limite."""
+
+    @abstractmethod
+    def set_capacity(self, capacidade):
+        """
+        Grava a capacidade ({zona: vagas}; 0 ou None remove o limite) junto da tabela de
+        preços e reconstrói as vagas livres com reconcile_occupancy.
+        """
+
+    @abstractmethod
+    def occupancy(self):
+        """
+        Leitura de tempo constante dos contadores: {zona: {"capacidade", "ocupadas"}}, com
+        capacidade None nas zonas sem limite.
+        """
+
+    @abstractmethod
+    def reconcile_occupancy(self):
+        """
+        Recalcula contadores e vagas livres a partir dos veículos estacionados (contar_vagas)
+        e corrige os que divergirem. Retorna {zona: ocupadas corrigidas - ocupadas antes}
+        das zonas corrigidas.
+        """
+
+    # --- Manutenção -----------------------------------------------------
+
+    def archive_finished(self, antes_de, tamanho_lote=1000, pausa=0.0, parar=None):
+        """
+        Move os finalizados com saída anterior a `antes_de` para as partições de arquivo,
+        em lotes de `tamanho_lote` com `pausa` segundos entre eles, até acabarem ou o
+        threading.Event `parar` ser acionado. Retorna quantos foram movidos. Backends sem
+        partições de arquivo não movem nada.
+        """
+        return 0
+
+    def ensure_indexes(self):
+        """Cria os índices do backend. Retorna a lista de erros encontrados."""
+        return []
+
+    def backfill_plate_tokens(self, tamanho_lote=1000):
+        """Gera os campos de busca de placa em registros antigos. Retorna quantos foram atualizados."""
+        return 0
+
+    def diagnose(self):
+        """Relatório de índices e planos de consulta, se o backend oferecer um."""
+        return None
+
+    def list_lots(self):
+        """Pátios com registros ou preços no armazenamento, sempre incluindo o deste repositório."""
+        return [self.lot_id]
+
+    def replication_status(self):
+        """
+        Situação do diário local (storage.journal): {"pendentes", "conflitos", "atraso_s",
+        "ultimo_erro", "ultima_replicacao"}. None se as gravações forem diretas.
+        """
+        return None
+
+    @property
+    def storage_key(self):
+        """
+        Identifica o armazenamento de forma estável entre processos, para caches em disco
+        (o retrato das análises do Dashboard). None se os dados não sobrevivem ao processo.
+        """
+        return None
+
+    # --- Acompanhamento dos estacionados (storage.live) -----------------
+
+    @property
+    def cache_key(self):
+        """Identifica o armazenamento, para compartilhar um espelho por processo."""
+        return (self.name, id(self))
+
+    def parked_version(self):
+        """
+        Valor que muda sempre que o conjunto de estacionados pode ter mudado, para a
+        sondagem periódica. None se o backend não souber dizer (recarrega a cada sondagem).
+        """
+        return None
+
+    def watch_parked(self, resume_after=None):
+        """
+        Fluxo de alterações dos veículos (change stream), com os métodos try_next(),
+        close() e o atributo resume_token. None se o backend não oferecer um.
+        """
+        return None
+
+    def on_local_write(self, callback):
+        """
+        Registra `callback` para receber, no formato dos eventos do change stream, as
+        gravações aceitas localmente antes de chegarem ao armazenamento (storage.journal).
+        Nos backends que gravam direto, não há o que avisar.
+        """
+
+
+class PriceConfigRepository(ABC):
+    """Interface de armazenamento da tabela de preços por tipo de veículo de um pátio."""
+
+    lot_id = DEFAULT_LOT
+
+    @property
+    @abstractmethod
+    def cache_key(self):
+        """Identifica o armazenamento para o cache de configuração em memória."""
+
+    @abstractmethod
+    def get(self):
+        """Retorna (prices, version), ou (None, None) se não houver configuração salva."""
+
+    @abstractmethod
+    def get_version(self):
+        """Retorna apenas a versão atual da configuração, ou None."""
+
+    @abstractmethod
+    def save(self, prices):
+        """Grava a tabela de preços, incrementa a versão e retorna a nova versão."""
@@ -0,0 +1,453 @@
+# storage/journal.py
+"""
+Diário local de gravações (write-ahead) à frente do MongoDB. Entradas, saídas e
+incrementos dos agregados são gravados primeiro em um SQLite local, com fsync a cada
+operação, e respondidos na hora; uma thread em segundo plano os reaplica no MongoDB,
+na ordem em que foram aceitos, com uma chave por operação que torna a reaplicação
+inofensiva. Assim a cancela depende do disco local, não da latência até o Atlas.
+
+Antes de aceitar uma entrada, o terminal procura a placa nas entradas do diário e no
+banco, esperando a resposta por no máximo JOURNAL_CHECK_TIMEOUT segundos. Sem resposta
+a tempo, ou se outro terminal registrar a placa logo depois, ela só é recusada na
+replicação: a operação fica marcada como conflito no diário e aparece na situação da
+replicação. A vaga de uma entrada também é reservada na replicação, e uma entrada que
+não couber na zona vira conflito. Só falhas de conexão e de tempo esgotado deixam a
+operação pendente para a próxima tentativa; qualquer outro erro do banco a marca como
+conflito, para não travar a fila. As demais gravações (remoção, importação,
+reconstrução dos agregados, arquivamento) esperam o diário esvaziar e seguem direto
+para o banco.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pymongo
+from bson import ObjectId, json_util
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, WTimeoutError
+
+from storage.base import VehicleRepository, ConflictError, VehicleAlreadyParked, VehicleNotParked, zona_veiculo
+from storage.workers import BackgroundWorker, WorkerRegistry
+from utils.plates import formas_placa, limpar_placa, normalizar_placa
+
+# Arquivo do diário; vazio desliga o diário e as gravações vão direto para o MongoDB
+JOURNAL_PATH = os.environ.get("JOURNAL_PATH", "")
+# Operações reaplicadas por rodada e espera (segundos) após uma falha de conexão
+JOURNAL_BATCH_SIZE = int(os.environ.get("JOURNAL_BATCH_SIZE", 200))
+JOURNAL_RETRY_INTERVAL = float(os.environ.get("JOURNAL_RETRY_INTERVAL", 2))
+# Por quanto tempo (segundos) as gravações diretas esperam o diário esvaziar
+JOURNAL_FLUSH_TIMEOUT = float(os.environ.get("JOURNAL_FLUSH_TIMEOUT", 30))
+# Dias em que as operações já replicadas continuam no arquivo, para auditoria
+JOURNAL_RETENTION_DAYS = float(os.environ.get("JOURNAL_RETENTION_DAYS", 7))
+# Espera máxima (segundos) pela consulta ao banco da placa de uma nova entrada
+JOURNAL_CHECK_TIMEOUT = float(os.environ.get("JOURNAL_CHECK_TIMEOUT", 0.3))
+
+# Erros que deixam a operação pendente (rede, eleição de primário, tempo esgotado); os
+# demais são do conteúdo da operação e se repetiriam a cada tentativa
+ERROS_TRANSITORIOS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operacoes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave TEXT NOT NULL UNIQUE,
+    tipo TEXT NOT NULL,
+    dados TEXT NOT NULL,
+    veiculo_id TEXT,
+    placa_normalizada TEXT,
+    depende TEXT,
+    criado_em REAL NOT NULL,
+    replicado_em REAL,
+    conflito INTEGER NOT NULL DEFAULT 0,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    erro TEXT
+);
+CREATE INDEX IF NOT EXISTS pendentes ON operacoes (replicado_em, seq);
+CREATE INDEX IF NOT EXISTS veiculo_tipo ON operacoes (veiculo_id, tipo);
+"""
+
+_replicadores = WorkerRegistry()
+
+
+def _dumps(dados):
+    return json_util.dumps(dados)
+
+
+def _loads(texto):
+    return json_util.loads(texto)
+
+
+class JournaledVehicleRepository(VehicleRepository):
+    """
+    Repositório que grava entradas, saídas e agregados no diário local e delega o resto
+    a `remoto` (um MongoVehicleRepository, que reaplica as operações com apply_journal).
+    """
+
+    name = "mongo"
+
+    def __init__(self, remoto, caminho):
+        self.remoto = remoto
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._replicando = threading.Lock()
+        self._ouvintes = []
+        self._local = threading.local()
+        self.novas = threading.Event()
+        self.ultimo_erro = None
+        self.ultima_replicacao = None
+        self.conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        # Cada operação só é confirmada depois de chegar ao disco
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+
+    # --- Diário -----------------------------------------------------------
+
+    def _anotar(self, tipo, dados, veiculo_id=None, placa_normalizada=None, depende=None):
+        chave = uuid.uuid4().hex
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO operacoes (chave, tipo, dados, veiculo_id, placa_normalizada, depende, criado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, tipo, _dumps(dados), veiculo_id and str(veiculo_id), placa_normalizada, depende, time.time())
+            )
+        self.novas.set()
+        return chave
+
+    def _avisar(self, evento):
+        for callback in list(self._ouvintes):
+            callback(evento)
+
+    def _entradas_pendentes(self, placa_normalizada=None):
+        """Entradas ainda não replicadas cujo veículo não tem saída no diário."""
+        sql = (
+            "SELECT dados FROM operacoes e WHERE e.tipo = 'entrada' AND e.replicado_em IS NULL "
+            "AND NOT EXISTS (SELECT 1 FROM operacoes s WHERE s.tipo = 'saida' AND s.veiculo_id = e.veiculo_id)"
+        )
+        parametros = ()
+        if placa_normalizada is not None:
+            sql += " AND e.placa_normalizada = ?"
+            parametros = (placa_normalizada,)
+        with self._lock:
+            return [_loads(dados) for (dados,) in self.conn.execute(sql + " ORDER BY e.seq", parametros)]
+
+    def _saidas_pendentes(self):
+        with self._lock:
+            return {
+                veiculo_id for (veiculo_id,) in self.conn.execute(
+                    "SELECT veiculo_id FROM operacoes WHERE tipo = 'saida' AND replicado_em IS NULL"
+                )
+            }
+
+    def _estacionado_no_banco(self, placa):
+        """
+        Se o banco tem um ticket aberto da placa sem saída no diário. Sem resposta em
+        JOURNAL_CHECK_TIMEOUT segundos, considera que não: a replicação decide.
+        """
+        try:
+            with pymongo.timeout(JOURNAL_CHECK_TIMEOUT):
+                veiculo = self.remoto.find_parked(placa)
+        except ERROS_TRANSITORIOS:
+            return False
+        return veiculo is not None and str(veiculo["_id"]) not in self._saidas_pendentes()
+
+    def _saida_anotada(self, veiculo_id):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM operacoes WHERE tipo = 'saida' AND veiculo_id = ? AND conflito = 0",
+                (str(veiculo_id),)
+            ).fetchone() is not None
+
+    # --- Gravações pelo diário -------------------------------------------
+
+    def insert(self, veiculo):
+        veiculo = {**veiculo, "lot_id": self.remoto.lot_id}
+        veiculo.setdefault("_id", ObjectId())
+        placa_normalizada = veiculo.get("placa_normalizada") or normalizar_placa(veiculo.get("placa"))
+        if veiculo.get("status") == "estacionado" and (
+            self._entradas_pendentes(placa_normalizada) or self._estacionado_no_banco(veiculo.get("placa"))
+        ):
+            raise VehicleAlreadyParked(veiculo.get("placa"))
+        self._anotar("entrada", veiculo, veiculo["_id"], placa_normalizada)
+        self._avisar({"operationType": "insert", "documentKey": {"_id": veiculo["_id"]}, "fullDocument": veiculo})
+        return veiculo["_id"]
+
+    def finalize(self, veiculo_id, campos):
+        """
+        Aceita a saída sem consultar o banco e retorna o veículo com os campos de saída
+        (os que o terminal conhece). Uma segunda saída para o mesmo ticket é recusada aqui;
+        a de outro terminal, na replicação.
+        """
+        if self._saida_anotada(veiculo_id):
+            raise VehicleNotParked(veiculo_id)
+        chave = self._anotar("saida", {"_id": veiculo_id, "campos": campos}, veiculo_id)
+        # O agregado gravado em seguida por aplicar_saida depende desta saída
+        self._local.saida = chave
+        finalizado = {"_id": veiculo_id, **campos}
+        self._avisar({"operationType": "update", "documentKey": {"_id": veiculo_id}, "fullDocument": finalizado})
+        return finalizado
+
+    def increment_rollup(self, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia):
+        depende, self._local.saida = getattr(self._local, "saida", None), None
+        self._anotar("agregado", {
+            "periodo": periodo,
+            "tipo_veiculo": tipo_veiculo,
+            "quantidade": quantidade,
+            "faturamento": faturamento,
+            "minutos_permanencia": minutos_permanencia,
+        }, depende=depende)
+
+    # --- Replicação -------------------------------------------------------
+
+    def replicar(self, limite=JOURNAL_BATCH_SIZE):
+        """
+        Reaplica no MongoDB até `limite` operações pendentes, em ordem. Operações recusadas
+        pelo banco, ou que falharem por qualquer motivo fora de ERROS_TRANSITORIOS, ficam
+        marcadas como conflito e a fila segue; uma falha transitória interrompe a rodada e
+        é propagada, mantendo a operação pendente. Retorna quantas foram processadas.
+        """
+        with self._replicando:
+            with self._lock:
+                pendentes = self.conn.execute(
+                    "SELECT seq, chave, tipo, dados, depende FROM operacoes "
+                    "WHERE replicado_em IS NULL ORDER BY seq LIMIT ?", (limite,)
+                ).fetchall()
+            for seq, chave, tipo, dados, depende in pendentes:
+                erro, conflito = None, 0
+                try:
+                    if depende and self._em_conflito(depende):
+                        raise ConflictError("A saída que originou este agregado foi recusada.")
+                    self.remoto.apply_journal(tipo, chave, _loads(dados))
+                except ConflictError as e:
+                    erro, conflito = str(e), 1
+                except ERROS_TRANSITORIOS as e:
+                    self.ultimo_erro = str(e)
+                    with self._lock:
+                        self.conn.execute(
+                            "UPDATE operacoes SET tentativas = tentativas + 1, erro = ? WHERE seq = ?", (str(e), seq)
+                        )
+                    raise
+                except Exception as e:
+                    erro, conflito = f"{type(e).__name__}: {e}", 1
+                with self._lock:
+                    self.conn.execute(
+                        "UPDATE operacoes SET replicado_em = ?, conflito = ?, erro = ?, "
+                        "tentativas = tentativas + 1 WHERE seq = ?",
+                        (time.time(), conflito, erro, seq)
+                    )
+                self.ultimo_erro = None
+                self.ultima_replicacao = datetime.now()
+            return len(pendentes)
+
+    def _em_conflito(self, chave):
+        with self._lock:
+            linha = self.conn.execute("SELECT conflito FROM operacoes WHERE chave = ?", (chave,)).fetchone()
+        return bool(linha and linha[0])
+
+    def flush(self, timeout=JOURNAL_FLUSH_TIMEOUT):
+        """Replica tudo o que estiver pendente; levanta TimeoutError se não conseguir a tempo."""
+        limite = time.monotonic() + timeout
+        while True:
+            try:
+                if not self.replicar():
+                    return
+            except Exception as e:
+                if time.monotonic() >= limite:
+                    raise TimeoutError(f"O diário local não pôde ser replicado no MongoDB: {e}")
+                time.sleep(min(JOURNAL_RETRY_INTERVAL, max(limite - time.monotonic(), 0)))
+
+    def purge(self, dias=JOURNAL_RETENTION_DAYS):
+        """Remove as operações replicadas sem conflito há mais de `dias` dias."""
+        with self._lock:
+            return self.conn.execute(
+                "DELETE FROM operacoes WHERE replicado_em < ? AND conflito = 0", (time.time() - dias * 86400,)
+            ).rowcount
+
+    def replication_status(self):
+        with self._lock:
+            pendentes, mais_antiga = self.conn.execute(
+                "SELECT COUNT(*), MIN(criado_em) FROM operacoes WHERE replicado_em IS NULL"
+            ).fetchone()
+            conflitos = self.conn.execute("SELECT COUNT(*) FROM operacoes WHERE conflito = 1").fetchone()[0]
+        return {
+            "pendentes": pendentes,
+            "conflitos": conflitos,
+            "atraso_s": time.time() - mais_antiga if mais_antiga else 0.0,
+            "ultimo_erro": self.ultimo_erro,
+            "ultima_replicacao": self.ultima_replicacao,
+        }
+
+    def list_conflicts(self, limite=50):
+        """Operações recusadas na replicação, da mais recente para a mais antiga."""
+        with self._lock:
+            linhas = self.conn.execute(
+                "SELECT tipo, dados, criado_em, erro FROM operacoes WHERE conflito = 1 ORDER BY seq DESC LIMIT ?",
+                (limite,)
+            ).fetchall()
+        return [
+            {"tipo": tipo, "dados": _loads(dados), "criado_em": datetime.fromtimestamp(criado_em), "erro": erro}
+            for tipo, dados, criado_em, erro in linhas
+        ]
+
+    def on_local_write(self, callback):
+        self._ouvintes.append(callback)
+
+    # --- Leituras: banco mais o que ainda está no diário ------------------
+
+    def find_parked(self, placa):
+        pendentes = self._entradas_pendentes(normalizar_placa(placa))
+        if pendentes:
+            return pendentes[0]
+        veiculo = self.remoto.find_parked(placa)
+        if veiculo is not None and str(veiculo["_id"]) in self._saidas_pendentes():
+            return None
+        return veiculo
+
+    def list_parked(self, busca=None, limite=None):
+        saidas = self._saidas_pendentes()
+        veiculos = [v for v in self.remoto.list_parked(busca, limite) if str(v["_id"]) not in saidas]
+        termo = limpar_placa(busca)
+        veiculos += [
+            v for v in self._entradas_pendentes()
+            if not termo or any(termo in forma for forma in formas_placa(v.get("placa")))
+        ]
+        return veiculos[:limite] if limite else veiculos
+
+    def list_history(self, busca=None, limite=50, apos=None):
+        return self.remoto.list_history(busca, limite, apos)
+
+    def iter_finished(self, inicio=None, fim=None, tamanho_lote=1000, tipos=None, campos=None):
+        return self.remoto.iter_finished(inicio, fim, tamanho_lote, tipos, campos)
+
+    def summarize_rollups(self, inicio, fim):
+        return self.remoto.summarize_rollups(inicio, fim)
+
+    def summarize_finished(self, inicio, fim):
+        return self.remoto.summarize_finished(inicio, fim)
+
+    def diagnose(self):
+        return self.remoto.diagnose()
+
+    def get_capacity(self):
+        return self.remoto.get_capacity()
+
+    def set_capacity(self, capacidade):
+        # As entradas do diário reservam a vaga ao chegar ao banco: não há o que esperar
+        self.remoto.set_capacity(capacidade)
+
+    def reconcile_occupancy(self):
+        return self.remoto.reconcile_occupancy()
+
+    def occupancy(self):
+        """Contadores do banco mais as entradas e saídas que ainda estão no diário."""
+        ocupacao = {zona: dict(contador) for zona, contador in self.remoto.occupancy().items()}
+        pendentes = [(zona_veiculo(v), 1) for v in self._entradas_pendentes()]
+        with self._lock:
+            # Saídas de entradas já replicadas; as de entradas pendentes já ficaram de fora acima
+            pendentes += [(zona_veiculo(_loads(dados)["campos"]), -1) for (dados,) in self.conn.execute(
+                "SELECT dados FROM operacoes s WHERE s.tipo = 'saida' AND s.replicado_em IS NULL "
+                "AND NOT EXISTS (SELECT 1 FROM operacoes e WHERE e.tipo = 'entrada' "
+                "AND e.veiculo_id = s.veiculo_id AND e.replicado_em IS NULL)"
+            )]
+        for zona, sinal in pendentes:
+            contador = ocupacao.setdefault(zona, {"capacidade": None, "ocupadas": 0})
+            contador["ocupadas"] = max(contador["ocupadas"] + sinal, 0)
+        return ocupacao
+
+    def list_lots(self):
+        return self.remoto.list_lots()
+
+    @property
+    def lot_id(self):
+        return self.remoto.lot_id
+
+    @property
+    def cache_key(self):
+        return ("journal", self.caminho) + self.remoto.cache_key
+
+    @property
+    def storage_key(self):
+        return self.remoto.storage_key
+
+    def parked_version(self):
+        return self.remoto.parked_version()
+
+    def watch_parked(self, resume_after=None):
+        return self.remoto.watch_parked(resume_after)
+
+    # --- Gravações diretas, depois de esvaziar o diário -------------------
+
+    def insert_many(self, veiculos):
+        self.flush()
+        return self.remoto.insert_many(veiculos)
+
+    def import_batch(self, veiculos):
+        self.flush()
+        return self.remoto.import_batch(veiculos)
+
+    def delete(self, veiculo_id):
+        self.flush()
+        return self.remoto.delete(veiculo_id)
+
+    def delete_all(self):
+        self.flush()
+        self.remoto.delete_all()
+
+    def reset_rollups(self, inicio=None, fim=None):
+        self.flush()
+        self.remoto.reset_rollups(inicio, fim)
+
+    def rebuild_rollups(self, dias_por_lote=31, inicio=None, fim=None):
+        self.flush()
+        return self.remoto.rebuild_rollups(dias_por_lote, inicio, fim)
+
+    def archive_finished(self, antes_de, tamanho_lote=1000, pausa=0.0, parar=None):
+        self.flush()
+        return self.remoto.archive_finished(antes_de, tamanho_lote, pausa, parar)
+
+    def ensure_indexes(self):
+        return self.remoto.ensure_indexes()
+
+    def backfill_plate_tokens(self, tamanho_lote=1000):
+        self.flush()
+        return self.remoto.backfill_plate_tokens(tamanho_lote)
+
+
+class ReplicationWorker(BackgroundWorker):
+    """Thread que reaplica o diário no MongoDB assim que há operações novas."""
+
+    def __init__(self, journal, retry_interval=JOURNAL_RETRY_INTERVAL, purge_interval=3600):
+        super().__init__("journal-replicator")
+        self.journal = journal
+        self.retry_interval = retry_interval
+        self.purge_interval = purge_interval
+
+    def run(self):
+        ultima_limpeza = 0.0
+        while not self.stop_event.is_set():
+            self.journal.novas.clear()
+            try:
+                if self.journal.replicar():
+                    continue
+                if time.monotonic() - ultima_limpeza > self.purge_interval:
+                    self.journal.purge()
+                    ultima_limpeza = time.monotonic()
+            except Exception as e:
+                # O erro também fica em replication_status(); tenta de novo após a espera
+                self._erro(e)
+                self.stop_event.wait(self.retry_interval)
+                continue
+            self.journal.novas.wait(self.retry_interval)
+
+    def stop(self):
+        super().stop()
+        self.journal.novas.set()
+
+
+def start_replicator(journal):
+    """Inicia (uma vez por diário) a replicação em segundo plano de `journal`."""
+    return _replicadores.start(journal.caminho, lambda: ReplicationWorker(journal))
+
+
+stop_all = _replicadores.stop_all
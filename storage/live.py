@@ -0,0 +1,194 @@
+# storage/live.py
+"""
+Espelho em memória dos veículos estacionados, compartilhado por todas as sessões do
+processo. É carregado uma vez e mantido atualizado por um change stream do MongoDB
+ou, nos backends sem change streams, por uma sondagem periódica de parked_version().
+As páginas leem do espelho em vez de consultar o banco a cada rerun.
+"""
+import os
+import threading
+from datetime import datetime
+
+from storage.workers import BackgroundWorker, WorkerRegistry
+from utils.plates import formas_placa, limpar_placa, normalizar_placa
+
+# Intervalo (segundos) da sondagem nos backends sem change stream
+LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", 1))
+# Espera (segundos) antes de reabrir um change stream interrompido
+LIVE_RETRY_INTERVAL = float(os.environ.get("LIVE_RETRY_INTERVAL", 5))
+
+_espelhos = WorkerRegistry()
+
+
+class ParkedMirror(BackgroundWorker):
+    """
+    Thread em segundo plano que mantém {_id: veículo} dos estacionados. `version` é
+    incrementado a cada alteração aplicada, e `status` guarda o modo de atualização
+    ("stream" ou "polling") e o último erro.
+    """
+
+    def __init__(self, repo, poll_interval=LIVE_POLL_INTERVAL, retry_interval=LIVE_RETRY_INTERVAL):
+        super().__init__(f"parked-mirror-{repo.name}", modo=None)
+        self.repo = repo
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.version = 0
+        self._condicao = threading.Condition()
+        self._veiculos = {}
+        self._formas = {}
+        # placa canônica -> _id, para localizar um estacionado sem ir ao banco
+        self._placas = {}
+        self._carregado = threading.Event()
+        self._carga = threading.Lock()
+        # Entradas e saídas ainda no diário local aparecem antes de chegarem ao banco
+        repo.on_local_write(self._aplicar)
+
+    # --- Aplicação das alterações ---------------------------------------
+
+    def _publicar(self):
+        # Chamado com self._condicao adquirida
+        self.version += 1
+        self.status = {**self.status, "ok": True, "error": None, "updated_at": datetime.now()}
+        self._condicao.notify_all()
+
+    def _guardar(self, veiculo):
+        veiculo = {chave: valor for chave, valor in veiculo.items() if chave != "placa_tokens"}
+        self._veiculos[veiculo["_id"]] = veiculo
+        self._formas[veiculo["_id"]] = formas_placa(veiculo.get("placa"))
+        self._placas[normalizar_placa(veiculo.get("placa"))] = veiculo["_id"]
+
+    def _descartar(self, veiculo_id):
+        self._formas.pop(veiculo_id, None)
+        veiculo = self._veiculos.pop(veiculo_id, None)
+        if veiculo is None:
+            return False
+        placa = normalizar_placa(veiculo.get("placa"))
+        if self._placas.get(placa) == veiculo_id:
+            del self._placas[placa]
+        return True
+
+    def _carregar(self):
+        """Recarrega todos os estacionados; só publica uma nova versão se algo mudou."""
+        # Cargas concorrentes (sondagem e sync) não podem aplicar uma leitura antiga por cima de uma nova
+        with self._carga:
+            atuais = {
+                veiculo["_id"]: {chave: valor for chave, valor in veiculo.items() if chave != "placa_tokens"}
+                for veiculo in self.repo.list_parked()
+            }
+            with self._condicao:
+                if atuais != self._veiculos or not self._carregado.is_set():
+                    self._veiculos.clear()
+                    self._formas.clear()
+                    self._placas.clear()
+                    for veiculo in atuais.values():
+                        self._guardar(veiculo)
+                    self._publicar()
+            self._carregado.set()
+
+    def _aplicar(self, evento):
+        with self._condicao:
+            veiculo_id = evento["documentKey"]["_id"]
+            documento = evento.get("fullDocument")
+            if evento["operationType"] != "delete" and documento and documento.get("status") == "estacionado":
+                self._guardar(documento)
+            elif not self._descartar(veiculo_id):
+                return
+            self._publicar()
+
+    # --- Laços de atualização -------------------------------------------
+
+    def _acompanhar(self):
+        """Segue o change stream; retorna False se o backend não tiver um."""
+        token = None
+        while not self.stop_event.is_set():
+            try:
+                stream = self.repo.watch_parked(resume_after=token)
+                if stream is None:
+                    return False
+                self.status = {**self.status, "modo": "stream"}
+                with stream:
+                    # O stream é aberto antes da carga, para que nada escape entre as duas
+                    if token is None:
+                        self._carregar()
+                    while not self.stop_event.is_set():
+                        evento = stream.try_next()
+                        if evento is not None:
+                            self._aplicar(evento)
+                        token = stream.resume_token
+            except Exception as e:
+                # Sem garantia de retomar do token, a próxima abertura recarrega tudo
+                self._erro(e)
+                token = None
+                self.stop_event.wait(self.retry_interval)
+        return True
+
+    def _sondar(self):
+        self.status = {**self.status, "modo": "polling"}
+        ultima = object()
+        while not self.stop_event.is_set():
+            try:
+                versao = self.repo.parked_version()
+                if versao is None or versao != ultima:
+                    self._carregar()
+                    ultima = versao
+            except Exception as e:
+                self._erro(e)
+            self.stop_event.wait(self.poll_interval)
+
+    def run(self):
+        if not self._acompanhar():
+            self._sondar()
+
+    # --- Leitura ----------------------------------------------------------
+
+    def snapshot(self, busca=None, limite=None, timeout=5):
+        """
+        Estacionados em ordem de entrada, filtrados por um trecho da placa (em qualquer
+        das grafias) e limitados a `limite`. Aguarda a primeira carga por até `timeout`.
+        """
+        if not self._carregado.wait(timeout):
+            raise TimeoutError(self.status.get("error") or "Espelho dos estacionados ainda não carregado.")
+        termo = limpar_placa(busca)
+        with self._condicao:
+            veiculos = [
+                dict(veiculo) for veiculo_id, veiculo in self._veiculos.items()
+                if not termo or any(termo in forma for forma in self._formas[veiculo_id])
+            ]
+        veiculos.sort(key=lambda v: (v.get("entrada") or datetime.min, str(v["_id"])))
+        return veiculos[:limite] if limite else veiculos
+
+    def find(self, placa):
+        """
+        Estacionado com a placa (em qualquer grafia), sem consultar o banco. Retorna None
+        se ela não estiver no espelho ou se ele ainda não tiver carregado: quem chama
+        confere então no repositório.
+        """
+        if not self._carregado.is_set():
+            return None
+        with self._condicao:
+            veiculo_id = self._placas.get(normalizar_placa(placa))
+            return dict(self._veiculos[veiculo_id]) if veiculo_id is not None else None
+
+    def wait_for_change(self, version, timeout):
+        """Bloqueia até `version` ficar para trás ou o `timeout` expirar. Retorna a versão atual."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def sync(self, version, timeout=0.5):
+        """
+        Chamado após uma gravação da própria sessão, para que ela já apareça no espelho:
+        na sondagem recarrega imediatamente; no change stream aguarda o evento chegar.
+        """
+        if self.status.get("modo") == "stream":
+            return self.wait_for_change(version, timeout)
+        self._carregar()
+        return self.version
+
+
+def get_mirror(repo):
+    """Retorna o espelho compartilhado do armazenamento de `repo`, iniciando-o na primeira chamada."""
+    return _espelhos.start(repo.cache_key, lambda: ParkedMirror(repo))
+
+
+stop_all = _espelhos.stop_all
@@ -0,0 +1,326 @@
+# storage/memory.py
+import bisect
+import heapq
+import itertools
+import threading
+
+from storage.base import (
+    DEFAULT_LOT,
+    VehicleRepository,
+    PriceConfigRepository,
+    AlreadyImported,
+    LotFull,
+    VehicleAlreadyParked,
+    VehicleNotParked,
+    contar_vagas,
+    corrigir_vagas,
+    periodo_rollup,
+    zona_veiculo,
+)
+from utils.plates import limpar_placa, normalizar_placa
+
+# Pátios abertos no processo; cada um tem o próprio repositório e índices, mas os _id
+# vêm de um contador único, como no MongoDB
+_patios = set()
+_ids = itertools.count(1)
+
+
+class MemoryVehicleRepository(VehicleRepository):
+    """
+    Armazenamento em memória do processo, para execuções locais e benchmarks.
+    Mantém um índice da placa canônica dos estacionados, um índice invertido
+    dos tokens de placa e uma lista ordenada por (saida, _id) dos finalizados,
+    equivalentes aos índices do MongoDB, e por zona um contador de estacionados e
+    um heap das vagas livres. Cada pátio tem a própria instância.
+    """
+
+    name = "memory"
+
+    def __init__(self, lot_id=DEFAULT_LOT):
+        self.lot_id = lot_id
+        _patios.add(lot_id)
+        self._lock = threading.RLock()
+        self._veiculos = {}
+        self._estacionados = {}
+        self._tokens = {}
+        self._finalizados = []
+        self._rollups = {}
+        # chave_importacao -> _id, a restrição de unicidade das linhas importadas
+        self._importados = {}
+        self._versao = 0
+        self._capacidade = {}
+        self._zonas = {}
+
+    @staticmethod
+    def _copia(veiculo):
+        # Os valores são imutáveis, exceto a lista de tokens, que não sai do repositório
+        return {chave: valor for chave, valor in veiculo.items() if chave != "placa_tokens"}
+
+    @staticmethod
+    def _chave_saida(veiculo_id, veiculo):
+        return (veiculo["saida"], veiculo_id)
+
+    @staticmethod
+    def _ordenavel(veiculo):
+        return veiculo.get("status") == "finalizado" and veiculo.get("saida") is not None
+
+    def _indexar(self, veiculo_id, veiculo):
+        for token in veiculo.get("placa_tokens", []):
+            self._tokens.setdefault(token, set()).add(veiculo_id)
+        if veiculo.get("chave_importacao") is not None:
+            self._importados[veiculo["chave_importacao"]] = veiculo_id
+        if veiculo.get("status") == "estacionado":
+            self._estacionados[veiculo.get("placa_normalizada")] = veiculo_id
+        if self._ordenavel(veiculo):
+            bisect.insort(self._finalizados, self._chave_saida(veiculo_id, veiculo))
+
+    def _desindexar(self, veiculo_id, veiculo):
+        for token in veiculo.get("placa_tokens", []):
+            ids = self._tokens.get(token)
+            if ids is not None:
+                ids.discard(veiculo_id)
+                if not ids:
+                    del self._tokens[token]
+        if self._estacionados.get(veiculo.get("placa_normalizada")) == veiculo_id:
+            del self._estacionados[veiculo.get("placa_normalizada")]
+        if self._importados.get(veiculo.get("chave_importacao")) == veiculo_id:
+            del self._importados[veiculo["chave_importacao"]]
+        if self._ordenavel(veiculo):
+            chave = self._chave_saida(veiculo_id, veiculo)
+            posicao = bisect.bisect_left(self._finalizados, chave)
+            if posicao < len(self._finalizados) and self._finalizados[posicao] == chave:
+                del self._finalizados[posicao]
+
+    def _candidatos(self, busca):
+        return self._tokens.get(limpar_placa(busca), set())
+
+    def _reservar(self, zona):
+        # Chamado com self._lock adquirida
+        situacao = self._zonas.setdefault(zona, {"capacidade": None, "ocupadas": 0, "livres": []})
+        if situacao["capacidade"] is None:
+            situacao["ocupadas"] += 1
+            return None
+        if not situacao["livres"]:
+            raise LotFull(zona)
+        situacao["ocupadas"] += 1
+        return heapq.heappop(situacao["livres"])
+
+    def _liberar(self, veiculo):
+        # Chamado com self._lock adquirida
+        situacao = self._zonas.get(zona_veiculo(veiculo))
+        if situacao is None or situacao["ocupadas"] <= 0:
+            return
+        situacao["ocupadas"] -= 1
+        vaga = veiculo.get("vaga")
+        if vaga is not None and situacao["capacidade"] and vaga <= situacao["capacidade"]:
+            heapq.heappush(situacao["livres"], vaga)
+
+    # --- Veículos -------------------------------------------------------
+
+    def find_parked(self, placa):
+        with self._lock:
+            veiculo_id = self._estacionados.get(normalizar_placa(placa))
+            return self._copia(self._veiculos[veiculo_id]) if veiculo_id is not None else None
+
+    def insert(self, veiculo):
+        with self._lock:
+            if veiculo.get("chave_importacao") in self._importados:
+                raise AlreadyImported(veiculo["chave_importacao"])
+            if veiculo.get("status") == "estacionado":
+                if veiculo.get("placa_normalizada") in self._estacionados:
+                    raise VehicleAlreadyParked(veiculo.get("placa"))
+                veiculo["zona"] = zona_veiculo(veiculo)
+                veiculo["vaga"] = self._reservar(veiculo["zona"])
+            veiculo_id = next(_ids)
+            self._versao += 1
+            documento = {
+                **veiculo,
+                "placa_tokens": list(veiculo.get("placa_tokens", [])),
+                "_id": veiculo_id,
+                "lot_id": self.lot_id,
+            }
+            self._veiculos[veiculo_id] = documento
+            self._indexar(veiculo_id, documento)
+            return veiculo_id
+
+    def insert_many(self, veiculos):
+        with self._lock:
+            return [self.insert(veiculo) for veiculo in veiculos]
+
+    def finalize(self, veiculo_id, campos):
+        with self._lock:
+            documento = self._veiculos.get(veiculo_id)
+            if documento is None or documento.get("status") != "estacionado":
+                raise VehicleNotParked(veiculo_id)
+            self._versao += 1
+            self._desindexar(veiculo_id, documento)
+            self._liberar(documento)
+            documento.update(campos)
+            self._indexar(veiculo_id, documento)
+            return self._copia(documento)
+
+    def delete(self, veiculo_id):
+        with self._lock:
+            documento = self._veiculos.pop(veiculo_id, None)
+            if documento is not None:
+                self._versao += 1
+                self._desindexar(veiculo_id, documento)
+                if documento.get("status") == "estacionado":
+                    self._liberar(documento)
+                return self._copia(documento)
+            return None
+
+    def delete_all(self):
+        with self._lock:
+            self._versao += 1
+            self._veiculos.clear()
+            self._estacionados.clear()
+            self._importados.clear()
+            self._tokens.clear()
+            self._finalizados.clear()
+            self.reconcile_occupancy()
+
+    def list_parked(self, busca=None, limite=None):
+        with self._lock:
+            candidatos = self._candidatos(busca) if limpar_placa(busca) else self._estacionados.values()
+            resultado = [
+                self._copia(self._veiculos[veiculo_id])
+                for veiculo_id in candidatos
+                if self._veiculos[veiculo_id].get("status") == "estacionado"
+            ]
+        resultado.sort(key=lambda v: v["_id"])
+        return resultado[:limite] if limite else resultado
+
+    def list_history(self, busca=None, limite=50, apos=None):
+        with self._lock:
+            if limpar_placa(busca):
+                candidatos = (
+                    self._veiculos[veiculo_id] for veiculo_id in self._candidatos(busca)
+                    if self._veiculos[veiculo_id].get("status") == "finalizado"
+                    and (apos is None or self._ordenavel(self._veiculos[veiculo_id])
+                         and self._chave_saida(veiculo_id, self._veiculos[veiculo_id]) < tuple(apos))
+                )
+                selecionados = heapq.nlargest(
+                    limite, candidatos,
+                    key=lambda v: (v.get("saida") is not None, v.get("saida") or 0, v["_id"])
+                )
+            else:
+                fim = bisect.bisect_left(self._finalizados, tuple(apos)) if apos is not None else len(self._finalizados)
+                selecionados = [
+                    self._veiculos[veiculo_id]
+                    for _, veiculo_id in reversed(self._finalizados[max(0, fim - limite):fim])
+                ]
+            return [self._copia(v) for v in selecionados]
+
+    def iter_finished(self, inicio=None, fim=None, tamanho_lote=1000, tipos=None, campos=None):
+        with self._lock:
+            inicio_fatia = bisect.bisect_left(self._finalizados, (inicio,)) if inicio is not None else 0
+            fim_fatia = bisect.bisect_right(self._finalizados, (fim, float("inf"))) if fim is not None else len(self._finalizados)
+            chaves = self._finalizados[inicio_fatia:fim_fatia]
+
+        for posicao in range(0, len(chaves), tamanho_lote):
+            with self._lock:
+                lote = [
+                    self._copia(self._veiculos[veiculo_id])
+                    for _, veiculo_id in chaves[posicao:posicao + tamanho_lote]
+                    if veiculo_id in self._veiculos
+                ]
+            for veiculo in lote:
+                if veiculo.get("entrada") is not None and (not tipos or veiculo.get("tipo_veiculo") in tipos):
+                    yield veiculo
+
+    def parked_version(self):
+        return self._versao
+
+    def list_lots(self):
+        return sorted(_patios)
+
+    # --- Ocupação e vagas -----------------------------------------------
+
+    def get_capacity(self):
+        with self._lock:
+            return dict(self._capacidade)
+
+    def set_capacity(self, capacidade):
+        with self._lock:
+            self._capacidade = {zona: int(vagas) for zona, vagas in capacidade.items() if vagas}
+            self.reconcile_occupancy()
+
+    def occupancy(self):
+        with self._lock:
+            return {
+                zona: {"capacidade": situacao["capacidade"], "ocupadas": situacao["ocupadas"]}
+                for zona, situacao in self._zonas.items()
+            }
+
+    def reconcile_occupancy(self):
+        with self._lock:
+            esperado = contar_vagas(
+                self._capacidade, (self._veiculos[veiculo_id] for veiculo_id in self._estacionados.values())
+            )
+            correcoes = corrigir_vagas(self._zonas, esperado)
+            # A lista ordenada já é um heap válido
+            self._zonas = esperado
+            return correcoes
+
+    # --- Agregados de faturamento --------------------------------------
+
+    def increment_rollup(self, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia):
+        with self._lock:
+            linha = self._rollups.setdefault((periodo, tipo_veiculo), [0, 0.0, 0.0])
+            linha[0] += quantidade
+            linha[1] += faturamento
+            linha[2] += minutos_permanencia
+
+    def reset_rollups(self, inicio=None, fim=None):
+        with self._lock:
+            if inicio is None:
+                self._rollups.clear()
+                return
+            inicio, fim = periodo_rollup(inicio), periodo_rollup(fim)
+            for chave in [chave for chave in self._rollups if inicio <= chave[0] <= fim]:
+                del self._rollups[chave]
+
+    def summarize_rollups(self, inicio, fim):
+        inicio = periodo_rollup(inicio)
+        total_faturado = 0.0
+        por_tipo = {}
+        with self._lock:
+            for (periodo, tipo), (quantidade, faturamento, _) in self._rollups.items():
+                if inicio <= periodo <= fim:
+                    total_faturado += faturamento
+                    por_tipo[tipo] = por_tipo.get(tipo, 0) + quantidade
+        por_tipo = {tipo: qtd for tipo, qtd in por_tipo.items() if qtd > 0}
+        return {
+            "total_faturado": total_faturado,
+            "quantidade": sum(por_tipo.values()),
+            "por_tipo": dict(sorted(por_tipo.items(), key=lambda item: (-item[1], item[0]))),
+        }
+
+
+class MemoryPriceConfigRepository(PriceConfigRepository):
+
+    def __init__(self, lot_id=DEFAULT_LOT):
+        self.lot_id = lot_id
+        self._lock = threading.Lock()
+        self._prices = None
+        self._version = None
+
+    @property
+    def cache_key(self):
+        return ("memory", id(self), self.lot_id)
+
+    def get(self):
+        with self._lock:
+            if self._prices is None:
+                return None, None
+            return dict(self._prices), self._version
+
+    def get_version(self):
+        return self._version
+
+    def save(self, prices):
+        with self._lock:
+            self._prices = dict(prices)
+            self._version = (self._version or 0) + 1
+            return self._version
@@ -0,0 +1,797 @@
+# storage/mongo.py
+import heapq
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.topology_description import TopologyDescription
+
+from storage.base import (
+    DEFAULT_LOT,
+    VehicleRepository,
+    PriceConfigRepository,
+    AlreadyImported,
+    ConflictError,
+    LotFull,
+    VehicleAlreadyParked,
+    VehicleNotParked,
+    contar_vagas,
+    corrigir_vagas,
+    fim_periodo_rollup,
+    periodo_rollup,
+    somar_resumos,
+    zona_veiculo,
+    CAMPOS_HISTORICO,
+)
+from utils.indexes import bootstrap_indexes, ensure_archive_indexes, verify_indexes, diagnosticar_consultas
+from utils.plates import filtro_busca_placa, indexar_placas, normalizar_placa
+
+ROLLUP_COLLECTION = "faturamento_por_hora"
+# Um documento por pátio e zona: {"lot_id", "zona", "capacidade", "ocupadas", "livres", "pendentes", "versao"}
+OCCUPANCY_COLLECTION = "ocupacao"
+# Idade (segundos) a partir da qual uma marca em `pendentes` é de uma gravação interrompida
+PENDING_OCCUPANCY_TIMEOUT = 120
+# Tentativas de set_capacity de reconstruir as zonas alteradas por entradas e saídas concorrentes
+CAPACITY_RECONCILE_ATTEMPTS = 5
+
+# Código devolvido por servidores standalone, que não têm change streams
+CHANGE_STREAM_NAO_SUPORTADO = 40573
+
+# Finalizados antigos são movidos para uma coleção por mês de saída: veiculos_arquivo_AAAA_MM
+ARCHIVE_PREFIX = "veiculos_arquivo_"
+# Por quanto tempo (segundos) a lista de partições é reaproveitada entre consultas
+ARCHIVE_LIST_TTL = 30
+
+# Chaves do diário local guardadas em cada agregado, para reconhecer um incremento reaplicado
+ROLLUP_JOURNAL_KEYS = 1000
+
+
+def nome_particao(saida):
+    return f"{ARCHIVE_PREFIX}{saida:%Y_%m}"
+
+
+def mes_particao(nome):
+    """Primeiro instante do mês de uma partição, ou None se o nome não for de uma."""
+    try:
+        return datetime.strptime(nome[len(ARCHIVE_PREFIX):], "%Y_%m") if nome.startswith(ARCHIVE_PREFIX) else None
+    except ValueError:
+        return None
+
+
+def _mes_seguinte(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def identidade_servidor(client):
+    """
+    Identifica o cluster de `client` sem as credenciais da string de conexão: o nome do
+    replica set (se houver) e os endereços dos servidores conhecidos, em ordem. Clientes
+    sem descrição da topologia (o mongomock) usam o próprio endereço.
+    """
+    descricao = getattr(client, "topology_description", None)
+    if not isinstance(descricao, TopologyDescription):
+        return (None, (f"{client.address[0]}:{client.address[1]}",))
+    enderecos = sorted(f"{host}:{porta}" for host, porta in descricao.server_descriptions())
+    return (descricao.replica_set_name, tuple(enderecos))
+
+
+def _resumo(cursor):
+    resultado = next(cursor, {"totais": [], "por_tipo": []})
+    totais = resultado["totais"][0] if resultado["totais"] else {}
+    return {
+        "total_faturado": float(totais.get("total_faturado", 0.0)),
+        "quantidade": int(totais.get("quantidade", 0)),
+        "por_tipo": {linha["_id"]: linha["quantidade"] for linha in resultado["por_tipo"]},
+    }
+
+
+class MongoVehicleRepository(VehicleRepository):
+    """
+    Veículos na coleção `veiculos` e agregados em `faturamento_por_hora` do mesmo banco.
+    Finalizados arquivados ficam nas partições mensais veiculos_arquivo_AAAA_MM, lidas
+    junto com `veiculos` pelo Histórico, Dashboard e exportação. Todos os pátios
+    dividem as coleções; toda consulta filtra por `lot_id`, o primeiro campo de
+    cada índice, e assim só percorre as entradas de índice do próprio pátio.
+
+    A ocupação de cada zona fica em `ocupacao`, com as vagas livres em ordem crescente:
+    a entrada reserva a menor vaga com um único find_one_and_update antes de gravar o
+    veículo, e a saída a devolve depois de finalizá-lo. Entre as duas gravações o _id
+    do veículo fica em `pendentes` no contador da zona, e a reconciliação não mexe em
+    uma zona com marca recente: o contador já mudou e o veículo ainda não (ou o
+    contrário). Uma queda entre as duas deixa a marca para trás; depois de
+    PENDING_OCCUPANCY_TIMEOUT segundos a reconciliação a descarta e refaz a zona.
+    """
+
+    name = "mongo"
+
+    def __init__(self, db, lot_id=DEFAULT_LOT):
+        self.db = db
+        self.lot_id = lot_id
+        self.collection = db.veiculos
+        self.rollups = db[ROLLUP_COLLECTION]
+        self.ocupacao = db[OCCUPANCY_COLLECTION]
+        self._particoes_cache = (0.0, [])
+        # Lida uma vez: novos membros descobertos depois não mudam a chave do retrato
+        self._servidor = identidade_servidor(db.client)
+
+    # --- Partições de arquivo -------------------------------------------
+
+    def _particoes(self, inicio=None, fim=None):
+        """
+        Partições existentes como (mês, coleção), da mais recente para a mais antiga,
+        restritas às que podem ter saídas entre `inicio` e `fim`.
+        """
+        lidas_em, particoes = self._particoes_cache
+        if time.monotonic() - lidas_em > ARCHIVE_LIST_TTL:
+            nomes = self.db.list_collection_names(filter={"name": {"$regex": f"^{ARCHIVE_PREFIX}"}})
+            particoes = sorted(
+                ((mes_particao(nome), self.db[nome]) for nome in nomes if mes_particao(nome)),
+                key=lambda item: item[0], reverse=True
+            )
+            self._particoes_cache = (time.monotonic(), particoes)
+        return [
+            (mes, colecao) for mes, colecao in particoes
+            if (inicio is None or _mes_seguinte(mes) > inicio) and (fim is None or mes <= fim)
+        ]
+
+    def _colecoes_finalizados(self, inicio=None, fim=None):
+        return [self.collection] + [colecao for _, colecao in self._particoes(inicio, fim)]
+
+    def archive_finished(self, antes_de, tamanho_lote=1000, pausa=0.0, parar=None):
+        """
+        Copia cada lote para as partições do mês de saída e só então o remove de
+        `veiculos`; se o processo cair no meio, o lote é copiado de novo sem duplicar.
+        """
+        filtro = {"lot_id": self.lot_id, "status": "finalizado", "saida": {"$lt": antes_de}}
+        movidos = 0
+        while parar is None or not parar.is_set():
+            lote = list(self.collection.find(filtro).sort([("saida", 1), ("_id", 1)]).limit(tamanho_lote))
+            if not lote:
+                break
+            existentes = {colecao.name for _, colecao in self._particoes()}
+            por_particao = {}
+            for veiculo in lote:
+                por_particao.setdefault(nome_particao(veiculo["saida"]), []).append(veiculo)
+            for nome, veiculos in por_particao.items():
+                if nome not in existentes:
+                    ensure_archive_indexes(self.db[nome])
+                    self._particoes_cache = (0.0, [])
+                try:
+                    self.db[nome].insert_many(veiculos, ordered=False)
+                except BulkWriteError as e:
+                    # Documentos já copiados por uma execução interrompida
+                    if any(falha.get("code") != 11000 for falha in e.details.get("writeErrors", [])):
+                        raise
+            self.collection.delete_many({"_id": {"$in": [veiculo["_id"] for veiculo in lote]}, "status": "finalizado"})
+            movidos += len(lote)
+            if len(lote) < tamanho_lote:
+                break
+            # Intervalo entre lotes, para não disputar o servidor com a operação
+            if parar is not None:
+                parar.wait(pausa)
+            elif pausa:
+                time.sleep(pausa)
+        return movidos
+
+    # --- Veículos -------------------------------------------------------
+
+    def find_parked(self, placa):
+        return self.collection.find_one({
+            "lot_id": self.lot_id,
+            "status": "estacionado",
+            "$or": [{"placa_normalizada": normalizar_placa(placa)}, {"placa": placa}]
+        })
+
+    def _documento(self, veiculo):
+        return {**veiculo, "lot_id": self.lot_id}
+
+    def _ocupar(self, veiculo):
+        """
+        Documento a gravar para `veiculo`, com a vaga já reservada se ele entra estacionado.
+        A reserva fica pendente até _concluir (gravado) ou _liberar (recusado).
+        """
+        documento = self._documento(veiculo)
+        if documento.get("status") == "estacionado":
+            documento.setdefault("_id", ObjectId())
+            documento["zona"] = veiculo["zona"] = zona_veiculo(documento)
+            documento["vaga"] = veiculo["vaga"] = self._reservar(documento["zona"], documento["_id"])
+        return documento
+
+    def _duplicado(self, detalhes, documento):
+        # Qual índice único recusou o documento: o das linhas importadas ou o da placa estacionada.
+        # Sem keyPattern no erro (servidores antigos), confere se a chave da linha já existe
+        chave = documento.get("chave_importacao")
+        padrao = (detalhes or {}).get("keyPattern")
+        if chave is not None and (
+            "chave_importacao" in padrao if padrao
+            else self.collection.find_one({"lot_id": self.lot_id, "chave_importacao": chave}, {"_id": 1})
+        ):
+            return AlreadyImported(chave)
+        return VehicleAlreadyParked(documento.get("placa"))
+
+    def insert(self, veiculo):
+        documento = self._ocupar(veiculo)
+        try:
+            veiculo_id = self.collection.insert_one(documento).inserted_id
+        except DuplicateKeyError as e:
+            self._liberar(documento)
+            raise self._duplicado(e.details, documento)
+        self._concluir_gravados([documento])
+        return veiculo_id
+
+    def insert_many(self, veiculos):
+        documentos = []
+        try:
+            for veiculo in veiculos:
+                documentos.append(self._ocupar(veiculo))
+        except LotFull:
+            for documento in documentos:
+                if documento.get("status") == "estacionado":
+                    self._liberar(documento)
+            raise
+        if not documentos:
+            return []
+        try:
+            inseridos = self.collection.insert_many(documentos, ordered=False).inserted_ids
+        except BulkWriteError as e:
+            # Os gravados ficam; as vagas dos recusados voltam antes de propagar o erro
+            recusados = {falha["index"] for falha in e.details.get("writeErrors", [])}
+            for posicao in recusados:
+                if documentos[posicao].get("status") == "estacionado":
+                    self._liberar(documentos[posicao])
+            self._concluir_gravados([d for posicao, d in enumerate(documentos) if posicao not in recusados])
+            raise
+        self._concluir_gravados(documentos)
+        return inseridos
+
+    def import_batch(self, veiculos):
+        erros, documentos = {}, {}
+        for posicao, veiculo in enumerate(veiculos):
+            try:
+                documentos[posicao] = self._ocupar(veiculo)
+            except LotFull as e:
+                erros[posicao] = e
+        if not documentos:
+            return erros
+        posicoes = list(documentos)
+        try:
+            # Não ordenado: o servidor grava o lote inteiro e devolve as falhas por posição
+            self.collection.bulk_write([InsertOne(documento) for documento in documentos.values()], ordered=False)
+        except BulkWriteError as e:
+            for falha in e.details.get("writeErrors", []):
+                posicao = posicoes[falha["index"]]
+                if documentos[posicao].get("status") == "estacionado":
+                    self._liberar(documentos[posicao])
+                if falha.get("code") == 11000:
+                    erros[posicao] = self._duplicado(falha, documentos[posicao])
+                else:
+                    erros[posicao] = ConflictError(falha.get("errmsg", "erro de gravação"))
+        self._concluir_gravados([documento for posicao, documento in documentos.items() if posicao not in erros])
+        return dict(sorted(erros.items()))
+
+    def _encerrar(self, veiculo_id, alterar):
+        """
+        Finaliza ou remove o estacionado `veiculo_id` com alterar(filtro), que devolve o
+        documento ou None, e devolve a vaga. A saída fica pendente no contador da zona
+        antes de o veículo mudar, e só sai dele junto com a vaga.
+        """
+        filtro = {"_id": veiculo_id, "lot_id": self.lot_id, "status": "estacionado"}
+        atual = self.collection.find_one(filtro, {"tipo_veiculo": 1, "zona": 1})
+        if atual is None:
+            return None
+        zona = zona_veiculo(atual)
+        self.ocupacao.update_one(
+            {"lot_id": self.lot_id, "zona": zona},
+            {"$push": {"pendentes": {"_id": veiculo_id, "em": datetime.now()}}, "$inc": {"versao": 1}},
+            upsert=True
+        )
+        documento = alterar(filtro)
+        if documento is None:
+            # Encerrado por outro terminal entre a leitura e a alteração
+            self._concluir(zona, [veiculo_id])
+        else:
+            self._liberar(documento)
+        return documento
+
+    def finalize(self, veiculo_id, campos):
+        finalizado = self._encerrar(veiculo_id, lambda filtro: self.collection.find_one_and_update(
+            filtro,
+            {"$set": campos},
+            projection={"placa_tokens": 0},
+            return_document=ReturnDocument.AFTER
+        ))
+        if finalizado is None:
+            raise VehicleNotParked(veiculo_id)
+        return finalizado
+
+    def delete(self, veiculo_id):
+        removido = self._encerrar(veiculo_id, self.collection.find_one_and_delete)
+        if removido is not None:
+            return removido
+        for colecao in self._colecoes_finalizados():
+            removido = colecao.find_one_and_delete({"_id": veiculo_id, "lot_id": self.lot_id})
+            if removido is not None:
+                return removido
+        return None
+
+    def delete_all(self):
+        # As partições de arquivo são de todos os pátios: só os documentos deste saem delas
+        for colecao in self._colecoes_finalizados():
+            colecao.delete_many({"lot_id": self.lot_id})
+        self.ocupacao.delete_many({"lot_id": self.lot_id})
+        self.reconcile_occupancy()
+
+    def list_parked(self, busca=None, limite=None):
+        query = {"lot_id": self.lot_id, "status": "estacionado"}
+        filtro_placa = filtro_busca_placa(busca)
+        if filtro_placa:
+            query.update(filtro_placa)
+        cursor = self.collection.find(query)
+        if limite:
+            cursor = cursor.limit(limite)
+        return list(cursor)
+
+    def list_history(self, busca=None, limite=50, apos=None):
+        query = {"lot_id": self.lot_id, "status": "finalizado"}
+        filtro_placa = filtro_busca_placa(busca)
+        if filtro_placa:
+            query.update(filtro_placa)
+        if apos is not None:
+            saida, veiculo_id = apos
+            query["$or"] = [{"saida": {"$lt": saida}}, {"saida": saida, "_id": {"$lt": veiculo_id}}]
+
+        def buscar(colecao):
+            cursor = colecao.find(query, {campo: 1 for campo in CAMPOS_HISTORICO})
+            return list(cursor.sort([("saida", -1), ("_id", -1)]).limit(limite))
+
+        chave = lambda v: (v["saida"], v["_id"])
+        veiculos = buscar(self.collection)
+        # Partições do mês mais recente para o mais antigo; para quando nenhuma mais antiga
+        # pode ter saídas posteriores à última linha da página
+        for mes, colecao in self._particoes(fim=apos[0] if apos is not None else None):
+            if len(veiculos) >= limite and veiculos[limite - 1]["saida"] >= _mes_seguinte(mes):
+                break
+            veiculos = sorted(veiculos + buscar(colecao), key=chave, reverse=True)[:limite]
+        return veiculos
+
+    def iter_finished(self, inicio=None, fim=None, tamanho_lote=1000, tipos=None, campos=None):
+        query = {"lot_id": self.lot_id, "status": "finalizado", "entrada": {"$ne": None}, "saida": {"$ne": None}}
+        if inicio is not None:
+            query["saida"]["$gte"] = inicio
+        if fim is not None:
+            query["saida"]["$lte"] = fim
+        if tipos:
+            query["tipo_veiculo"] = {"$in": list(tipos)}
+        # Um cursor no servidor por coleção, intercalados pela ordem de saída; o driver
+        # busca um lote de cada vez conforme a iteração avança
+        cursores = [
+            colecao.find(
+                query,
+                {campo: 1 for campo in campos} if campos else {"placa_tokens": 0},
+                batch_size=tamanho_lote
+            ).sort([("saida", 1), ("_id", 1)])
+            for colecao in self._colecoes_finalizados(inicio, fim)
+        ]
+        if len(cursores) == 1:
+            return cursores[0]
+        return heapq.merge(*cursores, key=lambda v: (v["saida"], v["_id"]))
+
+    # --- Ocupação e vagas -----------------------------------------------
+
+    def _reservar(self, zona, veiculo_id):
+        filtro = {"lot_id": self.lot_id, "zona": zona}
+        pendente = {"$push": {"pendentes": {"_id": veiculo_id, "em": datetime.now()}}}
+        # Zona com vagas livres: tira a primeira da lista, que é a menor
+        antes = self.ocupacao.find_one_and_update(
+            {**filtro, "livres.0": {"$exists": True}},
+            {"$pop": {"livres": -1}, "$inc": {"ocupadas": 1, "versao": 1}, **pendente},
+            projection={"_id": 0, "livres": {"$slice": 1}},
+        )
+        if antes is not None:
+            return antes["livres"][0]
+        # Zona sem capacidade (ou ainda sem contador): só conta. Em uma zona com capacidade
+        # e sem vagas o filtro não casa, e o upsert esbarra no índice único
+        try:
+            self.ocupacao.update_one(
+                {**filtro, "capacidade": None}, {"$inc": {"ocupadas": 1, "versao": 1}, **pendente}, upsert=True
+            )
+        except DuplicateKeyError:
+            raise LotFull(zona)
+        return None
+
+    def _concluir(self, zona, ids):
+        """Tira de `pendentes` da zona as marcas dos veículos `ids`."""
+        self.ocupacao.update_one(
+            {"lot_id": self.lot_id, "zona": zona},
+            {"$pull": {"pendentes": {"_id": {"$in": ids}}}, "$inc": {"versao": 1}},
+        )
+
+    def _concluir_gravados(self, documentos):
+        """Conclui as reservas de _ocupar dos documentos já gravados, uma atualização por zona."""
+        por_zona = {}
+        for documento in documentos:
+            if documento.get("status") == "estacionado":
+                por_zona.setdefault(documento["zona"], []).append(documento["_id"])
+        for zona, ids in por_zona.items():
+            self._concluir(zona, ids)
+
+    def _liberar(self, veiculo):
+        filtro = {"lot_id": self.lot_id, "zona": zona_veiculo(veiculo)}
+        # A marca pendente sai na mesma gravação que devolve a vaga
+        concluir = {"$pull": {"pendentes": {"_id": veiculo["_id"]}}}
+        vaga = veiculo.get("vaga")
+        if vaga is not None:
+            # Só devolve a vaga se ela ainda existir (a capacidade pode ter diminuído) e não estiver livre
+            devolvida = self.ocupacao.update_one(
+                {**filtro, "ocupadas": {"$gt": 0}, "capacidade": {"$gte": vaga}, "livres": {"$ne": vaga}},
+                {"$inc": {"ocupadas": -1, "versao": 1}, "$push": {"livres": {"$each": [vaga], "$sort": 1}}, **concluir},
+            )
+            if devolvida.matched_count:
+                return
+        liberada = self.ocupacao.update_one(
+            {**filtro, "ocupadas": {"$gt": 0}}, {"$inc": {"ocupadas": -1, "versao": 1}, **concluir}
+        )
+        if not liberada.matched_count:
+            self.ocupacao.update_one(filtro, {"$inc": {"versao": 1}, **concluir})
+
+    def get_capacity(self):
+        config = self.db.configuracoes.find_one(
+            {"lot_id": self.lot_id, "type": "capacity_config"}, {"_id": 0, "capacidade": 1}
+        )
+        return dict(config.get("capacidade") or {}) if config else {}
+
+    def set_capacity(self, capacidade):
+        self.db.configuracoes.update_one(
+            {"lot_id": self.lot_id, "type": "capacity_config"},
+            {"$set": {"capacidade": {zona: int(vagas) for zona, vagas in capacidade.items() if vagas}},
+             "$inc": {"version": 1}},
+            upsert=True
+        )
+        # Zonas alteradas durante a reconstrução ficam para a tentativa seguinte
+        for _ in range(CAPACITY_RECONCILE_ATTEMPTS):
+            if not self.reconcile_occupancy():
+                break
+
+    def occupancy(self):
+        return {
+            contador["zona"]: {"capacidade": contador.get("capacidade"), "ocupadas": contador.get("ocupadas", 0)}
+            for contador in self.ocupacao.find(
+                {"lot_id": self.lot_id}, {"_id": 0, "zona": 1, "capacidade": 1, "ocupadas": 1}
+            )
+        }
+
+    def reconcile_occupancy(self):
+        """
+        Lê os contadores antes dos estacionados e só regrava os que não mudaram desde a
+        leitura (campo `versao`); os alterados no meio por uma entrada ou saída ficam para
+        a rodada seguinte, assim como as zonas com uma entrada ou saída pendente. Marcas
+        pendentes vencidas são descartadas ao refazer a zona.
+        """
+        atual = {
+            contador["zona"]: {
+                "capacidade": contador.get("capacidade"),
+                "ocupadas": contador.get("ocupadas", 0),
+                "livres": contador.get("livres", []),
+                "pendentes": contador.get("pendentes", []),
+                "versao": contador.get("versao"),
+            }
+            for contador in self.ocupacao.find({"lot_id": self.lot_id}, {"_id": 0})
+        }
+        limite = datetime.now() - timedelta(seconds=PENDING_OCCUPANCY_TIMEOUT)
+        em_andamento = {
+            zona for zona, contador in atual.items()
+            if any(pendente["em"] > limite for pendente in contador["pendentes"])
+        }
+        esperado = contar_vagas(self.get_capacity(), self.collection.find(
+            {"lot_id": self.lot_id, "status": "estacionado"}, {"_id": 0, "tipo_veiculo": 1, "zona": 1, "vaga": 1}
+        ))
+        divergentes = corrigir_vagas(atual, esperado)
+        vencidas = {zona for zona, contador in atual.items() if contador["pendentes"]}
+        corrigidas = {}
+        for zona in sorted((set(divergentes) | vencidas) - em_andamento):
+            novo = esperado.get(zona, {"capacidade": None, "ocupadas": 0, "livres": []})
+            if zona in atual:
+                resultado = self.ocupacao.update_one(
+                    {"lot_id": self.lot_id, "zona": zona, "versao": atual[zona]["versao"]},
+                    {"$set": {**novo, "pendentes": []}, "$inc": {"versao": 1}},
+                )
+                if not resultado.matched_count:
+                    continue
+            else:
+                try:
+                    self.ocupacao.insert_one({"lot_id": self.lot_id, "zona": zona, **novo, "versao": 1})
+                except DuplicateKeyError:
+                    # Criado por uma entrada concorrente
+                    continue
+            if zona in divergentes:
+                corrigidas[zona] = divergentes[zona]
+        return corrigidas
+
+    # --- Agregados de faturamento --------------------------------------
+
+    def increment_rollup(self, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia):
+        self.rollups.update_one(
+            {"lot_id": self.lot_id, "periodo": periodo, "tipo_veiculo": tipo_veiculo},
+            {"$inc": {
+                "quantidade": quantidade,
+                "faturamento": faturamento,
+                "minutos_permanencia": minutos_permanencia,
+            }},
+            upsert=True
+        )
+
+    def reset_rollups(self, inicio=None, fim=None):
+        filtro = {"lot_id": self.lot_id}
+        if inicio is not None:
+            filtro["periodo"] = {"$gte": periodo_rollup(inicio), "$lte": periodo_rollup(fim)}
+        self.rollups.delete_many(filtro)
+
+    def summarize_rollups(self, inicio, fim):
+        pipeline = [
+            {"$match": {"lot_id": self.lot_id, "periodo": {
+                "$gte": periodo_rollup(inicio),
+                "$lte": fim,
+            }}},
+            {"$facet": {
+                "totais": [
+                    {"$group": {
+                        "_id": None,
+                        "total_faturado": {"$sum": "$faturamento"},
+                        "quantidade": {"$sum": "$quantidade"},
+                    }},
+                ],
+                "por_tipo": [
+                    {"$group": {"_id": "$tipo_veiculo", "quantidade": {"$sum": "$quantidade"}}},
+                    {"$match": {"quantidade": {"$gt": 0}}},
+                    {"$sort": {"quantidade": -1, "_id": 1}},
+                ],
+            }},
+        ]
+        return _resumo(self.rollups.aggregate(pipeline))
+
+    def summarize_finished(self, inicio, fim):
+        pipeline = [
+            {"$match": {"lot_id": self.lot_id, "status": "finalizado", "saida": {"$gte": inicio, "$lte": fim}}},
+            {"$project": {
+                "_id": 0,
+                "tipo_veiculo": {"$ifNull": ["$tipo_veiculo", "Carro"]},
+                "valor_cobrado": {"$ifNull": ["$valor_cobrado", 0]},
+            }},
+            {"$facet": {
+                "totais": [
+                    {"$group": {
+                        "_id": None,
+                        "total_faturado": {"$sum": "$valor_cobrado"},
+                        "quantidade": {"$sum": 1},
+                    }},
+                ],
+                "por_tipo": [
+                    {"$group": {"_id": "$tipo_veiculo", "quantidade": {"$sum": 1}}},
+                    {"$sort": {"quantidade": -1, "_id": 1}},
+                ],
+            }},
+        ]
+        return somar_resumos(
+            _resumo(colecao.aggregate(pipeline)) for colecao in self._colecoes_finalizados(inicio, fim)
+        )
+
+    def rebuild_rollups(self, dias_por_lote=31, inicio=None, fim=None):
+        """
+        Agrupa o histórico no servidor em janelas de `dias_por_lote` dias e grava
+        cada janela com um único bulk_write. Cada janela soma `veiculos` e as partições
+        de arquivo dos meses que ela cobre. Com `inicio` e `fim`, as janelas cobrem só
+        as horas de inicio a fim.
+        """
+        self.reset_rollups(inicio, fim)
+
+        saida, limite, intervalo = {"$ne": None}, None, ()
+        if inicio is not None:
+            intervalo = (periodo_rollup(inicio), fim_periodo_rollup(fim))
+            saida, limite = {"$gte": intervalo[0], "$lte": intervalo[1]}, periodo_rollup(fim) + timedelta(hours=1)
+        filtro = {"lot_id": self.lot_id, "status": "finalizado", "saida": saida, "entrada": {"$ne": None}}
+        extremos = [
+            (colecao.find_one(filtro, {"saida": 1}, sort=[("saida", 1)]),
+             colecao.find_one(filtro, {"saida": 1}, sort=[("saida", -1)]))
+            for colecao in self._colecoes_finalizados(*intervalo)
+        ]
+        extremos = [(primeiro["saida"], ultimo["saida"]) for primeiro, ultimo in extremos if primeiro and ultimo]
+        if not extremos:
+            return 0
+        primeiro = min(primeiro for primeiro, _ in extremos)
+        ultimo = max(ultimo for _, ultimo in extremos)
+
+        gravados = 0
+        inicio = periodo_rollup(primeiro)
+        while inicio <= ultimo:
+            fim = inicio + timedelta(days=dias_por_lote)
+            if limite is not None:
+                fim = min(fim, limite)
+            pipeline = [
+                {"$match": {**filtro, "saida": {"$gte": inicio, "$lt": fim}}},
+                {"$group": {
+                    "_id": {
+                        # Hora cheia da saída ($dateFromParts, e não $dateTrunc, que exige o MongoDB 5)
+                        "periodo": {"$dateFromParts": {
+                            "year": {"$year": "$saida"}, "month": {"$month": "$saida"},
+                            "day": {"$dayOfMonth": "$saida"}, "hour": {"$hour": "$saida"},
+                        }},
+                        "tipo_veiculo": {"$ifNull": ["$tipo_veiculo", "Carro"]},
+                    },
+                    "quantidade": {"$sum": 1},
+                    "faturamento": {"$sum": {"$ifNull": ["$valor_cobrado", 0]}},
+                    "minutos_permanencia": {
+                        "$sum": {"$divide": [{"$subtract": ["$saida", "$entrada"]}, 60000]}
+                    },
+                }},
+            ]
+            # Uma hora pode ter saídas em `veiculos` e no arquivo: soma as duas antes de gravar
+            janela = {}
+            for colecao in self._colecoes_finalizados(inicio, fim):
+                for linha in colecao.aggregate(pipeline):
+                    chave = (linha["_id"]["periodo"], linha["_id"]["tipo_veiculo"])
+                    soma = janela.setdefault(chave, [0, 0.0, 0.0])
+                    soma[0] += linha["quantidade"]
+                    soma[1] += linha["faturamento"]
+                    soma[2] += linha["minutos_permanencia"]
+            operacoes = [
+                ReplaceOne(
+                    {"lot_id": self.lot_id, "periodo": periodo, "tipo_veiculo": tipo_veiculo},
+                    {
+                        "lot_id": self.lot_id,
+                        "periodo": periodo,
+                        "tipo_veiculo": tipo_veiculo,
+                        "quantidade": quantidade,
+                        "faturamento": float(faturamento),
+                        "minutos_permanencia": float(minutos),
+                    },
+                    upsert=True
+                )
+                for (periodo, tipo_veiculo), (quantidade, faturamento, minutos) in janela.items()
+            ]
+            if operacoes:
+                self.rollups.bulk_write(operacoes, ordered=False)
+                gravados += len(operacoes)
+            inicio = fim
+
+        return gravados
+
+    # --- Diário local (storage.journal) --------------------------------
+
+    def apply_journal(self, tipo, chave, dados):
+        """
+        Reaplica uma operação do diário local. Reaplicar a mesma `chave` não tem efeito:
+        a entrada traz o _id gerado no terminal (e devolve a vaga reservada se ele já
+        estiver gravado), a saída só vale para o ticket aberto (ou já finalizado com a
+        mesma saída) e só libera a vaga quando o finaliza, e o incremento de agregado
+        registra a chave no próprio documento. Levanta ConflictError (LotFull, se não
+        houver vaga) se o banco recusar a operação.
+        """
+        if tipo == "entrada":
+            # A vaga é reservada aqui: o terminal aceitou a entrada sem consultar o banco
+            documento = self._ocupar(dados)
+            try:
+                self.collection.insert_one(documento)
+            except DuplicateKeyError:
+                self._liberar(documento)
+                if self.collection.find_one({"_id": dados["_id"]}, {"_id": 1}) is None:
+                    raise VehicleAlreadyParked(dados.get("placa"))
+            else:
+                self._concluir_gravados([documento])
+        elif tipo == "saida":
+            campos = dados["campos"]
+            anterior = self._encerrar(dados["_id"], lambda filtro: self.collection.find_one_and_update(
+                filtro, {"$set": campos}, projection={"tipo_veiculo": 1, "zona": 1, "vaga": 1}
+            ))
+            if anterior is None:
+                atual = self.collection.find_one({"_id": dados["_id"], "lot_id": self.lot_id}, {"status": 1, "saida": 1})
+                if not atual or atual.get("status") != "finalizado" or atual.get("saida") != campos["saida"]:
+                    raise VehicleNotParked(dados["_id"])
+        elif tipo == "agregado":
+            try:
+                self.rollups.update_one(
+                    {
+                        "lot_id": self.lot_id,
+                        "periodo": dados["periodo"],
+                        "tipo_veiculo": dados["tipo_veiculo"],
+                        "operacoes": {"$ne": chave},
+                    },
+                    {
+                        "$inc": {
+                            "quantidade": dados["quantidade"],
+                            "faturamento": dados["faturamento"],
+                            "minutos_permanencia": dados["minutos_permanencia"],
+                        },
+                        "$push": {"operacoes": {"$each": [chave], "$slice": -ROLLUP_JOURNAL_KEYS}},
+                    },
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                # O agregado já tem a chave: o filtro não casou e o upsert esbarrou no índice único
+                pass
+        else:
+            raise ValueError(f"Operação desconhecida no diário: {tipo}")
+
+    # --- Manutenção -----------------------------------------------------
+
+    def ensure_indexes(self):
+        return bootstrap_indexes(self.db, ARCHIVE_PREFIX, DEFAULT_LOT)
+
+    def backfill_plate_tokens(self, tamanho_lote=1000):
+        return sum(
+            indexar_placas(colecao, tamanho_lote=tamanho_lote) for colecao in self._colecoes_finalizados()
+        )
+
+    @property
+    def cache_key(self):
+        return ("mongo", id(self.db.client), self.collection.full_name, self.lot_id)
+
+    @property
+    def storage_key(self):
+        return ("mongo", self._servidor, self.collection.full_name, self.lot_id)
+
+    def list_lots(self):
+        # distinct sobre índices que começam por lot_id: uma entrada de índice por pátio
+        patios = {self.lot_id}
+        for colecao in (self.collection, self.rollups, self.db.configuracoes):
+            patios.update(patio for patio in colecao.distinct("lot_id") if patio is not None)
+        return sorted(patios)
+
+    def watch_parked(self, resume_after=None):
+        # Remoções só trazem o _id; o espelho ignora os que não são do pátio
+        pipeline = [
+            {"$match": {"$or": [
+                {"operationType": {"$in": ["insert", "update", "replace"]}, "fullDocument.lot_id": self.lot_id},
+                {"operationType": "delete"},
+            ]}},
+            {"$project": {"updateDescription": 0, "fullDocument.placa_tokens": 0}},
+        ]
+        try:
+            return self.collection.watch(
+                pipeline,
+                full_document="updateLookup",
+                resume_after=resume_after,
+                max_await_time_ms=1000,
+            )
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_NAO_SUPORTADO:
+                return None
+            raise
+
+    def diagnose(self):
+        return {"indices": verify_indexes(self.db), "consultas": diagnosticar_consultas(self.db, self.lot_id)}
+
+
+class MongoPriceConfigRepository(PriceConfigRepository):
+    """Tabela de preços de cada pátio no documento {"type": "price_config", "lot_id"} da coleção `configuracoes`."""
+
+    def __init__(self, db, lot_id=DEFAULT_LOT):
+        self.collection = db.configuracoes
+        self.lot_id = lot_id
+
+    @property
+    def cache_key(self):
+        return ("mongo", id(self.collection.database.client), self.collection.full_name, self.lot_id)
+
+    def _filtro(self):
+        return {"lot_id": self.lot_id, "type": "price_config"}
+
+    def get(self):
+        config = self.collection.find_one(self._filtro())
+        if config and "prices" in config:
+            return dict(config["prices"]), config.get("version", 0)
+        return None, None
+
+    def get_version(self):
+        config = self.collection.find_one(self._filtro(), {"_id": 0, "version": 1})
+        return config.get("version", 0) if config else None
+
+    def save(self, prices):
+        config = self.collection.find_one_and_update(
+            self._filtro(),
+            {"$set": {"prices": prices}, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return config.get("version", 0)
@@ -0,0 +1,44 @@
+# storage/occupancy.py
+"""
+Reconciliação em segundo plano dos contadores de ocupação: de tempos em tempos,
+recalcula os estacionados e as vagas livres de cada zona a partir dos veículos e
+corrige o que tiver divergido (uma gravação interrompida entre a vaga e o veículo,
+registros importados ou alterados fora do app). Entre uma rodada e outra, a leitura
+de vagas livres continua sendo só a dos contadores.
+"""
+import os
+
+from storage.workers import BackgroundWorker, WorkerRegistry
+
+# Intervalo (segundos) entre duas reconciliações; 0 desliga
+OCCUPANCY_RECONCILE_INTERVAL = float(os.environ.get("OCCUPANCY_RECONCILE_INTERVAL", 300))
+
+_reconciliadores = WorkerRegistry()
+
+
+class ReconcileWorker(BackgroundWorker):
+    """
+    Thread que chama repo.reconcile_occupancy a cada `interval` segundos. `status` guarda
+    a última rodada: as correções feitas ({zona: diferença}), quando e o último erro.
+    """
+
+    def __init__(self, repo, interval=OCCUPANCY_RECONCILE_INTERVAL):
+        super().__init__(f"occupancy-{repo.name}", interval, correcoes={})
+        self.repo = repo
+
+    def rodada(self):
+        return {"correcoes": self.repo.reconcile_occupancy()}
+
+
+def start_reconciler(repo, interval=OCCUPANCY_RECONCILE_INTERVAL):
+    """
+    Inicia (uma vez por armazenamento) a reconciliação dos contadores de `repo`. A
+    primeira rodada é imediata, o que também conta os estacionados de antes das vagas.
+    Retorna a thread, ou None se a reconciliação estiver desligada.
+    """
+    if interval <= 0:
+        return None
+    return _reconciliadores.start(repo.cache_key, lambda: ReconcileWorker(repo, interval))
+
+
+stop_all = _reconciliadores.stop_all
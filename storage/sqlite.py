@@ -0,0 +1,608 @@
+# storage/sqlite.py
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from storage.base import (
+    DEFAULT_LOT,
+    VehicleRepository,
+    PriceConfigRepository,
+    AlreadyImported,
+    ConflictError,
+    LotFull,
+    VehicleAlreadyParked,
+    VehicleNotParked,
+    contar_vagas,
+    corrigir_vagas,
+    fim_periodo_rollup,
+    periodo_rollup,
+    zona_veiculo,
+)
+from utils.plates import limpar_placa, normalizar_placa
+
+TABELA_FATURAMENTO = """
+CREATE TABLE IF NOT EXISTS faturamento_por_hora (
+    lot_id TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    tipo_veiculo TEXT NOT NULL,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    faturamento REAL NOT NULL DEFAULT 0,
+    minutos_permanencia REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, periodo, tipo_veiculo)
+);
+"""
+
+TABELA_CONFIGURACOES = """
+CREATE TABLE IF NOT EXISTS configuracoes (
+    lot_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    prices TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (lot_id, type)
+);
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS veiculos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lot_id TEXT NOT NULL,
+    placa TEXT,
+    placa_normalizada TEXT,
+    tipo_veiculo TEXT,
+    entrada TEXT,
+    saida TEXT,
+    status TEXT,
+    valor_cobrado REAL,
+    zona TEXT,
+    vaga INTEGER,
+    chave_importacao TEXT
+);
+DROP INDEX IF EXISTS status_saida;
+DROP INDEX IF EXISTS status_placa;
+DROP INDEX IF EXISTS status_saida_id;
+DROP INDEX IF EXISTS placa_estacionado_unico;
+CREATE INDEX IF NOT EXISTS lot_status_placa ON veiculos (lot_id, status, placa_normalizada);
+CREATE INDEX IF NOT EXISTS lot_status_saida_id ON veiculos (lot_id, status, saida, id);
+CREATE UNIQUE INDEX IF NOT EXISTS lot_placa_estacionado_unico
+    ON veiculos (lot_id, placa_normalizada) WHERE status = 'estacionado';
+CREATE UNIQUE INDEX IF NOT EXISTS lot_chave_importacao_unica
+    ON veiculos (lot_id, chave_importacao) WHERE chave_importacao IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS placa_tokens (
+    token TEXT NOT NULL,
+    veiculo_id INTEGER NOT NULL REFERENCES veiculos (id) ON DELETE CASCADE,
+    PRIMARY KEY (token, veiculo_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS placa_tokens_veiculo ON placa_tokens (veiculo_id);
+
+-- Contador de estacionados por zona e, nas zonas com capacidade, as vagas livres
+CREATE TABLE IF NOT EXISTS ocupacao (
+    lot_id TEXT NOT NULL,
+    zona TEXT NOT NULL,
+    capacidade INTEGER,
+    ocupadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, zona)
+);
+CREATE TABLE IF NOT EXISTS vagas_livres (
+    lot_id TEXT NOT NULL,
+    zona TEXT NOT NULL,
+    vaga INTEGER NOT NULL,
+    PRIMARY KEY (lot_id, zona, vaga)
+) WITHOUT ROWID;
+""" + TABELA_FATURAMENTO + TABELA_CONFIGURACOES
+
+# Bancos criados antes dos pátios: os registros existentes passam ao pátio padrão e as
+# tabelas de agregados e preços são recriadas com lot_id na chave primária
+MIGRACAO_PATIOS = f"""
+BEGIN IMMEDIATE;
+ALTER TABLE veiculos ADD COLUMN lot_id TEXT NOT NULL DEFAULT '{DEFAULT_LOT}';
+ALTER TABLE faturamento_por_hora RENAME TO faturamento_sem_patio;
+ALTER TABLE configuracoes RENAME TO configuracoes_sem_patio;
+{TABELA_FATURAMENTO}
+{TABELA_CONFIGURACOES}
+INSERT INTO faturamento_por_hora (lot_id, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia)
+    SELECT '{DEFAULT_LOT}', periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia
+    FROM faturamento_sem_patio;
+INSERT INTO configuracoes (lot_id, type, prices, version)
+    SELECT '{DEFAULT_LOT}', type, prices, version FROM configuracoes_sem_patio;
+DROP TABLE faturamento_sem_patio;
+DROP TABLE configuracoes_sem_patio;
+COMMIT;
+"""
+
+COLUNAS = (
+    "id", "lot_id", "placa", "placa_normalizada", "tipo_veiculo", "entrada", "saida", "status", "valor_cobrado",
+    "zona", "vaga",
+)
+
+
+def _iso(valor):
+    # Sempre com microssegundos, para que a ordem lexicográfica seja a cronológica
+    return valor.isoformat(timespec="microseconds") if valor is not None else None
+
+
+def _datetime(valor):
+    return datetime.fromisoformat(valor) if valor is not None else None
+
+
+def connect(path):
+    """
+    Abre o banco em modo WAL, compartilhado entre threads (o acesso é serializado
+    pelos repositórios), e cria o esquema se necessário.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(veiculos)")}
+    if colunas and "lot_id" not in colunas:
+        conn.executescript(MIGRACAO_PATIOS)
+    if colunas and "zona" not in colunas:
+        # Os estacionados existentes entram na contagem pela primeira reconciliação
+        conn.executescript("ALTER TABLE veiculos ADD COLUMN zona TEXT; ALTER TABLE veiculos ADD COLUMN vaga INTEGER;")
+    if colunas and "chave_importacao" not in colunas:
+        conn.execute("ALTER TABLE veiculos ADD COLUMN chave_importacao TEXT")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class _SQLiteRepository:
+
+    def __init__(self, conn, lock=None, lot_id=DEFAULT_LOT):
+        self.conn = conn
+        self.lot_id = lot_id
+        self._lock = lock or threading.RLock()
+        self._escritas = 0
+
+    @contextmanager
+    def _transacao(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            self._escritas += 1
+
+
+class SQLiteVehicleRepository(_SQLiteRepository, VehicleRepository):
+    """
+    Armazenamento em um arquivo SQLite local (modo WAL), com os mesmos índices do
+    MongoDB e uma tabela de tokens de placa para a busca por trecho. Os pátios
+    compartilham o arquivo; cada repositório lê e grava só as linhas do seu. A vaga é
+    reservada e liberada na mesma transação que grava a entrada ou a saída.
+    """
+
+    name = "sqlite"
+
+    def _documento(self, linha):
+        if linha is None:
+            return None
+        veiculo = dict(zip(COLUNAS, linha))
+        veiculo["_id"] = veiculo.pop("id")
+        veiculo["entrada"] = _datetime(veiculo["entrada"])
+        veiculo["saida"] = _datetime(veiculo["saida"])
+        return {chave: valor for chave, valor in veiculo.items() if valor is not None}
+
+    def _buscar(self, conn, veiculo_id):
+        linha = conn.execute(
+            f"SELECT {', '.join(COLUNAS)} FROM veiculos WHERE id = ? AND lot_id = ?", (veiculo_id, self.lot_id)
+        ).fetchone()
+        return self._documento(linha)
+
+    def _listar(self, status, busca, ordem, limite, apos=None):
+        termo = limpar_placa(busca)
+        colunas = ", ".join(f"v.{coluna}" for coluna in COLUNAS)
+        if termo:
+            # CROSS JOIN fixa a ordem: primeiro o índice de tokens, depois os veículos
+            sql = (f"SELECT {colunas} FROM placa_tokens t CROSS JOIN veiculos v ON v.id = t.veiculo_id "
+                   "WHERE t.token = ? AND v.lot_id = ? AND v.status = ?")
+            parametros = [termo, self.lot_id, status]
+        else:
+            sql = f"SELECT {colunas} FROM veiculos v WHERE v.lot_id = ? AND v.status = ?"
+            parametros = [self.lot_id, status]
+        if apos is not None:
+            # Comparação de row values: o SQLite percorre o índice (lot_id, status, saida, id) a partir do cursor
+            sql += " AND (v.saida, v.id) < (?, ?)"
+            parametros += [_iso(apos[0]), apos[1]]
+        sql += f" ORDER BY {ordem}"
+        if limite:
+            sql += " LIMIT ?"
+            parametros.append(limite)
+        with self._lock:
+            linhas = self.conn.execute(sql, parametros).fetchall()
+        return [self._documento(linha) for linha in linhas]
+
+    # --- Veículos -------------------------------------------------------
+
+    def find_parked(self, placa):
+        with self._lock:
+            linha = self.conn.execute(
+                f"SELECT {', '.join(COLUNAS)} FROM veiculos "
+                "WHERE lot_id = ? AND status = 'estacionado' AND placa_normalizada = ?",
+                (self.lot_id, normalizar_placa(placa))
+            ).fetchone()
+        return self._documento(linha)
+
+    def _inserir(self, conn, veiculo):
+        chave = veiculo.get("chave_importacao")
+        if chave is not None and conn.execute(
+            "SELECT 1 FROM veiculos WHERE lot_id = ? AND chave_importacao = ?", (self.lot_id, chave)
+        ).fetchone():
+            raise AlreadyImported(chave)
+        if veiculo.get("status") == "estacionado":
+            # A unicidade da placa é verificada antes de ocupar a vaga
+            if conn.execute(
+                "SELECT 1 FROM veiculos WHERE lot_id = ? AND status = 'estacionado' AND placa_normalizada = ?",
+                (self.lot_id, veiculo.get("placa_normalizada", normalizar_placa(veiculo.get("placa"))))
+            ).fetchone():
+                raise VehicleAlreadyParked(veiculo.get("placa"))
+            veiculo["zona"] = zona_veiculo(veiculo)
+            veiculo["vaga"] = self._reservar(conn, veiculo["zona"])
+        cursor = conn.execute(
+            "INSERT INTO veiculos (lot_id, placa, placa_normalizada, tipo_veiculo, entrada, saida, status, valor_cobrado, "
+            "zona, vaga, chave_importacao) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.lot_id,
+                veiculo.get("placa"),
+                veiculo.get("placa_normalizada", normalizar_placa(veiculo.get("placa"))),
+                veiculo.get("tipo_veiculo"),
+                _iso(veiculo.get("entrada")),
+                _iso(veiculo.get("saida")),
+                veiculo.get("status"),
+                veiculo.get("valor_cobrado"),
+                veiculo.get("zona"),
+                veiculo.get("vaga"),
+                chave,
+            )
+        )
+        veiculo_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO placa_tokens (token, veiculo_id) VALUES (?, ?)",
+            [(token, veiculo_id) for token in veiculo.get("placa_tokens", [])]
+        )
+        return veiculo_id
+
+    def insert(self, veiculo):
+        try:
+            with self._transacao() as conn:
+                return self._inserir(conn, veiculo)
+        except sqlite3.IntegrityError:
+            raise VehicleAlreadyParked(veiculo.get("placa"))
+
+    def insert_many(self, veiculos):
+        with self._transacao() as conn:
+            return [self._inserir(conn, veiculo) for veiculo in veiculos]
+
+    def import_batch(self, veiculos):
+        # Um único commit por lote; cada linha tem seu savepoint, para que uma recusada
+        # depois de reservar a vaga (violação de unicidade no INSERT) a devolva
+        erros = {}
+        with self._transacao() as conn:
+            for posicao, veiculo in enumerate(veiculos):
+                conn.execute("SAVEPOINT linha")
+                try:
+                    self._inserir(conn, veiculo)
+                except (VehicleAlreadyParked, LotFull, AlreadyImported, sqlite3.IntegrityError) as e:
+                    conn.execute("ROLLBACK TO linha")
+                    veiculo.pop("vaga", None)
+                    erros[posicao] = e if isinstance(e, ConflictError) else VehicleAlreadyParked(veiculo.get("placa"))
+                conn.execute("RELEASE linha")
+        return erros
+
+    def finalize(self, veiculo_id, campos):
+        atribuicoes = ", ".join(f"{coluna} = ?" for coluna in campos)
+        valores = [_iso(v) if isinstance(v, datetime) else v for v in campos.values()]
+        with self._transacao() as conn:
+            linha = conn.execute(
+                f"UPDATE veiculos SET {atribuicoes} WHERE id = ? AND lot_id = ? AND status = 'estacionado' "
+                f"RETURNING {', '.join(COLUNAS)}",
+                (*valores, veiculo_id, self.lot_id)
+            ).fetchall()
+            if linha:
+                finalizado = self._documento(linha[0])
+                self._liberar(conn, finalizado)
+        if not linha:
+            raise VehicleNotParked(veiculo_id)
+        return finalizado
+
+    def delete(self, veiculo_id):
+        with self._transacao() as conn:
+            anterior = self._buscar(conn, veiculo_id)
+            if anterior is not None:
+                conn.execute("DELETE FROM veiculos WHERE id = ?", (veiculo_id,))
+                if anterior.get("status") == "estacionado":
+                    self._liberar(conn, anterior)
+            return anterior
+
+    def delete_all(self):
+        # Os tokens saem junto com os veículos (ON DELETE CASCADE)
+        with self._transacao() as conn:
+            conn.execute("DELETE FROM veiculos WHERE lot_id = ?", (self.lot_id,))
+            self._reconciliar(conn)
+
+    def list_parked(self, busca=None, limite=None):
+        return self._listar("estacionado", busca, "v.id", limite)
+
+    def list_history(self, busca=None, limite=50, apos=None):
+        return self._listar("finalizado", busca, "v.saida DESC, v.id DESC", limite, apos)
+
+    def parked_version(self):
+        # data_version muda quando outra conexão (outro processo) grava no arquivo
+        with self._lock:
+            return (self._escritas, self.conn.execute("PRAGMA data_version").fetchone()[0])
+
+    @property
+    def storage_key(self):
+        # Caminho absoluto do arquivo principal; vazio em bancos ":memory:"
+        with self._lock:
+            arquivo = self.conn.execute("PRAGMA database_list").fetchone()[2]
+        return ("sqlite", arquivo, self.lot_id) if arquivo else None
+
+    def iter_finished(self, inicio=None, fim=None, tamanho_lote=1000, tipos=None, campos=None):
+        filtros = ["lot_id = ?", "status = 'finalizado'", "entrada IS NOT NULL", "saida IS NOT NULL"]
+        parametros = [self.lot_id]
+        if inicio is not None:
+            filtros.append("saida >= ?")
+            parametros.append(_iso(inicio))
+        if fim is not None:
+            filtros.append("saida <= ?")
+            parametros.append(_iso(fim))
+        if tipos:
+            filtros.append(f"tipo_veiculo IN ({', '.join('?' * len(tipos))})")
+            parametros.extend(tipos)
+        base = f"SELECT {', '.join(COLUNAS)} FROM veiculos WHERE {' AND '.join(filtros)}"
+
+        # Paginação por (saida, id), sem manter a trava durante toda a iteração
+        ultimo = None
+        while True:
+            sql, argumentos = base, list(parametros)
+            if ultimo is not None:
+                sql += " AND (saida, id) > (?, ?)"
+                argumentos += [ultimo[1], ultimo[0]]
+            sql += " ORDER BY saida, id LIMIT ?"
+            argumentos.append(tamanho_lote)
+
+            with self._lock:
+                linhas = self.conn.execute(sql, argumentos).fetchall()
+            for linha in linhas:
+                yield self._documento(linha)
+            if len(linhas) < tamanho_lote:
+                return
+            ultimo = (linhas[-1][0], linhas[-1][COLUNAS.index("saida")])
+
+    # --- Ocupação e vagas -----------------------------------------------
+
+    def _reservar(self, conn, zona):
+        # Chamado dentro de uma transação
+        linha = conn.execute(
+            "SELECT capacidade FROM ocupacao WHERE lot_id = ? AND zona = ?", (self.lot_id, zona)
+        ).fetchone()
+        if linha is None or linha[0] is None:
+            conn.execute(
+                "INSERT INTO ocupacao (lot_id, zona, ocupadas) VALUES (?, ?, 1) "
+                "ON CONFLICT (lot_id, zona) DO UPDATE SET ocupadas = ocupadas + 1",
+                (self.lot_id, zona)
+            )
+            return None
+        # Menor vaga livre da zona, pela chave primária
+        vaga = conn.execute(
+            "DELETE FROM vagas_livres WHERE lot_id = ? AND zona = ? AND vaga = "
+            "(SELECT MIN(vaga) FROM vagas_livres WHERE lot_id = ? AND zona = ?) RETURNING vaga",
+            (self.lot_id, zona, self.lot_id, zona)
+        ).fetchone()
+        if vaga is None:
+            raise LotFull(zona)
+        conn.execute(
+            "UPDATE ocupacao SET ocupadas = ocupadas + 1 WHERE lot_id = ? AND zona = ?", (self.lot_id, zona)
+        )
+        return vaga[0]
+
+    def _liberar(self, conn, veiculo):
+        # Chamado dentro de uma transação
+        zona = zona_veiculo(veiculo)
+        linha = conn.execute(
+            "UPDATE ocupacao SET ocupadas = ocupadas - 1 WHERE lot_id = ? AND zona = ? AND ocupadas > 0 "
+            "RETURNING capacidade",
+            (self.lot_id, zona)
+        ).fetchone()
+        vaga = veiculo.get("vaga")
+        if linha and linha[0] and vaga is not None and vaga <= linha[0]:
+            conn.execute(
+                "INSERT OR IGNORE INTO vagas_livres (lot_id, zona, vaga) VALUES (?, ?, ?)", (self.lot_id, zona, vaga)
+            )
+
+    def _capacidade(self, conn):
+        # A coluna prices guarda o JSON de qualquer tipo de configuração
+        linha = conn.execute(
+            "SELECT prices FROM configuracoes WHERE lot_id = ? AND type = 'capacity_config'", (self.lot_id,)
+        ).fetchone()
+        return json.loads(linha[0]) if linha else {}
+
+    def _reconciliar(self, conn):
+        # Chamado dentro de uma transação: nenhuma entrada ou saída acontece no meio
+        esperado = contar_vagas(self._capacidade(conn), [
+            {"tipo_veiculo": tipo_veiculo, "zona": zona, "vaga": vaga}
+            for tipo_veiculo, zona, vaga in conn.execute(
+                "SELECT tipo_veiculo, zona, vaga FROM veiculos WHERE lot_id = ? AND status = 'estacionado'",
+                (self.lot_id,)
+            )
+        ])
+        atual = {
+            zona: {"capacidade": capacidade, "ocupadas": ocupadas, "livres": []}
+            for zona, capacidade, ocupadas in conn.execute(
+                "SELECT zona, capacidade, ocupadas FROM ocupacao WHERE lot_id = ?", (self.lot_id,)
+            )
+        }
+        for zona, vaga in conn.execute("SELECT zona, vaga FROM vagas_livres WHERE lot_id = ?", (self.lot_id,)):
+            atual.setdefault(zona, {"capacidade": None, "ocupadas": 0, "livres": []})["livres"].append(vaga)
+        correcoes = corrigir_vagas(atual, esperado)
+        for zona in correcoes:
+            conn.execute("DELETE FROM ocupacao WHERE lot_id = ? AND zona = ?", (self.lot_id, zona))
+            conn.execute("DELETE FROM vagas_livres WHERE lot_id = ? AND zona = ?", (self.lot_id, zona))
+            if zona in esperado:
+                conn.execute(
+                    "INSERT INTO ocupacao (lot_id, zona, capacidade, ocupadas) VALUES (?, ?, ?, ?)",
+                    (self.lot_id, zona, esperado[zona]["capacidade"], esperado[zona]["ocupadas"])
+                )
+                conn.executemany(
+                    "INSERT INTO vagas_livres (lot_id, zona, vaga) VALUES (?, ?, ?)",
+                    [(self.lot_id, zona, vaga) for vaga in esperado[zona]["livres"]]
+                )
+        return correcoes
+
+    def get_capacity(self):
+        with self._lock:
+            return self._capacidade(self.conn)
+
+    def set_capacity(self, capacidade):
+        capacidade = {zona: int(vagas) for zona, vagas in capacidade.items() if vagas}
+        with self._transacao() as conn:
+            conn.execute(
+                "INSERT INTO configuracoes (lot_id, type, prices, version) VALUES (?, 'capacity_config', ?, 1) "
+                "ON CONFLICT (lot_id, type) DO UPDATE SET prices = excluded.prices, version = version + 1",
+                (self.lot_id, json.dumps(capacidade))
+            )
+            self._reconciliar(conn)
+
+    def occupancy(self):
+        with self._lock:
+            return {
+                zona: {"capacidade": capacidade, "ocupadas": ocupadas}
+                for zona, capacidade, ocupadas in self.conn.execute(
+                    "SELECT zona, capacidade, ocupadas FROM ocupacao WHERE lot_id = ?", (self.lot_id,)
+                )
+            }
+
+    def reconcile_occupancy(self):
+        with self._transacao() as conn:
+            return self._reconciliar(conn)
+
+    # --- Agregados de faturamento --------------------------------------
+
+    def increment_rollup(self, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia):
+        with self._transacao() as conn:
+            conn.execute(
+                "INSERT INTO faturamento_por_hora "
+                "(lot_id, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (lot_id, periodo, tipo_veiculo) DO UPDATE SET "
+                "quantidade = quantidade + excluded.quantidade, "
+                "faturamento = faturamento + excluded.faturamento, "
+                "minutos_permanencia = minutos_permanencia + excluded.minutos_permanencia",
+                (self.lot_id, _iso(periodo), tipo_veiculo, quantidade, faturamento, minutos_permanencia)
+            )
+
+    def _filtro_periodos(self, inicio, fim):
+        """WHERE dos agregados (e parâmetros) de todas as horas ou das de inicio a fim."""
+        if inicio is None:
+            return "lot_id = ?", (self.lot_id,)
+        return "lot_id = ? AND periodo >= ? AND periodo <= ?", (
+            self.lot_id, _iso(periodo_rollup(inicio)), _iso(periodo_rollup(fim))
+        )
+
+    def reset_rollups(self, inicio=None, fim=None):
+        filtro, parametros = self._filtro_periodos(inicio, fim)
+        with self._transacao() as conn:
+            conn.execute(f"DELETE FROM faturamento_por_hora WHERE {filtro}", parametros)
+
+    def _resumo(self, sql, parametros):
+        with self._lock:
+            linhas = self.conn.execute(sql, parametros).fetchall()
+        por_tipo = {tipo: int(quantidade) for tipo, quantidade, _ in linhas if quantidade > 0}
+        return {
+            "total_faturado": float(sum(faturamento or 0.0 for _, _, faturamento in linhas)),
+            "quantidade": sum(por_tipo.values()),
+            "por_tipo": dict(sorted(por_tipo.items(), key=lambda item: (-item[1], item[0]))),
+        }
+
+    def summarize_rollups(self, inicio, fim):
+        return self._resumo(
+            "SELECT tipo_veiculo, SUM(quantidade), SUM(faturamento) FROM faturamento_por_hora "
+            "WHERE lot_id = ? AND periodo >= ? AND periodo <= ? GROUP BY tipo_veiculo",
+            (self.lot_id, _iso(periodo_rollup(inicio)), _iso(fim))
+        )
+
+    def summarize_finished(self, inicio, fim):
+        return self._resumo(
+            "SELECT COALESCE(tipo_veiculo, 'Carro'), COUNT(*), SUM(COALESCE(valor_cobrado, 0)) FROM veiculos "
+            "WHERE lot_id = ? AND status = 'finalizado' AND saida >= ? AND saida <= ? GROUP BY 1",
+            (self.lot_id, _iso(inicio), _iso(fim))
+        )
+
+    def rebuild_rollups(self, dias_por_lote=31, inicio=None, fim=None):
+        filtro, parametros = self._filtro_periodos(inicio, fim)
+        saidas, limites = "", ()
+        if inicio is not None:
+            saidas = " AND saida >= ? AND saida <= ?"
+            limites = (_iso(periodo_rollup(inicio)), _iso(fim_periodo_rollup(fim)))
+        # Apagar e regravar na mesma transação: o Dashboard nunca vê as horas vazias
+        with self._transacao() as conn:
+            conn.execute(f"DELETE FROM faturamento_por_hora WHERE {filtro}", parametros)
+            conn.execute(
+                "INSERT INTO faturamento_por_hora "
+                "(lot_id, periodo, tipo_veiculo, quantidade, faturamento, minutos_permanencia) "
+                "SELECT lot_id, substr(saida, 1, 13) || ':00:00.000000', COALESCE(tipo_veiculo, 'Carro'), COUNT(*), "
+                "SUM(COALESCE(valor_cobrado, 0)), SUM((julianday(saida) - julianday(entrada)) * 1440) "
+                "FROM veiculos WHERE lot_id = ? AND status = 'finalizado' AND entrada IS NOT NULL AND saida IS NOT NULL"
+                f"{saidas} GROUP BY 2, 3",
+                (self.lot_id, *limites)
+            )
+            return conn.execute(f"SELECT COUNT(*) FROM faturamento_por_hora WHERE {filtro}", parametros).fetchone()[0]
+
+    def list_lots(self):
+        # Salta de pátio em pátio pelos índices que começam por lot_id (uma busca por pátio),
+        # em vez de percorrer todas as linhas como um SELECT DISTINCT
+        patios = {self.lot_id}
+        with self._lock:
+            for tabela in ("veiculos", "faturamento_por_hora", "configuracoes"):
+                patios.update(lot_id for (lot_id,) in self.conn.execute(
+                    f"WITH RECURSIVE patios (lot_id) AS ("
+                    f"SELECT MIN(lot_id) FROM {tabela} UNION ALL "
+                    f"SELECT (SELECT MIN(lot_id) FROM {tabela} WHERE lot_id > patios.lot_id) "
+                    f"FROM patios WHERE lot_id IS NOT NULL"
+                    f") SELECT lot_id FROM patios WHERE lot_id IS NOT NULL"
+                ))
+        return sorted(patios)
+
+
+class SQLitePriceConfigRepository(_SQLiteRepository, PriceConfigRepository):
+
+    def __init__(self, conn, lock=None, path=None, lot_id=DEFAULT_LOT):
+        super().__init__(conn, lock, lot_id)
+        self.path = path
+
+    @property
+    def cache_key(self):
+        return ("sqlite", self.path or id(self.conn), self.lot_id)
+
+    def get(self):
+        with self._lock:
+            linha = self.conn.execute(
+                "SELECT prices, version FROM configuracoes WHERE lot_id = ? AND type = 'price_config'", (self.lot_id,)
+            ).fetchone()
+        if linha is None:
+            return None, None
+        return json.loads(linha[0]), linha[1]
+
+    def get_version(self):
+        with self._lock:
+            linha = self.conn.execute(
+                "SELECT version FROM configuracoes WHERE lot_id = ? AND type = 'price_config'", (self.lot_id,)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def save(self, prices):
+        with self._transacao() as conn:
+            conn.execute(
+                "INSERT INTO configuracoes (lot_id, type, prices, version) VALUES (?, 'price_config', ?, 1) "
+                "ON CONFLICT (lot_id, type) DO UPDATE SET prices = excluded.prices, version = version + 1",
+                (self.lot_id, json.dumps(prices))
+            )
+            return conn.execute(
+                "SELECT version FROM configuracoes WHERE lot_id = ? AND type = 'price_config'", (self.lot_id,)
+            ).fetchone()[0]
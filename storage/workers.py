@@ -0,0 +1,69 @@
+# storage/workers.py
+"""
+Estrutura comum das threads em segundo plano do armazenamento (reconciliação da
+ocupação, arquivamento, espelho dos estacionados, replicação do diário): uma thread
+daemon com `stop_event` e `status`, e um registro que inicia uma única thread por
+armazenamento e para todas ao encerrar o processo.
+"""
+import atexit
+import threading
+from datetime import datetime
+
+
+class BackgroundWorker(threading.Thread):
+    """
+    Thread daemon que chama rodada() a cada `interval` segundos até stop(). `status`
+    guarda o resultado da última rodada (os campos retornados por rodada()), quando
+    ela terminou e o último erro. Threads com outro laço sobrescrevem run().
+    """
+
+    def __init__(self, name, interval=None, **status):
+        super().__init__(daemon=True, name=name)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.status = {"ok": True, **status, "error": None, "updated_at": None}
+
+    def rodada(self):
+        """Uma rodada do trabalho; retorna {campo: valor} a guardar em `status`."""
+        raise NotImplementedError
+
+    def _erro(self, erro):
+        self.status = {**self.status, "ok": False, "error": str(erro)}
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                resultado = self.rodada()
+                self.status = {**self.status, **resultado, "ok": True, "error": None, "updated_at": datetime.now()}
+            except Exception as e:
+                self._erro(e)
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class WorkerRegistry:
+    """Threads em execução por chave (o cache_key do armazenamento), paradas com o processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = {}
+        atexit.register(self.stop_all)
+
+    def start(self, chave, fabrica):
+        """Retorna a thread de `chave`, criando-a com fabrica() e iniciando-a na primeira chamada."""
+        with self._lock:
+            thread = self._threads.get(chave)
+            if thread is None:
+                thread = fabrica()
+                thread.start()
+                self._threads[chave] = thread
+            return thread
+
+    def stop_all(self):
+        with self._lock:
+            threads = list(self._threads.values())
+            self._threads.clear()
+        for thread in threads:
+            thread.stop()
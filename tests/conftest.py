@@ -0,0 +1,51 @@
+# tests/conftest.py
+"""
+Repositórios de cada backend para os testes de contrato: memória, SQLite em um arquivo
+temporário e MongoDB pelo mongomock (pulado se não estiver instalado).
+"""
+import pytest
+
+from storage.base import DEFAULT_LOT
+
+BACKENDS_TESTE = ["memory", "sqlite", "mongo"]
+
+
+@pytest.fixture(params=BACKENDS_TESTE)
+def abrir(request, tmp_path):
+    """Função que abre (repositório de veículos, repositório de preços) de um pátio no backend."""
+    if request.param == "memory":
+        from storage.memory import MemoryVehicleRepository, MemoryPriceConfigRepository
+
+        def abrir_patio(lot_id=DEFAULT_LOT):
+            return MemoryVehicleRepository(lot_id), MemoryPriceConfigRepository(lot_id)
+
+    elif request.param == "sqlite":
+        from storage.sqlite import connect, SQLiteVehicleRepository, SQLitePriceConfigRepository
+
+        caminho = str(tmp_path / "teste.db")
+        conn = connect(caminho)
+
+        def abrir_patio(lot_id=DEFAULT_LOT):
+            return SQLiteVehicleRepository(conn, lot_id=lot_id), SQLitePriceConfigRepository(conn, path=caminho, lot_id=lot_id)
+
+    else:
+        mongomock = pytest.importorskip("mongomock")
+        from storage.mongo import MongoVehicleRepository, MongoPriceConfigRepository
+
+        db = mongomock.MongoClient().estacionamento
+        MongoVehicleRepository(db).ensure_indexes()
+
+        def abrir_patio(lot_id=DEFAULT_LOT):
+            return MongoVehicleRepository(db, lot_id), MongoPriceConfigRepository(db, lot_id)
+
+    return abrir_patio
+
+
+@pytest.fixture
+def repo(abrir):
+    return abrir()[0]
+
+
+@pytest.fixture
+def config_repo(abrir):
+    return abrir()[1]
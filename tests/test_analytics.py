@@ -0,0 +1,118 @@
+# tests/test_analytics.py
+"""Retrato das análises do Dashboard: marca d'água incremental, janela de sobreposição, disco e atualização sem espera."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers import analytics_controller as analytics
+from storage.sqlite import connect, SQLiteVehicleRepository
+from utils.plates import campos_placa
+
+T0 = datetime(2024, 1, 2, 10, 0)
+
+
+@pytest.fixture(autouse=True)
+def sem_cache(monkeypatch):
+    # Cada teste começa sem retratos em memória nem atualizações em andamento
+    for nome in ("_retratos", "_travas", "_atualizacoes", "_erros"):
+        monkeypatch.setattr(analytics, nome, {})
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return SQLiteVehicleRepository(connect(str(tmp_path / "teste.db")))
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    return str(tmp_path / "retratos")
+
+
+def finalizado(repo, placa, saida, valor=10.0):
+    veiculo_id = repo.insert({
+        "placa": placa, "tipo_veiculo": "Carro", "entrada": saida - timedelta(hours=1), "status": "estacionado",
+        **campos_placa(placa),
+    })
+    repo.finalize(veiculo_id, {
+        "saida": saida, "status": "finalizado", "tipo_veiculo": "Carro", "entrada": saida - timedelta(hours=1),
+        "valor_cobrado": valor,
+    })
+
+
+def test_atualizacao_le_a_partir_da_marca_dagua(repo, pasta):
+    finalizado(repo, "AAA0001", T0)
+    finalizado(repo, "AAA0002", T0 + timedelta(hours=5))
+    primeiro = analytics.retrato(repo, pasta)
+    assert len(primeiro) == 2 and primeiro.marca_dagua == T0 + timedelta(hours=5)
+
+    # Gravada fora de ordem, dentro da janela de sobreposição: entra na atualização
+    finalizado(repo, "AAA0003", T0 + timedelta(hours=4, minutes=30))
+    # Gravada fora de ordem, antes da janela: só uma reconstrução completa a incorpora
+    finalizado(repo, "AAA0004", T0 + timedelta(hours=1))
+    segundo = analytics.retrato(repo, pasta, forcar=True)
+    assert len(segundo) == 3
+    assert list(segundo.saida.astype(datetime)) == [T0, T0 + timedelta(hours=4, minutes=30), T0 + timedelta(hours=5)]
+    assert segundo.completo_em == primeiro.completo_em
+
+    assert len(analytics.reconstruir_retrato(repo, pasta)) == 4
+
+
+def test_retrato_sem_mudancas_e_reaproveitado(repo, pasta):
+    finalizado(repo, "AAA0001", T0)
+    primeiro = analytics.retrato(repo, pasta)
+    assert analytics.retrato(repo, pasta, forcar=True) is primeiro
+    # Dentro do intervalo de atualização, nem consulta o armazenamento
+    finalizado(repo, "AAA0002", T0 + timedelta(hours=1))
+    assert analytics.retrato(repo, pasta) is primeiro
+
+
+def test_retrato_recarregado_do_disco(repo, pasta, monkeypatch):
+    finalizado(repo, "AAA0001", T0, 10.0)
+    finalizado(repo, "AAA0002", T0 + timedelta(days=40), 20.0)
+    analytics.retrato(repo, pasta)
+    arquivos = sorted(os.listdir(analytics._pasta(repo, pasta)))
+    assert arquivos == ["2024-01.parquet", "2024-02.parquet", "estado.json"]
+
+    # Outro processo: nada em memória, o retrato vem dos arquivos com a mesma marca d'água
+    monkeypatch.setattr(analytics, "_retratos", {})
+    recarregado = analytics._carregar(analytics._pasta(repo, pasta))
+    assert recarregado.marca_dagua == T0 + timedelta(days=40)
+    assert recarregado.tipos == ["Carro"] and list(recarregado.valor) == [10.0, 20.0]
+    assert len(analytics.retrato(repo, pasta)) == 2
+
+
+def test_descartar_refaz_o_retrato(repo, pasta):
+    finalizado(repo, "AAA0001", T0 + timedelta(hours=5))
+    analytics.retrato(repo, pasta)
+    finalizado(repo, "AAA0002", T0)
+    analytics.descartar_retrato(repo, pasta)
+    assert os.listdir(analytics._pasta(repo, pasta)) == []
+    assert len(analytics.retrato(repo, pasta)) == 2
+
+
+def test_retrato_sem_espera(repo, pasta):
+    finalizado(repo, "AAA0001", T0)
+    assert analytics.retrato_sem_espera(repo, pasta) is None
+    chave = analytics._chave(repo)
+    analytics._atualizacoes[chave].join(5)
+    pronto = analytics.retrato_sem_espera(repo, pasta)
+    assert len(pronto) == 1
+
+    # Vencido: continua servindo o último pronto enquanto a atualização corre
+    pronto.lido_em -= analytics.ANALYTICS_REFRESH_INTERVAL
+    finalizado(repo, "AAA0002", T0 + timedelta(hours=1))
+    assert analytics.retrato_sem_espera(repo, pasta) is pronto
+    analytics._atualizacoes[chave].join(5)
+    assert len(analytics.retrato_sem_espera(repo, pasta)) == 2
+
+
+def test_retrato_sem_espera_levanta_o_erro_sem_retrato_pronto(repo, pasta, monkeypatch):
+    def falhar(*args, **kwargs):
+        raise RuntimeError("armazenamento indisponível")
+
+    monkeypatch.setattr(repo, "iter_finished", falhar)
+    assert analytics.retrato_sem_espera(repo, pasta) is None
+    analytics._atualizacoes[analytics._chave(repo)].join(5)
+    with pytest.raises(RuntimeError, match="indisponível"):
+        analytics.retrato_sem_espera(repo, pasta)
@@ -0,0 +1,141 @@
+# tests/test_api.py
+"""Rotas da API das cancelas (api.py) sobre repositórios em memória, pelo TestClient do Starlette."""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("httpx", reason="o TestClient do Starlette exige o httpx")
+from starlette.testclient import TestClient
+
+import api
+from controllers.export_controller import COLUNAS_EXPORTACAO
+from controllers.vehicle_controller import registrar_entrada, registrar_saida
+from storage.memory import MemoryVehicleRepository, MemoryPriceConfigRepository
+
+T0 = datetime(2024, 1, 2, 10, 0)
+TOKEN = "segredo"
+
+
+@pytest.fixture
+def repo():
+    return MemoryVehicleRepository()
+
+
+@pytest.fixture
+def cliente(repo):
+    with TestClient(api.create_app(repo, MemoryPriceConfigRepository(), workers=4, token=TOKEN)) as cliente:
+        yield cliente
+
+
+def test_entrada_criada_e_placa_ja_estacionada(cliente):
+    resposta = cliente.post("/entradas", json={"placa": "abc1c34", "tipo_veiculo": "Moto"})
+    assert resposta.status_code == 201
+    assert resposta.json()["placa"] == "ABC1C34" and resposta.json()["tipo_veiculo"] == "Moto"
+
+    assert cliente.post("/entradas", json={"placa": "ABC-1C34"}).status_code == 409
+
+
+@pytest.mark.parametrize("corpo", [
+    {},
+    {"placa": "ABC1C34", "tipo_veiculo": "Avião"},
+    {"placa": "ABC1C34", "entrada": "ontem"},
+    ["ABC1C34"],
+])
+def test_entrada_invalida(cliente, corpo):
+    resposta = cliente.post("/entradas", json=corpo)
+    assert resposta.status_code == 422 and resposta.json()["erro"]
+
+
+def test_entrada_sem_json(cliente):
+    assert cliente.post("/entradas", content=b"placa=ABC1C34").status_code == 422
+
+
+def test_saida_de_placa_nao_estacionada(cliente):
+    resposta = cliente.post("/saidas", json={"placa": "XYZ9A99"})
+    assert resposta.status_code == 404
+
+
+def test_saida_cobra_a_permanencia(cliente):
+    cliente.post("/entradas", json={"placa": "ABC1C34", "entrada": T0.isoformat()})
+    resposta = cliente.post("/saidas", json={"placa": "ABC1C34", "saida": (T0 + timedelta(hours=2)).isoformat()})
+    assert resposta.status_code == 200 and resposta.json()["valor_cobrado"] > 0
+    assert cliente.post("/saidas", json={"placa": "ABC1C34"}).status_code == 404
+
+
+def test_lote_com_resultado_por_operacao(cliente):
+    resposta = cliente.post("/lote", json={"operacoes": [
+        {"operacao": "entrada", "placa": "ABC1C34", "entrada": T0.isoformat()},
+        {"operacao": "entrada", "placa": "ABC1C34"},
+        {"operacao": "cotacao", "placa": "ABC1C34", "saida": (T0 + timedelta(hours=1)).isoformat()},
+        {"operacao": "saida", "placa": "XYZ9A99"},
+        {"operacao": "estorno", "placa": "ABC1C34"},
+        "ABC1C34",
+    ]})
+    assert resposta.status_code == 200
+    assert [r["status"] for r in resposta.json()["resultados"]] == [201, 409, 200, 404, 422, 422]
+
+
+def test_lote_acima_do_limite(cliente, monkeypatch):
+    monkeypatch.setattr(api, "LIMITE_LOTE", 2)
+    operacoes = [{"operacao": "entrada", "placa": f"AAA000{i}"} for i in range(3)]
+    resposta = cliente.post("/lote", json={"operacoes": operacoes})
+    assert resposta.status_code == 422 and "2" in resposta.json()["erro"]
+    assert cliente.post("/lote", json={"operacoes": operacoes[:2]}).status_code == 200
+    assert cliente.post("/lote", json={"operacoes": "AAA0001"}).status_code == 422
+
+
+@pytest.mark.parametrize("rota,metodo", [("/entradas", "post"), ("/lote", "post"), ("/ocupacao", "get")])
+def test_patio_nao_atendido(cliente, rota, metodo):
+    if metodo == "post":
+        resposta = cliente.post(rota, json={"placa": "ABC1C34", "operacoes": [], "lot_id": "outro"})
+    else:
+        resposta = cliente.get(rota, params={"lot_id": "outro"})
+    assert resposta.status_code == 422 and "outro" in resposta.json()["erro"]
+
+
+def test_exportacao_exige_token(repo):
+    with TestClient(api.create_app(repo, MemoryPriceConfigRepository(), workers=4, token="")) as cliente:
+        assert cliente.get("/exportacao").status_code == 403
+
+
+def test_exportacao_token_errado(cliente):
+    assert cliente.get("/exportacao").status_code == 401
+    resposta = cliente.get("/exportacao", headers={"Authorization": "Bearer outro"})
+    assert resposta.status_code == 401 and resposta.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_exportacao_csv(cliente, repo):
+    for placa, tipo, dia in [("ABC1C34", "Carro", 2), ("DEF5G78", "Moto", 2), ("GHI9J12", "Carro", 5)]:
+        entrada = T0.replace(day=dia)
+        registrar_entrada(repo, placa, tipo, entrada)
+        veiculo = repo.find_parked(placa)
+        registrar_saida(repo, veiculo["_id"], entrada, entrada + timedelta(hours=1), tipo, 10.0)
+
+    autorizacao = {"Authorization": f"Bearer {TOKEN}"}
+    with cliente.stream("GET", "/exportacao", headers=autorizacao, params={"fim": "2024-01-03"}) as resposta:
+        assert resposta.status_code == 200
+        assert resposta.headers["content-type"].startswith("text/csv")
+        linhas = "".join(resposta.iter_text()).splitlines()
+    assert linhas[0] == ",".join(COLUNAS_EXPORTACAO)
+    assert sorted(linha.split(",")[0] for linha in linhas[1:]) == ["ABC1C34", "DEF5G78"]
+
+    resposta = cliente.get("/exportacao", headers=autorizacao, params={"tipo": "Moto"})
+    assert [linha.split(",")[0] for linha in resposta.text.splitlines()[1:]] == ["DEF5G78"]
+    assert cliente.get("/exportacao", headers=autorizacao, params={"inicio": "02/01/2024"}).status_code == 422
+
+
+def test_patios_abertos_uma_vez(monkeypatch):
+    abertos = []
+
+    def open_repositories(backend, mongo_uri=None, lot_id=None):
+        abertos.append(lot_id)
+        return MemoryVehicleRepository(lot_id or "padrao"), MemoryPriceConfigRepository(lot_id or "padrao")
+
+    monkeypatch.setattr(api, "open_repositories", open_repositories)
+    with TestClient(api.create_app(workers=4, patios=["norte"])) as cliente:
+        for _ in range(3):
+            assert cliente.get("/ocupacao", params={"lot_id": "norte"}).status_code == 200
+        assert cliente.post("/entradas", json={"placa": "ABC1C34", "lot_id": "norte"}).status_code == 201
+        assert cliente.post("/entradas", json={"placa": "ABC1C34", "lot_id": "norte"}).status_code == 409
+        assert cliente.get("/ocupacao", params={"lot_id": "sul"}).status_code == 422
+    assert abertos == [None, "norte"]
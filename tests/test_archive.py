@@ -0,0 +1,118 @@
+# tests/test_archive.py
+"""Arquivamento dos finalizados nas partições mensais do MongoDB e leitura do histórico através delas."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from storage.archive import ArchiveWorker, start_archiver
+from storage.mongo import MongoVehicleRepository
+from utils.plates import campos_placa
+
+mongomock = pytest.importorskip("mongomock")
+
+T0 = datetime(2024, 1, 20, 10, 0)
+CORTE = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def repo():
+    repo = MongoVehicleRepository(mongomock.MongoClient().estacionamento)
+    repo.ensure_indexes()
+    return repo
+
+
+def finalizado(repo, placa, saida, tipo="Carro", valor=10.0):
+    entrada = saida - timedelta(hours=1)
+    veiculo_id = repo.insert({"placa": placa, "tipo_veiculo": tipo, "entrada": entrada, "status": "estacionado", **campos_placa(placa)})
+    repo.finalize(veiculo_id, {
+        "saida": saida, "status": "finalizado", "tipo_veiculo": tipo, "entrada": entrada, "valor_cobrado": valor,
+    })
+    return veiculo_id
+
+
+def povoar(repo):
+    """Dois finalizados em janeiro, um em fevereiro, um recente e um estacionado."""
+    finalizado(repo, "JAN0001", T0)
+    finalizado(repo, "JAN0002", T0 + timedelta(days=5), "Moto")
+    finalizado(repo, "FEV0001", T0 + timedelta(days=20))
+    finalizado(repo, "MAR0001", CORTE + timedelta(days=3))
+    repo.insert({"placa": "EST0001", "tipo_veiculo": "Carro", "entrada": T0, "status": "estacionado", **campos_placa("EST0001")})
+
+
+def test_arquiva_por_mes_de_saida(repo):
+    povoar(repo)
+    assert repo.archive_finished(CORTE, tamanho_lote=2) == 3
+
+    db = repo.db
+    assert sorted(v["placa"] for v in db.veiculos_arquivo_2024_01.find()) == ["JAN0001", "JAN0002"]
+    assert [v["placa"] for v in db.veiculos_arquivo_2024_02.find()] == ["FEV0001"]
+    assert sorted(v["placa"] for v in db.veiculos.find()) == ["EST0001", "MAR0001"]
+    assert {"lot_status_saida_id", "lot_placa_tokens_status_saida_id"} <= set(db.veiculos_arquivo_2024_01.index_information())
+    # Uma segunda rodada não encontra mais nada a mover
+    assert repo.archive_finished(CORTE) == 0
+
+
+def test_arquivamento_interrompido_nao_duplica(repo):
+    povoar(repo)
+    # Queda depois de copiar para a partição e antes de remover de `veiculos`
+    copiado = repo.db.veiculos.find_one({"placa": "JAN0001"})
+    repo.db.veiculos_arquivo_2024_01.insert_one(copiado)
+
+    assert repo.archive_finished(CORTE) == 3
+    assert repo.db.veiculos_arquivo_2024_01.count_documents({}) == 2
+
+
+def test_arquiva_so_o_proprio_patio(repo):
+    outro = MongoVehicleRepository(repo.db, "outro")
+    finalizado(outro, "OUT0001", T0)
+    finalizado(repo, "JAN0001", T0)
+    assert repo.archive_finished(CORTE) == 1
+    assert [v["placa"] for v in repo.db.veiculos.find()] == ["OUT0001"]
+    assert [v["placa"] for v in outro.list_history()] == ["OUT0001"]
+    assert [v["placa"] for v in repo.list_history()] == ["JAN0001"]
+
+
+def test_historico_le_as_particoes(repo):
+    povoar(repo)
+    antes = [v["placa"] for v in repo.list_history(limite=10)]
+    repo.archive_finished(CORTE)
+    assert [v["placa"] for v in repo.list_history(limite=10)] == antes == ["MAR0001", "FEV0001", "JAN0002", "JAN0001"]
+
+    # Páginas de dois, com o cursor (saída, _id) da última linha, atravessando as coleções
+    paginas, apos = [], None
+    while True:
+        pagina = repo.list_history(limite=2, apos=apos)
+        if not pagina:
+            break
+        paginas.append([v["placa"] for v in pagina])
+        apos = (pagina[-1]["saida"], pagina[-1]["_id"])
+    assert paginas == [["MAR0001", "FEV0001"], ["JAN0002", "JAN0001"]]
+
+    assert [v["placa"] for v in repo.list_history(busca="JAN")] == ["JAN0002", "JAN0001"]
+
+
+def test_iter_finished_intercala_as_colecoes(repo):
+    povoar(repo)
+    repo.archive_finished(CORTE)
+
+    assert [v["placa"] for v in repo.iter_finished(tamanho_lote=1)] == ["JAN0001", "JAN0002", "FEV0001", "MAR0001"]
+    assert [v["placa"] for v in repo.iter_finished(T0 + timedelta(days=1), CORTE)] == ["JAN0002", "FEV0001"]
+    assert [v["placa"] for v in repo.iter_finished(tipos=["Moto"])] == ["JAN0002"]
+    assert repo.summarize_finished(T0, CORTE + timedelta(days=30))["quantidade"] == 4
+
+
+def test_delete_remove_da_particao(repo):
+    veiculo_id = finalizado(repo, "JAN0001", T0)
+    repo.archive_finished(CORTE)
+    assert repo.delete(veiculo_id)["placa"] == "JAN0001"
+    assert repo.db.veiculos_arquivo_2024_01.count_documents({}) == 0
+    assert repo.list_history() == []
+
+
+def test_rodada_do_arquivador(repo):
+    finalizado(repo, "ANT0001", datetime.now() - timedelta(days=40))
+    finalizado(repo, "REC0001", datetime.now() - timedelta(days=1))
+    assert start_archiver(repo, dias=0) is None
+
+    assert ArchiveWorker(repo, dias=30, pausa=0).rodada() == {"movidos": 1}
+    assert [v["placa"] for v in repo.db.veiculos.find()] == ["REC0001"]
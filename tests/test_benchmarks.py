@@ -0,0 +1,48 @@
+# tests/test_benchmarks.py
+"""Harness de benchmark: tráfego sintético reprodutível, execução curta e detecção de regressões."""
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from benchmarks.runner import comparar, executar, formatar
+from benchmarks.traffic import gerar_eventos_dia, gerar_historico
+from storage.memory import MemoryVehicleRepository
+
+DIA = date(2024, 1, 2)
+
+
+def test_trafego_reprodutivel_pela_seed():
+    assert gerar_eventos_dia(np.random.default_rng(7), DIA, 200) == gerar_eventos_dia(np.random.default_rng(7), DIA, 200)
+    eventos = gerar_eventos_dia(np.random.default_rng(7), DIA, 200)
+    assert [e[1] for e in eventos] == sorted(e[1] for e in eventos)
+    assert all(e[1].date() == DIA for e in eventos)
+    entradas = sum(1 for e in eventos if e[0] == "entrada")
+    assert entradas >= len(eventos) - entradas
+
+
+def test_historico_em_lotes_termina_no_fim():
+    fim = datetime(2024, 1, 2)
+    lotes = list(gerar_historico(np.random.default_rng(1), 250, fim, tamanho_lote=100))
+    assert [len(lote) for lote in lotes] == [100, 100, 50]
+    veiculos = [v for lote in lotes for v in lote]
+    assert all(v["status"] == "finalizado" and v["entrada"] < fim and v["saida"] > v["entrada"] for v in veiculos)
+    assert all(v["valor_cobrado"] >= 0 for v in veiculos)
+
+
+def test_executar_mede_cada_operacao():
+    resultado = executar(MemoryVehicleRepository(), historico=300, veiculos_por_dia=120, consultas_a_cada=10)
+    operacoes = resultado["operacoes"]
+    assert resultado["backend"] == "memory" and resultado["eventos"] > 0
+    for operacao in ("seed_insert_many", "rebuild_rollups", "registrar_entrada", "listar_estacionados", "dashboard_rollups"):
+        assert operacoes[operacao]["quantidade"] > 0
+        assert operacoes[operacao]["p50_ms"] <= operacoes[operacao]["p95_ms"] <= operacoes[operacao]["max_ms"]
+    assert "registrar_entrada" in formatar(resultado)
+
+
+def test_comparar_acusa_so_o_que_piorou_alem_da_tolerancia():
+    anterior = {"operacoes": {"a": {"p95_ms": 10.0}, "b": {"p95_ms": 10.0}, "c": {"p95_ms": 0.0}}}
+    atual = {"operacoes": {"a": {"p95_ms": 13.0}, "b": {"p95_ms": 11.0}, "c": {"p95_ms": 5.0}, "nova": {"p95_ms": 1.0}}}
+    regressoes = comparar(atual, anterior, tolerancia=0.2)
+    assert [r[0] for r in regressoes] == ["a"]
+    assert regressoes[0][3] == pytest.approx(0.3)
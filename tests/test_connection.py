@@ -0,0 +1,102 @@
+# tests/test_connection.py
+"""Cliente MongoDB compartilhado: reaproveitamento, encerramento e o health check em segundo plano."""
+import threading
+
+import pytest
+
+from utils import connection
+
+
+class ClienteFalso:
+    """Substituto do MongoClient: conta as criações e responde (ou não) ao ping."""
+
+    criados = []
+    bloquear = {}
+
+    def __init__(self, uri, **opcoes):
+        evento = self.bloquear.get(uri)
+        if evento is not None:
+            evento.wait(5)
+        self.uri = uri
+        self.opcoes = opcoes
+        self.fora_do_ar = uri.endswith("fora")
+        self.fechado = False
+        self.admin = self
+        self.criados.append(self)
+
+    def command(self, nome):
+        if self.fora_do_ar:
+            raise OSError("servidor inacessível")
+        return {"ok": 1}
+
+    def close(self):
+        self.fechado = True
+
+
+@pytest.fixture(autouse=True)
+def cliente_falso(monkeypatch):
+    monkeypatch.setattr(connection, "MongoClient", ClienteFalso)
+    monkeypatch.setattr(connection, "HEALTH_CHECK_INTERVAL", 3600)
+    monkeypatch.setattr(ClienteFalso, "criados", [])
+    monkeypatch.setattr(ClienteFalso, "bloquear", {})
+    yield
+    connection.close_all()
+
+
+def test_cliente_reaproveitado_por_uri_e_opcoes():
+    cliente = connection.get_client("mongodb://a")
+    assert connection.get_client("mongodb://a") is cliente
+    assert connection.get_client("mongodb://b") is not cliente
+    assert connection.get_client("mongodb://a", maxPoolSize=5) is not cliente
+    assert len(ClienteFalso.criados) == 3
+    assert cliente.opcoes["maxPoolSize"] == connection.DEFAULT_CLIENT_OPTIONS["maxPoolSize"]
+
+
+def test_servidor_inacessivel_nao_fica_em_cache():
+    with pytest.raises(ConnectionError, match="inacessível"):
+        connection.get_client("mongodb://fora")
+    assert ClienteFalso.criados[0].fechado
+    assert connection.connection_status("mongodb://fora") is None
+
+
+def test_uri_lenta_nao_bloqueia_as_outras():
+    liberar = threading.Event()
+    ClienteFalso.bloquear["mongodb://lenta"] = liberar
+    lenta = threading.Thread(target=connection.get_client, args=("mongodb://lenta",))
+    lenta.start()
+    try:
+        # Enquanto a criação da URI lenta espera, as outras (novas ou já em cache) respondem
+        assert connection.get_client("mongodb://rapida").uri == "mongodb://rapida"
+        assert lenta.is_alive()
+    finally:
+        liberar.set()
+        lenta.join(5)
+    assert connection.get_client("mongodb://lenta").uri == "mongodb://lenta"
+    assert len(ClienteFalso.criados) == 2
+
+
+def test_status_do_health_check():
+    cliente = connection.get_client("mongodb://a")
+    status = connection.connection_status("mongodb://a")
+    assert status["ok"] and status["error"] is None
+
+    # O monitor guarda a falha do último ping, sem derrubar o cliente
+    monitor = connection._clients[connection._client_key("mongodb://a", connection.DEFAULT_CLIENT_OPTIONS)]["monitor"]
+    cliente.fora_do_ar = True
+    monitor.check()
+    status = connection.connection_status("mongodb://a")
+    assert not status["ok"] and "inacessível" in status["error"]
+
+
+def test_close_client_e_close_all():
+    a, b = connection.get_client("mongodb://a"), connection.get_client("mongodb://b")
+    monitor = connection._clients[connection._client_key("mongodb://b", connection.DEFAULT_CLIENT_OPTIONS)]["monitor"]
+    connection.close_client("mongodb://a")
+    assert a.fechado and not b.fechado
+    assert connection.connection_status("mongodb://a") is None
+
+    connection.close_all()
+    assert b.fechado and monitor.stop_event.is_set()
+    assert connection.connection_status("mongodb://b") is None
+    # Depois de encerrado, um novo pedido cria outro cliente
+    assert connection.get_client("mongodb://b") is not b
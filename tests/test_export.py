@@ -0,0 +1,99 @@
+# tests/test_export.py
+"""Exportação do histórico em CSV e Parquet, lote a lote, nos três backends."""
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.export_controller import COLUNAS_EXPORTACAO, exportar, exportar_parquet, iter_csv
+from utils.plates import campos_placa
+
+T0 = datetime(2024, 1, 2, 10, 0)
+
+
+def finalizado(repo, placa, tipo="Carro", entrada=T0, horas=1, valor=10.0):
+    veiculo_id = repo.insert({"placa": placa, "tipo_veiculo": tipo, "entrada": entrada, "status": "estacionado", **campos_placa(placa)})
+    repo.finalize(veiculo_id, {
+        "saida": entrada + timedelta(hours=horas), "status": "finalizado", "tipo_veiculo": tipo, "entrada": entrada,
+        "valor_cobrado": valor,
+    })
+
+
+def linhas(pedacos):
+    return list(csv.DictReader(io.StringIO("".join(pedacos))))
+
+
+def test_csv_um_pedaco_por_lote(repo):
+    for i in range(5):
+        finalizado(repo, f"AAA000{i}", entrada=T0 + timedelta(minutes=i))
+    pedacos = list(iter_csv(repo, tamanho_lote=2))
+    # O cabeçalho sai junto do primeiro lote; o último lote tem o registro que sobrou
+    assert len(pedacos) == 3
+    assert pedacos[0].splitlines()[0] == ",".join(COLUNAS_EXPORTACAO)
+    assert [len(pedaco.splitlines()) for pedaco in pedacos] == [3, 2, 1]
+    assert sorted(linha["placa"] for linha in linhas(pedacos)) == [f"AAA000{i}" for i in range(5)]
+
+
+def test_csv_lote_exato_sem_pedaco_vazio(repo):
+    for i in range(4):
+        finalizado(repo, f"AAA000{i}", entrada=T0 + timedelta(minutes=i))
+    pedacos = list(iter_csv(repo, tamanho_lote=2))
+    assert len(pedacos) == 2 and all(pedacos)
+
+
+def test_csv_sem_registros_so_cabecalho(repo):
+    finalizado(repo, "AAA0001", entrada=T0)
+    repo.insert({"placa": "BBB0001", "tipo_veiculo": "Carro", "entrada": T0, "status": "estacionado", **campos_placa("BBB0001")})
+    assert list(iter_csv(repo, inicio=T0 + timedelta(days=1))) == [",".join(COLUNAS_EXPORTACAO) + "\r\n"]
+
+
+def test_csv_valores_da_linha(repo):
+    finalizado(repo, "ABC1C34", "Moto", horas=1.5, valor=7.5)
+    [linha] = linhas(iter_csv(repo))
+    assert linha == {
+        "placa": "ABC1C34",
+        "tipo_veiculo": "Moto",
+        "entrada": T0.isoformat(),
+        "saida": (T0 + timedelta(hours=1.5)).isoformat(),
+        "permanencia_minutos": "90.0",
+        "valor_cobrado": "7.5",
+    }
+
+
+def test_filtra_por_tipo_e_periodo(repo):
+    finalizado(repo, "AAA0001", "Carro", entrada=T0)
+    finalizado(repo, "AAA0002", "Moto", entrada=T0)
+    finalizado(repo, "AAA0003", "Carro", entrada=T0 + timedelta(days=3))
+    finalizado(repo, "AAA0004", "Caminhão", entrada=T0 + timedelta(days=3))
+
+    assert {linha["placa"] for linha in linhas(iter_csv(repo, tipos=["Carro"]))} == {"AAA0001", "AAA0003"}
+    assert {linha["placa"] for linha in linhas(iter_csv(repo, fim=T0 + timedelta(days=1)))} == {"AAA0001", "AAA0002"}
+    periodo = linhas(iter_csv(repo, T0 + timedelta(days=1), T0 + timedelta(days=5), ["Carro", "Caminhão"]))
+    assert {linha["placa"] for linha in periodo} == {"AAA0003", "AAA0004"}
+
+
+def test_parquet_um_row_group_por_lote(repo, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for i in range(5):
+        finalizado(repo, f"AAA000{i}", "Moto" if i % 2 else "Carro", entrada=T0 + timedelta(minutes=i))
+    destino = tmp_path / "historico.parquet"
+
+    assert exportar_parquet(repo, str(destino), tamanho_lote=2) == 5
+    arquivo = pq.ParquetFile(destino)
+    assert arquivo.metadata.num_row_groups == 3
+    assert arquivo.schema_arrow.names == COLUNAS_EXPORTACAO
+    tabela = arquivo.read().to_pylist()
+    assert sorted(linha["placa"] for linha in tabela) == [f"AAA000{i}" for i in range(5)]
+    assert all(linha["permanencia_minutos"] == 60.0 and linha["saida"] - linha["entrada"] == timedelta(hours=1) for linha in tabela)
+
+    assert exportar_parquet(repo, str(destino), tipos=["Moto"]) == 2
+    assert pq.read_table(destino).column("tipo_veiculo").to_pylist() == ["Moto", "Moto"]
+
+
+def test_exportar_por_formato(repo, tmp_path):
+    finalizado(repo, "AAA0001")
+    with open(tmp_path / "historico.csv", "w", newline="") as destino:
+        assert exportar(repo, destino, "csv") == 1
+    with pytest.raises(ValueError):
+        exportar(repo, tmp_path / "historico.xlsx", "xlsx")
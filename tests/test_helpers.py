@@ -0,0 +1,106 @@
+# tests/test_helpers.py
+"""Equivalência entre calcular_valor (uma cotação) e calcular_valores (tabelas compiladas)."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.helpers import calcular_valor, calcular_valores
+
+TIPOS = ["Carro", "Moto", "Caminhão", "Van", "Bicicleta"]
+
+
+def valor_legado(entrada, saida, tipo_veiculo, precos_por_hora):
+    """A conta original: frações de 15 minutos arredondadas para cima, no mínimo uma."""
+    preco_hora = precos_por_hora.get(tipo_veiculo, 10.0)
+    tempo_total_minutos = (saida - entrada).total_seconds() / 60
+    unidades_de_15_minutos = (tempo_total_minutos + 14) // 15
+    return max((unidades_de_15_minutos / 4) * preco_hora, preco_hora / 4)
+
+
+def permanencias(seed, quantidade=2000):
+    """Entradas e saídas aleatórias, com permanências nulas e entradas perto da meia-noite."""
+    rng = np.random.default_rng(seed)
+    base = datetime(2026, 1, 1)
+    entradas, saidas = [], []
+    for i in range(quantidade):
+        if i % 4 == 0:
+            # Em torno da virada do dia
+            entrada = base + timedelta(days=int(rng.integers(0, 60)), minutes=int(rng.integers(-30, 30)))
+        else:
+            entrada = base + timedelta(seconds=int(rng.integers(0, 60 * 86400)), microseconds=int(rng.integers(0, 10**6)))
+        escolha = i % 5
+        if escolha == 0:
+            duracao = timedelta(0)
+        elif escolha == 1:
+            duracao = timedelta(seconds=int(rng.integers(0, 600)))
+        elif escolha == 2:
+            # Exatamente sobre os limites das frações
+            duracao = timedelta(minutes=15 * int(rng.integers(1, 200)))
+        else:
+            duracao = timedelta(seconds=int(rng.integers(0, 3 * 86400)), microseconds=int(rng.integers(0, 10**6)))
+        entradas.append(entrada)
+        saidas.append(entrada + duracao)
+    tipos = [TIPOS[j] if j < len(TIPOS) else "Outro" for j in rng.integers(0, len(TIPOS) + 1, quantidade)]
+    return entradas, saidas, tipos
+
+
+def tabela_precos(seed):
+    rng = np.random.default_rng(seed)
+    # Alguns tipos ficam de fora e usam o preço padrão
+    return {tipo: float(round(rng.uniform(0.5, 40.0), 2)) for tipo in TIPOS if rng.random() < 0.8}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_escalar_igual_ao_vetorizado(seed):
+    entradas, saidas, tipos = permanencias(seed)
+    precos = tabela_precos(seed)
+    valores = calcular_valores(entradas, saidas, tipos, precos)
+    for entrada, saida, tipo, valor in zip(entradas, saidas, tipos, valores):
+        assert calcular_valor(entrada, saida, tipo, precos) == valor
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_preco_por_hora_igual_a_conta_original(seed):
+    entradas, saidas, tipos = permanencias(seed, quantidade=500)
+    precos = tabela_precos(seed)
+    valores = calcular_valores(entradas, saidas, tipos, precos)
+    for entrada, saida, tipo, valor in zip(entradas, saidas, tipos, valores):
+        # As tabelas compiladas arredondam para centavos
+        assert valor == pytest.approx(valor_legado(entrada, saida, tipo, precos), abs=0.005 + 1e-9)
+
+
+def test_permanencia_nula_cobra_uma_fracao():
+    entrada = datetime(2026, 3, 1, 23, 59, 59)
+    assert calcular_valor(entrada, entrada, "Carro", {"Carro": 10.0}) == 2.5
+    assert calcular_valores([entrada], entrada, "Carro", {"Carro": 10.0}).tolist() == [2.5]
+
+
+def test_textos_iso_e_saida_unica():
+    precos = {"Moto": 6.0}
+    entradas = ["2026-03-01T23:50:00", "2026-03-02T00:10:00"]
+    valores = calcular_valores(entradas, "2026-03-02T01:00:00", "Moto", precos)
+    esperado = [calcular_valor(entrada, "2026-03-02T01:00:00", "Moto", precos) for entrada in entradas]
+    assert valores.tolist() == esperado
+
+
+
+def test_datas_com_fuso_no_horario_local(monkeypatch):
+    import time
+
+    # Fuso local fixo (UTC-3): 01:30Z é 22:30 local, dentro da faixa noturna
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    try:
+        precos = {"Carro": {"preco_hora": 10.0, "faixas": [{"inicio": "22:00", "fim": "06:00", "preco_hora": 2.0}]}}
+        entradas = ["2026-03-02T01:30:00+00:00", "2026-03-02T03:00:00Z", datetime.fromisoformat("2026-03-01T22:00:00-03:00")]
+        saida = "2026-03-02T08:15:00+00:00"
+        vetorizado = calcular_valores(entradas, saida, "Carro", precos).tolist()
+        assert vetorizado == [calcular_valor(entrada, saida, "Carro", precos) for entrada in entradas]
+        # As mesmas datas já no horário local, como chegam da importação: toda a permanência é noturna
+        locais = [datetime(2026, 3, 1, 22, 30), datetime(2026, 3, 2, 0, 0), datetime(2026, 3, 1, 22, 0)]
+        assert vetorizado == calcular_valores(locais, datetime(2026, 3, 2, 5, 15), "Carro", precos).tolist()
+        assert vetorizado[0] == 2.0 * 6.75
+    finally:
+        monkeypatch.undo()
+        time.tzset()
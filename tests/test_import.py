@@ -0,0 +1,96 @@
+# tests/test_import.py
+"""Importação de movimentos: reimportar um arquivo não duplica histórico nem agregados."""
+import os
+from datetime import datetime
+
+import pytest
+
+from controllers.import_controller import importar, validar_linha
+
+MES = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+LINHAS = """placa,tipo_veiculo,entrada,saida,valor_cobrado
+ABC1234,Carro,2024-01-02T08:00:00,2024-01-02T10:00:00,20
+DEF5678,Moto,2024-01-02T09:00:00,2024-01-02T09:30:00,0
+GHI9012,Carro,2024-01-02T11:00:00,2024-01-02T12:00:00,
+JKL3456,Carro,2024-01-02T13:00:00,,
+XYZ0000,Carro,2024-01-02T13:00:00,2024-01-02T12:00:00,
+"""
+
+
+def arquivo_csv(tmp_path, conteudo=LINHAS):
+    caminho = tmp_path / "movimentos.csv"
+    caminho.write_text(conteudo, encoding="utf-8")
+    return str(caminho)
+
+
+def test_valor_zero_e_cortesia_e_nao_cobranca_ausente():
+    linha = {"placa": "ABC1234", "entrada": "2024-01-02T08:00:00", "saida": "2024-01-02T10:00:00"}
+    assert validar_linha({**linha, "valor_cobrado": 0})["valor_cobrado"] == 0.0
+    assert validar_linha({**linha, "valor_cobrado": "0,00"})["valor_cobrado"] == 0.0
+    assert "valor_cobrado" not in validar_linha({**linha, "valor_cobrado": ""})
+    assert "valor_cobrado" not in validar_linha({**linha, "valor_cobrado": None})
+
+
+def test_importa_uma_vez(repo, tmp_path):
+    caminho = arquivo_csv(tmp_path)
+    estado = importar(repo, caminho, tamanho_lote=2)
+    assert (estado["importados"], estado["erros"], estado["repetidas"]) == (4, 1, 0)
+    assert [v["placa"] for v in repo.list_parked()] == ["JKL3456"]
+    historico = {v["placa"]: v["valor_cobrado"] for v in repo.list_history()}
+    assert historico["DEF5678"] == 0.0 and historico["ABC1234"] == 20.0 and historico["GHI9012"] > 0
+
+
+def exigir_reconstrucao(repo):
+    """Na retomada, os agregados do lote são refeitos com rebuild_rollups, que grava com bulk_write."""
+    if repo.name == "mongo":
+        from pymongo import ReplaceOne
+
+        try:
+            repo.db.teste_lote.bulk_write([ReplaceOne({"_id": 0}, {"x": 1}, upsert=True)])
+        except TypeError:
+            pytest.skip("o mongomock não executa ReplaceOne em bulk_write com esta versão do pymongo")
+
+
+def test_reimportar_apos_queda_nao_duplica(repo, tmp_path):
+    exigir_reconstrucao(repo)
+    caminho = arquivo_csv(tmp_path)
+    importar(repo, caminho, tamanho_lote=2)
+    resumo = repo.summarize_rollups(*MES)
+
+    # Queda entre a gravação do lote e o checkpoint: o arquivo volta a ser lido desde o início
+    os.remove(caminho + ".checkpoint.json")
+    estado = importar(repo, caminho, tamanho_lote=2)
+    assert (estado["importados"], estado["repetidas"]) == (0, 4)
+    assert len(repo.list_history()) == 3 and len(repo.list_parked()) == 1
+    assert repo.summarize_rollups(*MES) == resumo
+
+    estado = importar(repo, caminho, recomecar=True)
+    assert (estado["importados"], estado["erros"], estado["repetidas"]) == (0, 1, 4)
+    assert repo.summarize_rollups(*MES) == resumo
+
+
+def test_queda_antes_dos_agregados_e_recuperada(repo, tmp_path, monkeypatch):
+    exigir_reconstrucao(repo)
+    caminho = arquivo_csv(tmp_path)
+    # Queda depois de gravar o primeiro lote e antes de somar os agregados dele
+    with monkeypatch.context() as m:
+        m.setattr(repo, "increment_rollup", lambda *args: (_ for _ in ()).throw(ConnectionError("queda")))
+        with pytest.raises(ConnectionError):
+            importar(repo, caminho, tamanho_lote=2)
+    assert len(repo.list_history()) == 2 and repo.summarize_rollups(*MES)["quantidade"] == 0
+
+    estado = importar(repo, caminho, tamanho_lote=2)
+    assert (estado["importados"], estado["repetidas"]) == (2, 2)
+    assert repo.summarize_rollups(*MES) == repo.summarize_finished(*MES)
+    assert repo.summarize_rollups(*MES)["quantidade"] == 3
+
+
+def test_outro_conteudo_e_outra_importacao(repo, tmp_path):
+    importar(repo, arquivo_csv(tmp_path))
+    outro = tmp_path / "outro"
+    outro.mkdir()
+    caminho = arquivo_csv(outro, LINHAS.replace("ABC1234", "ABC1235").replace("JKL3456,Carro,2024-01-02T13:00:00,,\n", ""))
+    estado = importar(repo, caminho)
+    assert (estado["importados"], estado["repetidas"]) == (3, 0)
+    assert len(repo.list_history()) == 6
@@ -0,0 +1,133 @@
+# tests/test_indexes.py
+"""Índices do MongoDB: criação, remoção dos obsoletos, migração para pátios e diagnóstico das consultas."""
+import pytest
+
+from utils import indexes
+from utils.indexes import INDEXES, bootstrap_indexes, diagnosticar_consultas, ensure_indexes, verify_indexes
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().estacionamento
+
+
+def exigir_update_em_lote(db):
+    from pymongo import UpdateOne
+
+    try:
+        db.teste_lote.bulk_write([UpdateOne({"_id": 0}, {"$set": {"x": 1}})])
+    except TypeError:
+        pytest.skip("o mongomock não executa UpdateOne em bulk_write com esta versão do pymongo")
+
+
+def test_cria_os_indices_e_remove_os_obsoletos(db):
+    exigir_update_em_lote(db)
+    db.veiculos.create_index("status", name="status_saida")
+    db.configuracoes.create_index("type", name="type_unico")
+    db.veiculos_arquivo_2024_01.insert_one({"status": "finalizado"})
+    assert ensure_indexes(db, "veiculos_arquivo_") == []
+
+    for colecao, specs in INDEXES.items():
+        existentes = db[colecao].index_information()
+        assert {spec["name"] for spec in specs} <= set(existentes)
+    assert "status_saida" not in db.veiculos.index_information()
+    assert "type_unico" not in db.configuracoes.index_information()
+    assert set(db.veiculos_arquivo_2024_01.index_information()) == {"_id_", *indexes.ARCHIVE_INDEXES}
+    assert all(item["ok"] for item in verify_indexes(db))
+
+
+def test_verify_indexes_aponta_ausentes_e_divergentes(db):
+    ensure_indexes(db)
+    db.configuracoes.drop_index("lot_type_unico")
+    db.configuracoes.create_index("type", name="lot_type_unico")
+    db.ocupacao.drop_index("lot_zona_unico")
+    relatorio = {(item["collection"], item["name"]): item for item in verify_indexes(db)}
+    assert relatorio[("ocupacao", "lot_zona_unico")]["detalhe"] == "ausente"
+    divergente = relatorio[("configuracoes", "lot_type_unico")]
+    assert not divergente["ok"] and "chaves" in divergente["detalhe"] and "unique" in divergente["detalhe"]
+
+
+def test_documentos_sem_patio_passam_ao_padrao(db):
+    exigir_update_em_lote(db)
+    db.veiculos.insert_many([{"placa": "ABC1234", "status": "estacionado"}, {"placa": "XYZ9876", "lot_id": "norte"}])
+    db.faturamento_por_hora.insert_one({"periodo": "2024-01-02T10", "tipo_veiculo": "Carro", "quantidade": 1})
+    db.configuracoes.insert_one({"type": "price_config", "prices": {"Carro": 10.0}})
+    db.veiculos_arquivo_2023_12.insert_one({"placa": "DEF5678", "status": "finalizado"})
+
+    ensure_indexes(db, "veiculos_arquivo_", "principal")
+    assert db.veiculos.find_one({"placa": "ABC1234"})["lot_id"] == "principal"
+    assert db.veiculos.find_one({"placa": "XYZ9876"})["lot_id"] == "norte"
+    for colecao in ("faturamento_por_hora", "configuracoes", "veiculos_arquivo_2023_12"):
+        assert db[colecao].count_documents({"lot_id": None}) == 0
+
+
+def test_bootstrap_executa_uma_vez_por_banco(db, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(indexes, "_bootstrapped", {})
+    monkeypatch.setattr(indexes, "ensure_indexes", lambda *args: chamadas.append(args) or ["erro"])
+    assert bootstrap_indexes(db) == ["erro"]
+    assert bootstrap_indexes(db) == ["erro"]
+    assert len(chamadas) == 1
+
+
+class CursorFalso:
+
+    def __init__(self, plano):
+        self.plano = plano
+
+    def explain(self):
+        if isinstance(self.plano, Exception):
+            raise self.plano
+        return {"queryPlanner": {"winningPlan": self.plano}}
+
+
+def test_diagnostico_aponta_varreduras_completas(db, monkeypatch):
+    consultas = [
+        ("Indexada", CursorFalso({"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "lot_status_placa"}})),
+        ("Varredura", CursorFalso({"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}})),
+        ("Com $or", CursorFalso({"stage": "LIMIT", "inputStage": {"stage": "OR", "inputStages": [
+            {"stage": "IXSCAN"}, {"stage": "COLLSCAN"},
+        ]}})),
+        ("Falha", CursorFalso(RuntimeError("sem permissão"))),
+    ]
+    monkeypatch.setattr(indexes, "_consultas_monitoradas", lambda db, lot_id: consultas)
+    diagnostico = {item["consulta"]: item for item in diagnosticar_consultas(db, "principal")}
+    assert not diagnostico["Indexada"]["collscan"] and diagnostico["Indexada"]["estagios"] == "IXSCAN → FETCH"
+    assert diagnostico["Varredura"]["collscan"]
+    assert diagnostico["Com $or"]["collscan"]
+    assert diagnostico["Falha"]["collscan"] is None and "sem permissão" in diagnostico["Falha"]["estagios"]
+
+
+
+def test_estacionados_antigos_recebem_os_campos_de_placa(db):
+    exigir_update_em_lote(db)
+    ensure_indexes(db, "veiculos_arquivo_", "principal")
+    db.veiculos.insert_many([
+        {"placa": "ABC-1234", "status": "estacionado", "lot_id": "principal"},
+        {"placa": "XYZ9876", "status": "finalizado", "lot_id": "principal"},
+    ])
+    assert not [erro for erro in ensure_indexes(db, "veiculos_arquivo_", "principal") if "campos de busca" in erro]
+    antigo = db.veiculos.find_one({"placa": "ABC-1234"})
+    assert antigo["placa_normalizada"] == "ABC1C34" and "1C3" in antigo["placa_tokens"]
+    assert db.veiculos.count_documents({"placa_tokens": "XYZ"}) == 1
+
+    # O índice único passa a cobrir o estacionado antigo: a mesma placa não abre outro ticket
+    from pymongo.errors import DuplicateKeyError
+
+    with pytest.raises(DuplicateKeyError):
+        db.veiculos.insert_one({"placa": "ABC1C34", "status": "estacionado", "lot_id": "principal",
+                                "placa_normalizada": "ABC1C34"})
+
+
+def test_estacionado_antigo_duplicado_e_apontado(db):
+    exigir_update_em_lote(db)
+    ensure_indexes(db, None, "principal")
+    db.veiculos.insert_many([
+        {"placa": "ABC-1234", "status": "estacionado", "lot_id": "principal"},
+        {"placa": "abc1c34", "status": "estacionado", "lot_id": "principal"},
+    ])
+    erros = [erro for erro in ensure_indexes(db, None, "principal") if "campos de busca" in erro]
+    assert len(erros) == 1 and erros[0].startswith("veiculos: 1 estacionado(s)")
+    assert db.veiculos.count_documents({"placa_normalizada": "ABC1C34"}) == 1
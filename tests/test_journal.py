@@ -0,0 +1,165 @@
+# tests/test_journal.py
+"""Diário local à frente do MongoDB (mongomock): aceite das entradas, replicação em ordem, conflitos e situação da fila."""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import AutoReconnect, NetworkTimeout, WriteError
+
+from controllers.vehicle_controller import registrar_entrada, registrar_saida
+from storage.base import VehicleAlreadyParked
+from storage.journal import JournaledVehicleRepository
+from storage.mongo import MongoVehicleRepository
+from utils.plates import campos_placa
+
+mongomock = pytest.importorskip("mongomock")
+
+T0 = datetime(2024, 1, 2, 10, 0)
+MES = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+@pytest.fixture
+def remoto():
+    remoto = MongoVehicleRepository(mongomock.MongoClient().estacionamento)
+    remoto.ensure_indexes()
+    return remoto
+
+
+@pytest.fixture
+def diario(remoto, tmp_path):
+    diario = JournaledVehicleRepository(remoto, str(tmp_path / "diario.db"))
+    yield diario
+    diario.conn.close()
+
+
+def estacionar(repo, placa):
+    return repo.insert({"placa": placa, "tipo_veiculo": "Carro", "entrada": T0, "status": "estacionado", **campos_placa(placa)})
+
+
+def test_entrada_e_saida_replicam_em_ordem(diario, remoto):
+    registrar_entrada(diario, "ABC1C34", "Carro", T0)
+    veiculo = diario.find_parked("ABC1C34")
+    registrar_saida(diario, veiculo["_id"], T0, T0 + timedelta(hours=2), "Carro", 20.0)
+    # Nada chegou ao banco ainda: entrada, saída e agregado esperam no diário
+    assert remoto.find_parked("ABC1C34") is None and remoto.list_history() == []
+    assert diario.replication_status()["pendentes"] == 3
+
+    assert diario.replicar() == 3
+    [finalizado] = remoto.list_history()
+    assert finalizado["_id"] == veiculo["_id"] and finalizado["saida"] == T0 + timedelta(hours=2)
+    assert remoto.summarize_rollups(*MES) == remoto.summarize_finished(*MES)
+    assert remoto.occupancy()["Carro"]["ocupadas"] == 0
+    assert diario.replication_status()["pendentes"] == 0 and diario.replication_status()["conflitos"] == 0
+
+
+def test_reaplicar_a_mesma_chave_nao_duplica(diario, remoto):
+    registrar_entrada(diario, "ABC1C34", "Carro", T0)
+    registrar_entrada(diario, "DEF5G78", "Moto", T0)
+    veiculo = diario.find_parked("ABC1C34")
+    registrar_saida(diario, veiculo["_id"], T0, T0 + timedelta(hours=1), "Carro", 10.0)
+    assert diario.replicar() == 4
+    antes = (remoto.summarize_rollups(*MES), remoto.occupancy(), remoto.list_history(), remoto.list_parked())
+
+    # Queda depois de aplicar e antes de marcar como replicado: as mesmas chaves voltam
+    diario.conn.execute("UPDATE operacoes SET replicado_em = NULL")
+    assert diario.replicar() == 4
+    assert (remoto.summarize_rollups(*MES), remoto.occupancy(), remoto.list_history(), remoto.list_parked()) == antes
+    assert remoto.collection.count_documents({}) == 2
+    assert diario.replication_status()["conflitos"] == 0
+
+
+def test_conflito_registrado_e_fila_segue(diario, remoto):
+    estacionar(diario, "ABC1C34")
+    # Outro terminal registra a mesma placa depois do aceite local
+    estacionar(remoto, "ABC1C34")
+    estacionar(diario, "DEF5G78")
+
+    assert diario.replicar() == 2
+    situacao = diario.replication_status()
+    assert (situacao["pendentes"], situacao["conflitos"], situacao["ultimo_erro"]) == (0, 1, None)
+    [conflito] = diario.list_conflicts()
+    assert conflito["tipo"] == "entrada" and conflito["dados"]["placa"] == "ABC1C34"
+    assert remoto.find_parked("DEF5G78") is not None
+    assert remoto.collection.count_documents({"placa": "ABC1C34"}) == 1
+
+
+@pytest.mark.parametrize("erro", [ValueError("valor"), KeyError("campo"), WriteError("documento inválido", code=121)])
+def test_erro_permanente_vira_conflito(diario, remoto, monkeypatch, erro):
+    aplicar = remoto.apply_journal
+
+    def apply_journal(tipo, chave, dados):
+        if dados.get("placa") == "ABC1C34":
+            raise erro
+        return aplicar(tipo, chave, dados)
+
+    monkeypatch.setattr(remoto, "apply_journal", apply_journal)
+    estacionar(diario, "ABC1C34")
+    estacionar(diario, "DEF5G78")
+
+    assert diario.replicar() == 2
+    [conflito] = diario.list_conflicts()
+    assert conflito["erro"].startswith(type(erro).__name__)
+    assert remoto.find_parked("DEF5G78") is not None and diario.replication_status()["pendentes"] == 0
+
+
+@pytest.mark.parametrize("erro", [AutoReconnect("primário indisponível"), NetworkTimeout("tempo esgotado")])
+def test_falha_de_conexao_mantem_pendente(diario, remoto, monkeypatch, erro):
+    aplicar = remoto.apply_journal
+    monkeypatch.setattr(remoto, "apply_journal", lambda *args: (_ for _ in ()).throw(erro))
+    estacionar(diario, "ABC1C34")
+    estacionar(diario, "DEF5G78")
+
+    with pytest.raises(type(erro)):
+        diario.replicar()
+    situacao = diario.replication_status()
+    assert (situacao["pendentes"], situacao["conflitos"]) == (2, 0) and situacao["ultimo_erro"]
+    assert diario.conn.execute("SELECT tentativas FROM operacoes ORDER BY seq").fetchall() == [(1,), (0,)]
+
+    monkeypatch.setattr(remoto, "apply_journal", aplicar)
+    assert diario.replicar() == 2
+    assert diario.replication_status()["ultimo_erro"] is None
+    assert len(remoto.list_parked()) == 2
+
+
+def test_situacao_da_fila(diario):
+    assert diario.replication_status()["atraso_s"] == 0.0
+    for placa in ("AAA0001", "AAA0002", "AAA0003"):
+        estacionar(diario, placa)
+    diario.conn.execute("UPDATE operacoes SET criado_em = ? WHERE seq = 1", (time.time() - 30,))
+
+    situacao = diario.replication_status()
+    assert situacao["pendentes"] == 3 and 30 <= situacao["atraso_s"] < 60
+    assert situacao["ultima_replicacao"] is None
+
+    assert diario.replicar(limite=2) == 2
+    situacao = diario.replication_status()
+    assert situacao["pendentes"] == 1 and situacao["atraso_s"] < 30
+    assert situacao["ultima_replicacao"] is not None
+
+    diario.replicar()
+    assert (diario.replication_status()["pendentes"], diario.replication_status()["atraso_s"]) == (0, 0.0)
+
+
+def test_placa_estacionada_e_recusada_no_aceite(diario, remoto):
+    no_banco = estacionar(remoto, "ABC1C34")
+    with pytest.raises(VehicleAlreadyParked):
+        estacionar(diario, "abc-1c34")
+
+    estacionar(diario, "DEF5G78")
+    with pytest.raises(VehicleAlreadyParked):
+        estacionar(diario, "DEF5G78")
+
+    # Com a saída ainda no diário, o ticket do banco já está fechado para o terminal
+    diario.finalize(no_banco, {"saida": T0 + timedelta(hours=1), "status": "finalizado"})
+    estacionar(diario, "ABC1C34")
+    assert diario.replication_status()["pendentes"] == 3
+
+
+def test_banco_sem_resposta_aceita_a_entrada(diario, remoto, monkeypatch):
+    estacionar(remoto, "ABC1C34")
+    monkeypatch.setattr(remoto, "find_parked", lambda placa: (_ for _ in ()).throw(NetworkTimeout("sem resposta")))
+    # A replicação é quem recusa o ticket duplicado
+    estacionar(diario, "ABC1C34")
+    monkeypatch.undo()
+    diario.replicar()
+    assert diario.replication_status()["conflitos"] == 1
@@ -0,0 +1,52 @@
+# tests/test_live.py
+"""Espelho dos estacionados: a cotação da cancela localiza a placa em memória antes do banco."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.pricing_controller import DEFAULT_PRICES
+from controllers.vehicle_controller import cotar_saida, registrar_entrada, registrar_saida
+from storage.live import ParkedMirror
+
+T0 = datetime(2024, 1, 2, 10, 0)
+
+
+@pytest.fixture
+def espelho(repo):
+    if repo.name == "mongo":
+        pytest.skip("o mongomock não tem change streams")
+    espelho = ParkedMirror(repo, poll_interval=0.05)
+    espelho.start()
+    espelho.snapshot()
+    yield espelho
+    espelho.stop()
+
+
+def test_find_em_qualquer_grafia(repo, espelho):
+    registrar_entrada(repo, "ABC-1234", "Carro", T0)
+    espelho.sync(espelho.version)
+    assert espelho.find("abc1234")["placa"] == "ABC-1234"
+    assert espelho.find("XYZ9999") is None
+
+
+def test_cotacao_pelo_espelho_sem_ir_ao_banco(repo, espelho, monkeypatch):
+    registrar_entrada(repo, "ABC1234", "Carro", T0)
+    espelho.sync(espelho.version)
+    consultas = []
+    find_parked = repo.find_parked
+    monkeypatch.setattr(repo, "find_parked", lambda placa: consultas.append(placa) or find_parked(placa))
+
+    veiculo, valor = cotar_saida(repo, "ABC1234", T0 + timedelta(hours=2), DEFAULT_PRICES, espelho=espelho)
+    assert veiculo["placa"] == "ABC1234" and valor > 0 and consultas == []
+
+    # Fora do espelho (por exemplo, uma entrada de outro terminal ainda não refletida), vale o banco
+    assert cotar_saida(repo, "XYZ9999", T0, DEFAULT_PRICES, espelho=espelho) == (None, None)
+    assert consultas == ["XYZ9999"]
+
+
+def test_saida_tira_do_espelho(repo, espelho):
+    registrar_entrada(repo, "ABC1234", "Carro", T0)
+    veiculo_id = repo.find_parked("ABC1234")["_id"]
+    registrar_saida(repo, veiculo_id, T0, T0 + timedelta(hours=1), "Carro", 10.0)
+    espelho.sync(espelho.version)
+    assert espelho.find("ABC1234") is None
@@ -0,0 +1,113 @@
+# tests/test_lots.py
+"""Separação por pátio: cada repositório lê e grava só o próprio pátio; bancos antigos migram para o padrão."""
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from controllers.dashboard_controller import resumo_faturamento_patios
+from controllers.vehicle_controller import registrar_entrada, registrar_saida
+from storage.base import DEFAULT_LOT
+
+T0 = datetime(2024, 1, 2, 10, 0)
+MES = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+def entrar_e_sair(repo, placa, valor):
+    registrar_entrada(repo, placa, "Carro", T0)
+    veiculo = repo.find_parked(placa)
+    registrar_saida(repo, veiculo["_id"], T0, T0 + timedelta(hours=1), "Carro", valor)
+
+
+def test_mesma_placa_estacionada_em_dois_patios(abrir):
+    centro, _ = abrir("centro")
+    norte, _ = abrir("norte")
+    registrar_entrada(centro, "ABC1234", "Carro", T0)
+    registrar_entrada(norte, "ABC1234", "Carro", T0)
+    assert centro.find_parked("ABC1234")["_id"] != norte.find_parked("ABC1234")["_id"]
+    assert len(centro.list_parked()) == len(norte.list_parked()) == 1
+
+    # A saída de um pátio não fecha o ticket do outro
+    veiculo = centro.find_parked("ABC1234")
+    registrar_saida(centro, veiculo["_id"], T0, T0 + timedelta(hours=1), "Carro", 10.0)
+    assert centro.find_parked("ABC1234") is None and norte.find_parked("ABC1234") is not None
+
+
+def test_historico_agregados_e_precos_por_patio(abrir):
+    (centro, precos_centro), (norte, precos_norte) = abrir("centro"), abrir("norte")
+    entrar_e_sair(centro, "AAA0001", 10.0)
+    entrar_e_sair(centro, "AAA0002", 20.0)
+    entrar_e_sair(norte, "BBB0001", 5.0)
+
+    assert [v["placa"] for v in norte.list_history()] == ["BBB0001"]
+    assert len(list(centro.iter_finished())) == 2
+    assert centro.summarize_rollups(*MES)["total_faturado"] == 30.0
+    assert norte.summarize_rollups(*MES)["total_faturado"] == 5.0
+
+    precos_centro.save({"Carro": 12.0})
+    assert precos_norte.get() == (None, None)
+    assert {"centro", "norte"} <= set(centro.list_lots())
+
+    # Uma remoção total limpa só o próprio pátio
+    norte.delete_all()
+    norte.reset_rollups()
+    assert len(centro.list_history()) == 2 and norte.list_history() == []
+
+
+def test_resumo_consolidado_soma_os_patios(abrir):
+    (centro, _), (norte, _) = abrir("centro"), abrir("norte")
+    entrar_e_sair(centro, "AAA0001", 10.0)
+    entrar_e_sair(norte, "BBB0001", 5.0)
+    resumo = resumo_faturamento_patios({"centro": centro, "norte": norte}, *MES)
+    assert resumo["total"]["total_faturado"] == 15.0 and resumo["total"]["quantidade"] == 2
+    assert resumo["por_patio"]["norte"]["total_faturado"] == 5.0
+
+
+# Esquema do SQLite antes da separação por pátio
+ESQUEMA_SEM_PATIOS = """
+CREATE TABLE veiculos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, placa TEXT, placa_normalizada TEXT, tipo_veiculo TEXT,
+    entrada TEXT, saida TEXT, status TEXT, valor_cobrado REAL
+);
+CREATE UNIQUE INDEX placa_estacionado_unico ON veiculos (placa_normalizada) WHERE status = 'estacionado';
+CREATE TABLE faturamento_por_hora (
+    periodo TEXT NOT NULL, tipo_veiculo TEXT NOT NULL, quantidade INTEGER NOT NULL DEFAULT 0,
+    faturamento REAL NOT NULL DEFAULT 0, minutos_permanencia REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (periodo, tipo_veiculo)
+);
+CREATE TABLE configuracoes (type TEXT PRIMARY KEY, prices TEXT NOT NULL, version INTEGER NOT NULL);
+"""
+
+
+def test_sqlite_antigo_migra_para_o_patio_padrao(tmp_path):
+    from storage.sqlite import connect, SQLitePriceConfigRepository, SQLiteVehicleRepository
+
+    caminho = str(tmp_path / "antigo.db")
+    antigo = sqlite3.connect(caminho)
+    antigo.executescript(ESQUEMA_SEM_PATIOS)
+    antigo.executemany(
+        "INSERT INTO veiculos (placa, placa_normalizada, tipo_veiculo, entrada, saida, status, valor_cobrado) "
+        "VALUES (?, ?, 'Carro', ?, ?, ?, ?)",
+        [("ABC1234", "ABC1C34", "2024-01-02T10:00:00.000000", "2024-01-02T11:00:00.000000", "finalizado", 10.0),
+         ("DEF5678", "DEF5G78", "2024-01-02T12:00:00.000000", None, "estacionado", None)],
+    )
+    antigo.execute("INSERT INTO faturamento_por_hora VALUES ('2024-01-02T11:00:00.000000', 'Carro', 1, 10.0, 60.0)")
+    antigo.execute("INSERT INTO configuracoes VALUES ('price_config', ?, 3)", (json.dumps({"Carro": 12.0}),))
+    antigo.commit()
+    antigo.close()
+
+    conn = connect(caminho)
+    repo = SQLiteVehicleRepository(conn, lot_id=DEFAULT_LOT)
+    assert [v["placa"] for v in repo.list_history()] == ["ABC1234"]
+    assert repo.find_parked("DEF5678") is not None
+    assert repo.summarize_rollups(*MES)["total_faturado"] == 10.0
+    assert SQLitePriceConfigRepository(conn, path=caminho, lot_id=DEFAULT_LOT).get() == ({"Carro": 12.0}, 3)
+    assert repo.list_lots() == [DEFAULT_LOT]
+
+    # Os outros pátios começam vazios e a placa já estacionada no padrão pode entrar neles
+    outro = SQLiteVehicleRepository(conn, lot_id="centro")
+    assert outro.list_history() == [] and outro.summarize_rollups(*MES)["quantidade"] == 0
+    registrar_entrada(outro, "DEF5678", "Carro", T0)
+
+    # Abrir de novo não repete a migração
+    conn.close()
+    assert len(SQLiteVehicleRepository(connect(caminho), lot_id=DEFAULT_LOT).list_history()) == 1
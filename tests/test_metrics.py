@@ -0,0 +1,100 @@
+# tests/test_metrics.py
+"""Métricas de desempenho: percentis dos histogramas, medição das telas e do armazenamento."""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from storage.memory import MemoryVehicleRepository
+from utils import metrics
+from utils.metrics import BUCKETS, Serie, formato_prometheus, instrumentar, medir, observar, series
+
+
+@pytest.fixture(autouse=True)
+def limpas():
+    metrics.zerar()
+    yield
+    metrics.zerar()
+
+
+def serie(duracoes):
+    resultado = Serie()
+    for duracao in duracoes:
+        resultado.observar(duracao, None, False)
+    return resultado
+
+
+def test_percentis_ficam_no_balde_da_amostra_exata():
+    duracoes = np.random.default_rng(19).lognormal(np.log(0.02), 1.0, size=5000)
+    estimada = serie(duracoes)
+    for fracao in (0.5, 0.95, 0.99):
+        exato = np.quantile(duracoes, fracao)
+        balde = next(posicao for posicao, limite in enumerate(BUCKETS) if exato <= limite)
+        inferior = BUCKETS[balde - 1] if balde else 0.0
+        assert inferior <= estimada.percentil(fracao) <= BUCKETS[balde]
+
+
+def test_percentil_interpola_dentro_do_balde_e_respeita_o_maximo():
+    # Quatro execuções entre 10 e 25 ms: a mediana fica na metade do balde
+    estimada = serie([0.012, 0.015, 0.018, 0.02])
+    assert estimada.percentil(0.5) == pytest.approx(0.0175)
+    assert estimada.percentil(1.0) == pytest.approx(0.02)
+    assert serie([]).percentil(0.5) is None
+    # Acima do último limite, o teto é o máximo observado
+    assert serie([12.0, 30.0]).percentil(0.99) <= 30.0
+
+
+def test_percentis_em_ordem():
+    estimada = serie(np.random.default_rng(1).exponential(0.05, size=1000))
+    assert estimada.percentil(0.5) <= estimada.percentil(0.95) <= estimada.percentil(0.99) <= estimada.maximo
+
+
+def test_series_resume_em_milissegundos():
+    for duracao in (0.001, 0.002, 0.003):
+        observar("etapa", "teste", duracao, documentos=2)
+    observar("etapa", "teste", 0.004, erro=True)
+    (resumo,) = series()
+    assert (resumo["grupo"], resumo["operacao"], resumo["quantidade"]) == ("etapa", "teste", 4)
+    assert resumo["media_ms"] == pytest.approx(2.5)
+    assert resumo["max_ms"] == pytest.approx(4.0)
+    assert (resumo["documentos"], resumo["erros"]) == (6, 1)
+    assert sum(resumo["baldes"]) == 4
+
+
+def test_medir_conta_erros_e_lentas(monkeypatch):
+    monkeypatch.setattr(metrics, "SLOW_OPERATION_MS", 0.0)
+    with medir("tela", "ok"):
+        pass
+    with pytest.raises(ValueError):
+        with medir("tela", "falha"):
+            raise ValueError("x")
+    resumo = {s["operacao"]: s for s in series()}
+    assert resumo["ok"]["erros"] == 0 and resumo["falha"]["erros"] == 1
+    assert {lenta["operacao"] for lenta in metrics.operacoes_lentas()} == {"ok", "falha"}
+
+
+def test_instrumentar_mede_metodos_e_iteradores():
+    repo = instrumentar(MemoryVehicleRepository("metricas"))
+    assert instrumentar(repo) is repo
+    assert repo.lot_id == "metricas"
+    repo.list_parked()
+    repo.insert_many([
+        {"placa": f"ABC000{i}", "tipo_veiculo": "Carro", "status": "finalizado",
+         "entrada": datetime(2024, 1, 1, 8), "saida": datetime(2024, 1, 1, 9 + i), "valor_cobrado": 1.0}
+        for i in range(3)
+    ])
+    assert len(list(repo.iter_finished())) == 3
+    resumo = {s["operacao"]: s for s in series() if s["grupo"] == "storage"}
+    assert resumo["memory.list_parked"]["quantidade"] == 1
+    assert resumo["memory.insert_many"]["documentos"] == 3
+    # O iterador é medido quando termina de ser consumido, com os documentos lidos
+    assert resumo["memory.iter_finished"]["documentos"] == 3
+
+
+def test_formato_prometheus_acumula_os_baldes():
+    for duracao in (0.0005, 0.003, 0.2, 20.0):
+        observar("storage", "memory.find_parked", duracao)
+    texto = formato_prometheus()
+    assert 'estacionamento_operacao_segundos_bucket{grupo="storage",operacao="memory.find_parked",le="0.001"} 1' in texto
+    assert 'estacionamento_operacao_segundos_bucket{grupo="storage",operacao="memory.find_parked",le="+Inf"} 4' in texto
+    assert 'estacionamento_operacao_segundos_count{grupo="storage",operacao="memory.find_parked"} 4' in texto
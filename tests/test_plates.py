@@ -0,0 +1,55 @@
+# tests/test_plates.py
+"""Placas: limpeza, forma canônica (antiga ↔ Mercosul), grafias equivalentes e campos de busca."""
+import pytest
+
+from utils.plates import campos_placa, filtro_busca_placa, formas_placa, limpar_placa, normalizar_placa, tokens_placa
+
+
+@pytest.mark.parametrize("placa, limpa", [
+    ("abc-1234", "ABC1234"),
+    (" abc 1c34 ", "ABC1C34"),
+    ("ABC.1234", "ABC1234"),
+    (None, ""),
+])
+def test_limpar_placa(placa, limpa):
+    assert limpar_placa(placa) == limpa
+
+
+@pytest.mark.parametrize("placa", ["ABC1234", "abc-1234", "ABC 1234", "ABC1C34", "abc1c34", "Abc-1C34"])
+def test_grafias_da_mesma_placa_tem_a_mesma_forma_canonica(placa):
+    assert normalizar_placa(placa) == "ABC1C34"
+
+
+def test_quinto_caractere_de_0_a_9_vira_letra():
+    assert [normalizar_placa(f"ABC1{d}34") for d in range(10)] == [f"ABC1{chr(ord('A') + d)}34" for d in range(10)]
+
+
+def test_placa_fora_dos_padroes_so_e_limpa():
+    assert normalizar_placa("ab-12") == "AB12"
+    assert formas_placa("ab-12") == {"AB12"}
+
+
+def test_formas_antiga_e_mercosul():
+    assert formas_placa("abc-1234") == {"ABC1234", "ABC1C34"}
+    assert formas_placa("ABC1C34") == {"ABC1C34", "ABC1234"}
+    # Uma Mercosul de verdade também é achada pela grafia numérica equivalente
+    assert formas_placa("BRA2E19") == {"BRA2E19", "BRA2419"}
+
+
+def test_tokens_cobrem_qualquer_trecho_das_duas_grafias():
+    tokens = tokens_placa("ABC-1234")
+    for trecho in ("ABC1234", "ABC1C34", "C1C", "1234", "234", "A", "1C3"):
+        assert trecho in tokens
+    assert tokens == sorted(set(tokens))
+    assert tokens_placa("abc1c34") == tokens
+
+
+def test_campos_placa():
+    campos = campos_placa("abc-1234")
+    assert campos["placa_normalizada"] == "ABC1C34"
+    assert campos["placa_tokens"] == tokens_placa("ABC1234")
+
+
+def test_filtro_busca_placa():
+    assert filtro_busca_placa(" c-1c3 ") == {"placa_tokens": "C1C3"}
+    assert filtro_busca_placa(" - ") is None
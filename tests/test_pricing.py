@@ -0,0 +1,100 @@
+# tests/test_pricing.py
+"""Cache da tabela de preços compartilhado entre as sessões (controllers.pricing_controller)."""
+import pytest
+
+from controllers import pricing_controller
+from controllers.pricing_controller import DEFAULT_PRICES, obter_precos, save_config
+
+
+class Relogio:
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+
+class Contador:
+    """Repositório de preços que conta as leituras feitas no armazenamento."""
+
+    def __init__(self, config_repo):
+        self.config_repo = config_repo
+        self.cache_key = config_repo.cache_key
+        self.leituras = []
+
+    def get(self):
+        self.leituras.append("get")
+        return self.config_repo.get()
+
+    def get_version(self):
+        self.leituras.append("get_version")
+        return self.config_repo.get_version()
+
+    def save(self, prices):
+        return self.config_repo.save(prices)
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(pricing_controller, "time", relogio)
+    pricing_controller.invalidate_config_cache()
+    yield relogio
+    pricing_controller.invalidate_config_cache()
+
+
+@pytest.fixture
+def precos(config_repo):
+    return Contador(config_repo)
+
+
+def test_sem_configuracao_usa_os_precos_padrao(relogio, precos):
+    assert obter_precos(precos) == DEFAULT_PRICES
+    assert precos.leituras == ["get"]
+
+
+def test_leituras_dentro_do_ttl_nao_consultam_o_repositorio(relogio, precos):
+    precos.config_repo.save({"Carro": 12.0})
+    assert obter_precos(precos) == {"Carro": 12.0}
+    relogio.agora += pricing_controller.PRICE_CONFIG_TTL - 1
+    for _ in range(5):
+        assert obter_precos(precos) == {"Carro": 12.0}
+    assert precos.leituras == ["get"]
+
+    # A cópia devolvida não altera o cache
+    obter_precos(precos)["Carro"] = 99.0
+    assert obter_precos(precos) == {"Carro": 12.0}
+
+
+def test_depois_do_ttl_so_a_versao_e_lida(relogio, precos):
+    precos.config_repo.save({"Carro": 12.0})
+    obter_precos(precos)
+    relogio.agora += pricing_controller.PRICE_CONFIG_TTL
+    assert obter_precos(precos) == {"Carro": 12.0}
+    assert precos.leituras == ["get", "get_version"]
+    # A conferência renova o prazo
+    relogio.agora += 1
+    obter_precos(precos)
+    assert precos.leituras == ["get", "get_version"]
+
+
+def test_versao_alterada_por_outro_processo_recarrega(relogio, precos):
+    precos.config_repo.save({"Carro": 12.0})
+    obter_precos(precos)
+    precos.config_repo.save({"Carro": 15.0})
+    # Até o fim do prazo, a alteração de outro processo não é vista
+    assert obter_precos(precos) == {"Carro": 12.0}
+    relogio.agora += pricing_controller.PRICE_CONFIG_TTL
+    assert obter_precos(precos) == {"Carro": 15.0}
+    assert precos.leituras == ["get", "get_version", "get"]
+
+
+def test_save_config_atualiza_o_cache_na_hora(relogio, precos):
+    obter_precos(precos)
+    save_config(precos, {"Carro": 20.0})
+    assert obter_precos(precos) == {"Carro": 20.0}
+    relogio.agora += pricing_controller.PRICE_CONFIG_TTL
+    assert obter_precos(precos) == {"Carro": 20.0}
+    # Nova versão já conhecida: só a versão é conferida
+    assert precos.leituras == ["get", "get_version"]
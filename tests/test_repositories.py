@@ -0,0 +1,156 @@
+# tests/test_repositories.py
+"""Contrato de VehicleRepository e PriceConfigRepository, igual para memória, SQLite e MongoDB."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.vehicle_controller import remover_veiculo
+from storage.base import VehicleAlreadyParked, VehicleNotParked
+from utils.plates import campos_placa
+
+T0 = datetime(2024, 1, 2, 10, 0)
+MES = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+def estacionar(repo, placa, tipo="Carro", entrada=T0):
+    veiculo = {"placa": placa, "tipo_veiculo": tipo, "entrada": entrada, "status": "estacionado", **campos_placa(placa)}
+    return repo.insert(veiculo)
+
+
+def finalizar(repo, veiculo_id, entrada, saida, valor, tipo="Carro"):
+    return repo.finalize(veiculo_id, {
+        "saida": saida, "status": "finalizado", "tipo_veiculo": tipo, "entrada": entrada, "valor_cobrado": valor,
+    })
+
+
+def test_insert_e_find_parked_em_qualquer_grafia(repo):
+    veiculo_id = estacionar(repo, "ABC-1234")
+    encontrado = repo.find_parked("abc1234")
+    assert encontrado["_id"] == veiculo_id
+    assert encontrado["placa"] == "ABC-1234"
+    assert encontrado["entrada"] == T0
+    assert repo.find_parked("XYZ9999") is None
+
+
+def test_placa_estacionada_duas_vezes_e_recusada(repo):
+    estacionar(repo, "ABC-1234")
+    with pytest.raises(VehicleAlreadyParked):
+        estacionar(repo, "abc1234")
+
+
+def test_list_parked_filtra_por_trecho_de_placa(repo):
+    estacionar(repo, "ABC-1234")
+    estacionar(repo, "XYZ9A87", "Moto")
+    assert len(repo.list_parked()) == 2
+    assert [v["placa"] for v in repo.list_parked("1234")] == ["ABC-1234"]
+
+
+def test_finalize_uma_unica_vez(repo):
+    veiculo_id = estacionar(repo, "ABC1234")
+    finalizado = finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=2), 20.0)
+    assert finalizado["status"] == "finalizado" and finalizado["valor_cobrado"] == 20.0
+    assert repo.find_parked("ABC1234") is None
+    with pytest.raises(VehicleNotParked):
+        finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=3), 30.0)
+    # Depois da saída, a placa pode entrar de novo
+    estacionar(repo, "ABC1234", entrada=T0 + timedelta(hours=5))
+
+
+def test_delete(repo):
+    veiculo_id = estacionar(repo, "ABC1234")
+    removido = repo.delete(veiculo_id)
+    assert removido["placa"] == "ABC1234"
+    assert repo.find_parked("ABC1234") is None
+    assert repo.delete(veiculo_id) is None
+
+
+def test_remover_veiculo_informa_o_resultado(repo):
+    veiculo_id = estacionar(repo, "ABC1234")
+    assert remover_veiculo(repo, veiculo_id)[0] is True
+    removido, mensagem = remover_veiculo(repo, veiculo_id)
+    assert removido is False and "não encontrado" in mensagem
+
+
+def test_list_history_pagina_por_saida(repo):
+    for i in range(5):
+        veiculo_id = estacionar(repo, f"AAA000{i}")
+        finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=i + 1), float(i))
+    primeira = repo.list_history(limite=2)
+    assert [v["placa"] for v in primeira] == ["AAA0004", "AAA0003"]
+    assert isinstance(primeira[0]["saida"], datetime)
+    cursor = (primeira[-1]["saida"], primeira[-1]["_id"])
+    assert [v["placa"] for v in repo.list_history(limite=10, apos=cursor)] == ["AAA0002", "AAA0001", "AAA0000"]
+    assert [v["placa"] for v in repo.list_history("0003")] == ["AAA0003"]
+
+
+def test_iter_finished_por_intervalo_e_tipo(repo):
+    for i, tipo in enumerate(["Carro", "Moto", "Carro"]):
+        veiculo_id = estacionar(repo, f"BBB000{i}", tipo)
+        finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=i + 1), 10.0, tipo)
+    estacionar(repo, "CCC0000")
+    assert [v["placa"] for v in repo.iter_finished(tamanho_lote=1)] == ["BBB0000", "BBB0001", "BBB0002"]
+    assert len(list(repo.iter_finished(inicio=T0 + timedelta(hours=1, minutes=30)))) == 2
+    assert len(list(repo.iter_finished(fim=T0 + timedelta(hours=2)))) == 2
+    assert [v["placa"] for v in repo.iter_finished(tipos=["Moto"])] == ["BBB0001"]
+
+
+def test_agregados_igual_ao_historico(repo):
+    for placa, tipo, horas, valor in [("DDD0001", "Carro", 2, 20.0), ("DDD0002", "Moto", 1, 5.0)]:
+        veiculo_id = estacionar(repo, placa, tipo)
+        finalizado = finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=horas), valor, tipo)
+        repo.increment_rollup(finalizado["saida"].replace(minute=0, second=0, microsecond=0), tipo, 1, valor, horas * 60.0)
+    por_agregados = repo.summarize_rollups(*MES)
+    assert por_agregados == repo.summarize_finished(*MES)
+    assert por_agregados["total_faturado"] == 25.0 and por_agregados["quantidade"] == 2
+    assert por_agregados["por_tipo"] == {"Carro": 1, "Moto": 1}
+
+    repo.reset_rollups()
+    assert repo.summarize_rollups(*MES)["quantidade"] == 0
+
+
+def exigir_reconstrucao(repo):
+    if repo.name == "mongo":
+        from pymongo import ReplaceOne
+
+        try:
+            repo.db.teste_lote.bulk_write([ReplaceOne({"_id": 0}, {"x": 1}, upsert=True)])
+        except TypeError:
+            pytest.skip("o mongomock não executa ReplaceOne em bulk_write com esta versão do pymongo")
+
+
+def test_reconstruir_agregados(repo):
+    exigir_reconstrucao(repo)
+    veiculo_id = estacionar(repo, "EEE0001")
+    finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=2), 20.0)
+    assert repo.rebuild_rollups() == 1
+    assert repo.summarize_rollups(*MES) == repo.summarize_finished(*MES)
+
+
+def test_reconstruir_agregados_de_um_intervalo(repo):
+    exigir_reconstrucao(repo)
+    for placa, horas in [("EEE0001", 1), ("EEE0002", 3), ("EEE0003", 5)]:
+        finalizar(repo, estacionar(repo, placa), T0, T0 + timedelta(hours=horas, minutes=30), 10.0)
+    repo.increment_rollup(T0 + timedelta(hours=1), "Carro", 1, 10.0, 90.0)
+    # Agregados fora do intervalo não são tocados, mesmo que estejam errados
+    repo.increment_rollup(T0 + timedelta(hours=5), "Carro", 7, 70.0, 0.0)
+
+    assert repo.rebuild_rollups(inicio=T0 + timedelta(hours=2, minutes=10), fim=T0 + timedelta(hours=3, minutes=59)) == 1
+    resumo = repo.summarize_rollups(*MES)
+    assert resumo["quantidade"] == 9 and resumo["total_faturado"] == 90.0
+    assert repo.summarize_rollups(T0 + timedelta(hours=3), T0 + timedelta(hours=3))["quantidade"] == 1
+
+
+def test_delete_all(repo):
+    veiculo_id = estacionar(repo, "FFF0001")
+    finalizar(repo, veiculo_id, T0, T0 + timedelta(hours=1), 10.0)
+    estacionar(repo, "FFF0002")
+    repo.delete_all()
+    assert repo.list_parked() == [] and repo.list_history() == []
+
+
+def test_config_de_precos_versionada(config_repo):
+    assert config_repo.get() == (None, None)
+    assert config_repo.save({"Carro": 1.0}) == 1
+    assert config_repo.save({"Carro": 2.0}) == 2
+    assert config_repo.get() == ({"Carro": 2.0}, 2)
+    assert config_repo.get_version() == 2
@@ -0,0 +1,15 @@
+# tests/test_startup.py
+"""Partida a frio do app (benchmarks.startup): primeiro render sem erros e dentro do orçamento."""
+import pytest
+
+from benchmarks.startup import STARTUP_BUDGET_S, medir_partida
+
+pytest.importorskip("streamlit.testing.v1", reason="AppTest do Streamlit indisponível")
+
+
+def test_primeiro_render_dentro_do_orcamento():
+    medida = medir_partida("memory", reruns=1)
+    assert medida["erros"] == []
+    assert medida["primeiro_render_s"] < STARTUP_BUDGET_S
+    # Sem MongoDB nem Dashboard na tela inicial, os módulos pesados ficam para depois
+    assert medida["modulos_pesados"] == []
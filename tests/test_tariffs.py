@@ -0,0 +1,127 @@
+# tests/test_tariffs.py
+"""Motor de tarifas: somas acumuladas da tabela do dia contra a conta minuto a minuto."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.helpers import calcular_valor, calcular_valores
+from utils.tariffs import MINUTOS_DIA, TabelaTarifa, compilar_tarifas, montar_regra, regra_tarifa
+
+REGRAS = {
+    "simples": 12.0,
+    "faixas": {
+        "preco_hora": 12.0,
+        # Faixa que cruza a meia-noite e uma faixa posterior que se sobrepõe a ela
+        "faixas": [{"inicio": "22:00", "fim": "06:00", "preco_hora": 4.0},
+                   {"inicio": "05:00", "fim": "07:30", "preco_hora": 9.0},
+                   {"inicio": "12:00", "fim": "14:00", "preco_hora": 18.0}],
+    },
+    "completa": {
+        "preco_hora": 12.0, "fracao_minutos": 30, "carencia_minutos": 10, "primeira_hora": 20.0, "diaria_maxima": 90.0,
+        "faixas": [{"inicio": "22:00", "fim": "06:00", "preco_hora": 4.0}],
+    },
+}
+
+
+def preco_por_minuto(regra):
+    """Preço de cada minuto do dia, aplicando as faixas na ordem (as posteriores prevalecem)."""
+    regra = regra_tarifa(regra)
+    precos = [regra["preco_hora"] / 60] * MINUTOS_DIA
+    for faixa in regra["faixas"]:
+        inicio, fim = (int(h) * 60 + int(m) for h, m in (faixa[c].split(":") for c in ("inicio", "fim")))
+        minutos = range(inicio, fim) if inicio <= fim else [*range(inicio, MINUTOS_DIA), *range(0, fim)]
+        for minuto in minutos:
+            precos[minuto] = faixa["preco_hora"] / 60
+    return precos
+
+
+def referencia(regra, inicio, permanencia):
+    """A regra aplicada minuto a minuto, período de 24h por período, sem tabelas."""
+    precos, regra = preco_por_minuto(regra), regra_tarifa(regra)
+    if regra["carencia_minutos"] and permanencia <= regra["carencia_minutos"]:
+        return 0.0
+    # Frações como na conta original: (minutos + fração - 1) // fração, no mínimo uma
+    fracao = regra["fracao_minutos"]
+    cobrado = int(max((permanencia + fracao - 1) // fracao, 1) * fracao)
+    total = 0.0
+    for comeco in range(0, cobrado, MINUTOS_DIA):
+        primeiro = comeco == 0 and regra["primeira_hora"] is not None
+        custo = regra["primeira_hora"] if primeiro else 0.0
+        for minuto in range(comeco + (60 if primeiro else 0), min(comeco + MINUTOS_DIA, cobrado)):
+            custo += precos[(inicio + minuto) % MINUTOS_DIA]
+        if regra["diaria_maxima"] is not None:
+            custo = min(custo, regra["diaria_maxima"])
+        total += custo
+    return total
+
+
+@pytest.mark.parametrize("nome", REGRAS)
+def test_custo_acumulado_igual_a_soma_dos_minutos(nome):
+    tabela = TabelaTarifa(REGRAS[nome])
+    precos = preco_por_minuto(REGRAS[nome])
+    acumulado = np.concatenate([[0.0], np.cumsum(precos * 2)])
+    minutos = np.arange(2 * MINUTOS_DIA + 1, dtype=np.float64)
+    np.testing.assert_allclose(tabela._custo_ate(minutos), acumulado, atol=1e-9)
+    # Um trecho por faixa, não um por minuto
+    assert len(tabela.limites) <= 2 * len(regra_tarifa(REGRAS[nome])["faixas"]) + 1
+
+
+@pytest.mark.parametrize("nome", REGRAS)
+def test_cotacao_igual_a_conta_minuto_a_minuto(nome):
+    rng = np.random.default_rng(18)
+    tabela = TabelaTarifa(REGRAS[nome])
+    inicios = rng.integers(0, MINUTOS_DIA, size=300)
+    permanencias = np.where(rng.random(300) < 0.5, rng.integers(0, 240, size=300), rng.integers(0, 4 * MINUTOS_DIA, size=300))
+    esperados = [referencia(REGRAS[nome], int(i), int(p)) for i, p in zip(inicios, permanencias)]
+    np.testing.assert_allclose(tabela.cotar(inicios, permanencias), esperados, atol=0.005 + 1e-9)
+    for inicio, permanencia, esperado in zip(inicios[:50], permanencias[:50], esperados):
+        assert tabela.cotar_um(float(inicio), float(permanencia)) == pytest.approx(esperado, abs=0.005 + 1e-9)
+
+
+def test_diaria_maxima_por_periodo_de_24h():
+    tabela = TabelaTarifa(REGRAS["completa"])
+    # Três dias inteiros pagam três diárias
+    assert tabela.cotar_um(0.0, 3 * MINUTOS_DIA) == 270.0
+    # O que passa dos três dias é cobrado pelo preço da hora, sem o valor da primeira hora
+    assert tabela.cotar_um(600.0, 3 * MINUTOS_DIA + 30) == 270.0 + 6.0
+
+
+def test_carencia_e_fracao_minima():
+    tabela = TabelaTarifa(REGRAS["completa"])
+    assert tabela.cotar_um(600.0, 10.0) == 0.0
+    assert tabela.cotar_um(600.0, 10.5) == 20.0
+    simples = TabelaTarifa(12.0)
+    assert simples.cotar_um(600.0, 0.0) == 3.0
+    assert simples.cotar_um(600.0, 15.0) == 3.0 and simples.cotar_um(600.0, 16.0) == 6.0
+
+
+def test_mensalista_nao_paga():
+    precos = {"Carro": REGRAS["completa"], "mensalistas": ["abc-1234"]}
+    entrada, saida = datetime(2024, 1, 2, 8), datetime(2024, 1, 2, 18)
+    assert calcular_valor(entrada, saida, "Carro", precos, placa="ABC1234") == 0.0
+    assert calcular_valor(entrada, saida, "Carro", precos, placa="XYZ9999") > 0
+    valores = calcular_valores([entrada] * 2, [saida] * 2, ["Carro"] * 2, precos, placas=["ABC-1234", "XYZ9999"])
+    assert valores[0] == 0.0 and valores[1] == calcular_valor(entrada, saida, "Carro", precos)
+
+
+def test_virada_do_dia_usa_a_faixa_noturna():
+    precos = {"Carro": REGRAS["faixas"]}
+    entrada = datetime(2024, 1, 2, 23, 30)
+    assert calcular_valor(entrada, entrada + timedelta(hours=1), "Carro", precos) == pytest.approx(4.0)
+    assert calcular_valor(entrada, entrada + timedelta(hours=7), "Carro", precos) == pytest.approx(
+        referencia(REGRAS["faixas"], 23 * 60 + 30, 7 * 60), abs=0.005
+    )
+
+
+def test_tabela_compilada_uma_vez_por_conteudo():
+    assert compilar_tarifas({"Carro": 12.0, "Moto": 5.0}) is compilar_tarifas({"Moto": 5.0, "Carro": 12.0})
+    assert compilar_tarifas({"Carro": 12.0}) is not compilar_tarifas({"Carro": 13.0})
+
+
+def test_montar_regra_grava_so_o_necessario():
+    assert montar_regra(10.0) == 10.0
+    assert montar_regra(10.0, fracao_minutos=15, carencia_minutos=0) == 10.0
+    regra = montar_regra(10.0, fracao_minutos=30, primeira_hora=15.0)
+    assert regra == {"preco_hora": 10.0, "fracao_minutos": 30, "primeira_hora": 15.0}
+    assert regra_tarifa(regra)["carencia_minutos"] == 0 and regra_tarifa(regra)["faixas"] == []
@@ -0,0 +1,135 @@
+# utils/connection.py
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from utils.metrics import medir
+
+# Parâmetros do pool, sobrescrevíveis por variáveis de ambiente
+DEFAULT_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 20)),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+    "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000)),
+    "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    "socketTimeoutMS": int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 20000)),
+}
+HEALTH_CHECK_INTERVAL = float(os.environ.get("MONGO_HEALTH_CHECK_INTERVAL", 30))
+
+_lock = threading.Lock()
+_clients = {}
+# Uma trava por URI, adquirida só durante a criação do cliente
+_travas = {}
+
+
+class _HealthMonitor(threading.Thread):
+    """
+    Thread em segundo plano que executa um ping periódico no servidor e
+    guarda o último resultado, para que as páginas não precisem pingar a cada rerun.
+    """
+
+    def __init__(self, client, interval):
+        super().__init__(daemon=True, name="mongo-health-monitor")
+        self.client = client
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.status = {"ok": True, "error": None, "checked_at": datetime.now()}
+
+    def check(self):
+        try:
+            with medir("conexao", "ping"):
+                self.client.admin.command("ping")
+            self.status = {"ok": True, "error": None, "checked_at": datetime.now()}
+        except Exception as e:
+            self.status = {"ok": False, "error": str(e), "checked_at": datetime.now()}
+        return self.status
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def _client_key(mongo_uri, options):
+    return (mongo_uri, tuple(sorted(options.items())))
+
+
+def get_client(mongo_uri, **options):
+    """
+    Retorna o MongoClient compartilhado para a string de conexão informada,
+    criando-o (e validando com um único ping) apenas na primeira chamada.
+    Todas as sessões do Streamlit reaproveitam o mesmo pool de conexões.
+    """
+    if not mongo_uri:
+        raise ValueError("String de conexão não informada.")
+
+    client_options = {**DEFAULT_CLIENT_OPTIONS, **options}
+    key = _client_key(mongo_uri, client_options)
+
+    with _lock:
+        entry = _clients.get(key)
+        if entry is not None:
+            return entry["client"]
+        trava = _travas.setdefault(key, threading.Lock())
+
+    # A criação e o ping correm só sob a trava desta URI: uma conexão lenta ou
+    # inacessível não segura as sessões das outras, nem as que já têm o cliente
+    with trava:
+        with _lock:
+            entry = _clients.get(key)
+        if entry is not None:
+            return entry["client"]
+
+        client = MongoClient(mongo_uri, **client_options)
+        monitor = _HealthMonitor(client, HEALTH_CHECK_INTERVAL)
+        status = monitor.check()
+        if not status["ok"]:
+            client.close()
+            raise ConnectionError(status["error"])
+
+        monitor.start()
+        with _lock:
+            _clients[key] = {"client": client, "monitor": monitor}
+        return client
+
+
+def connection_status(mongo_uri, **options):
+    """
+    Retorna o resultado do último health check em segundo plano
+    ({"ok", "error", "checked_at"}), ou None se não houver cliente criado.
+    """
+    key = _client_key(mongo_uri, {**DEFAULT_CLIENT_OPTIONS, **options})
+    entry = _clients.get(key)
+    if entry is None:
+        return None
+    return entry["monitor"].status
+
+
+def close_client(mongo_uri, **options):
+    key = _client_key(mongo_uri, {**DEFAULT_CLIENT_OPTIONS, **options})
+    with _lock:
+        entry = _clients.pop(key, None)
+    if entry is not None:
+        entry["monitor"].stop()
+        entry["client"].close()
+
+
+def close_all():
+    """
+    Encerra todos os clientes e monitores. Registrada no atexit para
+    um desligamento limpo do processo.
+    """
+    with _lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for entry in entries:
+        entry["monitor"].stop()
+        entry["client"].close()
+
+
+atexit.register(close_all)
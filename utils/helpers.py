@@ -1,17 +1,56 @@
 # utils/helpers.py
 from datetime import datetime
 
-def calcular_valor(entrada, saida, tipo_veiculo, precos_por_hora):
-    preco_hora = precos_por_hora.get(tipo_veiculo, 10.0)
+import numpy as np
 
-    if isinstance(entrada, str):
-        entrada = datetime.fromisoformat(entrada)
-    if isinstance(saida, str):
-        saida = datetime.fromisoformat(saida)
+from utils.tariffs import compilar_tarifas
 
-    tempo_permanencia = saida - entrada
-    tempo_total_minutos = tempo_permanencia.total_seconds() / 60
-    unidades_de_15_minutos = (tempo_total_minutos + 14) // 15
+def calcular_valor(entrada, saida, tipo_veiculo, precos_por_hora, placa=None):
+    """
+    Valor de uma permanência pelas regras de tarifa do tipo (utils.tariffs): com um
+    preço simples por hora, cobra frações de 15 minutos, com no mínimo uma.
+    """
+    entrada, saida = _local(entrada), _local(saida)
 
-    valor_a_pagar = (unidades_de_15_minutos / 4) * preco_hora
-    return max(valor_a_pagar, preco_hora/4)
\ No newline at end of file
+    meia_noite = entrada.replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio = (entrada - meia_noite).total_seconds() / 60
+    tempo_total_minutos = (saida - entrada).total_seconds() / 60
+
+    return compilar_tarifas(precos_por_hora).cotar_um(inicio, tempo_total_minutos, tipo_veiculo, placa)
+
+def _local(data):
+    """
+    Data sem fuso no horário local. Textos ISO 8601 são lidos e datas com fuso são
+    convertidas para o horário local, como na importação (controllers.import_controller).
+    """
+    if isinstance(data, str):
+        data = datetime.fromisoformat(data)
+    return data.astimezone().replace(tzinfo=None) if data.tzinfo else data
+
+def _para_datetime64(valores):
+    if isinstance(valores, (datetime, str)):
+        valores = [valores]
+    if isinstance(valores, np.ndarray) and valores.dtype.kind == "M":
+        return valores.astype("datetime64[us]")
+    if any(isinstance(valor, str) or getattr(valor, "tzinfo", None) for valor in valores):
+        # Textos e datas com fuso vão ao horário local um a um, pela mesma regra de calcular_valor
+        valores = [_local(valor) for valor in valores]
+    return np.array(valores, dtype="datetime64[us]")
+
+def calcular_valores(entradas, saidas, tipos_veiculo, precos_por_hora, placas=None):
+    """
+    Versão vetorizada de calcular_valor: recebe sequências de entradas, saídas e tipos
+    (uma saída ou um tipo únicos são aplicados a todas as entradas) e cota todas de uma
+    vez nas tabelas compiladas. Retorna um np.ndarray de float64.
+    """
+    entradas = _para_datetime64(entradas)
+    saidas = _para_datetime64(saidas)
+    if isinstance(tipos_veiculo, str) or tipos_veiculo is None:
+        tipos_veiculo = [tipos_veiculo] * len(entradas)
+
+    # Mesma conta de timedelta.total_seconds(): microssegundos inteiros / 10**6
+    microssegundos = (saidas - entradas).astype(np.int64)
+    tempo_total_minutos = (microssegundos / 1e6) / 60
+    inicio = ((entradas - entradas.astype("datetime64[D]")).astype(np.int64) / 1e6) / 60
+
+    return compilar_tarifas(precos_por_hora).cotar(inicio, tempo_total_minutos, tipos_veiculo, placas)
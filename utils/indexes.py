@@ -0,0 +1,255 @@
+# utils/indexes.py
+import threading
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from utils.plates import indexar_placas
+
+# Índices por coleção, alinhados às consultas do app. Todos começam por lot_id: as
+# consultas de um pátio percorrem só o trecho do índice desse pátio
+INDEXES = {
+    "veiculos": [
+        {
+            # registrar_entrada e a lista de Veículos Estacionados
+            "name": "lot_status_placa",
+            "keys": [("lot_id", ASCENDING), ("status", ASCENDING), ("placa", ASCENDING)],
+        },
+        {
+            # Dashboard (intervalo de saída) e páginas do Histórico (cursor em saída e _id)
+            "name": "lot_status_saida_id",
+            "keys": [("lot_id", ASCENDING), ("status", ASCENDING), ("saida", DESCENDING), ("_id", DESCENDING)],
+        },
+        {
+            # Impede dois tickets abertos no pátio para a mesma placa (em qualquer grafia)
+            "name": "lot_placa_estacionado_unico",
+            "keys": [("lot_id", ASCENDING), ("placa_normalizada", ASCENDING)],
+            "unique": True,
+            "partialFilterExpression": {"status": "estacionado", "placa_normalizada": {"$exists": True}},
+        },
+        {
+            # Uma linha de um arquivo importado é gravada uma única vez, mesmo se o lote for repetido
+            "name": "lot_chave_importacao_unica",
+            "keys": [("lot_id", ASCENDING), ("chave_importacao", ASCENDING)],
+            "unique": True,
+            "partialFilterExpression": {"chave_importacao": {"$exists": True}},
+        },
+        {
+            # Busca de placa por trecho nas listas de estacionados e no Histórico
+            "name": "lot_placa_tokens_status_saida_id",
+            "keys": [
+                ("lot_id", ASCENDING), ("placa_tokens", ASCENDING), ("status", ASCENDING),
+                ("saida", DESCENDING), ("_id", DESCENDING),
+            ],
+        },
+    ],
+    "configuracoes": [
+        {
+            "name": "lot_type_unico",
+            "keys": [("lot_id", ASCENDING), ("type", ASCENDING)],
+            "unique": True,
+        },
+    ],
+    "faturamento_por_hora": [
+        {
+            "name": "lot_periodo_tipo_unico",
+            "keys": [("lot_id", ASCENDING), ("periodo", ASCENDING), ("tipo_veiculo", ASCENDING)],
+            "unique": True,
+        },
+    ],
+    "ocupacao": [
+        {
+            # Um contador por zona; também recusa a entrada em uma zona lotada (ver MongoVehicleRepository)
+            "name": "lot_zona_unico",
+            "keys": [("lot_id", ASCENDING), ("zona", ASCENDING)],
+            "unique": True,
+        },
+    ],
+}
+
+# Índices substituídos por versões que também cobrem _id ou começam por lot_id; removidos por ensure_indexes
+OBSOLETE_INDEXES = {
+    "veiculos": [
+        "status_saida", "placa_tokens_status_saida", "status_placa", "status_saida_id",
+        "placa_estacionado_unico", "placa_tokens_status_saida_id",
+    ],
+    "configuracoes": ["type_unico"],
+    "faturamento_por_hora": ["periodo_tipo_unico"],
+}
+
+# Índices criados em cada partição de arquivo (veiculos_arquivo_AAAA_MM), que só tem finalizados
+ARCHIVE_INDEXES = ["lot_status_saida_id", "lot_placa_tokens_status_saida_id"]
+
+_lock = threading.Lock()
+_bootstrapped = {}
+
+
+def _opcoes(spec):
+    return {k: v for k, v in spec.items() if k not in ("name", "keys")}
+
+
+def _remover_obsoletos(collection, nomes, erros):
+    existentes = collection.index_information()
+    for nome in nomes:
+        if nome in existentes:
+            try:
+                collection.drop_index(nome)
+            except OperationFailure as e:
+                erros.append(f"{collection.name}.{nome}: {e}")
+
+
+def ensure_indexes(db, archive_prefix=None, patio_padrao=None):
+    """
+    Cria os índices declarados em INDEXES (create_index é idempotente), também nas
+    partições de arquivo cujo nome começa por `archive_prefix`, remove os de
+    OBSOLETE_INDEXES e retorna uma lista de erros, um por índice que não pôde ser
+    criado ou removido, sem interromper o app.
+
+    Com `patio_padrao`, os documentos gravados antes da separação por pátio (sem
+    lot_id) passam a esse pátio; a busca por lot_id nulo usa os índices recém-criados.
+    Os veículos sem os campos de busca de placa os recebem (indexar_placas), o que põe
+    os estacionados antigos sob o índice único de placa aberta.
+    """
+    erros = []
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            try:
+                collection.create_index(spec["keys"], name=spec["name"], **_opcoes(spec))
+            except OperationFailure as e:
+                erros.append(f"{collection_name}.{spec['name']}: {e}")
+    particoes = [db[nome] for nome in db.list_collection_names() if archive_prefix and nome.startswith(archive_prefix)]
+    for particao in particoes:
+        try:
+            ensure_archive_indexes(particao)
+        except OperationFailure as e:
+            erros.append(f"{particao.name}: {e}")
+    if patio_padrao is not None:
+        for collection in [db[nome] for nome in INDEXES] + particoes:
+            collection.update_many({"lot_id": None}, {"$set": {"lot_id": patio_padrao}})
+    # Registros anteriores à busca por trecho: sem placa_normalizada, um estacionado fica
+    # fora da busca e do índice único, e a mesma placa ganharia um segundo ticket aberto
+    for collection in [db.veiculos] + particoes:
+        recusados = []
+        indexar_placas(collection, recusados=recusados)
+        if recusados:
+            erros.append(
+                f"{collection.name}: {len(recusados)} estacionado(s) com a placa já aberta em outro ticket "
+                f"ficaram sem os campos de busca: {', '.join(map(str, recusados))}"
+            )
+    for collection_name, nomes in OBSOLETE_INDEXES.items():
+        _remover_obsoletos(db[collection_name], nomes, erros)
+    for particao in particoes:
+        _remover_obsoletos(particao, OBSOLETE_INDEXES["veiculos"], erros)
+    return erros
+
+
+def bootstrap_indexes(db, archive_prefix=None, patio_padrao=None):
+    """
+    Executa ensure_indexes uma única vez por banco durante a vida do processo,
+    retornando os erros da primeira execução nas chamadas seguintes.
+    """
+    key = (id(db.client), db.name)
+    with _lock:
+        if key not in _bootstrapped:
+            _bootstrapped[key] = ensure_indexes(db, archive_prefix, patio_padrao)
+        return _bootstrapped[key]
+
+
+def ensure_archive_indexes(collection):
+    """Cria em uma partição de arquivo os índices de ARCHIVE_INDEXES."""
+    for spec in INDEXES["veiculos"]:
+        if spec["name"] in ARCHIVE_INDEXES:
+            collection.create_index(spec["keys"], name=spec["name"], **_opcoes(spec))
+
+
+def verify_indexes(db):
+    """
+    Compara os índices existentes com os declarados. Retorna uma lista de
+    dicionários {"collection", "name", "ok", "detalhe"}.
+    """
+    relatorio = []
+    for collection_name, specs in INDEXES.items():
+        existentes = db[collection_name].index_information()
+        for spec in specs:
+            atual = existentes.get(spec["name"])
+            if atual is None:
+                relatorio.append({"collection": collection_name, "name": spec["name"], "ok": False, "detalhe": "ausente"})
+                continue
+
+            divergencias = []
+            if [tuple(k) for k in atual["key"]] != [tuple(k) for k in spec["keys"]]:
+                divergencias.append(f"chaves {atual['key']}")
+            for opcao, valor in _opcoes(spec).items():
+                if atual.get(opcao) != valor:
+                    divergencias.append(f"{opcao}={atual.get(opcao)}")
+            relatorio.append({
+                "collection": collection_name,
+                "name": spec["name"],
+                "ok": not divergencias,
+                "detalhe": ", ".join(divergencias) or "ok",
+            })
+    return relatorio
+
+
+def _estagios(plano):
+    """Percorre recursivamente um plano de execução retornando os nomes dos estágios."""
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            yield plano["stage"]
+        for valor in plano.values():
+            yield from _estagios(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            yield from _estagios(item)
+
+
+def _consultas_monitoradas(db, lot_id):
+    agora = datetime.now()
+    return [
+        ("Entrada (placa estacionada)", db.veiculos.find({
+            "lot_id": lot_id, "placa_normalizada": "ABC1C34", "status": "estacionado",
+        })),
+        ("Busca de placa", db.veiculos.find({"lot_id": lot_id, "placa_tokens": "1C3", "status": "estacionado"}).limit(50)),
+        ("Veículos Estacionados", db.veiculos.find({"lot_id": lot_id, "status": "estacionado"})),
+        ("Dashboard (bruto)", db.veiculos.find({
+            "lot_id": lot_id,
+            "status": "finalizado",
+            "saida": {"$gte": agora - timedelta(days=30), "$lte": agora},
+        })),
+        ("Histórico", db.veiculos.find({"lot_id": lot_id, "status": "finalizado"}).sort([("saida", -1), ("_id", -1)]).limit(50)),
+        ("Histórico (página seguinte)", db.veiculos.find({
+            "lot_id": lot_id,
+            "status": "finalizado",
+            "$or": [{"saida": {"$lt": agora}}, {"saida": agora, "_id": {"$lt": ObjectId()}}],
+        }).sort([("saida", -1), ("_id", -1)]).limit(50)),
+        ("Configuração de preços", db.configuracoes.find({"lot_id": lot_id, "type": "price_config"}).limit(1)),
+        ("Vagas livres", db.ocupacao.find({"lot_id": lot_id}, {"_id": 0, "livres": 0})),
+        ("Dashboard (agregados)", db.faturamento_por_hora.find({
+            "lot_id": lot_id,
+            "periodo": {"$gte": agora - timedelta(days=30), "$lte": agora},
+        })),
+        ("Pátios", db.veiculos.find({}, {"_id": 0, "lot_id": 1}).sort("lot_id", 1).limit(1)),
+    ]
+
+
+def diagnosticar_consultas(db, lot_id):
+    """
+    Executa explain() nas consultas principais do app, no pátio `lot_id`, e indica
+    quais fazem varredura completa da coleção (COLLSCAN).
+    """
+    diagnostico = []
+    for nome, cursor in _consultas_monitoradas(db, lot_id):
+        try:
+            plano = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            estagios = list(_estagios(plano))
+            diagnostico.append({
+                "consulta": nome,
+                "collscan": "COLLSCAN" in estagios,
+                "estagios": " → ".join(reversed(estagios)),
+            })
+        except Exception as e:
+            diagnostico.append({"consulta": nome, "collscan": None, "estagios": f"erro: {e}"})
+    return diagnostico
@@ -0,0 +1,292 @@
+# utils/metrics.py
+"""
+Métricas de desempenho do processo: quantidade, duração e documentos devolvidos de
+cada chamada ao armazenamento (via instrumentar), de cada aba e etapa das telas (via
+medir) e do ping da conexão. As durações vão para histogramas no formato do
+Prometheus, exportados em um endpoint HTTP local (METRICS_PORT), em um arquivo
+(METRICS_FILE) e na rota /metrics da API. As operações acima de SLOW_OPERATION_MS
+ficam também em uma lista das mais recentes.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores (segundos) dos baldes dos histogramas
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Operações mais lentas que isto (milissegundos) entram na lista de lentas
+SLOW_OPERATION_MS = float(os.environ.get("SLOW_OPERATION_MS", 250))
+# Porta do endpoint /metrics local (0 desliga) e arquivo regravado a cada METRICS_FILE_INTERVAL segundos
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.environ.get("METRICS_FILE_INTERVAL", 15))
+
+# Métodos cujo resultado é consumido aos poucos: a medição termina quando a iteração acaba
+METODOS_ITERADORES = ("iter_finished",)
+
+_lock = threading.Lock()
+_series = {}
+_lentas = deque(maxlen=100)
+_exportacao = {"iniciada": False}
+
+
+class Serie:
+    """Histograma de durações de uma operação, com o total de documentos devolvidos."""
+
+    def __init__(self):
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.documentos = 0
+        self.erros = 0
+        self.baldes = [0] * (len(BUCKETS) + 1)
+
+    def observar(self, duracao, documentos, erro):
+        self.quantidade += 1
+        self.soma += duracao
+        self.maximo = max(self.maximo, duracao)
+        self.documentos += documentos or 0
+        self.erros += bool(erro)
+        for posicao, limite in enumerate(BUCKETS):
+            if duracao <= limite:
+                self.baldes[posicao] += 1
+                return
+        self.baldes[-1] += 1
+
+    def percentil(self, fracao):
+        """Estimativa por interpolação dentro do balde, como o histogram_quantile do Prometheus."""
+        if not self.quantidade:
+            return None
+        alvo = fracao * self.quantidade
+        acumulado = 0
+        for posicao, contagem in enumerate(self.baldes):
+            if contagem and acumulado + contagem >= alvo:
+                inferior = BUCKETS[posicao - 1] if posicao else 0.0
+                superior = BUCKETS[posicao] if posicao < len(BUCKETS) else self.maximo
+                return min(inferior + (superior - inferior) * (alvo - acumulado) / contagem, self.maximo)
+            acumulado += contagem
+        return self.maximo
+
+
+def observar(grupo, operacao, duracao, documentos=None, erro=False):
+    """Registra uma execução de `operacao` (do `grupo` "storage", "tela", "etapa" ou "conexao")."""
+    with _lock:
+        serie = _series.get((grupo, operacao))
+        if serie is None:
+            serie = _series[(grupo, operacao)] = Serie()
+        serie.observar(duracao, documentos, erro)
+    if duracao * 1000 >= SLOW_OPERATION_MS:
+        _lentas.append({
+            "quando": datetime.now(),
+            "grupo": grupo,
+            "operacao": operacao,
+            "duracao_ms": duracao * 1000,
+            "documentos": documentos,
+        })
+
+
+@contextmanager
+def medir(grupo, operacao):
+    """Mede o bloco (ou a função decorada) como uma execução de `operacao`."""
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        yield
+    except BaseException as e:
+        # st.rerun e st.stop interrompem o script com exceções de controle, que não são erros
+        erro = isinstance(e, Exception) and type(e).__module__.split(".")[0] != "streamlit"
+        raise
+    finally:
+        observar(grupo, operacao, time.perf_counter() - inicio, erro=erro)
+
+
+def _documentos(resultado):
+    if resultado is None:
+        return 0
+    if isinstance(resultado, (list, tuple)):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return 1
+    return None
+
+
+def _iterar(resultado, grupo, operacao, inicio):
+    documentos = 0
+    erro = False
+    try:
+        for documento in resultado:
+            documentos += 1
+            yield documento
+    except Exception:
+        erro = True
+        raise
+    finally:
+        observar(grupo, operacao, time.perf_counter() - inicio, documentos, erro)
+
+
+class RepositorioInstrumentado:
+    """
+    Envolve um repositório e mede cada chamada de método público como a operação
+    "<backend>.<método>" do grupo "storage". Atributos e propriedades passam direto.
+    """
+
+    def __init__(self, repo, prefixo=None):
+        self._repo = repo
+        self._prefixo = prefixo or getattr(repo, "name", type(repo).__name__)
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._repo, nome)
+        if nome.startswith("_") or not callable(atributo):
+            return atributo
+        operacao = f"{self._prefixo}.{nome}"
+
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resultado = atributo(*args, **kwargs)
+            except Exception:
+                observar("storage", operacao, time.perf_counter() - inicio, erro=True)
+                raise
+            if nome in METODOS_ITERADORES:
+                return _iterar(resultado, "storage", operacao, inicio)
+            observar("storage", operacao, time.perf_counter() - inicio, _documentos(resultado))
+            return resultado
+
+        return medido
+
+
+def instrumentar(repo, prefixo=None):
+    """Retorna `repo` com as chamadas medidas (sem envolver duas vezes)."""
+    if isinstance(repo, RepositorioInstrumentado):
+        return repo
+    return RepositorioInstrumentado(repo, prefixo)
+
+
+# --- Leitura e exportação ---------------------------------------------------
+
+def series():
+    """Resumo de cada operação medida: quantidade, média, p50/p95/p99 e máximo (ms), documentos e erros."""
+    with _lock:
+        itens = [(chave, serie, list(serie.baldes)) for chave, serie in _series.items()]
+    resumo = []
+    for (grupo, operacao), serie, baldes in sorted(itens, key=lambda item: item[0]):
+        resumo.append({
+            "grupo": grupo,
+            "operacao": operacao,
+            "quantidade": serie.quantidade,
+            "media_ms": serie.soma / serie.quantidade * 1000 if serie.quantidade else 0.0,
+            "p50_ms": (serie.percentil(0.50) or 0.0) * 1000,
+            "p95_ms": (serie.percentil(0.95) or 0.0) * 1000,
+            "p99_ms": (serie.percentil(0.99) or 0.0) * 1000,
+            "max_ms": serie.maximo * 1000,
+            "documentos": serie.documentos,
+            "erros": serie.erros,
+            "baldes": baldes,
+        })
+    return resumo
+
+
+def operacoes_lentas():
+    """Operações mais lentas que SLOW_OPERATION_MS, da mais recente para a mais antiga."""
+    return list(reversed(_lentas))
+
+
+def zerar():
+    with _lock:
+        _series.clear()
+    _lentas.clear()
+
+
+def _rotulos(grupo, operacao, **extras):
+    pares = {"grupo": grupo, "operacao": operacao, **extras}
+    return ",".join(f'{chave}="{str(valor).replace(chr(34), chr(39))}"' for chave, valor in pares.items())
+
+
+def formato_prometheus():
+    """Todas as séries no formato de texto de exposição do Prometheus."""
+    with _lock:
+        itens = [(chave, serie.quantidade, serie.soma, serie.documentos, serie.erros, list(serie.baldes))
+                 for chave, serie in sorted(_series.items())]
+    linhas = [
+        "# HELP estacionamento_operacao_segundos Duração das operações do armazenamento e das telas.",
+        "# TYPE estacionamento_operacao_segundos histogram",
+    ]
+    for (grupo, operacao), quantidade, soma, _, _, baldes in itens:
+        acumulado = 0
+        for limite, contagem in zip(BUCKETS + ("+Inf",), baldes):
+            acumulado += contagem
+            linhas.append(f"estacionamento_operacao_segundos_bucket{{{_rotulos(grupo, operacao, le=limite)}}} {acumulado}")
+        linhas.append(f"estacionamento_operacao_segundos_sum{{{_rotulos(grupo, operacao)}}} {soma}")
+        linhas.append(f"estacionamento_operacao_segundos_count{{{_rotulos(grupo, operacao)}}} {quantidade}")
+    linhas += [
+        "# HELP estacionamento_documentos_total Documentos devolvidos pelas operações do armazenamento.",
+        "# TYPE estacionamento_documentos_total counter",
+    ]
+    linhas += [
+        f"estacionamento_documentos_total{{{_rotulos(grupo, operacao)}}} {documentos}"
+        for (grupo, operacao), _, _, documentos, _, _ in itens if grupo == "storage"
+    ]
+    linhas += [
+        "# HELP estacionamento_erros_total Operações que terminaram com erro.",
+        "# TYPE estacionamento_erros_total counter",
+    ]
+    linhas += [
+        f"estacionamento_erros_total{{{_rotulos(grupo, operacao)}}} {erros}"
+        for (grupo, operacao), _, _, _, erros, _ in itens
+    ]
+    return "\n".join(linhas) + "\n"
+
+
+class _MetricasHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = formato_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def gravar_metricas(caminho):
+    # Grava em um temporário e renomeia, para o coletor nunca ler um arquivo pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(formato_prometheus())
+    os.replace(temporario, caminho)
+
+
+def _gravar_periodicamente(caminho, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            gravar_metricas(caminho)
+        except OSError:
+            pass
+
+
+def iniciar_exportacao(porta=METRICS_PORT, arquivo=METRICS_FILE):
+    """
+    Inicia, uma vez por processo, o endpoint http://localhost:<porta>/metrics e a
+    gravação periódica do arquivo, conforme configurados.
+    """
+    with _lock:
+        if _exportacao["iniciada"]:
+            return
+        _exportacao["iniciada"] = True
+    if porta:
+        servidor = ThreadingHTTPServer(("127.0.0.1", porta), _MetricasHandler)
+        threading.Thread(target=servidor.serve_forever, daemon=True, name="metrics-http").start()
+    if arquivo:
+        threading.Thread(
+            target=_gravar_periodicamente, args=(arquivo, METRICS_FILE_INTERVAL), daemon=True, name="metrics-file"
+        ).start()
@@ -0,0 +1,100 @@
+# utils/plates.py
+import re
+
+PLACA_ANTIGA = re.compile(r"^[A-Z]{3}[0-9]{4}$")
+PLACA_MERCOSUL = re.compile(r"^[A-Z]{3}[0-9][A-Z][0-9]{2}$")
+
+# Quantidade máxima de resultados devolvidos por uma busca de placa
+LIMITE_BUSCA = 50
+
+def limpar_placa(placa):
+    """
+    Remove hífens, espaços e qualquer outro caractere não alfanumérico e
+    converte para maiúsculas: "abc-1234" -> "ABC1234".
+    """
+    return re.sub(r"[^A-Z0-9]", "", str(placa or "").upper())
+
+def normalizar_placa(placa):
+    """
+    Forma canônica da placa. Placas no formato antigo são convertidas para o
+    padrão Mercosul (o quinto caractere vira letra: 0 -> A, 1 -> B, ...), de modo
+    que "ABC-1234" e "ABC1C34" representam o mesmo veículo.
+    """
+    placa = limpar_placa(placa)
+    if PLACA_ANTIGA.match(placa):
+        return placa[:4] + chr(ord("A") + int(placa[4])) + placa[5:]
+    return placa
+
+def formas_placa(placa):
+    """Retorna as grafias equivalentes da placa (antiga e Mercosul, quando aplicável)."""
+    placa = limpar_placa(placa)
+    formas = {placa}
+    if PLACA_ANTIGA.match(placa):
+        formas.add(normalizar_placa(placa))
+    elif PLACA_MERCOSUL.match(placa):
+        formas.add(placa[:4] + str(ord(placa[4]) - ord("A")) + placa[5:])
+    return formas
+
+def tokens_placa(placa):
+    """
+    Todas as substrings das grafias da placa. Como placas têm 7 caracteres, são
+    poucas dezenas de tokens, e uma busca por qualquer trecho vira uma igualdade
+    em um índice multikey em vez de um $regex sem âncora.
+    """
+    tokens = set()
+    for forma in formas_placa(placa):
+        for inicio in range(len(forma)):
+            for fim in range(inicio + 1, len(forma) + 1):
+                tokens.add(forma[inicio:fim])
+    return sorted(tokens)
+
+def campos_placa(placa):
+    """Campos de busca que acompanham a placa em cada documento de veículo."""
+    return {
+        "placa_normalizada": normalizar_placa(placa),
+        "placa_tokens": tokens_placa(placa),
+    }
+
+def filtro_busca_placa(busca):
+    """
+    Filtro MongoDB para a busca digitada pelo operador, ou None se a busca
+    estiver vazia depois de limpa.
+    """
+    termo = limpar_placa(busca)
+    if not termo:
+        return None
+    return {"placa_tokens": termo}
+
+def indexar_placas(collection, tamanho_lote=1000, recusados=None):
+    """
+    Preenche os campos de busca nos documentos que ainda não os possuem
+    (registros anteriores a este índice), em lotes. Um estacionado cuja placa já
+    está aberta em outro ticket do pátio é recusado pelo índice único: fica sem os
+    campos, é pulado e, se `recusados` for uma lista, tem o _id anotado nela.
+    Retorna quantos foram atualizados.
+    """
+    # Só o MongoDB usa este índice; os backends locais não precisam carregar o pymongo
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+
+    pulados = []
+    atualizados = 0
+    while True:
+        filtro = {"$or": [{"placa_tokens": {"$exists": False}}, {"placa_normalizada": {"$exists": False}}]}
+        if pulados:
+            filtro["_id"] = {"$nin": pulados}
+        lote = list(collection.find(filtro, {"placa": 1}).limit(tamanho_lote))
+        if not lote:
+            if recusados is not None:
+                recusados.extend(pulados)
+            return atualizados
+        try:
+            collection.bulk_write([
+                UpdateOne({"_id": doc["_id"]}, {"$set": campos_placa(doc.get("placa"))})
+                for doc in lote
+            ], ordered=False)
+            atualizados += len(lote)
+        except BulkWriteError as e:
+            falhas = [lote[erro["index"]]["_id"] for erro in e.details["writeErrors"]]
+            pulados += falhas
+            atualizados += len(lote) - len(falhas)
@@ -0,0 +1,226 @@
+# utils/tariffs.py
+"""
+Motor de tarifas. A tabela de preços (configuracoes, "prices") guarda, por tipo de
+veículo, um preço por hora (o formato original) ou uma regra:
+
+    {
+        "preco_hora": 10.0,           # valor da hora fora das faixas
+        "fracao_minutos": 15,         # unidade de cobrança (padrão: 15)
+        "carencia_minutos": 10,       # permanências até aqui não pagam
+        "primeira_hora": 15.0,        # valor fechado da primeira hora
+        "diaria_maxima": 60.0,        # teto de cada período de 24h desde a entrada
+        "faixas": [{"inicio": "22:00", "fim": "06:00", "preco_hora": 5.0}],
+    }
+
+e, na chave "mensalistas", a lista de placas que não pagam. Cada regra é compilada uma
+vez em uma tabela do dia (limites das faixas em minutos e o custo acumulado desde a
+meia-noite em cada limite); o custo de qualquer permanência sai de duas buscas binárias
+nessa tabela, sem percorrer a permanência, e um lote inteiro é cotado de uma vez com
+np.searchsorted.
+"""
+import json
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+from utils.plates import normalizar_placa
+
+# Preço por hora dos tipos ausentes da tabela
+PRECO_HORA_PADRAO = 10.0
+FRACAO_PADRAO = 15
+MINUTOS_DIA = 24 * 60
+
+_lock = threading.Lock()
+_compiladas = {}
+# Tabelas distintas guardadas em memória (a tabela salva e as das simulações)
+LIMITE_COMPILADAS = 32
+
+
+def _minuto_do_dia(hora):
+    horas, minutos = str(hora).split(":")
+    minuto = int(horas) * 60 + int(minutos)
+    if not 0 <= minuto <= MINUTOS_DIA:
+        raise ValueError(f"Horário inválido: {hora}")
+    return minuto
+
+
+def regra_tarifa(valor):
+    """Regra completa de um tipo, a partir de um preço por hora ou de uma regra parcial."""
+    if not isinstance(valor, dict):
+        valor = {"preco_hora": PRECO_HORA_PADRAO if valor is None else float(valor)}
+    return {
+        "preco_hora": float(valor.get("preco_hora", PRECO_HORA_PADRAO)),
+        "fracao_minutos": int(valor.get("fracao_minutos") or FRACAO_PADRAO),
+        "carencia_minutos": float(valor.get("carencia_minutos") or 0),
+        "primeira_hora": None if valor.get("primeira_hora") is None else float(valor["primeira_hora"]),
+        "diaria_maxima": None if valor.get("diaria_maxima") is None else float(valor["diaria_maxima"]),
+        "faixas": [dict(faixa) for faixa in valor.get("faixas") or []],
+    }
+
+
+def montar_regra(preco_hora, fracao_minutos=FRACAO_PADRAO, carencia_minutos=0, primeira_hora=None,
+                 diaria_maxima=None, faixas=None):
+    """Valor a gravar para um tipo: só o preço por hora, se nenhuma outra regra estiver ativa."""
+    regra = {"preco_hora": float(preco_hora)}
+    if fracao_minutos and int(fracao_minutos) != FRACAO_PADRAO:
+        regra["fracao_minutos"] = int(fracao_minutos)
+    if carencia_minutos:
+        regra["carencia_minutos"] = carencia_minutos
+    if primeira_hora is not None:
+        regra["primeira_hora"] = float(primeira_hora)
+    if diaria_maxima is not None:
+        regra["diaria_maxima"] = float(diaria_maxima)
+    if faixas:
+        regra["faixas"] = [dict(faixa) for faixa in faixas]
+    return regra if len(regra) > 1 else regra["preco_hora"]
+
+
+def preco_hora(valor):
+    """Preço por hora fora das faixas, para um preço simples ou uma regra."""
+    return regra_tarifa(valor)["preco_hora"]
+
+
+class TabelaTarifa:
+    """Regra de um tipo compilada para o dia: limites (minutos), preço por minuto de cada trecho e custo acumulado."""
+
+    def __init__(self, regra):
+        regra = regra_tarifa(regra)
+        self.fracao = regra["fracao_minutos"]
+        self.carencia = regra["carencia_minutos"]
+        self.primeira_hora = regra["primeira_hora"]
+        self.diaria_maxima = regra["diaria_maxima"]
+
+        # Preço por minuto de cada minuto do dia; as faixas posteriores prevalecem
+        por_minuto = np.full(MINUTOS_DIA, regra["preco_hora"] / 60)
+        for faixa in regra["faixas"]:
+            inicio, fim = _minuto_do_dia(faixa["inicio"]), _minuto_do_dia(faixa["fim"])
+            trechos = [(inicio, fim)] if inicio <= fim else [(inicio, MINUTOS_DIA), (0, fim)]
+            for de, ate in trechos:
+                por_minuto[de:ate] = float(faixa["preco_hora"]) / 60
+
+        # Só os minutos em que o preço muda viram limites: a tabela tem um trecho por faixa
+        mudancas = np.flatnonzero(np.diff(por_minuto)) + 1
+        self.limites = np.concatenate([[0], mudancas]).astype(np.float64)
+        self.taxas = por_minuto[self.limites.astype(np.int64)]
+        larguras = np.diff(np.append(self.limites, MINUTOS_DIA))
+        self.acumulado = np.concatenate([[0.0], np.cumsum(self.taxas * larguras)])[:-1]
+        self.custo_dia = float(np.sum(self.taxas * larguras))
+        # Cópias em listas para cotar_um, que evita o custo fixo do NumPy em uma única cotação
+        self._tabela = (self.limites.tolist(), self.acumulado.tolist(), self.taxas.tolist())
+
+    def _custo_ate(self, minutos):
+        """Custo desde a meia-noite até `minutos` depois dela (pode passar de um dia)."""
+        dias, resto = np.divmod(minutos, MINUTOS_DIA)
+        trecho = np.searchsorted(self.limites, resto, side="right") - 1
+        return dias * self.custo_dia + self.acumulado[trecho] + (resto - self.limites[trecho]) * self.taxas[trecho]
+
+    def _periodo(self, inicio, duracao, primeiro):
+        """Custo de um período de até 24h que começa `inicio` minutos após a meia-noite."""
+        custo = self._custo_ate(inicio + duracao) - self._custo_ate(inicio)
+        if self.primeira_hora is not None:
+            apos_primeira = self._custo_ate(inicio + np.maximum(duracao, 60)) - self._custo_ate(inicio + 60)
+            custo = np.where(primeiro, self.primeira_hora + apos_primeira, custo)
+        if self.diaria_maxima is not None:
+            custo = np.minimum(custo, self.diaria_maxima)
+        return custo
+
+    def cotar(self, inicio, permanencia):
+        """
+        Valores de permanências de `permanencia` minutos iniciadas `inicio` minutos após a
+        meia-noite (arrays). A permanência é arredondada para cima em frações, com no
+        mínimo uma; cada período de 24h desde a entrada tem o próprio teto.
+        """
+        inicio = np.asarray(inicio, dtype=np.float64)
+        permanencia = np.asarray(permanencia, dtype=np.float64)
+        fracoes = np.maximum((permanencia + self.fracao - 1) // self.fracao, 1)
+        cobrado = fracoes * self.fracao
+        dias, resto = np.divmod(cobrado, MINUTOS_DIA)
+
+        primeiro = self._periodo(inicio, np.minimum(cobrado, MINUTOS_DIA), True)
+        dia_completo = float(self._periodo(np.float64(0), np.float64(MINUTOS_DIA), False))
+        valores = (
+            primeiro
+            + np.maximum(dias - 1, 0) * dia_completo
+            + np.where(dias >= 1, self._periodo(inicio, resto, False), 0.0)
+        )
+        valores = np.round(valores, 2)
+        if self.carencia:
+            valores = np.where(permanencia <= self.carencia, 0.0, valores)
+        return valores
+
+    def cotar_um(self, inicio, permanencia):
+        """Mesma conta de cotar para uma única permanência, com bisect em vez de arrays."""
+        if self.carencia and permanencia <= self.carencia:
+            return 0.0
+        limites, acumulado, taxas = self._tabela
+
+        def custo_ate(minutos):
+            dias, resto = divmod(minutos, MINUTOS_DIA)
+            trecho = bisect_right(limites, resto) - 1
+            return dias * self.custo_dia + acumulado[trecho] + (resto - limites[trecho]) * taxas[trecho]
+
+        def periodo(duracao, primeiro):
+            # Mesma ordem das operações de cotar, para que os dois caminhos arredondem igual
+            if primeiro and self.primeira_hora is not None:
+                custo = self.primeira_hora + (custo_ate(inicio + max(duracao, 60)) - custo_ate(inicio + 60))
+            else:
+                custo = custo_ate(inicio + duracao) - custo_ate(inicio)
+            return custo if self.diaria_maxima is None else min(custo, self.diaria_maxima)
+
+        cobrado = max((permanencia + self.fracao - 1) // self.fracao, 1) * self.fracao
+        dias, resto = divmod(cobrado, MINUTOS_DIA)
+        valor = periodo(min(cobrado, MINUTOS_DIA), True)
+        if dias >= 1:
+            dia_completo = self.custo_dia if self.diaria_maxima is None else min(self.custo_dia, self.diaria_maxima)
+            valor = valor + (dias - 1) * dia_completo + periodo(resto, False)
+        return float(np.round(valor, 2))
+
+
+class Tarifario:
+    """Tabelas compiladas de todos os tipos e o conjunto de placas de mensalistas."""
+
+    def __init__(self, precos):
+        self.tabelas = {
+            tipo: TabelaTarifa(valor) for tipo, valor in precos.items() if tipo != "mensalistas"
+        }
+        self.padrao = TabelaTarifa(PRECO_HORA_PADRAO)
+        self.mensalistas = {normalizar_placa(placa) for placa in precos.get("mensalistas") or []}
+
+    def tabela(self, tipo):
+        return self.tabelas.get(tipo, self.padrao)
+
+    def cotar(self, inicio, permanencia, tipos, placas=None):
+        """
+        Cota um lote: `inicio` em minutos após a meia-noite da entrada, `permanencia` em
+        minutos e o tipo de cada veículo. Placas de mensalistas saem com valor zero.
+        """
+        inicio = np.asarray(inicio, dtype=np.float64)
+        permanencia = np.asarray(permanencia, dtype=np.float64)
+        tipos = np.asarray(tipos, dtype=object)
+        valores = np.zeros(len(permanencia), dtype=np.float64)
+        for tipo in set(tipos.tolist()):
+            mascara = tipos == tipo
+            valores[mascara] = self.tabela(tipo).cotar(inicio[mascara], permanencia[mascara])
+        if placas is not None and self.mensalistas:
+            valores[[normalizar_placa(placa) in self.mensalistas for placa in placas]] = 0.0
+        return valores
+
+    def cotar_um(self, inicio, permanencia, tipo, placa=None):
+        if placa is not None and normalizar_placa(placa) in self.mensalistas:
+            return 0.0
+        return self.tabela(tipo).cotar_um(inicio, permanencia)
+
+
+def compilar_tarifas(precos):
+    """Tarifario da tabela de preços, compilado uma única vez para cada conteúdo de tabela."""
+    chave = json.dumps(precos, sort_keys=True, default=str)
+    with _lock:
+        tarifario = _compiladas.get(chave)
+    if tarifario is None:
+        tarifario = Tarifario(precos)
+        with _lock:
+            if len(_compiladas) >= LIMITE_COMPILADAS:
+                _compiladas.clear()
+            _compiladas[chave] = tarifario
+    return tarifario